@@ -0,0 +1,375 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Mapping, Optional, Tuple
+
+from .settings import DEFAULT_TENANT, tenant_name
+
+PRIORITY_STREAM = "stream"
+PRIORITY_BATCH = "extract"
+_PRIORITIES = (PRIORITY_STREAM, PRIORITY_BATCH)
+
+# Tenant names come from a request header: past this many, unknown ones share one bucket.
+MAX_TENANTS = 64
+OTHER_TENANT = "other"
+_WAIT_SAMPLES = 256
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after_s: int):
+        super().__init__(f"admission rejected: {reason}")
+        self.reason = reason
+        self.retry_after_s = retry_after_s
+
+
+@dataclass(frozen=True)
+class AdmissionConfig:
+    initial_limit: float = 4.0
+    min_limit: float = 1.0
+    max_limit: float = 8.0
+    queue_size: int = 8
+    max_wait_s: float = 30.0
+    target_latency_s: float = 45.0
+    backoff: float = 0.7
+    # (name, weight, max in flight or 0) of the tenants with a non-default share.
+    tenants: Tuple[Tuple[str, int, int], ...] = ()
+    tenant_max_in_flight: int = 0
+    # Share of the limit that plain requests cannot take: kept for interactive (stream) ones.
+    interactive_reserve: float = 0.0
+
+
+def resolve_tenant(headers: Mapping[str, str], *, header: str, api_keys: Mapping[str, str]) -> str:
+    """Tenant of a request: a configured API key (X-API-Key or Bearer) wins over the self-declared header."""
+    key = headers.get("x-api-key") or ""
+    auth = headers.get("authorization") or ""
+    if not key and auth.lower().startswith("bearer "):
+        key = auth[7:].strip()
+    if key and key in api_keys:
+        return api_keys[key]
+    return tenant_name(headers.get(header.lower()) if header else None)
+
+
+class _Tenant:
+    __slots__ = ("name", "weight", "cap", "queues", "in_flight", "finish", "admitted", "rejected", "waits")
+
+    def __init__(self, name: str, weight: int, cap: int):
+        self.name = name
+        self.weight = max(1, weight)
+        self.cap = max(0, cap)
+        self.queues: Dict[str, Deque[_Waiter]] = {p: deque() for p in _PRIORITIES}
+        self.in_flight = 0
+        # Virtual finish tag of its newest queued request (weighted fair queuing).
+        self.finish = 0.0
+        self.admitted = 0
+        self.rejected = 0
+        self.waits: Deque[float] = deque(maxlen=_WAIT_SAMPLES)
+
+    def queued(self) -> int:
+        return sum(len(q) for q in self.queues.values())
+
+
+class _Waiter:
+    __slots__ = ("loop", "future", "priority", "tenant", "tag", "enqueued", "state", "slot")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, priority: str, tenant: _Tenant, tag: float):
+        self.loop = loop
+        self.future: asyncio.Future = loop.create_future()
+        self.priority = priority
+        self.tenant = tenant
+        self.tag = tag
+        self.enqueued = time.monotonic()
+        # queued -> granted | displaced, changed under the controller lock
+        self.state = "queued"
+        self.slot: Optional[Slot] = None
+
+
+class Slot:
+    """A granted slot; `release(...)` once with the outcome (slots may be released from worker threads)."""
+
+    def __init__(self, controller: "AdmissionController", priority: str, tenant: str = DEFAULT_TENANT, waited_s: float = 0.0):
+        self._controller = controller
+        self.priority = priority
+        self.tenant = tenant
+        self.waited_s = waited_s
+        self.started = time.monotonic()
+        self._released = False
+
+    def release(self, *, overloaded: bool = False, neutral: bool = False) -> None:
+        if self._released:
+            return
+        self._released = True
+        self._controller._release(self, time.monotonic() - self.started, overloaded=overloaded, neutral=neutral)
+
+
+class AdmissionController:
+    """AIMD concurrency limit with a bounded, per-tenant weighted fair wait queue.
+
+    Completions faster than the target latency grow the limit by 1/limit (about +1 per
+    full window); a slow or overloaded completion multiplies it by `backoff`, at most
+    once per window so one burst of slow calls is not counted many times. Waiting
+    stream requests are admitted before plain ones, and a stream arriving at a full
+    queue displaces the newest plain waiter.
+
+    Between tenants (departments) the queue is weighted fair: every waiter gets a virtual
+    finish tag `max(now, tenant's last tag) + 1/weight` and the smallest eligible tag goes
+    first, so a tenant's month-end bulk upload interleaves with everyone else's requests
+    instead of queueing ahead of them. A tenant over its concurrency cap waits while others
+    proceed, and plain requests leave `interactive_reserve` of the limit to stream ones.
+    """
+
+    def __init__(self, config: AdmissionConfig = AdmissionConfig()):
+        self._lock = threading.Lock()
+        self._tenants: Dict[str, _Tenant] = {}
+        self.config = config
+        self.limit = float(config.initial_limit)
+        self.in_flight = 0
+        self.batch_in_flight = 0
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {"queue_full": 0, "timeout": 0, "displaced": 0}
+        self.increases = 0
+        self.decreases = 0
+        self._latency_ewma_s: Optional[float] = None
+        self._last_decrease = -math.inf
+        self._virtual = 0.0
+
+    def configure(self, config: AdmissionConfig) -> None:
+        """Apply new bounds (config reload); the learned limit is kept, clamped into them."""
+        with self._lock:
+            self.config = config
+            self.limit = min(max(self.limit, config.min_limit), config.max_limit)
+            for tenant in self._tenants.values():
+                tenant.weight, tenant.cap = self._share(tenant.name)
+            woken = self._dispatch()
+        self._wake_all(woken)
+
+    def _share(self, name: str) -> Tuple[int, int]:
+        for tenant, weight, cap in self.config.tenants:
+            if tenant == name:
+                return max(1, weight), cap or self.config.tenant_max_in_flight
+        return 1, self.config.tenant_max_in_flight
+
+    def _tenant(self, name: str) -> _Tenant:
+        if name not in self._tenants and len(self._tenants) >= MAX_TENANTS and all(name != t for t, _, _ in self.config.tenants):
+            name = OTHER_TENANT
+        tenant = self._tenants.get(name)
+        if tenant is None:
+            tenant = self._tenants[name] = _Tenant(name, *self._share(name))
+        return tenant
+
+    def _queued(self) -> int:
+        return sum(t.queued() for t in self._tenants.values())
+
+    def _effective_limit(self) -> int:
+        return max(1, math.floor(self.limit))
+
+    def _reserved(self) -> int:
+        limit = self._effective_limit()
+        return min(limit - 1, math.floor(limit * self.config.interactive_reserve))
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < self._effective_limit()
+
+    def _can_start(self, tenant: _Tenant, priority: str) -> bool:
+        if not self._has_capacity() or (tenant.cap and tenant.in_flight >= tenant.cap):
+            return False
+        return priority == PRIORITY_STREAM or self.batch_in_flight < self._effective_limit() - self._reserved()
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        """Smallest finish tag among the queue heads that may start now; stream waiters first."""
+        for priority in _PRIORITIES:
+            best: Optional[_Waiter] = None
+            for tenant in self._tenants.values():
+                queue = tenant.queues[priority]
+                if queue and (best is None or queue[0].tag < best.tag) and self._can_start(tenant, priority):
+                    best = queue[0]
+            if best is not None:
+                return best
+        return None
+
+    def _grant(self, tenant: _Tenant, priority: str, waited_s: float) -> Slot:
+        self.in_flight += 1
+        self.admitted += 1
+        tenant.in_flight += 1
+        tenant.admitted += 1
+        tenant.waits.append(waited_s)
+        if priority == PRIORITY_BATCH:
+            self.batch_in_flight += 1
+        return Slot(self, priority, tenant.name, waited_s)
+
+    def _dequeue(self, waiter: _Waiter) -> None:
+        tenant = waiter.tenant
+        tenant.queues[waiter.priority].remove(waiter)
+        if not tenant.queued():
+            # Tags of requests that left without being served do not count against the tenant.
+            tenant.finish = min(tenant.finish, self._virtual)
+
+    def _victim(self, tenant: _Tenant, priority: str) -> Optional[_Waiter]:
+        """Plain waiter to displace from a full queue: the newest one of the tenant queueing the most.
+
+        A stream request displaces any plain waiter; a plain one only a tenant holding more
+        of the queue than the newcomer's own tenant would after it joined.
+        """
+        heaviest = max(
+            (t for t in self._tenants.values() if t.queues[PRIORITY_BATCH]),
+            key=lambda t: (t.queued(), t.finish),
+            default=None,
+        )
+        if heaviest is None:
+            return None
+        if priority != PRIORITY_STREAM and (heaviest is tenant or heaviest.queued() <= tenant.queued() + 1):
+            return None
+        return heaviest.queues[PRIORITY_BATCH][-1]
+
+    def retry_after_s(self) -> int:
+        """Rough time until a new request would get a slot: queue ahead of it, drained `limit` at a time."""
+        latency = self._latency_ewma_s or self.config.target_latency_s
+        waves = (self._queued() + 1) / max(1.0, self.limit)
+        return int(min(120, max(1, math.ceil(latency * waves))))
+
+    async def acquire(self, priority: str = PRIORITY_BATCH, tenant: str = DEFAULT_TENANT) -> Slot:
+        loop = asyncio.get_running_loop()
+        displaced: Optional[_Waiter] = None
+        with self._lock:
+            owner = self._tenant(tenant)
+            if self._can_start(owner, priority) and self._next_waiter() is None:
+                return self._grant(owner, priority, 0.0)
+            if self._queued() >= self.config.queue_size:
+                displaced = self._victim(owner, priority)
+                if displaced is None:
+                    self.rejected["queue_full"] += 1
+                    owner.rejected += 1
+                    raise AdmissionRejected("queue_full", self.retry_after_s())
+                self._dequeue(displaced)
+                displaced.state = "displaced"
+                displaced.tenant.rejected += 1
+                self.rejected["displaced"] += 1
+            tag = owner.finish = max(self._virtual, owner.finish) + 1.0 / owner.weight
+            waiter = _Waiter(loop, priority, owner, tag)
+            owner.queues[priority].append(waiter)
+            retry_after = self.retry_after_s()
+        if displaced is not None:
+            self._wake(displaced, AdmissionRejected("displaced", retry_after))
+
+        try:
+            try:
+                result = await asyncio.wait_for(asyncio.shield(waiter.future), timeout=self.config.max_wait_s)
+            except asyncio.TimeoutError:
+                with self._lock:
+                    if waiter.state == "queued":
+                        self._dequeue(waiter)
+                        self.rejected["timeout"] += 1
+                        owner.rejected += 1
+                        raise AdmissionRejected("timeout", self.retry_after_s())
+                # Granted or displaced in the same instant; the result is already on its way.
+                result = await waiter.future
+        except asyncio.CancelledError:
+            # Client went away while waiting: leave the queue, or hand back a slot granted meanwhile.
+            with self._lock:
+                if waiter.state == "queued":
+                    self._dequeue(waiter)
+            if waiter.state == "granted" and waiter.slot is not None:
+                waiter.slot.release(neutral=True)
+            raise
+        if isinstance(result, AdmissionRejected):
+            raise result
+        return result
+
+    @staticmethod
+    def _wake(waiter: _Waiter, result: Any) -> None:
+        def _set() -> None:
+            if not waiter.future.done():
+                waiter.future.set_result(result)
+
+        waiter.loop.call_soon_threadsafe(_set)
+
+    def _wake_all(self, woken: List[_Waiter]) -> None:
+        for waiter in woken:
+            self._wake(waiter, waiter.slot)
+
+    def _adjust(self, latency_s: float, overloaded: bool) -> None:
+        alpha = 0.3
+        self._latency_ewma_s = latency_s if self._latency_ewma_s is None else (1 - alpha) * self._latency_ewma_s + alpha * latency_s
+        cfg = self.config
+        now = time.monotonic()
+        if overloaded or latency_s > cfg.target_latency_s:
+            # One decrease per window (about one request latency, at least 1 s) so a burst counts once.
+            if now - self._last_decrease >= max(1.0, self._latency_ewma_s or 0.0):
+                self.limit = max(cfg.min_limit, self.limit * cfg.backoff)
+                self._last_decrease = now
+                self.decreases += 1
+        elif self.limit < cfg.max_limit:
+            self.limit = min(cfg.max_limit, self.limit + 1.0 / self.limit)
+            self.increases += 1
+
+    def _dispatch(self) -> List[_Waiter]:
+        woken = []
+        now = time.monotonic()
+        while True:
+            waiter = self._next_waiter()
+            if waiter is None:
+                break
+            waiter.tenant.queues[waiter.priority].popleft()
+            self._virtual = max(self._virtual, waiter.tag)
+            waiter.state = "granted"
+            waiter.slot = self._grant(waiter.tenant, waiter.priority, now - waiter.enqueued)
+            woken.append(waiter)
+        return woken
+
+    def _release(self, slot: Slot, latency_s: float, *, overloaded: bool, neutral: bool) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self._tenant(slot.tenant).in_flight -= 1
+            if slot.priority == PRIORITY_BATCH:
+                self.batch_in_flight -= 1
+            if not neutral:
+                self._adjust(latency_s, overloaded)
+            woken = self._dispatch()
+        self._wake_all(woken)
+
+    @staticmethod
+    def _wait_stats(tenant: _Tenant) -> Dict[str, Any]:
+        waits = sorted(tenant.waits)
+        if not waits:
+            return {"p50": None, "p95": None, "max": None}
+        return {
+            "p50": int(waits[len(waits) // 2] * 1000),
+            "p95": int(waits[min(len(waits) - 1, math.ceil(len(waits) * 0.95) - 1)] * 1000),
+            "max": int(waits[-1] * 1000),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "limit": round(self.limit, 2),
+                "effective_limit": self._effective_limit(),
+                "interactive_reserved": self._reserved(),
+                "in_flight": self.in_flight,
+                "batch_in_flight": self.batch_in_flight,
+                "queue_depth": {p: sum(len(t.queues[p]) for t in self._tenants.values()) for p in _PRIORITIES},
+                "queue_size": self.config.queue_size,
+                "admitted": self.admitted,
+                "rejected": dict(self.rejected),
+                "limit_increases": self.increases,
+                "limit_decreases": self.decreases,
+                "latency_ewma_s": round(self._latency_ewma_s, 2) if self._latency_ewma_s is not None else None,
+                "target_latency_s": self.config.target_latency_s,
+                "retry_after_s": self.retry_after_s(),
+                # Wait in the queue of the last admitted requests, per tenant (ms).
+                "tenants": {
+                    t.name: {
+                        "weight": t.weight,
+                        "max_in_flight": t.cap or None,
+                        "in_flight": t.in_flight,
+                        "queued": t.queued(),
+                        "admitted": t.admitted,
+                        "rejected": t.rejected,
+                        "wait_ms": self._wait_stats(t),
+                    }
+                    for t in self._tenants.values()
+                },
+            }
@@ -1,37 +1,52 @@
 from __future__ import annotations
 
 import base64
-import json
 import logging
 import os
 import re
+import threading
 import time
-from typing import Any, Callable, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 
 import anthropic
 import fitz  # PyMuPDF
 from anthropic import Anthropic
 from pydantic import ValidationError
 
+from .scan_preprocess import pixmap_to_array, preprocess_scan
+from .debug_events import ELAPSED, TTFT, DebugLog, as_debug_log
+from .escalation import (
+    ESCALATED_VISION_STEP,
+    ESCALATION,
+    escalated_settings,
+    escalation_reasons,
+    estimate_image_tokens,
+    first_pass_settings,
+)
+from .extract_backends import ExtractionBackend, RulesBackend, create_backend, record_extraction
+from .json_repair import JsonFieldStream, JsonRecovery, recover_json_object
+from .memory_budget import MB, MEMORY_BUDGET, MemoryBudgetTimeout, MemoryGrant, estimate_render_bytes, render_zoom
+from .ru_normalize import normalize_leave_type
+from .rule_extract import apply_rule_fields
 from .schemas import LeaveRequestExtract
+from .settings import Settings, get_settings
+from .signature_detect import detect_signature, reconcile_signature
 
 
 class UpstreamAIError(RuntimeError):
-    def __init__(self, *, step: str, status_code: int, message: str, debug_steps: Optional[List[str]] = None):
+    def __init__(self, *, step: str, status_code: int, message: str, debug_steps: Optional[Sequence[str]] = None):
         super().__init__(message)
         self.step = step
         self.status_code = status_code
-        self.debug_steps = debug_steps or []
+        # Errors always carry the rendered steps: they end up in the error payload and logs.
+        self.debug_steps = list(debug_steps or [])
 
 
 logger = logging.getLogger(__name__)
 
 
-def _add_debug(debug_steps: List[str], message: str, on_debug: Optional[Callable[[str], None]] = None) -> None:
-    debug_steps.append(message)
-    logger.info("[extract] %s", message)
-    if on_debug:
-        on_debug(message)
+def _elapsed_ms(started: float) -> int:
+    return int((time.monotonic() - started) * 1000)
 
 
 
@@ -112,41 +127,6 @@ def _should_try_structured_parse_fallback(err: Exception, primary_model: str, fa
     return False
 
 
-def _env_int(name: str, default: int) -> int:
-    v = os.getenv(name)
-    if v is None or v.strip() == "":
-        return default
-    try:
-        return int(v)
-    except ValueError:
-        return default
-
-
-def _env_int_min(name: str, default: int, minimum: int) -> int:
-    return max(minimum, _env_int(name, default))
-
-
-def _env_str(name: str, default: str) -> str:
-    v = os.getenv(name)
-    return default if v is None or v.strip() == "" else v.strip()
-
-
-def _max_image_b64_chars_limit() -> int:
-    """Compatibility helper for max image payload env vars.
-
-    Prefers canonical MAX_IMAGE_B64_CHARS and falls back to legacy
-    PDF_MAX_B64_BYTES for backward compatibility.
-    """
-    canonical = os.getenv("MAX_IMAGE_B64_CHARS")
-    if canonical is not None and canonical.strip() != "":
-        try:
-            return int(canonical)
-        except ValueError:
-            return 4_000_000
-
-    return _env_int("PDF_MAX_B64_BYTES", 4_000_000)
-
-
 def _pix_to_png_bytes(pix) -> bytes:
     try:
         return pix.tobytes("png")
@@ -165,26 +145,7 @@ def _extract_text_from_msg(msg) -> str:
 
 
 def _extract_first_json_object(text: str) -> Dict[str, Any]:
-    text = (text or "").strip()
-    if not text:
-        raise ValueError("Пустой ответ модели")
-
-    decoder = json.JSONDecoder()
-    for idx, ch in enumerate(text):
-        if ch != "{":
-            continue
-        try:
-            obj, _ = decoder.raw_decode(text[idx:])
-            if isinstance(obj, dict):
-                return obj
-        except json.JSONDecodeError:
-            continue
-
-    fenced = re.search(r"```(?:json)?\s*([\s\S]*?)\s*```", text, flags=re.IGNORECASE)
-    if fenced:
-        return json.loads(fenced.group(1).strip())
-
-    raise ValueError("В ответе модели не найден валидный JSON объект")
+    return recover_json_object(text).value
 
 
 def _system_prompt_ru() -> str:
@@ -195,25 +156,27 @@ def _system_prompt_ru() -> str:
     )
 
 
-def _draft_prompt_ru() -> str:
+def _draft_prompt_ru(signature: bool = True) -> str:
+    # SIGNATURE_DETECTOR=replace: the signature is judged locally, the model is not asked about it.
     return (
         "Считай заявление по изображениям.\n"
         "Сделай:\n"
         "1) Блок TRANSCRIPTION: построчная расшифровка видимого текста (как есть).\n"
         "2) Блок CANDIDATE_FIELDS: key:value для полей employee.full_name, leave.start_date, leave.end_date, "
-        "leave.days_count, leave.leave_type, request_date, manager.full_name, подпись.\n"
+        f"leave.days_count, leave.leave_type, request_date, manager.full_name{', подпись' if signature else ''}.\n"
         "Если не уверен — null.\n"
     )
 
 
-def _parse_prompt_ru_json_only(draft_text: str) -> str:
+def _parse_prompt_ru_json_only(draft_text: str, signature: bool = True) -> str:
     return (
         "На основе распознанного текста верни ТОЛЬКО валидный JSON-объект без markdown и пояснений.\n"
         "Критично: поле leave.leave_type верни только одним из canonical значений: "
         "annual_paid | unpaid | study | maternity | childcare | other | unknown.\n"
         "Если поле не подтверждается текстом — null.\n"
         "Структура верхнего уровня: schema_version, employer_name, employee, manager, request_date, leave, "
-        "signature_present, signature_confidence, raw_text, quality.\n"
+        f"{'signature_present, signature_confidence' if signature else 'signature_present=null, signature_confidence=null'}, "
+        "raw_text, quality.\n"
         "Структура leave: leave_type, start_date, end_date, days_count, comment, reason_text, "
         "is_part_of_annual_leave, schedule_reference.\n"
         "Все даты строго YYYY-MM-DD.\n\n"
@@ -228,46 +191,27 @@ def _short_error(err: Exception) -> str:
 
 
 def _normalize_leave_type(raw: Optional[str]) -> str:
-    value = (raw or "").strip().lower()
-    if not value:
-        return "unknown"
-
-    aliases = {
-        "annual_paid": "annual_paid",
-        "ежегодный оплачиваемый отпуск": "annual_paid",
-        "ежегодный оплачиваемый": "annual_paid",
-        "оплачиваемый отпуск": "annual_paid",
-        "unpaid": "unpaid",
-        "без сохранения": "unpaid",
-        "без сохранения заработной платы": "unpaid",
-        "study": "study",
-        "учебный": "study",
-        "maternity": "maternity",
-        "беременности и родам": "maternity",
-        "childcare": "childcare",
-        "по уходу за ребенком": "childcare",
-        "по уходу за ребёнком": "childcare",
-        "other": "other",
-        "unknown": "unknown",
-    }
-
-    if value in aliases:
-        return aliases[value]
-
-    if "оплач" in value and "отпуск" in value:
-        return "annual_paid"
-    if "без сохран" in value:
-        return "unpaid"
-    if "учеб" in value:
-        return "study"
-    if "беремен" in value or "родам" in value:
-        return "maternity"
-    if "уход" in value and ("ребен" in value or "ребён" in value):
-        return "childcare"
-    return "unknown"
+    return normalize_leave_type(raw)
 
 
-def _normalize_fallback_payload(raw_json: Dict[str, Any], debug_steps: List[str], on_debug: Optional[Callable[[str], None]]) -> Dict[str, Any]:
+def _normalize_fallback_payload(
+    raw_json: JsonRecovery | Dict[str, Any],
+    debug_steps: DebugLog | List[str],
+    on_debug: Optional[Callable[[str], None]] = None,
+) -> Dict[str, Any]:
+    debug = as_debug_log(debug_steps, on_debug)
+    if isinstance(raw_json, JsonRecovery):
+        recovery = raw_json
+        if recovery.repaired:
+            debug.add(
+                "structured.fallback.repair",
+                "json_repaired",
+                "Шаг {step}: JSON обрезан, восстановлен (dropped_chars={dropped_chars}, appended='{appended}')",
+                level=logging.WARNING,
+                dropped_chars=recovery.dropped_chars,
+                appended=recovery.appended,
+            )
+        raw_json = recovery.value
     payload = dict(raw_json)
     leave = payload.get("leave")
     if isinstance(leave, dict):
@@ -275,7 +219,13 @@ def _normalize_fallback_payload(raw_json: Dict[str, Any], debug_steps: List[str]
         normalized = _normalize_leave_type(original if isinstance(original, str) else None)
         if original != normalized:
             leave["leave_type"] = normalized
-            _add_debug(debug_steps, f"Шаг structured.fallback.normalize: leave_type '{original}' -> '{normalized}'", on_debug)
+            debug.add(
+                "structured.fallback.normalize",
+                "normalized",
+                "Шаг {step}: leave_type '{original}' -> '{normalized}'",
+                original=original,
+                normalized=normalized,
+            )
 
     signature_confidence = payload.get("signature_confidence")
     if signature_confidence is not None:
@@ -299,19 +249,22 @@ def _normalize_fallback_payload(raw_json: Dict[str, Any], debug_steps: List[str]
             normalized_sc = None
 
         if normalized_sc is None:
-            _add_debug(
-                debug_steps,
-                f"Шаг structured.fallback.normalize: signature_confidence '{signature_confidence}' -> null",
-                on_debug,
+            debug.add(
+                "structured.fallback.normalize",
+                "normalized",
+                "Шаг {step}: signature_confidence '{original}' -> null",
+                original=signature_confidence,
             )
             payload["signature_confidence"] = None
         else:
             clipped_sc = max(0.0, min(1.0, float(normalized_sc)))
             if clipped_sc != signature_confidence:
-                _add_debug(
-                    debug_steps,
-                    f"Шаг structured.fallback.normalize: signature_confidence '{signature_confidence}' -> {clipped_sc}",
-                    on_debug,
+                debug.add(
+                    "structured.fallback.normalize",
+                    "normalized",
+                    "Шаг {step}: signature_confidence '{original}' -> {normalized}",
+                    original=signature_confidence,
+                    normalized=clipped_sc,
                 )
             payload["signature_confidence"] = clipped_sc
 
@@ -322,10 +275,12 @@ def _normalize_fallback_payload(raw_json: Dict[str, Any], debug_steps: List[str]
             if isinstance(value, str):
                 normalized_value = [value.strip()] if value.strip() else []
                 quality[key] = normalized_value
-                _add_debug(
-                    debug_steps,
-                    f"Шаг structured.fallback.normalize: quality.{key} string -> list[{len(normalized_value)}]",
-                    on_debug,
+                debug.add(
+                    "structured.fallback.normalize",
+                    "normalized",
+                    "Шаг {step}: quality.{key} string -> list[{items}]",
+                    key=key,
+                    items=len(normalized_value),
                 )
             elif isinstance(value, list):
                 normalized_value = []
@@ -337,16 +292,21 @@ def _normalize_fallback_payload(raw_json: Dict[str, Any], debug_steps: List[str]
                         normalized_value.append(text)
                 if normalized_value != value:
                     quality[key] = normalized_value
-                    _add_debug(
-                        debug_steps,
-                        f"Шаг structured.fallback.normalize: quality.{key} list sanitized ({len(value)} -> {len(normalized_value)})",
-                        on_debug,
+                    debug.add(
+                        "structured.fallback.normalize",
+                        "normalized",
+                        "Шаг {step}: quality.{key} list sanitized ({before} -> {after})",
+                        key=key,
+                        before=len(value),
+                        after=len(normalized_value),
                     )
 
     return payload
 
 
-def _trim_draft_text(draft_text: str, max_chars: int, debug_steps: List[str], on_debug: Optional[Callable[[str], None]]) -> str:
+def _trim_draft_text(
+    draft_text: str, max_chars: int, debug_steps: DebugLog | List[str], on_debug: Optional[Callable[[str], None]] = None
+) -> str:
     cleaned = (draft_text or "").replace("\x00", "").strip()
     if len(cleaned) <= max_chars:
         return cleaned
@@ -354,21 +314,46 @@ def _trim_draft_text(draft_text: str, max_chars: int, debug_steps: List[str], on
     head = max_chars * 2 // 3
     tail = max_chars - head
     trimmed = cleaned[:head] + "\n... [TRIMMED] ...\n" + cleaned[-tail:]
-    _add_debug(
-        debug_steps,
-        f"Шаг structured.parse: draft_text обрезан (orig={len(cleaned)}, limit={max_chars}, head={head}, tail={tail})",
-        on_debug,
+    as_debug_log(debug_steps, on_debug).add(
+        "structured.parse",
+        "draft_trimmed",
+        "Шаг {step}: draft_text обрезан (orig={orig}, limit={limit}, head={head}, tail={tail})",
+        level=logging.WARNING,
+        orig=len(cleaned),
+        limit=max_chars,
+        head=head,
+        tail=tail,
     )
     return trimmed
 
 
-def _create_anthropic_client(api_key: str, max_retries: int, http_timeout_s: int) -> Anthropic:
+def _new_anthropic_client(api_key: str, max_retries: int, http_timeout_s: int) -> Anthropic:
     try:
         return Anthropic(api_key=api_key, max_retries=max_retries, timeout=max(5, int(http_timeout_s)))
     except TypeError:
         return Anthropic(api_key=api_key, max_retries=max_retries)
 
 
+# One client per process and config: requests (and the startup warm-up) share its connection pool,
+# so the TLS session opened at warm-up is reused. with_options() copies keep the same pool.
+_CLIENTS: Dict[Tuple[str, int, int], Anthropic] = {}
+_CLIENTS_LOCK = threading.Lock()
+if hasattr(os, "register_at_fork"):
+    # A pool inherited from a preloading parent must not be shared across processes.
+    os.register_at_fork(after_in_child=_CLIENTS.clear)
+
+
+def _create_anthropic_client(api_key: str, max_retries: int, http_timeout_s: int) -> Anthropic:
+    key = (api_key, int(max_retries), int(http_timeout_s))
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            # A config reload changes the key; in-flight requests keep their reference to the old client.
+            _CLIENTS.clear()
+            client = _CLIENTS[key] = _new_anthropic_client(*key)
+    return client
+
+
 def _client_with_timeout(client: Anthropic, timeout_s: int):
     timeout_s = max(5, int(timeout_s))
     with_options = getattr(client, "with_options", None)
@@ -380,18 +365,6 @@ def _client_with_timeout(client: Anthropic, timeout_s: int):
     return client
 
 
-def _estimate_retry_backoff_s(max_retries: int) -> int:
-    retries = max(0, int(max_retries))
-    # Conservative estimate for SDK backoff budget to avoid premature outer timeout cuts.
-    return retries * 2
-
-
-def _worst_case_call_budget_s(per_attempt_timeout_s: int, max_retries: int) -> int:
-    attempts = max(1, int(max_retries) + 1)
-    timeout_per_attempt = max(5, int(per_attempt_timeout_s))
-    return timeout_per_attempt * attempts + _estimate_retry_backoff_s(max_retries)
-
-
 def _fallback_reason(err: Exception) -> str:
     if isinstance(err, (anthropic.APITimeoutError, TimeoutError)):
         return "timeout"
@@ -420,7 +393,27 @@ def _request_id_of(obj: Any) -> Optional[str]:
     return None
 
 
-def _raise_timeout(step: str, err: Exception, debug_steps: List[str]):
+def _stream_message(messages_api, on_text: Callable[[str], None], **kwargs) -> Tuple[Any, Optional[int]]:
+    """messages.stream(...) forwarding text deltas; returns the final message and TTFT in ms."""
+    started = time.monotonic()
+    ttft_ms: Optional[int] = None
+    with messages_api.stream(**kwargs) as stream:
+        for text in stream.text_stream:
+            if ttft_ms is None:
+                ttft_ms = int((time.monotonic() - started) * 1000)
+            if text:
+                on_text(text)
+        final = stream.get_final_message()
+        rid = _request_id_of(stream)
+    if rid and not _request_id_of(final):
+        try:
+            final._request_id = rid
+        except Exception:
+            pass
+    return final, ttft_ms
+
+
+def _raise_timeout(step: str, err: Exception, debug_steps: Sequence[str]):
     raise UpstreamAIError(
         step=step,
         status_code=504,
@@ -429,33 +422,150 @@ def _raise_timeout(step: str, err: Exception, debug_steps: List[str]):
     ) from err
 
 
+_PAGE_SCAN_LONG_EDGE = 160
+_PAGE_INK_THRESHOLD = 200
+_PAGE_BLANK_INK_RATIO = 0.002
+# Lower band of the page where the date/signature line usually sits.
+_PAGE_SIGNATURE_BAND = (0.55, 0.95)
+_PAGE_KEYWORDS = {
+    "заявлен": 3.0,
+    "отпуск": 3.0,
+    "прошу": 2.0,
+    "предостав": 1.0,
+    "календарн": 1.0,
+    "подпись": 0.5,
+}
+_INK_TABLE = bytes(1 if v < _PAGE_INK_THRESHOLD else 0 for v in range(256))
+
+
+def _ink_ratio(samples: bytes) -> float:
+    if not samples:
+        return 0.0
+    return samples.translate(_INK_TABLE).count(1) / len(samples)
+
+
+def _page_keyword_score(text: str) -> float:
+    low = (text or "").lower().replace("ё", "е")
+    return sum(weight for marker, weight in _PAGE_KEYWORDS.items() if marker in low)
+
+
+def _score_pdf_page(page) -> Dict[str, Any]:
+    """Cheap pre-pass score: low-res ink density, text-layer keywords, signature band."""
+    rect = page.rect
+    long_edge_pts = max(rect.width, rect.height) or 1.0
+    zoom = float(_PAGE_SCAN_LONG_EDGE) / float(long_edge_pts)
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+    samples = bytes(getattr(pix, "samples", b"") or b"")
+    width, height = int(pix.width), int(pix.height)
+
+    ink = _ink_ratio(samples)
+    top, bottom = (int(height * edge) for edge in _PAGE_SIGNATURE_BAND)
+    band_ink = _ink_ratio(samples[top * width : bottom * width]) if width and bottom > top else 0.0
+
+    try:
+        text = page.get_text("text") or ""
+    except Exception:
+        text = ""
+    keyword_score = _page_keyword_score(text)
+
+    blank = ink < _PAGE_BLANK_INK_RATIO and not text.strip()
+    score = 0.0
+    if not blank:
+        # Ink saturates quickly: a filled cover sheet should not outrank a sparse application.
+        score += min(ink / 0.05, 1.0) * 2.0
+        score += keyword_score
+        if band_ink >= _PAGE_BLANK_INK_RATIO:
+            score += 1.0
+    return {
+        "score": round(score, 3),
+        "ink": round(ink, 4),
+        "band_ink": round(band_ink, 4),
+        "keywords": keyword_score,
+        "blank": blank,
+    }
+
+
+def _choose_pages(scores: List[Dict[str, Any]], max_pages: int) -> List[int]:
+    """Top-scored non-blank pages, kept in document order; earlier pages win ties."""
+    candidates = [i for i, s in enumerate(scores) if not s["blank"]] or list(range(len(scores)))
+    ranked = sorted(candidates, key=lambda i: (-scores[i]["score"], i))
+    return sorted(ranked[:max_pages])
+
+
+def _select_pdf_pages(
+    doc,
+    max_pages: int,
+    debug_steps: DebugLog | List[str],
+    *,
+    mode: str = "smart",
+    on_debug: Optional[Callable[[str], None]] = None,
+) -> Tuple[List[int], List[Dict[str, Any]]]:
+    total_pages = doc.page_count
+    if mode != "smart" or total_pages <= max_pages:
+        return list(range(min(max_pages, total_pages))), []
+
+    started = time.monotonic()
+    scores = [_score_pdf_page(doc.load_page(i)) for i in range(total_pages)]
+    selected = _choose_pages(scores, max_pages)
+    as_debug_log(debug_steps, on_debug).add(
+        "pdf.select",
+        "pages",
+        "PDF выбор страниц: selected={selected}, scores={scores}, elapsed_ms={ms}",
+        level=logging.DEBUG,
+        selected=selected,
+        scores=[s["score"] for s in scores],
+        ms=_elapsed_ms(started),
+    )
+    return selected, scores
+
+
+def _preprocess_pixmap(pix, colorspace, stages: List[str]) -> Tuple[Any, Dict[str, Any]]:
+    img = pixmap_to_array(pix.samples, pix.width, pix.height, pix.n)
+    processed, stats = preprocess_scan(img, stages)
+    height, width = processed.shape[:2]
+    return fitz.Pixmap(colorspace, width, height, processed.tobytes(), 0), stats
+
+
 def _render_pdf_to_image_blocks(
     pdf_bytes: bytes,
-    debug_steps: List[str],
+    debug_steps: DebugLog | List[str],
     *,
     on_debug: Optional[Callable[[str], None]] = None,
+    settings: Optional[Settings] = None,
+    memory: Optional[MemoryGrant] = None,
 ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
-    max_pages = _env_int_min("PDF_MAX_PAGES", 1, 1)
-    target_long_edge = _env_int_min("PDF_TARGET_LONG_EDGE", 1568, 512)
-    max_b64_chars = _max_image_b64_chars_limit()
-    color_mode = _env_str("PDF_COLOR_MODE", "gray").lower()
+    cfg = settings or get_settings()
+    debug = as_debug_log(debug_steps, on_debug)
+    max_pages = cfg.PDF_MAX_PAGES
+    target_long_edge = cfg.PDF_TARGET_LONG_EDGE
+    max_b64_chars = cfg.MAX_IMAGE_B64_CHARS
+    color_mode = cfg.PDF_COLOR_MODE
 
     doc = fitz.open(stream=pdf_bytes, filetype="pdf")
     total_pages = doc.page_count
-    pages_to_send = min(max_pages, total_pages)
     colorspace = fitz.csGRAY if color_mode == "gray" else fitz.csRGB
+    preprocess_stages = list(cfg.PDF_PREPROCESS_STAGES)
 
     blocks: List[Dict[str, Any]] = []
     page_stats: List[Dict[str, Any]] = []
-
-    _add_debug(debug_steps, f"PDF открыт: pages_total={total_pages}, pages_to_send={pages_to_send}, color_mode={color_mode}", on_debug)
+    preprocess_ms: Dict[str, float] = {}
 
     try:
-        for i in range(pages_to_send):
+        selected_pages, page_scores = _select_pdf_pages(doc, max_pages, debug, mode=cfg.PDF_PAGE_SELECTION)
+        pages_to_send = len(selected_pages)
+        debug.add(
+            "pdf",
+            "opened",
+            "PDF открыт: pages_total={total}, pages_to_send={pages}, color_mode={color_mode}",
+            total=total_pages,
+            pages=pages_to_send,
+            color_mode=color_mode,
+        )
+
+        for i in selected_pages:
             page = doc.load_page(i)
             rect = page.rect
-            long_edge_pts = max(rect.width, rect.height) or 1.0
-            zoom = max(0.5, min(float(target_long_edge) / float(long_edge_pts), 4.0))
+            zoom = render_zoom(rect.width, rect.height, target_long_edge)
 
             mat = fitz.Matrix(zoom, zoom)
             pix = page.get_pixmap(matrix=mat, colorspace=colorspace, alpha=False)
@@ -465,11 +575,29 @@ def _render_pdf_to_image_blocks(
                 mat = fitz.Matrix(zoom * scale, zoom * scale)
                 pix = page.get_pixmap(matrix=mat, colorspace=colorspace, alpha=False)
 
+            preprocess_stats = None
+            if preprocess_stages:
+                pix, preprocess_stats = _preprocess_pixmap(pix, colorspace, preprocess_stages)
+                for stage, ms in preprocess_stats["stage_ms"].items():
+                    preprocess_ms[stage] = round(preprocess_ms.get(stage, 0.0) + ms, 2)
+
+            signature = None
+            if cfg.SIGNATURE_DETECTOR != "off":
+                signature = detect_signature(pixmap_to_array(pix.samples, pix.width, pix.height, pix.n))
+
             png_bytes = _pix_to_png_bytes(pix)
             b64 = base64.b64encode(png_bytes).decode("ascii")
+            if memory is not None:
+                # Pixmap, PNG and base64 of this page are all alive here: the per-page peak.
+                memory.checkpoint("render.page")
 
             blocks.append({"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": b64}})
-            page_stats.append({"page": i, "w_px": pix.width, "h_px": pix.height, "png_bytes": len(png_bytes), "b64_chars": len(b64)})
+            stat = {"page": i, "w_px": pix.width, "h_px": pix.height, "png_bytes": len(png_bytes), "b64_chars": len(b64)}
+            if preprocess_stats is not None:
+                stat["preprocess"] = preprocess_stats
+            if signature is not None:
+                stat["signature"] = signature.as_dict()
+            page_stats.append(stat)
 
         approx_b64_chars = sum(p["b64_chars"] for p in page_stats)
         if approx_b64_chars > max_b64_chars:
@@ -478,22 +606,123 @@ def _render_pdf_to_image_blocks(
         info = {
             "total_pages": total_pages,
             "pages_sent": pages_to_send,
+            "selected_pages": selected_pages,
+            "page_scores": page_scores,
             "target_long_edge": target_long_edge,
             "color_mode": color_mode,
             "approx_b64_chars": approx_b64_chars,
             "page_stats": page_stats,
         }
-        _add_debug(
-            debug_steps,
-            f"PDF->PNG ок: pages_sent={pages_to_send}, approx_b64_chars={approx_b64_chars}, page0={page_stats[0] if page_stats else None}",
-            on_debug,
+        signed = [p for p in page_stats if "signature" in p]
+        if signed:
+            # The application page with the strongest handwriting in its signature band.
+            best = max(signed, key=lambda p: p["signature"]["score"])
+            info["signature"] = {"page": best["page"], **best["signature"]}
+            debug.add(
+                "signature",
+                "detected",
+                "Шаг {step}: локальный детектор score={score}, strokes={strokes}, page={page}, ms={ms}",
+                level=logging.DEBUG,
+                **info["signature"],
+            )
+        if preprocess_stages:
+            pixels_before = sum(p["preprocess"]["pixels_before"] for p in page_stats)
+            pixels_after = sum(p["preprocess"]["pixels_after"] for p in page_stats)
+            info["preprocess"] = {
+                "stages": preprocess_stages,
+                "stage_ms": preprocess_ms,
+                "pixels_before": pixels_before,
+                "pixels_after": pixels_after,
+                "pixels_saved_ratio": round(1 - pixels_after / pixels_before, 4) if pixels_before else 0.0,
+            }
+            debug.add(
+                "pdf.preprocess",
+                "preprocess",
+                "PDF preprocess: stages={stages}, stage_ms={stage_ms}, pixels {before} -> {after}",
+                level=logging.DEBUG,
+                stages=preprocess_stages,
+                stage_ms=preprocess_ms,
+                before=pixels_before,
+                after=pixels_after,
+            )
+        # page0 is a whole stats dict: only formatted if the step is shown or logged.
+        debug.add(
+            "pdf",
+            "rendered",
+            "PDF->PNG ок: pages_sent={pages}, approx_b64_chars={b64_chars}, page0={page0}",
+            pages=pages_to_send,
+            b64_chars=approx_b64_chars,
+            page0=page_stats[0] if page_stats else "None",
         )
         return blocks, info
     finally:
         doc.close()
 
 
-def _raise_upstream(step: str, err: Exception, debug_steps: List[str]):
+def _estimate_render_memory(pdf_bytes: bytes, cfg: Settings) -> Dict[str, int]:
+    """Peak estimate before rendering, from page boxes and the render zoom (no pixmaps yet)."""
+    rects: List[Tuple[float, float]] = []
+    try:
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    except Exception:
+        # Broken PDF: the renderer reports it; only the upload itself is budgeted.
+        doc = None
+    if doc is not None:
+        try:
+            for i in range(doc.page_count):
+                box = doc.page_cropbox(i)
+                rects.append((box.width, box.height))
+        finally:
+            doc.close()
+    # Smart selection may pick any pages: budget for the largest ones.
+    rects.sort(key=lambda r: r[0] * r[1], reverse=True)
+    return estimate_render_bytes(
+        len(pdf_bytes),
+        rects[: cfg.PDF_MAX_PAGES],
+        target_long_edge=cfg.PDF_TARGET_LONG_EDGE,
+        channels=1 if cfg.PDF_COLOR_MODE == "gray" else 3,
+        preprocess=bool(cfg.PDF_PREPROCESS_STAGES),
+    )
+
+
+def _reserve_render_memory(
+    pdf_bytes: bytes, cfg: Settings, debug_steps: DebugLog | List[str], on_debug: Optional[Callable[[str], None]] = None
+) -> MemoryGrant:
+    debug = as_debug_log(debug_steps, on_debug)
+    estimate = _estimate_render_memory(pdf_bytes, cfg)
+    try:
+        grant = MEMORY_BUDGET.acquire(
+            estimate["bytes"], limit_bytes=cfg.MEMORY_BUDGET_MB * MB, timeout_s=cfg.MEMORY_BUDGET_MAX_WAIT_S
+        )
+    except MemoryBudgetTimeout as e:
+        debug.add(
+            "memory",
+            "timeout",
+            "Шаг {step}: бюджет памяти занят, ожидание {waited_s:.1f} с истекло",
+            level=logging.WARNING,
+            waited_s=e.waited_s,
+        )
+        raise UpstreamAIError(
+            step="memory",
+            status_code=503,
+            message="Сервер занят обработкой других крупных документов. Повторите попытку позже.",
+            debug_steps=debug_steps,
+        ) from e
+    debug.add(
+        "memory",
+        "reserved",
+        "Шаг {step}: оценка_mb={estimate_mb:.1f} (pages={pages}, pixels={pixels}), бюджет_mb={budget_mb}, wait_ms={wait_ms}",
+        level=logging.INFO if grant.waited_ms else logging.DEBUG,
+        estimate_mb=estimate["bytes"] / MB,
+        pages=estimate["pages"],
+        pixels=estimate["pixels"],
+        budget_mb=cfg.MEMORY_BUDGET_MB or "off",
+        wait_ms=grant.waited_ms,
+    )
+    return grant
+
+
+def _raise_upstream(step: str, err: Exception, debug_steps: Sequence[str]):
     status = int(getattr(err, "status_code", 502) or 502)
     if _is_overloaded_error(err):
         status = 503
@@ -505,325 +734,581 @@ def _raise_upstream(step: str, err: Exception, debug_steps: List[str]):
     ) from err
 
 
-def extract_leave_request_with_debug(
-    pdf_bytes: bytes,
-    filename: str = "upload.pdf",
-    *,
-    model: Optional[str] = None,
-    on_debug: Optional[Callable[[str], None]] = None,
-) -> Tuple[LeaveRequestExtract, List[str]]:
-    debug_steps: List[str] = []
-    _add_debug(debug_steps, f"Файл загружен: name={filename}, bytes={len(pdf_bytes)}", on_debug)
-
-    if os.getenv("MOCK_MODE", "0").strip() == "1":
-        _add_debug(debug_steps, "MOCK_MODE=1, внешний AI не вызывается", on_debug)
-        parsed = LeaveRequestExtract.model_validate(
-            {
-                "schema_version": "1.0",
-                "employer_name": None,
-                "employee": {"full_name": "Иванов Иван Иванович", "position": "Инженер", "department": "ИТ"},
-                "manager": {"full_name": None, "position": None},
-                "request_date": "2026-02-21",
-                "leave": {
-                    "leave_type": "annual_paid",
-                    "start_date": "2026-03-01",
-                    "end_date": "2026-03-14",
-                    "days_count": 14,
-                    "comment": None,
-                },
-                "signature_present": True,
-                "signature_confidence": 0.8,
-                "raw_text": "Прошу предоставить ежегодный оплачиваемый отпуск",
-                "quality": {"overall_confidence": 0.8, "missing_fields": [], "notes": ["MOCK_MODE=1"]},
-            }
-        )
-        return parsed, debug_steps
+class AnthropicBackend:
+    """The Anthropic API backend: PDF -> PNG render, vision draft, structured parse (with fallback chains)."""
+
+    name = "anthropic"
+    # The render size matters to the model: PDF_ESCALATION may re-run the passes at full size.
+    escalates = True
+
+    def __init__(
+        self,
+        cfg: Settings,
+        debug_steps: DebugLog,
+        *,
+        model: Optional[str] = None,
+        on_delta: Optional[Callable[[str, str], None]] = None,
+        on_field: Optional[Callable[[str, Any], None]] = None,
+        on_reset: Optional[Callable[[str], None]] = None,
+    ):
+        self.cfg = cfg
+        self.debug_steps = debug_steps
+        self.on_delta = on_delta
+        self.on_field = on_field
+        self.on_reset = on_reset
+        self._memory: Optional[MemoryGrant] = None
+        # Rendered passes: the second one (PDF_ESCALATION) streams its transcription under its own step.
+        self._passes = 0
+
+        api_key = cfg.ANTHROPIC_API_KEY
+        if not api_key:
+            debug_steps.add("config", "error", "Ошибка: ANTHROPIC_API_KEY отсутствует", level=logging.ERROR)
+            raise UpstreamAIError(
+                step="config",
+                status_code=500,
+                message="ANTHROPIC_API_KEY не задан (Render env vars / .env).",
+                debug_steps=debug_steps,
+            )
 
-    api_key = os.getenv("ANTHROPIC_API_KEY")
-    if not api_key:
-        _add_debug(debug_steps, "Ошибка: ANTHROPIC_API_KEY отсутствует", on_debug)
-        raise UpstreamAIError(
-            step="config",
-            status_code=500,
-            message="ANTHROPIC_API_KEY не задан (Render env vars / .env).",
-            debug_steps=debug_steps,
+        self.vision_model = model or cfg.ANTHROPIC_VISION_MODEL
+        self.structured_model = _resolve_structured_model(cfg.ANTHROPIC_STRUCTURED_MODEL)
+        self.configured_vision_fallback_model = cfg.ANTHROPIC_VISION_FALLBACK_MODEL
+        self.vision_fallback_model = _resolve_vision_fallback_model(self.vision_model, self.configured_vision_fallback_model)
+        self.configured_structured_fallback_model = cfg.ANTHROPIC_STRUCTURED_FALLBACK_MODEL
+        self.structured_fallback_model = _resolve_structured_fallback_model(
+            self.structured_model, self.configured_structured_fallback_model
         )
-
-    vision_model = model or os.getenv("ANTHROPIC_VISION_MODEL") or os.getenv("ANTHROPIC_MODEL", "claude-sonnet-4-6")
-    structured_model = _resolve_structured_model(os.getenv("ANTHROPIC_STRUCTURED_MODEL"))
-    configured_vision_fallback_model = os.getenv("ANTHROPIC_VISION_FALLBACK_MODEL")
-    vision_fallback_model = _resolve_vision_fallback_model(vision_model, configured_vision_fallback_model)
-    configured_structured_fallback_model = os.getenv("ANTHROPIC_STRUCTURED_FALLBACK_MODEL")
-    structured_fallback_model = _resolve_structured_fallback_model(structured_model, configured_structured_fallback_model)
-    max_retries = _env_int("ANTHROPIC_MAX_RETRIES", 2)
-    anthropic_http_timeout_s = _env_int_min("ANTHROPIC_HTTP_TIMEOUT_S", 60, 10)
-    draft_max_tokens = _env_int_min("ANTHROPIC_DRAFT_MAX_TOKENS", 1024, 256)
-    out_max_tokens = _env_int_min("ANTHROPIC_MAX_TOKENS", 1024, 512)
-    vision_timeout_s = _env_int_min("ANTHROPIC_VISION_TIMEOUT_S", 90, 15)
-    structured_parse_timeout_s = _env_int_min("ANTHROPIC_STRUCTURED_PARSE_TIMEOUT_S", 30, 15)
-    structured_fallback_timeout_s = _env_int_min("ANTHROPIC_STRUCTURED_FALLBACK_TIMEOUT_S", 90, 15)
-    structured_draft_max_chars = _env_int_min("ANTHROPIC_STRUCTURED_DRAFT_MAX_CHARS", 12000, 2000)
-
-    vision_worst_case_s = _worst_case_call_budget_s(vision_timeout_s, max_retries)
-    structured_parse_worst_case_s = _worst_case_call_budget_s(structured_parse_timeout_s, max_retries)
-    structured_fallback_worst_case_s = _worst_case_call_budget_s(structured_fallback_timeout_s, max_retries)
-    min_required_sdk_timeout = max(vision_worst_case_s, structured_parse_worst_case_s, structured_fallback_worst_case_s) + 5
-    effective_http_timeout_s = max(anthropic_http_timeout_s, min_required_sdk_timeout)
-    if effective_http_timeout_s != anthropic_http_timeout_s:
-        _add_debug(
-            debug_steps,
-            f"Конфиг AI: sdk_http_timeout_s повышен с {anthropic_http_timeout_s} до {effective_http_timeout_s} "
-            f"(>= max step worst-case with retries + 5s)",
-            on_debug,
+        self.max_retries = cfg.ANTHROPIC_MAX_RETRIES
+        self.draft_max_tokens = cfg.ANTHROPIC_DRAFT_MAX_TOKENS
+        self.out_max_tokens = cfg.ANTHROPIC_MAX_TOKENS
+        self.vision_timeout_s = cfg.ANTHROPIC_VISION_TIMEOUT_S
+        self.structured_parse_timeout_s = cfg.ANTHROPIC_STRUCTURED_PARSE_TIMEOUT_S
+        self.structured_fallback_timeout_s = cfg.ANTHROPIC_STRUCTURED_FALLBACK_TIMEOUT_S
+        self.structured_draft_max_chars = cfg.ANTHROPIC_STRUCTURED_DRAFT_MAX_CHARS
+        self.vision_stream = on_delta is not None and cfg.ANTHROPIC_VISION_STREAM
+        self.structured_stream = on_field is not None and cfg.ANTHROPIC_STRUCTURED_STREAM
+        self.ask_signature = cfg.SIGNATURE_DETECTOR != "replace"
+
+        self.client = _create_anthropic_client(api_key=api_key, max_retries=self.max_retries, http_timeout_s=cfg.SDK_HTTP_TIMEOUT_S)
+
+        # The full config (budgets included) is logged once per load/reload; here only what identifies it.
+        debug_steps.add(
+            "config",
+            "models",
+            "Конфиг AI: generation={generation}, vision_model={vision_model}, structured_model={structured_model}, "
+            "vision_fallback_model={vision_fallback_model}, structured_fallback_model={structured_fallback_model}",
+            level=logging.DEBUG,
+            generation=cfg.GENERATION,
+            vision_model=self.vision_model,
+            structured_model=self.structured_model,
+            vision_fallback_model=self.vision_fallback_model or None,
+            structured_fallback_model=self.structured_fallback_model or None,
         )
 
-    client = _create_anthropic_client(api_key=api_key, max_retries=max_retries, http_timeout_s=effective_http_timeout_s)
-
-    _add_debug(
-        debug_steps,
-        f"Конфиг AI: vision_model={vision_model}, structured_model={structured_model}, retries={max_retries}, "
-        f"sdk_http_timeout_s={effective_http_timeout_s}, vision_timeout_s={vision_timeout_s}, "
-        f"structured_parse_timeout_s={structured_parse_timeout_s}, structured_fallback_timeout_s={structured_fallback_timeout_s}, "
-        f"vision_budget_worst_case_s={vision_worst_case_s}, structured_parse_budget_worst_case_s={structured_parse_worst_case_s}, "
-        f"structured_fallback_budget_worst_case_s={structured_fallback_worst_case_s}, "
-        f"structured_draft_max_chars={structured_draft_max_chars}, vision_fallback_model={vision_fallback_model or '-'}, configured_vision_fallback_model={configured_vision_fallback_model or '-'}, structured_fallback_model={structured_fallback_model or '-'}, configured_structured_fallback_model={configured_structured_fallback_model or '-'}",
-        on_debug,
-    )
-
-    try:
-        image_blocks, render_info = _render_pdf_to_image_blocks(pdf_bytes, debug_steps, on_debug=on_debug)
-    except Exception as e:
-        _add_debug(debug_steps, f"Шаг PDF->PNG: ошибка: {type(e).__name__}", on_debug)
-        raise UpstreamAIError(
-            step="render",
-            status_code=422,
-            message="Не удалось обработать PDF перед отправкой в AI.",
-            debug_steps=debug_steps,
-        ) from e
-
-    try:
-        _add_debug(debug_steps, f"Шаг vision: отправка PNG в Anthropic (sdk_attempt=1/{max_retries + 1})", on_debug)
-        vision_step_started = time.monotonic()
-
-        def _vision_call(selected_model: str):
-            scoped = _client_with_timeout(client, vision_timeout_s + 5)
-            _add_debug(
-                debug_steps,
-                f"Шаг vision.call: method=messages.create, model={selected_model}, timeout_s={vision_timeout_s + 5}, sdk_attempt_range=1..{max_retries + 1}",
-                on_debug,
+    def render(self, pdf_bytes: bytes, render_cfg: Settings) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        debug_steps = self.debug_steps
+        # Render + vision hold the pixmaps, images and request body: wait until they fit the process memory budget.
+        self._passes += 1
+        memory = self._memory = _reserve_render_memory(pdf_bytes, render_cfg, debug_steps)
+        try:
+            image_blocks, render_info = _render_pdf_to_image_blocks(pdf_bytes, debug_steps, settings=render_cfg, memory=memory)
+            memory.checkpoint("render")
+        except Exception as e:
+            memory.release()
+            debug_steps.add("render", "error", "Шаг PDF->PNG: ошибка: {error}", level=logging.WARNING, error=type(e).__name__)
+            raise UpstreamAIError(
+                step="render",
+                status_code=422,
+                message="Не удалось обработать PDF перед отправкой в AI.",
+                debug_steps=debug_steps,
+            ) from e
+        return image_blocks, render_info
+
+    def draft(self, image_blocks: List[Dict[str, Any]]) -> str:
+        debug_steps = self.debug_steps
+        memory = self._memory
+        escalated = self._passes > 1
+        if escalated and self.on_reset is not None:
+            # The stream client drops the first pass's draft, fields and early issues.
+            self.on_reset(ESCALATED_VISION_STEP)
+        try:
+            debug_steps.add("vision", "send", "Шаг {step}: отправка PNG в Anthropic (sdk_attempt=1/{attempts})", attempts=self.max_retries + 1)
+            vision_step_started = time.monotonic()
+
+            def _vision_call(selected_model: str, step: str = "vision"):
+                scoped = _client_with_timeout(self.client, self.vision_timeout_s + 5)
+                method = "messages.stream" if self.vision_stream else "messages.create"
+                debug_steps.add(
+                    "vision.call",
+                    "call",
+                    "Шаг {step}: method={method}, model={model}, timeout_s={timeout_s}, sdk_attempt_range=1..{attempts}",
+                    level=logging.DEBUG,
+                    method=method,
+                    model=selected_model,
+                    timeout_s=self.vision_timeout_s + 5,
+                    attempts=self.max_retries + 1,
+                )
+                request = dict(
+                    model=selected_model,
+                    max_tokens=self.draft_max_tokens,
+                    temperature=0,
+                    system=_system_prompt_ru(),
+                    messages=[{"role": "user", "content": image_blocks + [{"type": "text", "text": _draft_prompt_ru(self.ask_signature)}]}],
+                )
+                if not self.vision_stream:
+                    return scoped.messages.create(**request)
+                delta_step = step.replace("vision", ESCALATED_VISION_STEP, 1) if escalated else step
+                msg, ttft_ms = _stream_message(scoped.messages, lambda text: self.on_delta(delta_step, text), **request)
+                debug_steps.add(step, TTFT, "Шаг {step}: ttft_ms={ttft_ms}", ttft_ms=ttft_ms)
+                return msg
+
+            draft_msg = _vision_call(self.vision_model)
+            draft_text = _extract_text_from_msg(draft_msg)
+            debug_steps.add("vision", "response", "Шаг {step}: ответ получен, chars={chars}", chars=len(draft_text))
+            debug_steps.add("vision", ELAPSED, "Шаг {step}: elapsed_ms={elapsed_ms}", elapsed_ms=_elapsed_ms(vision_step_started))
+            rid = _request_id_of(draft_msg)
+            if rid:
+                debug_steps.add("vision", "request_id", "Шаг {step}: request_id={request_id}", request_id=rid)
+        except anthropic.APITimeoutError as e:
+            debug_steps.add("vision", "timeout", "Шаг vision: timeout", level=logging.WARNING)
+            debug_steps.add("vision", ELAPSED, "Шаг {step}: elapsed_ms={elapsed_ms}", elapsed_ms=_elapsed_ms(vision_step_started))
+            _raise_timeout("vision", e, debug_steps)
+        except anthropic.APIError as e:
+            status_code = int(getattr(e, "status_code", 0) or 0)
+            debug_steps.add(
+                "vision",
+                "error",
+                "Шаг {step}: ошибка API: {error}, status={status}",
+                level=logging.WARNING,
+                error=type(e).__name__,
+                status=status_code,
             )
-            return scoped.messages.create(
-                model=selected_model,
-                max_tokens=draft_max_tokens,
-                temperature=0,
-                system=_system_prompt_ru(),
-                messages=[{"role": "user", "content": image_blocks + [{"type": "text", "text": _draft_prompt_ru()}]}],
+            rid = _request_id_of(e)
+            if rid:
+                debug_steps.add("vision", "request_id", "Шаг {step}: error_request_id={request_id}", request_id=rid)
+            if _should_try_vision_fallback(e, self.vision_model, self.vision_fallback_model):
+                debug_steps.add(
+                    "vision",
+                    "fallback",
+                    "Шаг {step}: fallback_reason={reason}; пробуем fallback model={model} (configured={configured}, primary={primary})",
+                    level=logging.WARNING,
+                    reason=_fallback_reason(e),
+                    model=self.vision_fallback_model,
+                    configured=self.configured_vision_fallback_model or None,
+                    primary=self.vision_model,
+                )
+                vision_fallback_started = time.monotonic()
+                try:
+                    draft_msg = _vision_call(str(self.vision_fallback_model), "vision.fallback")
+                    draft_text = _extract_text_from_msg(draft_msg)
+                    debug_steps.add("vision.fallback", "response", "Шаг {step}: ответ получен, chars={chars}", chars=len(draft_text))
+                    debug_steps.add(
+                        "vision.fallback", ELAPSED, "Шаг {step}: elapsed_ms={elapsed_ms}", elapsed_ms=_elapsed_ms(vision_fallback_started)
+                    )
+                    rid = _request_id_of(draft_msg)
+                    if rid:
+                        debug_steps.add("vision.fallback", "request_id", "Шаг {step}: request_id={request_id}", request_id=rid)
+                except anthropic.APITimeoutError as fallback_timeout:
+                    debug_steps.add("vision.fallback", "timeout", "Шаг vision.fallback: timeout", level=logging.WARNING)
+                    debug_steps.add(
+                        "vision.fallback", ELAPSED, "Шаг {step}: elapsed_ms={elapsed_ms}", elapsed_ms=_elapsed_ms(vision_fallback_started)
+                    )
+                    _raise_timeout("vision", fallback_timeout, debug_steps)
+                except anthropic.APIError as fallback_error:
+                    fallback_status = int(getattr(fallback_error, "status_code", 0) or 0)
+                    debug_steps.add(
+                        "vision.fallback",
+                        "error",
+                        "Шаг {step}: ошибка API: {error}, status={status}",
+                        level=logging.WARNING,
+                        error=type(fallback_error).__name__,
+                        status=fallback_status,
+                    )
+                    rid = _request_id_of(fallback_error)
+                    if rid:
+                        debug_steps.add("vision.fallback", "request_id", "Шаг {step}: error_request_id={request_id}", request_id=rid)
+                    _raise_upstream("vision", fallback_error, debug_steps)
+            else:
+                _raise_upstream("vision", e, debug_steps)
+        finally:
+            # The images and the encoded request body are not needed after the vision step.
+            memory.checkpoint("vision")
+            image_blocks = None
+            memory.release()
+
+        if not draft_text:
+            draft_text = "TRANSCRIPTION:\n(null)\nCANDIDATE_FIELDS:\n(null)"
+            debug_steps.add("vision", "empty", "Шаг vision: пустой ответ, подставлен дефолтный draft", level=logging.WARNING)
+
+        draft_text = _trim_draft_text(draft_text, self.structured_draft_max_chars, debug_steps)
+        if "base64" in draft_text.lower() and len(draft_text) > 4000:
+            debug_steps.add(
+                "structured.parse", "warning", "Шаг structured.parse: предупреждение — в draft_text есть маркеры base64", level=logging.WARNING
             )
+        debug_steps.add("structured.parse", "draft", "Шаг {step}: draft_chars={chars}", chars=len(draft_text))
+        return draft_text
 
-        draft_msg = _vision_call(vision_model)
-        draft_text = _extract_text_from_msg(draft_msg)
-        _add_debug(debug_steps, f"Шаг vision: ответ получен, chars={len(draft_text)}", on_debug)
-        _add_debug(debug_steps, f"Шаг vision: elapsed_ms={int((time.monotonic() - vision_step_started) * 1000)}", on_debug)
-        rid = _request_id_of(draft_msg)
-        if rid:
-            _add_debug(debug_steps, f"Шаг vision: request_id={rid}", on_debug)
-    except anthropic.APITimeoutError as e:
-        _add_debug(debug_steps, "Шаг vision: timeout", on_debug)
-        _add_debug(debug_steps, f"Шаг vision: elapsed_ms={int((time.monotonic() - vision_step_started) * 1000)}", on_debug)
-        _raise_timeout("vision", e, debug_steps)
-    except anthropic.APIError as e:
-        status_code = int(getattr(e, "status_code", 0) or 0)
-        _add_debug(debug_steps, f"Шаг vision: ошибка API: {type(e).__name__}, status={status_code}", on_debug)
-        rid = _request_id_of(e)
-        if rid:
-            _add_debug(debug_steps, f"Шаг vision: error_request_id={rid}", on_debug)
-        if _should_try_vision_fallback(e, vision_model, vision_fallback_model):
-            _add_debug(
-                debug_steps,
-                f"Шаг vision: fallback_reason={_fallback_reason(e)}; пробуем fallback model={vision_fallback_model} "
-                f"(configured={configured_vision_fallback_model or '-'}, primary={vision_model})",
-                on_debug,
+    def structure(self, draft_text: str) -> LeaveRequestExtract:
+        debug_steps = self.debug_steps
+        try:
+            debug_steps.add(
+                "structured.parse",
+                "send",
+                "Шаг {step}: отправка draft на структуризацию (sdk_attempt=1/{attempts})",
+                attempts=self.max_retries + 1,
             )
-            vision_fallback_started = time.monotonic()
-            try:
-                draft_msg = _vision_call(str(vision_fallback_model))
-                draft_text = _extract_text_from_msg(draft_msg)
-                _add_debug(debug_steps, f"Шаг vision.fallback: ответ получен, chars={len(draft_text)}", on_debug)
-                _add_debug(debug_steps, f"Шаг vision.fallback: elapsed_ms={int((time.monotonic() - vision_fallback_started) * 1000)}", on_debug)
-                rid = _request_id_of(draft_msg)
-                if rid:
-                    _add_debug(debug_steps, f"Шаг vision.fallback: request_id={rid}", on_debug)
-            except anthropic.APITimeoutError as fallback_timeout:
-                _add_debug(debug_steps, "Шаг vision.fallback: timeout", on_debug)
-                _add_debug(debug_steps, f"Шаг vision.fallback: elapsed_ms={int((time.monotonic() - vision_fallback_started) * 1000)}", on_debug)
-                _raise_timeout("vision", fallback_timeout, debug_steps)
-            except anthropic.APIError as fallback_error:
-                fallback_status = int(getattr(fallback_error, "status_code", 0) or 0)
-                _add_debug(debug_steps, f"Шаг vision.fallback: ошибка API: {type(fallback_error).__name__}, status={fallback_status}", on_debug)
-                rid = _request_id_of(fallback_error)
-                if rid:
-                    _add_debug(debug_steps, f"Шаг vision.fallback: error_request_id={rid}", on_debug)
-                _raise_upstream("vision", fallback_error, debug_steps)
-        else:
-            _raise_upstream("vision", e, debug_steps)
-
-    if not draft_text:
-        draft_text = "TRANSCRIPTION:\n(null)\nCANDIDATE_FIELDS:\n(null)"
-        _add_debug(debug_steps, "Шаг vision: пустой ответ, подставлен дефолтный draft", on_debug)
-
-    draft_text = _trim_draft_text(draft_text, structured_draft_max_chars, debug_steps, on_debug)
-    if "base64" in draft_text.lower() and len(draft_text) > 4000:
-        _add_debug(debug_steps, "Шаг structured.parse: предупреждение — в draft_text есть маркеры base64", on_debug)
-    _add_debug(debug_steps, f"Шаг structured.parse: draft_chars={len(draft_text)}", on_debug)
-
-    try:
-        _add_debug(debug_steps, f"Шаг structured.parse: отправка draft на структуризацию (sdk_attempt=1/{max_retries + 1})", on_debug)
-        structured_parse_started = time.monotonic()
-
-        def _structured_parse_call(selected_model: str):
-            scoped = _client_with_timeout(client, structured_parse_timeout_s + 5)
-            _add_debug(
-                debug_steps,
-                f"Шаг structured.parse.call: method=messages.parse, model={selected_model}, timeout_s={structured_parse_timeout_s + 5}, sdk_attempt_range=1..{max_retries + 1}",
-                on_debug,
+            structured_parse_started = time.monotonic()
+
+            def _structured_parse_call(selected_model: str):
+                scoped = _client_with_timeout(self.client, self.structured_parse_timeout_s + 5)
+                method = "messages.stream" if self.structured_stream else "messages.parse"
+                debug_steps.add(
+                    "structured.parse.call",
+                    "call",
+                    "Шаг {step}: method={method}, model={model}, timeout_s={timeout_s}, sdk_attempt_range=1..{attempts}",
+                    level=logging.DEBUG,
+                    method=method,
+                    model=selected_model,
+                    timeout_s=self.structured_parse_timeout_s + 5,
+                    attempts=self.max_retries + 1,
+                )
+                request = dict(
+                    model=selected_model,
+                    max_tokens=self.out_max_tokens,
+                    temperature=0,
+                    system=_system_prompt_ru(),
+                    messages=[{"role": "user", "content": _parse_prompt_ru_json_only(draft_text, self.ask_signature)}],
+                    output_format=LeaveRequestExtract,
+                )
+                if not self.structured_stream:
+                    return scoped.messages.parse(**request).parsed_output
+                fields = JsonFieldStream()
+
+                def _forward(text: str) -> None:
+                    for path, value in fields.feed(text):
+                        if path == "leave.leave_type" and isinstance(value, str):
+                            value = _normalize_leave_type(value)
+                        self.on_field(path, value)
+
+                msg, ttft_ms = _stream_message(scoped.messages, _forward, **request)
+                debug_steps.add("structured.parse", TTFT, "Шаг {step}: ttft_ms={ttft_ms}", ttft_ms=ttft_ms)
+                if msg.parsed_output is None:
+                    raise ValueError("structured stream завершился без parsed_output")
+                return msg.parsed_output
+
+            parsed = _structured_parse_call(self.structured_model)
+            debug_steps.add("structured.parse", "ok", "Шаг structured.parse: успешно")
+            debug_steps.add(
+                "structured.parse", ELAPSED, "Шаг {step}: elapsed_ms={elapsed_ms}", elapsed_ms=_elapsed_ms(structured_parse_started)
             )
-            return scoped.messages.parse(
-                model=selected_model,
-                max_tokens=out_max_tokens,
-                temperature=0,
-                system=_system_prompt_ru(),
-                messages=[{"role": "user", "content": _parse_prompt_ru_json_only(draft_text)}],
-                output_format=LeaveRequestExtract,
-            ).parsed_output
-
-        parsed = _structured_parse_call(structured_model)
-        _add_debug(debug_steps, "Шаг structured.parse: успешно", on_debug)
-        _add_debug(debug_steps, f"Шаг structured.parse: elapsed_ms={int((time.monotonic() - structured_parse_started) * 1000)}", on_debug)
-    except Exception as e:
-        _add_debug(debug_steps, f"Шаг structured.parse: ошибка {type(e).__name__}: {_short_error(e)}", on_debug)
-        _add_debug(debug_steps, f"Шаг structured.parse: elapsed_ms={int((time.monotonic() - structured_parse_started) * 1000)}", on_debug)
-        rid = _request_id_of(e)
-        if rid:
-            _add_debug(debug_steps, f"Шаг structured.parse: error_request_id={rid}", on_debug)
-
-        if _should_try_structured_parse_fallback(e, structured_model, structured_fallback_model):
-            parse_fallback_model = structured_fallback_model or structured_model
-            _add_debug(
-                debug_steps,
-                f"Шаг structured.parse.fallback: reason={_fallback_reason(e)}; пробуем model={parse_fallback_model} "
-                f"(configured={configured_structured_fallback_model or '-'}, primary={structured_model})",
-                on_debug,
+        except Exception as e:
+            debug_steps.add(
+                "structured.parse",
+                "error",
+                "Шаг {step}: ошибка {error}: {detail}",
+                level=logging.WARNING,
+                error=type(e).__name__,
+                detail=_short_error(e),
             )
-            structured_parse_fallback_started = time.monotonic()
-            try:
-                parsed = _structured_parse_call(parse_fallback_model)
-                _add_debug(debug_steps, "Шаг structured.parse.fallback: успешно", on_debug)
-                _add_debug(debug_steps, f"Шаг structured.parse.fallback: elapsed_ms={int((time.monotonic() - structured_parse_fallback_started) * 1000)}", on_debug)
-            except Exception as parse_fallback_err:
-                _add_debug(
-                    debug_steps,
-                    f"Шаг structured.parse.fallback: ошибка {type(parse_fallback_err).__name__}: {_short_error(parse_fallback_err)}; reason={_fallback_reason(parse_fallback_err)}; пробуем fallback через messages.create",
-                    on_debug,
+            debug_steps.add(
+                "structured.parse", ELAPSED, "Шаг {step}: elapsed_ms={elapsed_ms}", elapsed_ms=_elapsed_ms(structured_parse_started)
+            )
+            rid = _request_id_of(e)
+            if rid:
+                debug_steps.add("structured.parse", "request_id", "Шаг {step}: error_request_id={request_id}", request_id=rid)
+
+            if _should_try_structured_parse_fallback(e, self.structured_model, self.structured_fallback_model):
+                parse_fallback_model = self.structured_fallback_model or self.structured_model
+                debug_steps.add(
+                    "structured.parse.fallback",
+                    "fallback",
+                    "Шаг {step}: reason={reason}; пробуем model={model} (configured={configured}, primary={primary})",
+                    level=logging.WARNING,
+                    reason=_fallback_reason(e),
+                    model=parse_fallback_model,
+                    configured=self.configured_structured_fallback_model or None,
+                    primary=self.structured_model,
                 )
-                _add_debug(debug_steps, f"Шаг structured.parse.fallback: elapsed_ms={int((time.monotonic() - structured_parse_fallback_started) * 1000)}", on_debug)
-                rid = _request_id_of(parse_fallback_err)
-                if rid:
-                    _add_debug(debug_steps, f"Шаг structured.parse.fallback: error_request_id={rid}", on_debug)
-                e = parse_fallback_err
-            else:
-                e = None
-
-        if e is not None:
-            if not _is_transient_error(e):
-                _add_debug(
-                    debug_steps,
-                    f"Шаг structured: fallback через messages.create пропущен, reason={_fallback_reason(e)}",
-                    on_debug,
+                structured_parse_fallback_started = time.monotonic()
+                try:
+                    parsed = _structured_parse_call(parse_fallback_model)
+                    debug_steps.add("structured.parse.fallback", "ok", "Шаг structured.parse.fallback: успешно")
+                    debug_steps.add(
+                        "structured.parse.fallback",
+                        ELAPSED,
+                        "Шаг {step}: elapsed_ms={elapsed_ms}",
+                        elapsed_ms=_elapsed_ms(structured_parse_fallback_started),
+                    )
+                except Exception as parse_fallback_err:
+                    debug_steps.add(
+                        "structured.parse.fallback",
+                        "error",
+                        "Шаг {step}: ошибка {error}: {detail}; reason={reason}; пробуем fallback через messages.create",
+                        level=logging.WARNING,
+                        error=type(parse_fallback_err).__name__,
+                        detail=_short_error(parse_fallback_err),
+                        reason=_fallback_reason(parse_fallback_err),
+                    )
+                    debug_steps.add(
+                        "structured.parse.fallback",
+                        ELAPSED,
+                        "Шаг {step}: elapsed_ms={elapsed_ms}",
+                        elapsed_ms=_elapsed_ms(structured_parse_fallback_started),
+                    )
+                    rid = _request_id_of(parse_fallback_err)
+                    if rid:
+                        debug_steps.add(
+                            "structured.parse.fallback", "request_id", "Шаг {step}: error_request_id={request_id}", request_id=rid
+                        )
+                    e = parse_fallback_err
+                else:
+                    e = None
+
+            if e is not None:
+                if not _is_transient_error(e):
+                    debug_steps.add(
+                        "structured",
+                        "fallback_skipped",
+                        "Шаг {step}: fallback через messages.create пропущен, reason={reason}",
+                        level=logging.WARNING,
+                        reason=_fallback_reason(e),
+                    )
+                    if isinstance(e, anthropic.APITimeoutError):
+                        _raise_timeout("structured", e, debug_steps)
+                    if isinstance(e, anthropic.APIError):
+                        _raise_upstream("structured", e, debug_steps)
+                    raise UpstreamAIError(
+                        step="structured",
+                        status_code=500,
+                        message="Ошибка структуризации ответа AI-сервиса.",
+                        debug_steps=debug_steps,
+                    ) from e
+
+                debug_steps.add(
+                    "structured",
+                    "fallback",
+                    "Шаг {step}: пробуем fallback через messages.create (reason={reason})",
+                    level=logging.WARNING,
+                    reason=_fallback_reason(e),
                 )
-                if isinstance(e, anthropic.APITimeoutError):
-                    _raise_timeout("structured", e, debug_steps)
-                if isinstance(e, anthropic.APIError):
-                    _raise_upstream("structured", e, debug_steps)
-                raise UpstreamAIError(
-                    step="structured",
-                    status_code=500,
-                    message="Ошибка структуризации ответа AI-сервиса.",
-                    debug_steps=debug_steps,
-                ) from e
-
-            _add_debug(debug_steps, f"Шаг structured: пробуем fallback через messages.create (reason={_fallback_reason(e)})", on_debug)
-            structured_create_started = time.monotonic()
-            try:
-                def _structured_fallback_call(selected_model: str):
-                    scoped = _client_with_timeout(client, structured_fallback_timeout_s + 5)
-                    _add_debug(
-                        debug_steps,
-                        f"Шаг structured.fallback.call: method=messages.create, model={selected_model}, timeout_s={structured_fallback_timeout_s + 5}, sdk_attempt_range=1..{max_retries + 1}",
-                        on_debug,
+                structured_create_started = time.monotonic()
+                try:
+                    def _structured_fallback_call(selected_model: str):
+                        scoped = _client_with_timeout(self.client, self.structured_fallback_timeout_s + 5)
+                        debug_steps.add(
+                            "structured.fallback.call",
+                            "call",
+                            "Шаг {step}: method=messages.create, model={model}, timeout_s={timeout_s}, sdk_attempt_range=1..{attempts}",
+                            level=logging.DEBUG,
+                            model=selected_model,
+                            timeout_s=self.structured_fallback_timeout_s + 5,
+                            attempts=self.max_retries + 1,
+                        )
+                        return scoped.messages.create(
+                            model=selected_model,
+                            max_tokens=self.out_max_tokens,
+                            temperature=0,
+                            system=_system_prompt_ru(),
+                            messages=[{"role": "user", "content": _parse_prompt_ru_json_only(draft_text, self.ask_signature)}],
+                        )
+
+                    create_model = self.structured_fallback_model or self.structured_model
+                    if create_model != self.structured_model:
+                        debug_steps.add(
+                            "structured.fallback.create",
+                            "fallback",
+                            "Шаг {step}: пробуем модель={model} (configured={configured}, primary={primary})",
+                            model=create_model,
+                            configured=self.configured_structured_fallback_model or None,
+                            primary=self.structured_model,
+                        )
+                    raw_msg = _structured_fallback_call(create_model)
+                    raw_text = _extract_text_from_msg(raw_msg)
+                    debug_steps.add("structured.fallback.create", "response", "Шаг {step}: ответ chars={chars}", chars=len(raw_text))
+                    debug_steps.add(
+                        "structured.fallback.create",
+                        ELAPSED,
+                        "Шаг {step}: elapsed_ms={elapsed_ms}",
+                        elapsed_ms=_elapsed_ms(structured_create_started),
                     )
-                    return scoped.messages.create(
-                        model=selected_model,
-                        max_tokens=out_max_tokens,
-                        temperature=0,
-                        system=_system_prompt_ru(),
-                        messages=[{"role": "user", "content": _parse_prompt_ru_json_only(draft_text)}],
+                    rid = _request_id_of(raw_msg)
+                    if rid:
+                        debug_steps.add("structured.fallback.create", "request_id", "Шаг {step}: request_id={request_id}", request_id=rid)
+                    recovery = recover_json_object(raw_text)
+                    normalized_json = _normalize_fallback_payload(recovery, debug_steps)
+                    parsed = LeaveRequestExtract.model_validate(normalized_json)
+                    parsed.quality.notes.append("structured_fallback=create+json")
+                    if recovery.repaired:
+                        parsed.quality.notes.append("structured_fallback: JSON был обрезан, требует уточнения")
+                    debug_steps.add("structured.fallback.validate", "ok", "Шаг structured.fallback.validate: JSON валиден")
+                except Exception as fallback_err:
+                    debug_steps.add(
+                        "structured.fallback",
+                        "error",
+                        "Шаг {step}: ошибка {error}: {detail}",
+                        level=logging.WARNING,
+                        error=type(fallback_err).__name__,
+                        detail=_short_error(fallback_err),
                     )
-
-                create_model = structured_fallback_model or structured_model
-                if create_model != structured_model:
-                    _add_debug(
-                        debug_steps,
-                        f"Шаг structured.fallback.create: пробуем модель={create_model} "
-                        f"(configured={configured_structured_fallback_model or '-'}, primary={structured_model})",
-                        on_debug,
+                    debug_steps.add(
+                        "structured.fallback", ELAPSED, "Шаг {step}: elapsed_ms={elapsed_ms}", elapsed_ms=_elapsed_ms(structured_create_started)
                     )
-                raw_msg = _structured_fallback_call(create_model)
-                raw_text = _extract_text_from_msg(raw_msg)
-                _add_debug(debug_steps, f"Шаг structured.fallback.create: ответ chars={len(raw_text)}", on_debug)
-                _add_debug(debug_steps, f"Шаг structured.fallback.create: elapsed_ms={int((time.monotonic() - structured_create_started) * 1000)}", on_debug)
-                rid = _request_id_of(raw_msg)
-                if rid:
-                    _add_debug(debug_steps, f"Шаг structured.fallback.create: request_id={rid}", on_debug)
-                raw_json = _extract_first_json_object(raw_text)
-                normalized_json = _normalize_fallback_payload(raw_json, debug_steps, on_debug)
-                parsed = LeaveRequestExtract.model_validate(normalized_json)
-                parsed.quality.notes.append("structured_fallback=create+json")
-                _add_debug(debug_steps, "Шаг structured.fallback.validate: JSON валиден", on_debug)
-            except Exception as fallback_err:
-                _add_debug(debug_steps, f"Шаг structured.fallback: ошибка {type(fallback_err).__name__}: {_short_error(fallback_err)}", on_debug)
-                _add_debug(debug_steps, f"Шаг structured.fallback: elapsed_ms={int((time.monotonic() - structured_create_started) * 1000)}", on_debug)
-                rid = _request_id_of(fallback_err)
-                if rid:
-                    _add_debug(debug_steps, f"Шаг structured.fallback: error_request_id={rid}", on_debug)
-                if isinstance(fallback_err, ValidationError):
+                    rid = _request_id_of(fallback_err)
+                    if rid:
+                        debug_steps.add("structured.fallback", "request_id", "Шаг {step}: error_request_id={request_id}", request_id=rid)
+                    if isinstance(fallback_err, ValidationError):
+                        raise UpstreamAIError(
+                            step="structured",
+                            status_code=422,
+                            message="Ответ AI получен, но не соответствует схеме данных. Проверьте тип отпуска/даты в документе.",
+                            debug_steps=debug_steps,
+                        ) from fallback_err
+                    source_err = fallback_err if isinstance(fallback_err, (anthropic.APIError, anthropic.APITimeoutError)) else (e or fallback_err)
+                    if isinstance(source_err, anthropic.APITimeoutError):
+                        _raise_timeout("structured", source_err, debug_steps)
+                    if isinstance(source_err, anthropic.APIError):
+                        _raise_upstream("structured", source_err, debug_steps)
                     raise UpstreamAIError(
                         step="structured",
-                        status_code=422,
-                        message="Ответ AI получен, но не соответствует схеме данных. Проверьте тип отпуска/даты в документе.",
+                        status_code=500,
+                        message="Ошибка структуризации ответа AI-сервиса.",
                         debug_steps=debug_steps,
-                    ) from fallback_err
-                source_err = fallback_err if isinstance(fallback_err, (anthropic.APIError, anthropic.APITimeoutError)) else (e or fallback_err)
-                if isinstance(source_err, anthropic.APITimeoutError):
-                    _raise_timeout("structured", source_err, debug_steps)
-                if isinstance(source_err, anthropic.APIError):
-                    _raise_upstream("structured", source_err, debug_steps)
-                raise UpstreamAIError(
-                    step="structured",
-                    status_code=500,
-                    message="Ошибка структуризации ответа AI-сервиса.",
-                    debug_steps=debug_steps,
-                ) from source_err
+                    ) from source_err
+        return parsed
+
+
+def _run_backend(
+    extractor: ExtractionBackend, pdf_bytes: bytes, cfg: Settings, debug_steps: DebugLog
+) -> Tuple[LeaveRequestExtract, Dict[str, Any]]:
+    """The backend's passes (two with PDF_ESCALATION), the signature check and the recording; -> (extract, render_info)."""
+    # PDF_ESCALATION: a cheap small grayscale pass first, the full-size one only when its result is not good enough.
+    escalation = cfg.PDF_ESCALATION and extractor.escalates
+    render_cfg = first_pass_settings(cfg) if escalation else cfg
+    first_render_info: Optional[Dict[str, Any]] = None
+    reasons: List[str] = []
+    while True:
+        image_blocks, render_info = extractor.render(pdf_bytes, render_cfg)
+        draft_text = extractor.draft(image_blocks)
+        image_blocks = None
+        parsed = extractor.structure(draft_text)
+        # What the backend answered, before the detector and the notes below: that is what a replay returns.
+        structured = parsed.model_dump(mode="json")
+
+        # Before the escalation decision: an unclear signature is one of its reasons.
+        signature_note = reconcile_signature(parsed, render_info.get("signature"), cfg.SIGNATURE_DETECTOR)
+        if signature_note:
+            parsed.quality.notes.append(signature_note)
+            debug_steps.add("signature", "reconciled", "Шаг {step}: {note}", note=signature_note)
+
+        if not escalation or first_render_info is not None:
+            break
+        first_render_info = render_info
+        reasons = escalation_reasons(parsed, cfg.PDF_ESCALATION_CONFIDENCE_PERCENT / 100)
+        if not reasons:
+            break
+        render_cfg = escalated_settings(cfg, reasons)
+        debug_steps.add(
+            "escalation",
+            "escalate",
+            "Шаг {step}: повторный проход long_edge={long_edge}, color_mode={color_mode}, reasons={reasons}",
+            level=logging.INFO,
+            long_edge=render_cfg.PDF_TARGET_LONG_EDGE,
+            color_mode=render_cfg.PDF_COLOR_MODE,
+            reasons=reasons,
+        )
+
+    if escalation:
+        # Without escalation the document would have been rendered once at full size, as the second pass was.
+        second_pass_tokens = estimate_image_tokens(render_info) if reasons else 0
+        ESCALATION.record(
+            first_pass_tokens=estimate_image_tokens(first_render_info),
+            single_pass_tokens=second_pass_tokens or estimate_image_tokens(first_render_info, cfg.PDF_TARGET_LONG_EDGE),
+            second_pass_tokens=second_pass_tokens,
+            reasons=reasons,
+        )
+        if reasons:
+            parsed.quality.notes.append(f"escalation: first_pass_long_edge={first_render_info['target_long_edge']}, reasons={','.join(reasons)}")
+
+    if cfg.EXTRACTION_RECORD_DIR and extractor.name != "replay":
+        record_extraction(cfg.EXTRACTION_RECORD_DIR, pdf_bytes, extractor.name, render_info, draft_text, structured, debug_steps)
+
+    return parsed, render_info
+
+
+def extract_leave_request_with_debug(
+    pdf_bytes: bytes,
+    filename: str = "upload.pdf",
+    *,
+    model: Optional[str] = None,
+    backend: Optional[str] = None,
+    on_debug: Optional[Callable[[str], None]] = None,
+    on_delta: Optional[Callable[[str, str], None]] = None,
+    on_field: Optional[Callable[[str, Any], None]] = None,
+    on_reset: Optional[Callable[[str], None]] = None,
+) -> Tuple[LeaveRequestExtract, DebugLog]:
+    """PDF -> render -> draft -> structured extract, on the `backend` (EXTRACTION_BACKEND by default).
+
+    Returns the extract and its DebugLog: a sequence of the step messages that also
+    carries the structured events (`timings()` for the trace).
+
+    With RULE_EXTRACTOR=hybrid a text-layer PDF is parsed locally first: the AI backend is skipped
+    when that finds every field, and the local fields stand in for it when the AI service is down.
+
+    `on_debug` receives each debug step as it is added; `on_delta(step, text)` receives
+    vision transcription chunks while they are generated, and `on_field(path, value)`
+    each structured field (e.g. "leave.start_date") as soon as its value is complete.
+    Both use the streaming Messages API. `on_reset(step)` is called before a PDF_ESCALATION
+    second pass whose deltas and fields replace the first pass's.
+    """
+    # One snapshot for the whole request: a concurrent reload does not change it midway.
+    cfg = get_settings()
+    debug_steps = DebugLog(on_debug, log=logger, sample_percent=cfg.DEBUG_LOG_SAMPLE_PERCENT)
+    debug_steps.add("upload", "file", "Файл загружен: name={name}, bytes={size}", name=filename, size=len(pdf_bytes))
+    name = backend or cfg.EXTRACTION_BACKEND
+
+    # RULE_EXTRACTOR=hybrid: a template application with a text layer is read by compiled patterns first.
+    rules = RulesBackend(cfg, debug_steps) if name == "anthropic" and cfg.RULE_EXTRACTOR == "hybrid" else None
+    found = rules.read(pdf_bytes) if rules is not None else None
+    min_confidence = cfg.RULE_MIN_CONFIDENCE_PERCENT / 100
+    if found is not None and found.complete(min_confidence):
+        debug_steps.add("rules", "complete", "Шаг {step}: все поля найдены в текстовом слое, AI не вызывается", level=logging.INFO)
+        parsed, render_info = _run_backend(rules, pdf_bytes, cfg, debug_steps)
+    else:
+        try:
+            extractor = create_backend(name, cfg, debug_steps, model=model, on_delta=on_delta, on_field=on_field, on_reset=on_reset)
+            parsed, render_info = _run_backend(extractor, pdf_bytes, cfg, debug_steps)
+        except UpstreamAIError as e:
+            # Degraded mode: the AI service is down or overloaded, but the text layer had something to offer.
+            if found is None or not (e.status_code == 429 or e.status_code >= 500):
+                raise
+            debug_steps.add(
+                "rules",
+                "degraded",
+                "Шаг {step}: AI недоступен (step={failed}, status={status}), ответ из текстового слоя",
+                level=logging.WARNING,
+                failed=e.step,
+                status=e.status_code,
+            )
+            parsed, render_info = _run_backend(rules, pdf_bytes, cfg, debug_steps)
+            parsed.quality.notes.append(f"degraded: AI недоступен (step={e.step}, status={e.status_code}), поля из текстового слоя")
+        else:
+            if found is not None:
+                changed = apply_rule_fields(parsed, found, min_confidence)
+                if changed:
+                    parsed.quality.notes.append(f"text_layer: {', '.join(changed)}")
+                    debug_steps.add("rules", "merged", "Шаг {step}: поля из текстового слоя: {fields}", fields=changed)
 
     try:
         parsed.quality.notes.append(
             f"render: pages_sent={render_info['pages_sent']}/{render_info['total_pages']}, "
+            f"selected_pages={render_info.get('selected_pages')}, "
             f"target_long_edge={render_info['target_long_edge']}, approx_b64_chars={render_info['approx_b64_chars']}, "
             f"color_mode={render_info['color_mode']}"
         )
     except Exception:
         pass
 
-    _add_debug(debug_steps, "Готово: extraction успешно завершён", on_debug)
+    debug_steps.add("done", "ok", "Готово: extraction успешно завершён")
     return parsed, debug_steps
 
 
@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .compliance_rules import rules as R
+from .compliance_rules.common import parse_iso, safe_text
+from .compliance_rules.engine import current_plan
+from .compliance_rules.registry import DispatchPlan, RuleDef
+from .issues import decision_from_flags, from_compliance, from_validation, is_severe_error
+from .production_calendar import current_calendar
+from .schemas import LeaveRequestExtract, ValidationIssue
+from .validation import LOW_CONFIDENCE_THRESHOLD, VALIDATION_MESSAGES
+
+
+@dataclass
+class ExtractColumns:
+    """Columnar view of many extracts: ordinals/counts as int64, tri-states as int8, flags as bool."""
+
+    n: int
+    start: np.ndarray
+    end: np.ndarray
+    request: np.ndarray
+    has_start: np.ndarray
+    has_end: np.ndarray
+    has_request: np.ndarray
+    days: np.ndarray
+    has_days: np.ndarray
+    signature: np.ndarray
+    signature_confidence: np.ndarray
+    overall_confidence: np.ndarray
+    annual_paid: np.ndarray
+    unpaid: np.ndarray
+    employer_text: np.ndarray
+    employee_text: np.ndarray
+    manager_text: np.ndarray
+    request_text: np.ndarray
+    start_text: np.ndarray
+    end_text: np.ndarray
+    employee_raw: np.ndarray
+    start_raw: np.ndarray
+    end_raw: np.ndarray
+    comment_text: np.ndarray
+    unpaid_marker: np.ndarray
+    human_check: np.ndarray
+
+
+def _ordinal(value: Optional[str]) -> int:
+    parsed = parse_iso(value)
+    return parsed.toordinal() if parsed else 0
+
+
+def to_columns(extracts: Sequence[LeaveRequestExtract]) -> ExtractColumns:
+    n = len(extracts)
+    start = np.fromiter((_ordinal(ex.leave.start_date) for ex in extracts), dtype=np.int64, count=n)
+    end = np.fromiter((_ordinal(ex.leave.end_date) for ex in extracts), dtype=np.int64, count=n)
+    request = np.fromiter((_ordinal(ex.request_date) for ex in extracts), dtype=np.int64, count=n)
+    days_raw = [ex.leave.days_count for ex in extracts]
+    signature_raw = [ex.signature_present for ex in extracts]
+
+    def flags(values) -> np.ndarray:
+        return np.fromiter(values, dtype=bool, count=n)
+
+    def floats(values) -> np.ndarray:
+        return np.fromiter((np.nan if v is None else v for v in values), dtype=np.float64, count=n)
+
+    return ExtractColumns(
+        n=n,
+        start=start,
+        end=end,
+        request=request,
+        has_start=start > 0,
+        has_end=end > 0,
+        has_request=request > 0,
+        days=np.fromiter((0 if d is None else d for d in days_raw), dtype=np.int64, count=n),
+        has_days=flags(d is not None for d in days_raw),
+        signature=np.fromiter((-1 if s is None else int(s) for s in signature_raw), dtype=np.int8, count=n),
+        signature_confidence=floats(ex.signature_confidence for ex in extracts),
+        overall_confidence=floats(ex.quality.overall_confidence for ex in extracts),
+        annual_paid=flags(ex.leave.leave_type == "annual_paid" for ex in extracts),
+        unpaid=flags(ex.leave.leave_type == "unpaid" for ex in extracts),
+        employer_text=flags(bool(safe_text(ex.employer_name)) for ex in extracts),
+        employee_text=flags(bool(safe_text(ex.employee.full_name)) for ex in extracts),
+        manager_text=flags(bool(safe_text(ex.manager.full_name)) for ex in extracts),
+        request_text=flags(bool(safe_text(ex.request_date)) for ex in extracts),
+        start_text=flags(bool(safe_text(ex.leave.start_date)) for ex in extracts),
+        end_text=flags(bool(safe_text(ex.leave.end_date)) for ex in extracts),
+        employee_raw=flags(bool(ex.employee.full_name) for ex in extracts),
+        start_raw=flags(bool(ex.leave.start_date) for ex in extracts),
+        end_raw=flags(bool(ex.leave.end_date) for ex in extracts),
+        comment_text=flags(bool(safe_text(ex.leave.comment)) for ex in extracts),
+        unpaid_marker=flags(R.has_unpaid_reason_marker(ex.raw_text) for ex in extracts),
+        human_check=flags(R.has_human_check_note(ex.quality.notes) for ex in extracts),
+    )
+
+
+# A check is (mask, spec, details_builder); details_builder maps a row index to the issue details.
+Check = Tuple[np.ndarray, Any, Any]
+
+
+def validation_checks(c: ExtractColumns) -> List[Check]:
+    both_dates = c.has_start & c.has_end
+    low_conf = c.overall_confidence < LOW_CONFIDENCE_THRESHOLD
+    conf = c.overall_confidence
+    return [
+        (~c.employee_raw, "missing_employee_full_name", None),
+        (~c.start_raw, "missing_leave_start_date", None),
+        (~c.end_raw & ~c.has_days, "missing_end_or_days", None),
+        (c.start_raw & ~c.has_start, "bad_start_date", None),
+        (c.end_raw & ~c.has_end, "bad_end_date", None),
+        (both_dates & (c.end < c.start), "dates_inverted", None),
+        (low_conf, "low_confidence", lambda i: {"confidence": float(conf[i])}),
+    ]
+
+
+def compliance_checks(c: ExtractColumns, plan: Optional[DispatchPlan] = None) -> List[Check]:
+    """Vectorized rules of `plan` (default: the active one), at the versions it selected (COMPLIANCE_RULE_PINS)."""
+    plan = plan or current_plan()
+    short_notice = plan.rule("DATE-003")
+    mismatch = plan.rule("COUNT-002")
+    missing_days = plan.rule("COUNT-003")
+    both_dates = c.has_start & c.has_end
+    notice = c.has_request & c.has_start
+    delta = c.start - c.request
+    calendar = current_calendar()
+    span = c.end - c.start + 1
+    # Same inputs as derive_inputs: holidays are excluded from annual paid leave (ст. 120 ТК РФ) since v2.
+    holidays = np.where(c.annual_paid & both_dates, calendar.holidays_between_many(c.start, c.end), 0)
+    zero = np.zeros(c.n, dtype=np.int64)
+    excluded = holidays if mismatch.version >= 2 else zero
+    expected = span - excluded
+    expected_missing = span - (holidays if missing_days.version >= 2 else zero)
+    late = delta < R.SHORT_NOTICE_DAYS
+    working = None
+    if short_notice.version >= 2:
+        working = calendar.working_days_between_many(c.request, c.start - 1)
+        late |= working < R.SHORT_NOTICE_WORKING_DAYS
+
+    def notice_details(i: int) -> Dict[str, int]:
+        details = {"days_before_start": int(delta[i])}
+        if working is not None:
+            details["working_days_before_start"] = int(working[i])
+        return details
+
+    return [
+        (~c.employer_text, plan.rule("DOC-REQ-001"), None),
+        (~c.employee_text, plan.rule("DOC-REQ-002"), None),
+        (~c.manager_text, plan.rule("DOC-REQ-003"), None),
+        (~c.request_text, plan.rule("DOC-REQ-004"), None),
+        (~c.start_text, plan.rule("DOC-REQ-005"), None),
+        (~c.end_text, plan.rule("DOC-REQ-006"), None),
+        (c.signature == 0, plan.rule("DOC-SIGN-001"), None),
+        (
+            (c.signature == 1) & (c.signature_confidence < R.LOW_SIGNATURE_CONFIDENCE_THRESHOLD),
+            plan.rule("OCR-SIGN-002"),
+            None,
+        ),
+        (both_dates & (c.start > c.end), plan.rule("DATE-001"), None),
+        (notice & (c.request > c.start), plan.rule("DATE-002"), None),
+        (notice & (delta >= 0) & late, short_notice, notice_details),
+        (c.has_days & (c.days <= 0), plan.rule("COUNT-001"), None),
+        (
+            c.has_days & both_dates & (expected != c.days),
+            mismatch,
+            lambda i: _mismatch_details(int(expected[i]), int(c.days[i]), int(excluded[i])),
+        ),
+        (~c.has_days & both_dates, missing_days, lambda i: {"expected": int(expected_missing[i])}),
+        # Without leave history every version of LAW-122-001 is the same reminder.
+        (c.annual_paid & c.has_days & (c.days < R.ANNUAL_PART_MIN_DAYS), plan.rule("LAW-122-001"), None),
+        (c.unpaid & ~c.comment_text & ~c.unpaid_marker, plan.rule("LAW-128-001"), None),
+        (c.human_check, plan.rule("OCR-QUALITY-001"), None),
+    ]
+
+
+def _mismatch_details(expected: int, actual: int, excluded: int) -> Dict[str, int]:
+    details = {"expected": expected, "actual": actual}
+    if excluded:
+        details["holidays_excluded"] = excluded
+    return details
+
+
+class _Templates:
+    """Public Issue dicts per spec, converted once through the regular from_* mappers."""
+
+    def __init__(self) -> None:
+        self._compliance: Dict[str, Dict[str, Any]] = {}
+        self._validation: Dict[str, Dict[str, Any]] = {}
+        self._decisions: Dict[Tuple[bool, bool, bool], Dict[str, Any]] = {}
+
+    def compliance(self, spec: RuleDef, details: Optional[dict]) -> Dict[str, Any]:
+        tpl = self._compliance.get(spec.code)
+        if tpl is None:
+            tpl = self._compliance[spec.code] = from_compliance([spec.build()])[0].model_dump()
+        if details is None:
+            return dict(tpl)
+        if "{" in spec.message:
+            return {**tpl, "message": spec.message.format_map(details), "details": details}
+        return {**tpl, "details": details}
+
+    def validation(self, code: str, fmt: Optional[dict]) -> Dict[str, Any]:
+        level, message = VALIDATION_MESSAGES[code]
+        if fmt:
+            message = message.format(**fmt)
+        tpl = self._validation.get(message)
+        if tpl is None:
+            tpl = self._validation[message] = from_validation([ValidationIssue(level=level, code=code, message=message)])[0].model_dump()
+        return dict(tpl)
+
+    def decision(self, severe_error: bool, warn_exists: bool, has_issues: bool) -> Dict[str, Any]:
+        key = (severe_error, warn_exists, has_issues)
+        out = self._decisions.get(key)
+        if out is None:
+            out = self._decisions[key] = decision_from_flags(*key).model_dump()
+        return dict(out)
+
+
+def run_batch_checks(extracts: Sequence[LeaveRequestExtract]) -> List[Dict[str, Any]]:
+    """Validation + compliance for many extracts at once.
+
+    Produces, per record, the same `issues`, `decision` and `needs_rewrite` as
+    validate_extract + run_compliance_checks + from_* + build_decision.
+    """
+    cols = to_columns(extracts)
+    templates = _Templates()
+    validation: List[List[Dict[str, Any]]] = [[] for _ in range(cols.n)]
+    compliance: List[List[Dict[str, Any]]] = [[] for _ in range(cols.n)]
+
+    for mask, code, details in validation_checks(cols):
+        for i in np.flatnonzero(mask).tolist():
+            validation[i].append(templates.validation(code, details(i) if details else None))
+
+    needs_rewrite = np.zeros(cols.n, dtype=bool)
+    for mask, spec, details in compliance_checks(cols):
+        rows = np.flatnonzero(mask)
+        if spec.level == "error":
+            needs_rewrite[rows] = True
+        for i in rows.tolist():
+            compliance[i].append(templates.compliance(spec, details(i) if details else None))
+
+    results: List[Dict[str, Any]] = []
+    for i in range(cols.n):
+        issues = validation[i] + compliance[i]
+        severe = any(is_severe_error(it["severity"], it["domain"], it["category"]) for it in issues)
+        warn = any(it["severity"] == "warn" for it in issues)
+        results.append(
+            {
+                "issues": issues,
+                "decision": templates.decision(severe, warn, bool(issues)),
+                "needs_rewrite": bool(needs_rewrite[i]),
+            }
+        )
+    return results
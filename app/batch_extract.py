@@ -0,0 +1,266 @@
+"""Offline batch extraction: PDFs -> ApiResponse records as JSONL, resumable.
+
+Run:
+    python -m app.batch_extract scans/2019 "scans/2020/**/*.pdf" --out results.jsonl --workers 4
+
+Same pipeline as /api/extract (render, vision, structured, validation, compliance),
+without HTTP. Every finished document is appended to `--out` and then recorded in
+the checkpoint (`<out>.checkpoint` by default, keyed by path, size and mtime); a
+rerun with the same checkpoint skips them. Failed documents are recorded too and are
+retried only with `--retry-failed`.
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, TextIO
+
+from .ai_extract import UpstreamAIError, extract_leave_request_with_debug
+from .pipeline import finish_extraction
+from .response_profile import dump_json
+from .settings import EXTRACTION_BACKENDS, get_settings
+
+logger = logging.getLogger(__name__)
+
+STATUS_FAILED = "failed"
+
+
+def find_pdfs(inputs: Sequence[str]) -> List[Path]:
+    """Directories (recursive) and glob patterns -> unique PDF paths, sorted for a stable order."""
+    found: Dict[str, Path] = {}
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            candidates: Iterable[Path] = (p for p in path.rglob("*") if p.suffix.lower() == ".pdf")
+        else:
+            candidates = (Path(p) for p in glob.glob(item, recursive=True))
+        for candidate in candidates:
+            if candidate.is_file():
+                found.setdefault(str(candidate.resolve()), candidate)
+    return sorted(found.values(), key=lambda p: str(p))
+
+
+def _file_key(path: Path) -> str:
+    stat = path.stat()
+    return f"{path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class Checkpoint:
+    """Append-only JSONL of finished documents; the last line per key (path, size, mtime) wins.
+
+    Keyed by file metadata rather than content so that resuming a large backfill does
+    not have to read every already processed scan again.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.done: Dict[str, str] = {}
+        if path.exists():
+            with path.open("r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A line cut by a crash: that document is simply processed again.
+                        continue
+                    self.done[entry["key"]] = entry["status"]
+        self._file = path.open("a", encoding="utf-8")
+
+    def should_skip(self, key: str, retry_failed: bool) -> bool:
+        status = self.done.get(key)
+        return status is not None and not (retry_failed and status == STATUS_FAILED)
+
+    def record(self, key: str, sha256: Optional[str], status: str) -> None:
+        self.done[key] = status
+        self._file.write(json.dumps({"key": key, "sha256": sha256, "status": status}, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def _failure(err: Exception) -> Dict[str, Any]:
+    if isinstance(err, UpstreamAIError):
+        return {"type": type(err).__name__, "step": err.step, "status": err.status_code, "message": str(err)}
+    return {"type": type(err).__name__, "step": None, "status": None, "message": str(err)[:320]}
+
+
+def process_file(
+    path: Path, *, with_debug: bool, store_path: str = "", backend: Optional[str] = None
+) -> tuple[str, Optional[str], bytes]:
+    """One document -> (status, sha256, JSONL line). Pipeline errors become `failed` records, never exceptions."""
+    started = time.monotonic()
+    head: Dict[str, Any] = {"file": str(path)}
+    try:
+        data = path.read_bytes()
+        sha256 = hashlib.sha256(data).hexdigest()
+        head.update(sha256=sha256, bytes=len(data))
+        extract, debug_steps = extract_leave_request_with_debug(data, path.name, backend=backend)
+        # With RESULT_STORE_PATH also checked against the leave history and saved, so a backfill shows up in /api/results.
+        resp = finish_extraction(
+            extract, debug_steps, data, path.name, with_debug=with_debug, store_path=store_path, request_id="batch", sha256=sha256
+        )
+    except Exception as err:
+        head.update(status=STATUS_FAILED, elapsed_ms=int((time.monotonic() - started) * 1000), error=_failure(err))
+        if with_debug:
+            head["debug_steps"] = list(getattr(err, "debug_steps", []) or [])
+        return STATUS_FAILED, head.get("sha256"), (json.dumps(head, ensure_ascii=False) + "\n").encode("utf-8")
+    status = resp.decision.status
+    head.update(status=status, elapsed_ms=int((time.monotonic() - started) * 1000))
+    exclude = None if resp.debug_steps is not None else {"debug_steps"}
+    # The response is serialized once by pydantic-core and spliced into the record.
+    line = json.dumps(head, ensure_ascii=False)[:-1].encode("utf-8") + b', "response": ' + dump_json(resp, exclude=exclude) + b"}\n"
+    return status, sha256, line
+
+
+def _format_eta(seconds: float) -> str:
+    seconds = int(max(0, seconds))
+    return f"{seconds // 3600:d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+class Progress:
+    def __init__(self, total: int, stream: TextIO):
+        self.total = total
+        self.done = 0
+        self.statuses: Counter = Counter()
+        self.started = time.monotonic()
+        self._stream = stream
+
+    def update(self, path: Path, status: str) -> None:
+        self.done += 1
+        self.statuses[status] += 1
+        elapsed = time.monotonic() - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - self.done) / rate if rate > 0 else 0.0
+        self._stream.write(
+            f"[{self.done}/{self.total}] {rate * 60:.1f} док/мин, ETA {_format_eta(eta)} — {status}: {path.name}\n"
+        )
+        self._stream.flush()
+
+    def summary(self, skipped: int, interrupted: bool) -> str:
+        elapsed = time.monotonic() - self.started
+        parts = [f"{status}={count}" for status, count in sorted(self.statuses.items())]
+        rate = self.done / elapsed * 60 if elapsed > 0 else 0.0
+        head = "Прервано" if interrupted else "Готово"
+        return (
+            f"{head}: обработано {self.done} из {self.total} за {_format_eta(elapsed)} ({rate:.1f} док/мин); "
+            f"пропущено по checkpoint: {skipped}; статусы: {', '.join(parts) or '-'}"
+        )
+
+
+def run(
+    inputs: Sequence[str],
+    out: Path,
+    *,
+    checkpoint: Optional[Path] = None,
+    workers: int = 4,
+    with_debug: bool = False,
+    retry_failed: bool = False,
+    store_path: str = "",
+    backend: Optional[str] = None,
+    stream: TextIO = sys.stderr,
+) -> Counter:
+    """Process every PDF not yet in the checkpoint; returns the status counts of this run."""
+    paths = find_pdfs(inputs)
+    checkpoint = checkpoint or out.with_name(out.name + ".checkpoint")
+    for parent in (out.parent, checkpoint.parent):
+        parent.mkdir(parents=True, exist_ok=True)
+    ckpt = Checkpoint(checkpoint)
+    todo: List[tuple[Path, str]] = []
+    skipped = 0
+    for path in paths:
+        key = _file_key(path)
+        if ckpt.should_skip(key, retry_failed):
+            skipped += 1
+        else:
+            todo.append((path, key))
+
+    progress = Progress(len(todo), stream)
+    write_lock = threading.Lock()
+    interrupted = False
+
+    def _job(path: Path, key: str) -> tuple[Path, str]:
+        # Read in the worker: only `workers` documents are in memory at a time.
+        status, sha256, line = process_file(path, with_debug=with_debug, store_path=store_path, backend=backend)
+        with write_lock:
+            out_file.write(line)
+            out_file.flush()
+            # Output first, checkpoint second: a crash in between reprocesses (never loses) the document.
+            ckpt.record(key, sha256, status)
+        return path, status
+
+    with out.open("ab") as out_file, ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="batch") as pool:
+        pending: set[Future] = set()
+        queue = iter(todo)
+        try:
+            while True:
+                # Keep at most 2x workers submitted so a huge backlog is not queued up front.
+                for path, key in queue:
+                    pending.add(pool.submit(_job, path, key))
+                    if len(pending) >= 2 * max(1, workers):
+                        break
+                if not pending:
+                    break
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    progress.update(*future.result())
+        except KeyboardInterrupt:
+            interrupted = True
+            stream.write("Остановка: дожидаемся документов в работе, новые не запускаются...\n")
+            for future in pending:
+                future.cancel()
+            for future in pending:
+                if not future.cancelled():
+                    progress.update(*future.result())
+    ckpt.close()
+    stream.write(progress.summary(skipped, interrupted) + "\n")
+    stream.flush()
+    if interrupted:
+        raise KeyboardInterrupt
+    return progress.statuses
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.batch_extract",
+        description="Пакетное извлечение заявлений из PDF в JSONL (с продолжением по checkpoint).",
+    )
+    parser.add_argument("inputs", nargs="+", help="каталоги (рекурсивно) или glob-шаблоны PDF")
+    parser.add_argument("--out", required=True, type=Path, help="JSONL с результатами (дописывается)")
+    parser.add_argument("--checkpoint", type=Path, default=None, help="файл checkpoint (по умолчанию <out>.checkpoint)")
+    parser.add_argument("--workers", type=int, default=get_settings().BATCH_WORKERS, help="параллельных документов")
+    parser.add_argument("--debug", action="store_true", help="добавлять debug_steps в записи")
+    parser.add_argument(
+        "--backend", choices=EXTRACTION_BACKENDS, default=None, help="backend извлечения (по умолчанию EXTRACTION_BACKEND)"
+    )
+    parser.add_argument("--retry-failed", action="store_true", help="повторить документы, упавшие в прошлых запусках")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    try:
+        statuses = run(
+            args.inputs,
+            args.out,
+            checkpoint=args.checkpoint,
+            workers=args.workers,
+            with_debug=args.debug,
+            retry_failed=args.retry_failed,
+            store_path=get_settings().RESULT_STORE_PATH,
+            backend=args.backend,
+        )
+    except KeyboardInterrupt:
+        return 130
+    return 1 if statuses.get(STATUS_FAILED) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
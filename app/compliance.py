@@ -1,11 +1,18 @@
 from __future__ import annotations
 
+from typing import Any, Mapping, Optional
+
 from .compliance_rules import run_all_rules
 from .schemas import ComplianceIssue, LeaveRequestExtract
 
 
-def run_compliance_checks(extract: LeaveRequestExtract) -> tuple[list[ComplianceIssue], bool]:
-    """Run MVP TK-RF oriented rules and return issues + rewrite recommendation."""
-    issues = run_all_rules(extract)
+def run_compliance_checks(
+    extract: LeaveRequestExtract, context: Optional[Mapping[str, Any]] = None
+) -> tuple[list[ComplianceIssue], bool]:
+    """Run MVP TK-RF oriented rules and return issues + rewrite recommendation.
+
+    `context` adds cross-request inputs (see LeaveHistory.rule_inputs); without it only the document is checked.
+    """
+    issues = run_all_rules(extract, context)
     needs_rewrite = any(i.level == "error" for i in issues)
     return issues, needs_rewrite
@@ -1,3 +1,4 @@
-from .engine import run_all_rules
+from .engine import current_plan, rule_profile, run_all_rules
+from .registry import DispatchPlan, RuleDef
 
-__all__ = ["run_all_rules"]
+__all__ = ["DispatchPlan", "RuleDef", "current_plan", "rule_profile", "run_all_rules"]
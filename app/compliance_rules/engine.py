@@ -1,30 +1,46 @@
 from __future__ import annotations
 
+import logging
+import threading
+from typing import Any, Mapping, Optional
+
 from ..schemas import ComplianceIssue, LeaveRequestExtract
-from .common import RuleContext, RuleFunc
-from .rules import dates_and_counts_rule, leave_type_hints_rule, quality_hints_rule, required_fields_rule, signature_rule
-
-RULES: tuple[RuleFunc, ...] = (
-    required_fields_rule,
-    signature_rule,
-    dates_and_counts_rule,
-    leave_type_hints_rule,
-    quality_hints_rule,
-)
-
-
-def run_all_rules(extract: LeaveRequestExtract) -> list[ComplianceIssue]:
-    ctx = RuleContext(extract=extract)
-    for rule in RULES:
-        try:
-            rule(ctx)
-        except Exception as exc:  # noqa: BLE001
-            ctx.add(
-                level="warn",
-                code="compliance_internal_error",
-                message=f"Внутренняя ошибка проверки соответствия: {type(exc).__name__}",
-                rule_id="SYS-001",
-                legal_basis="Техническая ошибка сервиса проверки.",
-                action_hint="Повторите проверку или обратитесь к администратору сервиса.",
-            )
-    return ctx.issues
+from ..settings import get_settings
+from .registry import DispatchPlan, parse_pins
+from .rules import PREVIOUS_VERSIONS, RULES
+
+logger = logging.getLogger(__name__)
+
+
+def build_plan(pins: Optional[str]) -> DispatchPlan:
+    """Compile the rules; COMPLIANCE_RULE_PINS selects non-latest rule versions, e.g. "COUNT-002@1"."""
+    return DispatchPlan((*RULES, *PREVIOUS_VERSIONS), pins=parse_pins(pins))
+
+
+# Compiled once per config generation (startup, then SIGHUP reloads that change the snapshot).
+PLAN = build_plan(get_settings().COMPLIANCE_RULE_PINS)
+_plan_generation = get_settings().GENERATION
+_plan_lock = threading.Lock()
+
+
+def current_plan() -> DispatchPlan:
+    """The plan for the active settings snapshot; invalid pins keep the previous plan."""
+    global PLAN, _plan_generation
+    cfg = get_settings()
+    if cfg.GENERATION != _plan_generation:
+        with _plan_lock:
+            if cfg.GENERATION != _plan_generation:
+                try:
+                    PLAN = build_plan(cfg.COMPLIANCE_RULE_PINS)
+                except ValueError:
+                    logger.exception("COMPLIANCE_RULE_PINS=%r rejected, keeping the previous rule versions", cfg.COMPLIANCE_RULE_PINS)
+                _plan_generation = cfg.GENERATION
+    return PLAN
+
+
+def run_all_rules(extract: LeaveRequestExtract, context: Optional[Mapping[str, Any]] = None) -> list[ComplianceIssue]:
+    return current_plan().run(extract, context)
+
+
+def rule_profile() -> list[dict]:
+    return current_plan().profile()
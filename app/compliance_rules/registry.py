@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Mapping, Optional, Union
+
+from ..production_calendar import current_calendar
+from ..schemas import ComplianceIssue, LeaveRequestExtract
+from .common import parse_iso, safe_text
+
+# A rule predicate gets the derived inputs and returns falsy (no issue), True, or a details dict.
+RuleCheck = Callable[[Mapping[str, Any]], Union[bool, dict, None]]
+
+
+@dataclass(frozen=True)
+class RuleDef:
+    """Declarative compliance rule.
+
+    `requires` lists derived inputs (see derive_inputs) that must be present for
+    the rule to run; `message` may reference details keys as a str.format template.
+    """
+
+    rule_id: str
+    code: str
+    level: str
+    message: str
+    legal_basis: str
+    action_hint: str
+    when: RuleCheck
+    field: Optional[str] = None
+    requires: tuple[str, ...] = ()
+    version: int = 1
+
+    def build(self, details: Optional[dict] = None, *, message_args: Optional[dict] = None) -> ComplianceIssue:
+        args = message_args if message_args is not None else details
+        message = self.message.format_map(args) if args and "{" in self.message else self.message
+        return ComplianceIssue(
+            level=self.level,
+            code=self.code,
+            field=self.field,
+            message=message,
+            details=details,
+            rule_id=self.rule_id,
+            legal_basis=self.legal_basis,
+            action_hint=self.action_hint,
+        )
+
+
+INTERNAL_ERROR = RuleDef(
+    rule_id="SYS-001",
+    code="compliance_internal_error",
+    level="warn",
+    message="Внутренняя ошибка проверки соответствия: {error}",
+    legal_basis="Техническая ошибка сервиса проверки.",
+    action_hint="Повторите проверку или обратитесь к администратору сервиса.",
+    when=lambda _: False,
+)
+
+
+def derive_inputs(extract: LeaveRequestExtract) -> dict[str, Any]:
+    """Normalized rule inputs; absent values are simply not in the dict."""
+    ex = extract
+    out: dict[str, Any] = {}
+    for key, value in (
+        ("employer_name", ex.employer_name),
+        ("employee.full_name", ex.employee.full_name),
+        ("manager.full_name", ex.manager.full_name),
+        ("request_date", ex.request_date),
+        ("leave.start_date", ex.leave.start_date),
+        ("leave.end_date", ex.leave.end_date),
+        ("leave.comment", ex.leave.comment),
+        ("raw_text", ex.raw_text),
+    ):
+        text = safe_text(value)
+        if text:
+            out[key] = text
+
+    sd = parse_iso(ex.leave.start_date)
+    ed = parse_iso(ex.leave.end_date)
+    rd = parse_iso(ex.request_date)
+    if sd:
+        out["start"] = sd
+    if ed:
+        out["end"] = ed
+    if rd:
+        out["request"] = rd
+    calendar = current_calendar()
+    if sd and ed:
+        out["expected_days"] = (ed - sd).days + 1
+        holidays = calendar.holidays_between(sd, ed)
+        out["holidays_in_range"] = holidays
+        # Ст. 120 ТК РФ: public holidays inside annual paid leave are not counted in its days.
+        out["leave_days"] = out["expected_days"] - (holidays if ex.leave.leave_type == "annual_paid" else 0)
+    if sd and rd:
+        out["days_before_start"] = (sd - rd).days
+        # From the request date up to the day before the start.
+        out["working_days_before_start"] = calendar.working_days_between(rd, sd.toordinal() - 1)
+
+    out["leave_type"] = ex.leave.leave_type
+    if ex.leave.days_count is not None:
+        out["days_count"] = ex.leave.days_count
+    if ex.signature_present is not None:
+        out["signature_present"] = ex.signature_present
+    if ex.signature_confidence is not None:
+        out["signature_confidence"] = ex.signature_confidence
+    notes = [n for n in (ex.quality.notes or []) if isinstance(n, str)]
+    if notes:
+        out["quality.notes"] = notes
+    return out
+
+
+@dataclass
+class RuleStats:
+    evaluated: int = 0
+    skipped: int = 0
+    fired: int = 0
+    errors: int = 0
+    total_ns: int = 0
+
+
+@dataclass
+class _CompiledRule:
+    rule: RuleDef
+    required_mask: int
+    stats: RuleStats = field(default_factory=RuleStats)
+
+
+class DispatchPlan:
+    """Rules compiled once: active versions resolved, required inputs turned into bitmasks."""
+
+    def __init__(self, rules: Iterable[RuleDef], pins: Optional[Mapping[str, int]] = None):
+        pins = dict(pins or {})
+        by_id: dict[str, dict[int, RuleDef]] = {}
+        for rule in rules:
+            by_id.setdefault(rule.rule_id, {})[rule.version] = rule
+
+        selected: list[RuleDef] = []
+        for rule_id, versions in by_id.items():
+            version = pins.get(rule_id, max(versions))
+            if version not in versions:
+                raise ValueError(f"Unknown version {version} for rule {rule_id}; known: {sorted(versions)}")
+            selected.append(versions[version])
+
+        inputs = sorted({name for rule in selected for name in rule.requires})
+        self._bits = {name: 1 << i for i, name in enumerate(inputs)}
+        self._compiled = [
+            _CompiledRule(rule=rule, required_mask=sum(self._bits[name] for name in rule.requires)) for rule in selected
+        ]
+        self._lock = threading.Lock()
+
+    @property
+    def rules(self) -> list[RuleDef]:
+        return [c.rule for c in self._compiled]
+
+    def rule(self, rule_id: str) -> RuleDef:
+        for c in self._compiled:
+            if c.rule.rule_id == rule_id:
+                return c.rule
+        raise KeyError(rule_id)
+
+    def _present_mask(self, inputs: Mapping[str, Any]) -> int:
+        mask = 0
+        for name, bit in self._bits.items():
+            if name in inputs:
+                mask |= bit
+        return mask
+
+    def run(self, extract: LeaveRequestExtract, context: Optional[Mapping[str, Any]] = None) -> list[ComplianceIssue]:
+        """`context`: inputs from outside the document itself (e.g. `history.*` from the leave history)."""
+        inputs = derive_inputs(extract)
+        if context:
+            inputs.update(context)
+        present = self._present_mask(inputs)
+        issues: list[ComplianceIssue] = []
+        # Per-call tallies are merged under the lock once, so profiling stays cheap per rule.
+        tallies: list[tuple[RuleStats, int, bool, bool]] = []
+        for c in self._compiled:
+            if c.required_mask & present != c.required_mask:
+                tallies.append((c.stats, -1, False, False))
+                continue
+            started = time.perf_counter_ns()
+            fired = failed = False
+            try:
+                result = c.rule.when(inputs)
+                if result:
+                    issues.append(c.rule.build(result if isinstance(result, dict) else None))
+                    fired = True
+            except Exception as exc:  # noqa: BLE001
+                failed = True
+                issues.append(INTERNAL_ERROR.build(message_args={"error": type(exc).__name__}))
+            tallies.append((c.stats, time.perf_counter_ns() - started, fired, failed))
+
+        with self._lock:
+            for stats, elapsed_ns, fired, failed in tallies:
+                if elapsed_ns < 0:
+                    stats.skipped += 1
+                    continue
+                stats.evaluated += 1
+                stats.total_ns += elapsed_ns
+                stats.fired += fired
+                stats.errors += failed
+        return issues
+
+    def profile(self) -> list[dict[str, Any]]:
+        with self._lock:
+            out = []
+            for c in self._compiled:
+                s = c.stats
+                out.append(
+                    {
+                        "rule_id": c.rule.rule_id,
+                        "version": c.rule.version,
+                        "code": c.rule.code,
+                        "level": c.rule.level,
+                        "requires": list(c.rule.requires),
+                        "evaluated": s.evaluated,
+                        "skipped": s.skipped,
+                        "fired": s.fired,
+                        "errors": s.errors,
+                        "total_ms": round(s.total_ns / 1e6, 3),
+                        "avg_us": round(s.total_ns / s.evaluated / 1e3, 3) if s.evaluated else 0.0,
+                    }
+                )
+            return out
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            for c in self._compiled:
+                c.stats = RuleStats()
+
+
+def parse_pins(raw: Optional[str]) -> dict[str, int]:
+    """Parse COMPLIANCE_RULE_PINS, e.g. "COUNT-002@1,DATE-003@2"."""
+    pins: dict[str, int] = {}
+    for part in (raw or "").split(","):
+        rule_id, sep, version = part.strip().partition("@")
+        if sep and rule_id and version.strip().isdigit():
+            pins[rule_id.strip()] = int(version)
+    return pins
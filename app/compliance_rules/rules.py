@@ -1,214 +1,346 @@
 from __future__ import annotations
 
-from .common import RuleContext, parse_iso, safe_text
-
-
-def required_fields_rule(ctx: RuleContext) -> None:
-    ex = ctx.extract
-    if not safe_text(ex.employer_name):
-        ctx.add(
-            level="error",
-            code="missing_employer_name",
-            field="employer_name",
-            message="Не указана организация работодателя.",
-            rule_id="DOC-REQ-001",
-            legal_basis="ТК РФ (практика документооборота): реквизиты заявления должны однозначно идентифицировать работодателя.",
-            action_hint="Добавьте полное наименование организации в шапке заявления.",
-        )
-    if not safe_text(ex.employee.full_name):
-        ctx.add(
-            level="error",
-            code="missing_employee_name",
-            field="employee.full_name",
-            message="Не указано ФИО сотрудника.",
-            rule_id="DOC-REQ-002",
-            legal_basis="ТК РФ: заявление должно позволять идентифицировать работника.",
-            action_hint="Укажите полные ФИО сотрудника без сокращений.",
-        )
-    if not safe_text(ex.manager.full_name):
-        ctx.add(
-            level="warn",
-            code="missing_manager_name",
-            field="manager.full_name",
-            message="Не указано ФИО руководителя/адресата заявления.",
-            rule_id="DOC-REQ-003",
-            legal_basis="Локальные практики кадрового делопроизводства: адресат заявления должен быть определён.",
-            action_hint="Добавьте ФИО адресата (руководителя/уполномоченного лица).",
-        )
-    if not safe_text(ex.request_date):
-        ctx.add(
-            level="error",
-            code="missing_request_date",
-            field="request_date",
-            message="Не указана дата заявления.",
-            rule_id="DOC-REQ-004",
-            legal_basis="ТК РФ и кадровая практика: дата заявления нужна для фиксации волеизъявления.",
-            action_hint="Проставьте дату составления заявления в формате YYYY-MM-DD.",
-        )
-    if not safe_text(ex.leave.start_date):
-        ctx.add(
-            level="error",
-            code="missing_leave_start_date",
-            field="leave.start_date",
-            message="Не указана дата начала отпуска.",
-            rule_id="DOC-REQ-005",
-            legal_basis="ТК РФ: период отпуска должен быть определён датами.",
-            action_hint="Укажите дату начала отпуска.",
-        )
-    if not safe_text(ex.leave.end_date):
-        ctx.add(
-            level="error",
-            code="missing_leave_end_date",
-            field="leave.end_date",
-            message="Не указана дата окончания отпуска.",
-            rule_id="DOC-REQ-006",
-            legal_basis="ТК РФ: период отпуска должен быть определён датами.",
-            action_hint="Укажите дату окончания отпуска.",
-        )
-
-
-def signature_rule(ctx: RuleContext) -> None:
-    ex = ctx.extract
-    if ex.signature_present is False:
-        ctx.add(
-            level="error",
-            code="missing_signature",
-            field="signature_present",
-            message="В заявлении не обнаружена подпись сотрудника.",
-            rule_id="DOC-SIGN-001",
-            legal_basis="Кадровая практика: заявление работника подписывается заявителем.",
-            action_hint="Подпишите заявление и загрузите PDF повторно.",
-        )
-    if ex.signature_present is True and ex.signature_confidence is not None and ex.signature_confidence < 0.6:
-        ctx.add(
-            level="warn",
-            code="low_signature_confidence",
-            field="signature_confidence",
-            message="Подпись найдена, но уверенность низкая. Желательна ручная проверка.",
-            rule_id="OCR-SIGN-002",
-            legal_basis="Техническая проверка OCR/vision: низкая уверенность требует ручного подтверждения.",
-            action_hint="Проверьте визуально наличие подписи в скане.",
-        )
-
-
-def dates_and_counts_rule(ctx: RuleContext) -> None:
-    ex = ctx.extract
-    sd = parse_iso(ex.leave.start_date)
-    ed = parse_iso(ex.leave.end_date)
-    rd = parse_iso(ex.request_date)
-
-    if sd and ed and sd > ed:
-        ctx.add(
-            level="error",
-            code="invalid_date_range",
-            field="leave",
-            message="Дата начала отпуска позже даты окончания.",
-            rule_id="DATE-001",
-            legal_basis="ТК РФ: период отпуска не может иметь обратный диапазон дат.",
-            action_hint="Исправьте даты начала и окончания отпуска.",
-        )
-
-    if rd and sd:
-        if rd > sd:
-            ctx.add(
-                level="warn",
-                code="request_after_start",
-                field="request_date",
-                message="Дата заявления позже даты начала отпуска.",
-                rule_id="DATE-002",
-                legal_basis="Кадровая практика: заявление обычно подаётся до начала отпуска.",
-                action_hint="Проверьте дату заявления и дату начала отпуска.",
-            )
-        delta = (sd - rd).days
-        if 0 <= delta < 14:
-            ctx.add(
-                level="info",
-                code="short_notice",
-                field="request_date",
-                message="До начала отпуска меньше 14 дней. По практике/графику отпусков может потребоваться согласование.",
-                details={"days_before_start": delta},
-                rule_id="DATE-003",
-                legal_basis="Ст. 123 ТК РФ (график отпусков) и локальные процедуры согласования.",
-                action_hint="Проверьте необходимость дополнительного согласования с работодателем.",
-            )
-
-    expected_days = None
-    if sd and ed:
-        expected_days = (ed - sd).days + 1
-
-    if ex.leave.days_count is not None:
-        if ex.leave.days_count <= 0:
-            ctx.add(
-                level="error",
-                code="invalid_days_count",
-                field="leave.days_count",
-                message="Количество дней должно быть больше 0.",
-                rule_id="COUNT-001",
-                legal_basis="Логическая проверка кадрового документа: длительность отпуска должна быть положительной.",
-                action_hint="Укажите корректное количество календарных дней.",
-            )
-        if expected_days is not None and expected_days != ex.leave.days_count:
-            ctx.add(
-                level="error",
-                code="days_count_mismatch",
-                field="leave.days_count",
-                message="Количество дней не совпадает с диапазоном дат (инклюзивно).",
-                details={"expected": expected_days, "actual": ex.leave.days_count},
-                rule_id="COUNT-002",
-                legal_basis="Период отпуска и число календарных дней должны быть согласованы.",
-                action_hint="Скорректируйте даты или количество дней, чтобы значения совпали.",
-            )
-    elif expected_days is not None:
-        ctx.add(
-            level="warn",
-            code="missing_days_count",
-            field="leave.days_count",
-            message="Лучше указать количество календарных дней, чтобы не было разночтений.",
-            details={"expected": expected_days},
-            rule_id="COUNT-003",
-            legal_basis="Кадровая практика: явное указание длительности снижает риск ошибок в приказе.",
-            action_hint="Добавьте количество календарных дней отпуска.",
-        )
-
-
-def leave_type_hints_rule(ctx: RuleContext) -> None:
-    ex = ctx.extract
-    if ex.leave.leave_type == "annual_paid" and ex.leave.days_count is not None and ex.leave.days_count < 14:
-        ctx.add(
-            level="warn",
-            code="annual_paid_part_lt14",
-            field="leave.days_count",
-            message="Если ежегодный отпуск делится на части, одна часть должна быть не менее 14 календарных дней. Убедитесь, что в другом периоде есть 14+ дней.",
-            rule_id="LAW-122-001",
-            legal_basis="Ст. 125 ТК РФ: одна из частей ежегодного оплачиваемого отпуска — не менее 14 календарных дней.",
-            action_hint="Проверьте суммарное планирование частей отпуска и подтвердите наличие части 14+ дней.",
-        )
-
-    if ex.leave.leave_type == "unpaid":
-        comment = safe_text(ex.leave.comment).lower()
-        raw = safe_text(ex.raw_text).lower()
-        markers = ["по семейным обстоятельствам", "по состоянию здоровья", "по уходу", "по причине"]
-        if not comment and not any(m in raw for m in markers):
-            ctx.add(
-                level="info",
-                code="unpaid_no_reason",
-                field="leave.comment",
-                message="Для отпуска без сохранения обычно указывают причину. Добавьте формулировку, если это необходимо.",
-                rule_id="LAW-128-001",
-                legal_basis="Ст. 128 ТК РФ: отпуск без сохранения предоставляется по заявлению работника, как правило с указанием причины.",
-                action_hint="Добавьте краткое основание (например, семейные обстоятельства).",
-            )
-
-
-def quality_hints_rule(ctx: RuleContext) -> None:
-    notes = [n.lower() for n in (ctx.extract.quality.notes or []) if isinstance(n, str)]
-    if any(("возможно искажение" in n) or ("требует уточнения" in n) for n in notes):
-        ctx.add(
-            level="info",
-            code="needs_human_check",
-            field="quality.notes",
-            message="В распознавании есть неоднозначности. Рекомендуется ручная проверка полей.",
-            rule_id="OCR-QUALITY-001",
-            legal_basis="Техническое ограничение OCR/LLM: неоднозначный распознанный текст требует ручной валидации.",
-            action_hint="Сверьте извлечённые поля с исходным PDF вручную.",
-        )
+from typing import Any, Mapping
+
+from .. import ru_normalize
+from .registry import RuleDef
+
+SHORT_NOTICE_DAYS = 14
+# About two working weeks to sign the order and pay the leave (ст. 136: at least 3 days before the start).
+SHORT_NOTICE_WORKING_DAYS = 10
+ANNUAL_PART_MIN_DAYS = 14
+LOW_SIGNATURE_CONFIDENCE_THRESHOLD = 0.6
+
+
+def has_unpaid_reason_marker(raw_text: str | None) -> bool:
+    return ru_normalize.has_unpaid_reason_marker(raw_text)
+
+
+def has_human_check_note(notes: list | None) -> bool:
+    return any(ru_normalize.has_human_check_marker(n) for n in (notes or []) if isinstance(n, str))
+
+
+def _days_count_mismatch(f: Mapping[str, Any]) -> dict | None:
+    if f["expected_days"] != f["days_count"]:
+        return {"expected": f["expected_days"], "actual": f["days_count"]}
+    return None
+
+
+def _short_notice(f: Mapping[str, Any]) -> dict | None:
+    delta = f["days_before_start"]
+    if 0 <= delta < SHORT_NOTICE_DAYS:
+        return {"days_before_start": delta}
+    return None
+
+
+def _leave_days_mismatch(f: Mapping[str, Any]) -> dict | None:
+    if f["leave_days"] == f["days_count"]:
+        return None
+    details = {"expected": f["leave_days"], "actual": f["days_count"]}
+    excluded = f["expected_days"] - f["leave_days"]
+    if excluded:
+        details["holidays_excluded"] = excluded
+    return details
+
+
+def _short_notice_working_days(f: Mapping[str, Any]) -> dict | None:
+    delta = f["days_before_start"]
+    working = f["working_days_before_start"]
+    if delta >= 0 and (delta < SHORT_NOTICE_DAYS or working < SHORT_NOTICE_WORKING_DAYS):
+        return {"days_before_start": delta, "working_days_before_start": working}
+    return None
+
+
+def _annual_part_lt14(f: Mapping[str, Any]) -> dict | bool | None:
+    if f["leave_type"] != "annual_paid" or f["days_count"] >= ANNUAL_PART_MIN_DAYS:
+        return None
+    longest = f.get("history.annual_max_part")
+    if longest is None:
+        # No leave history: only a reminder is possible.
+        return True
+    if longest >= ANNUAL_PART_MIN_DAYS:
+        return None
+    return {"longest_other_part": longest}
+
+
+def _leave_overlap(f: Mapping[str, Any]) -> dict:
+    periods = f["history.overlaps"]
+    return {"periods": ", ".join(f"{p['start']}..{p['end']}" for p in periods), "overlaps": periods}
+
+
+def _unpaid_no_reason(f: Mapping[str, Any]) -> bool:
+    return f["leave_type"] == "unpaid" and "leave.comment" not in f and not has_unpaid_reason_marker(f.get("raw_text"))
+
+
+MISSING_EMPLOYER_NAME = RuleDef(
+    rule_id="DOC-REQ-001",
+    code="missing_employer_name",
+    level="error",
+    field="employer_name",
+    message="Не указана организация работодателя.",
+    legal_basis="ТК РФ (практика документооборота): реквизиты заявления должны однозначно идентифицировать работодателя.",
+    action_hint="Добавьте полное наименование организации в шапке заявления.",
+    when=lambda f: "employer_name" not in f,
+)
+MISSING_EMPLOYEE_NAME = RuleDef(
+    rule_id="DOC-REQ-002",
+    code="missing_employee_name",
+    level="error",
+    field="employee.full_name",
+    message="Не указано ФИО сотрудника.",
+    legal_basis="ТК РФ: заявление должно позволять идентифицировать работника.",
+    action_hint="Укажите полные ФИО сотрудника без сокращений.",
+    when=lambda f: "employee.full_name" not in f,
+)
+MISSING_MANAGER_NAME = RuleDef(
+    rule_id="DOC-REQ-003",
+    code="missing_manager_name",
+    level="warn",
+    field="manager.full_name",
+    message="Не указано ФИО руководителя/адресата заявления.",
+    legal_basis="Локальные практики кадрового делопроизводства: адресат заявления должен быть определён.",
+    action_hint="Добавьте ФИО адресата (руководителя/уполномоченного лица).",
+    when=lambda f: "manager.full_name" not in f,
+)
+MISSING_REQUEST_DATE = RuleDef(
+    rule_id="DOC-REQ-004",
+    code="missing_request_date",
+    level="error",
+    field="request_date",
+    message="Не указана дата заявления.",
+    legal_basis="ТК РФ и кадровая практика: дата заявления нужна для фиксации волеизъявления.",
+    action_hint="Проставьте дату составления заявления в формате YYYY-MM-DD.",
+    when=lambda f: "request_date" not in f,
+)
+MISSING_LEAVE_START_DATE = RuleDef(
+    rule_id="DOC-REQ-005",
+    code="missing_leave_start_date",
+    level="error",
+    field="leave.start_date",
+    message="Не указана дата начала отпуска.",
+    legal_basis="ТК РФ: период отпуска должен быть определён датами.",
+    action_hint="Укажите дату начала отпуска.",
+    when=lambda f: "leave.start_date" not in f,
+)
+MISSING_LEAVE_END_DATE = RuleDef(
+    rule_id="DOC-REQ-006",
+    code="missing_leave_end_date",
+    level="error",
+    field="leave.end_date",
+    message="Не указана дата окончания отпуска.",
+    legal_basis="ТК РФ: период отпуска должен быть определён датами.",
+    action_hint="Укажите дату окончания отпуска.",
+    when=lambda f: "leave.end_date" not in f,
+)
+MISSING_SIGNATURE = RuleDef(
+    rule_id="DOC-SIGN-001",
+    code="missing_signature",
+    level="error",
+    field="signature_present",
+    message="В заявлении не обнаружена подпись сотрудника.",
+    legal_basis="Кадровая практика: заявление работника подписывается заявителем.",
+    action_hint="Подпишите заявление и загрузите PDF повторно.",
+    requires=("signature_present",),
+    when=lambda f: f["signature_present"] is False,
+)
+LOW_SIGNATURE_CONFIDENCE = RuleDef(
+    rule_id="OCR-SIGN-002",
+    code="low_signature_confidence",
+    level="warn",
+    field="signature_confidence",
+    message="Подпись найдена, но уверенность низкая. Желательна ручная проверка.",
+    legal_basis="Техническая проверка OCR/vision: низкая уверенность требует ручного подтверждения.",
+    action_hint="Проверьте визуально наличие подписи в скане.",
+    requires=("signature_present", "signature_confidence"),
+    when=lambda f: f["signature_present"] is True and f["signature_confidence"] < LOW_SIGNATURE_CONFIDENCE_THRESHOLD,
+)
+INVALID_DATE_RANGE = RuleDef(
+    rule_id="DATE-001",
+    code="invalid_date_range",
+    level="error",
+    field="leave",
+    message="Дата начала отпуска позже даты окончания.",
+    legal_basis="ТК РФ: период отпуска не может иметь обратный диапазон дат.",
+    action_hint="Исправьте даты начала и окончания отпуска.",
+    requires=("start", "end"),
+    when=lambda f: f["start"] > f["end"],
+)
+REQUEST_AFTER_START = RuleDef(
+    rule_id="DATE-002",
+    code="request_after_start",
+    level="warn",
+    field="request_date",
+    message="Дата заявления позже даты начала отпуска.",
+    legal_basis="Кадровая практика: заявление обычно подаётся до начала отпуска.",
+    action_hint="Проверьте дату заявления и дату начала отпуска.",
+    requires=("request", "start"),
+    when=lambda f: f["request"] > f["start"],
+)
+SHORT_NOTICE_V1 = RuleDef(
+    rule_id="DATE-003",
+    code="short_notice",
+    level="info",
+    field="request_date",
+    message="До начала отпуска меньше 14 дней. По практике/графику отпусков может потребоваться согласование.",
+    legal_basis="Ст. 123 ТК РФ (график отпусков) и локальные процедуры согласования.",
+    action_hint="Проверьте необходимость дополнительного согласования с работодателем.",
+    requires=("days_before_start",),
+    when=_short_notice,
+)
+# v2: long holidays (January, May) leave HR too few working days even with 14+ calendar days of notice.
+SHORT_NOTICE = RuleDef(
+    rule_id="DATE-003",
+    version=2,
+    code="short_notice",
+    level="info",
+    field="request_date",
+    message="До начала отпуска меньше 14 календарных или 10 рабочих дней (рабочих дней: {working_days_before_start}). По практике/графику отпусков может потребоваться согласование.",
+    legal_basis="Ст. 123 ТК РФ (график отпусков), ст. 136 ТК РФ (оплата отпуска не позднее чем за 3 дня) и производственный календарь.",
+    action_hint=SHORT_NOTICE_V1.action_hint,
+    requires=("days_before_start", "working_days_before_start"),
+    when=_short_notice_working_days,
+)
+INVALID_DAYS_COUNT = RuleDef(
+    rule_id="COUNT-001",
+    code="invalid_days_count",
+    level="error",
+    field="leave.days_count",
+    message="Количество дней должно быть больше 0.",
+    legal_basis="Логическая проверка кадрового документа: длительность отпуска должна быть положительной.",
+    action_hint="Укажите корректное количество календарных дней.",
+    requires=("days_count",),
+    when=lambda f: f["days_count"] <= 0,
+)
+DAYS_COUNT_MISMATCH_V1 = RuleDef(
+    rule_id="COUNT-002",
+    code="days_count_mismatch",
+    level="error",
+    field="leave.days_count",
+    message="Количество дней не совпадает с диапазоном дат (инклюзивно).",
+    legal_basis="Период отпуска и число календарных дней должны быть согласованы.",
+    action_hint="Скорректируйте даты или количество дней, чтобы значения совпали.",
+    requires=("days_count", "expected_days"),
+    when=_days_count_mismatch,
+)
+# v2: ст. 120 ТК РФ, public holidays inside annual paid leave are not counted.
+DAYS_COUNT_MISMATCH = RuleDef(
+    rule_id="COUNT-002",
+    version=2,
+    code="days_count_mismatch",
+    level="error",
+    field="leave.days_count",
+    message="Количество дней не совпадает с периодом: ожидается {expected} (даты включительно; для ежегодного отпуска без нерабочих праздничных дней).",
+    legal_basis="Ст. 120 ТК РФ: нерабочие праздничные дни, приходящиеся на период ежегодного отпуска, в число календарных дней отпуска не включаются.",
+    action_hint=DAYS_COUNT_MISMATCH_V1.action_hint,
+    requires=("days_count", "leave_days"),
+    when=_leave_days_mismatch,
+)
+MISSING_DAYS_COUNT_V1 = RuleDef(
+    rule_id="COUNT-003",
+    code="missing_days_count",
+    level="warn",
+    field="leave.days_count",
+    message="Лучше указать количество календарных дней, чтобы не было разночтений.",
+    legal_basis="Кадровая практика: явное указание длительности снижает риск ошибок в приказе.",
+    action_hint="Добавьте количество календарных дней отпуска.",
+    requires=("expected_days",),
+    when=lambda f: {"expected": f["expected_days"]} if "days_count" not in f else None,
+)
+MISSING_DAYS_COUNT = RuleDef(
+    rule_id="COUNT-003",
+    version=2,
+    code="missing_days_count",
+    level="warn",
+    field="leave.days_count",
+    message=MISSING_DAYS_COUNT_V1.message,
+    legal_basis=MISSING_DAYS_COUNT_V1.legal_basis,
+    action_hint=MISSING_DAYS_COUNT_V1.action_hint,
+    requires=("leave_days",),
+    when=lambda f: {"expected": f["leave_days"]} if "days_count" not in f else None,
+)
+ANNUAL_PAID_PART_LT14_V1 = RuleDef(
+    rule_id="LAW-122-001",
+    code="annual_paid_part_lt14",
+    level="warn",
+    field="leave.days_count",
+    message="Если ежегодный отпуск делится на части, одна часть должна быть не менее 14 календарных дней. Убедитесь, что в другом периоде есть 14+ дней.",
+    legal_basis="Ст. 125 ТК РФ: одна из частей ежегодного оплачиваемого отпуска — не менее 14 календарных дней.",
+    action_hint="Проверьте суммарное планирование частей отпуска и подтвердите наличие части 14+ дней.",
+    requires=("days_count",),
+    when=lambda f: f["leave_type"] == "annual_paid" and f["days_count"] < ANNUAL_PART_MIN_DAYS,
+)
+# v2: with the leave history, silent when a 14+ day part of the same year is already accepted.
+ANNUAL_PAID_PART_LT14 = RuleDef(
+    rule_id="LAW-122-001",
+    version=2,
+    code="annual_paid_part_lt14",
+    level="warn",
+    field="leave.days_count",
+    message=ANNUAL_PAID_PART_LT14_V1.message,
+    legal_basis=ANNUAL_PAID_PART_LT14_V1.legal_basis,
+    action_hint=ANNUAL_PAID_PART_LT14_V1.action_hint,
+    requires=("days_count",),
+    when=_annual_part_lt14,
+)
+LEAVE_OVERLAP = RuleDef(
+    rule_id="HIST-001",
+    code="leave_overlap",
+    level="warn",
+    field="leave",
+    message="Период отпуска пересекается с ранее принятыми заявлениями сотрудника: {periods}.",
+    legal_basis="Ст. 114, 123 ТК РФ: отпуск предоставляется на определённый период; один период не оформляется дважды.",
+    action_hint="Сверьте даты с ранее оформленными отпусками сотрудника; при переносе оформите перенос или отзыв отпуска.",
+    requires=("history.overlaps",),
+    when=_leave_overlap,
+)
+UNPAID_NO_REASON = RuleDef(
+    rule_id="LAW-128-001",
+    code="unpaid_no_reason",
+    level="info",
+    field="leave.comment",
+    message="Для отпуска без сохранения обычно указывают причину. Добавьте формулировку, если это необходимо.",
+    legal_basis="Ст. 128 ТК РФ: отпуск без сохранения предоставляется по заявлению работника, как правило с указанием причины.",
+    action_hint="Добавьте краткое основание (например, семейные обстоятельства).",
+    when=_unpaid_no_reason,
+)
+NEEDS_HUMAN_CHECK = RuleDef(
+    rule_id="OCR-QUALITY-001",
+    code="needs_human_check",
+    level="info",
+    field="quality.notes",
+    message="В распознавании есть неоднозначности. Рекомендуется ручная проверка полей.",
+    legal_basis="Техническое ограничение OCR/LLM: неоднозначный распознанный текст требует ручной валидации.",
+    action_hint="Сверьте извлечённые поля с исходным PDF вручную.",
+    requires=("quality.notes",),
+    when=lambda f: has_human_check_note(f["quality.notes"]),
+)
+
+# Evaluation order is the order of issues in the response.
+RULES: tuple[RuleDef, ...] = (
+    MISSING_EMPLOYER_NAME,
+    MISSING_EMPLOYEE_NAME,
+    MISSING_MANAGER_NAME,
+    MISSING_REQUEST_DATE,
+    MISSING_LEAVE_START_DATE,
+    MISSING_LEAVE_END_DATE,
+    MISSING_SIGNATURE,
+    LOW_SIGNATURE_CONFIDENCE,
+    INVALID_DATE_RANGE,
+    REQUEST_AFTER_START,
+    SHORT_NOTICE,
+    INVALID_DAYS_COUNT,
+    DAYS_COUNT_MISMATCH,
+    MISSING_DAYS_COUNT,
+    ANNUAL_PAID_PART_LT14,
+    LEAVE_OVERLAP,
+    UNPAID_NO_REASON,
+    NEEDS_HUMAN_CHECK,
+)
+
+# Older versions, selectable with COMPLIANCE_RULE_PINS (e.g. "LAW-122-001@1").
+PREVIOUS_VERSIONS: tuple[RuleDef, ...] = (
+    SHORT_NOTICE_V1,
+    DAYS_COUNT_MISMATCH_V1,
+    MISSING_DAYS_COUNT_V1,
+    ANNUAL_PAID_PART_LT14_V1,
+)
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import logging
+import random
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Union, overload
+
+logger = logging.getLogger(__name__)
+
+OnDebug = Optional[Callable[[str], None]]
+
+# Kinds whose typed fields feed Trace.timings_ms directly.
+ELAPSED = "elapsed"
+TTFT = "ttft"
+
+
+class DebugEvent:
+    """One debug step: `step` ("vision", "structured.parse"...), `kind` and typed `fields`.
+
+    The text is `template.format_map(fields)` (plus `{step}`; None renders as "-"),
+    built on first `render()` and cached; a template without fields is used verbatim.
+    """
+
+    __slots__ = ("step", "kind", "template", "fields", "level", "_text")
+
+    def __init__(self, step: str, kind: str, template: str, fields: Optional[Dict[str, Any]] = None, level: int = logging.INFO):
+        self.step = step
+        self.kind = kind
+        self.template = template
+        self.fields = fields or {}
+        self.level = level
+        self._text: Optional[str] = None
+
+    def render(self) -> str:
+        if self._text is None:
+            if not self.fields:
+                self._text = self.template
+            else:
+                values = {k: "-" if v is None else v for k, v in self.fields.items()}
+                self._text = self.template.format_map({"step": self.step, **values})
+        return self._text
+
+    __str__ = render
+
+    def __repr__(self) -> str:
+        return f"DebugEvent({self.step!r}, {self.kind!r}, {self.fields!r})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "step": self.step,
+            "kind": self.kind,
+            "level": logging.getLevelName(self.level).lower(),
+            "fields": dict(self.fields),
+            "message": self.render(),
+        }
+
+
+class DebugLog(Sequence[str]):
+    """Debug events of one request.
+
+    Indexing and iteration give the legacy `debug_steps` strings, rendered on demand;
+    a request whose steps are never shown (and not logged) never formats them.
+    `on_debug` (streaming) receives every step as text, since there is a reader.
+
+    Logging: a request is sampled with `sample_percent`; sampled requests log each
+    event at its own level, the others only warnings and errors.
+    """
+
+    def __init__(
+        self,
+        on_debug: OnDebug = None,
+        *,
+        log: Optional[logging.Logger] = None,
+        sample_percent: int = 100,
+        sink: Optional[List[str]] = None,
+    ):
+        self.events: List[DebugEvent] = []
+        self._on_debug = on_debug
+        self._log = log or logger
+        self._sampled = sample_percent >= 100 or random.random() * 100 < sample_percent
+        self._sink = sink
+
+    def add(self, step: str, kind: str, template: str, *, level: int = logging.INFO, **fields: Any) -> DebugEvent:
+        event = DebugEvent(step, kind, template, fields, level)
+        self.events.append(event)
+        if (self._sampled or level >= logging.WARNING) and self._log.isEnabledFor(level):
+            # %s: the logging module renders the event only if a handler emits the record.
+            self._log.log(level, "[extract] %s", event)
+        if self._sink is not None:
+            self._sink.append(event.render())
+        if self._on_debug is not None:
+            self._on_debug(event.render())
+        return event
+
+    def append(self, message: str) -> None:
+        """Pre-rendered text step (compatibility with list-style callers)."""
+        self.add("", "text", message)
+
+    def extend(self, items: Iterable[Union[str, DebugEvent]]) -> None:
+        for item in items.events if isinstance(items, DebugLog) else items:
+            if isinstance(item, DebugEvent):
+                self.events.append(item)
+            else:
+                self.append(item)
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    @overload
+    def __getitem__(self, index: int) -> str: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[str]: ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [event.render() for event in self.events[index]]
+        return self.events[index].render()
+
+    def __iter__(self) -> Iterator[str]:
+        for event in self.events:
+            yield event.render()
+
+    def render(self) -> List[str]:
+        """The compatibility view: `debug_steps` as a list of strings."""
+        return [event.render() for event in self.events]
+
+    def timings(self) -> Dict[str, int]:
+        """`<step>` elapsed and `<step>.ttft` first-token times straight from the typed fields."""
+        timings: Dict[str, int] = {}
+        for event in self.events:
+            if event.kind == ELAPSED:
+                timings[event.step] = int(event.fields["elapsed_ms"])
+            elif event.kind == TTFT and event.fields.get("ttft_ms") is not None:
+                timings[f"{event.step}.ttft"] = int(event.fields["ttft_ms"])
+        return timings
+
+
+def as_debug_log(debug_steps: Union[DebugLog, List[str]], on_debug: OnDebug = None) -> DebugLog:
+    """Helpers take a DebugLog or a plain list (tests, older callers); a list receives the rendered strings."""
+    if isinstance(debug_steps, DebugLog):
+        return debug_steps
+    return DebugLog(on_debug, sink=debug_steps)
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import math
+import threading
+from typing import Any, Dict, List, Mapping, Optional
+
+from .schemas import LeaveRequestExtract
+from .settings import Settings
+from .validation import validate_extract
+
+# Anthropic bills an image at about width * height / 750 input tokens.
+PIXELS_PER_IMAGE_TOKEN = 750
+SIGNATURE_REASON = "signature"
+# Stream `delta` step of the second pass's transcription; `on_reset` with it starts that pass.
+ESCALATED_VISION_STEP = "vision.escalated"
+
+
+def estimate_image_tokens(render_info: Mapping[str, Any], target_long_edge: Optional[int] = None) -> int:
+    """Image input tokens of a render; with `target_long_edge` the same pages as if rendered at that size."""
+    scale = 1.0
+    if target_long_edge and render_info.get("target_long_edge"):
+        scale = target_long_edge / render_info["target_long_edge"]
+    return sum(
+        math.ceil(p["w_px"] * scale * p["h_px"] * scale / PIXELS_PER_IMAGE_TOKEN) for p in render_info.get("page_stats", ())
+    )
+
+
+def first_pass_settings(cfg: Settings) -> Settings:
+    """Render config of the cheap pass: smaller long edge, grayscale."""
+    return cfg.model_copy(
+        update={"PDF_TARGET_LONG_EDGE": min(cfg.PDF_FIRST_PASS_LONG_EDGE, cfg.PDF_TARGET_LONG_EDGE), "PDF_COLOR_MODE": "gray"}
+    )
+
+
+def escalated_settings(cfg: Settings, reasons: List[str]) -> Settings:
+    """Render config of the second pass: the full PDF_TARGET_LONG_EDGE, in colour when the stamp/signature was unclear."""
+    if SIGNATURE_REASON in reasons:
+        return cfg.model_copy(update={"PDF_COLOR_MODE": "rgb"})
+    return cfg
+
+
+def escalation_reasons(extract: LeaveRequestExtract, min_confidence: float) -> List[str]:
+    """Why the first pass is not good enough; empty = keep it."""
+    reasons: List[str] = []
+    confidence = extract.quality.overall_confidence
+    if confidence is None or confidence < min_confidence:
+        reasons.append("low_confidence")
+    reasons.extend(issue.code for issue in validate_extract(extract) if issue.level == "error")
+    # Blue ink and stamps are faint in a small grayscale image; a confidently unsigned form is not re-rendered.
+    signature = extract.signature_present
+    if signature is None or (signature and (extract.signature_confidence or 0.0) < min_confidence):
+        reasons.append(SIGNATURE_REASON)
+    return reasons
+
+
+class EscalationStats:
+    """Per-worker counters of two-pass rendering: escalation rate and image tokens against one full-size pass."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.documents = 0
+        self.escalated = 0
+        self.reasons: Dict[str, int] = {}
+        self.first_pass_tokens = 0
+        self.second_pass_tokens = 0
+        self.single_pass_tokens = 0
+
+    def record(self, *, first_pass_tokens: int, single_pass_tokens: int, second_pass_tokens: int = 0, reasons: List[str] = ()) -> None:
+        with self._lock:
+            self.documents += 1
+            self.first_pass_tokens += first_pass_tokens
+            self.single_pass_tokens += single_pass_tokens
+            if reasons:
+                self.escalated += 1
+                self.second_pass_tokens += second_pass_tokens
+                for reason in reasons:
+                    self.reasons[reason] = self.reasons.get(reason, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            spent = self.first_pass_tokens + self.second_pass_tokens
+            return {
+                "documents": self.documents,
+                "escalated": self.escalated,
+                "escalation_rate": round(self.escalated / self.documents, 4) if self.documents else 0.0,
+                "reasons": dict(self.reasons),
+                "image_tokens": {
+                    "first_pass": self.first_pass_tokens,
+                    "second_pass": self.second_pass_tokens,
+                    "single_pass_estimate": self.single_pass_tokens,
+                    "saved": self.single_pass_tokens - spent,
+                },
+            }
+
+
+ESCALATION = EscalationStats()
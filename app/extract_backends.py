@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional, Protocol, Tuple
+
+import fitz  # PyMuPDF
+import numpy as np
+
+from .debug_events import DebugLog
+from .rule_extract import RuleExtraction, application_text, parse_application_text
+from .schemas import LeaveRequestExtract
+from .settings import Settings
+from .signature_detect import detect_signature
+
+logger = logging.getLogger(__name__)
+
+RECORDING_VERSION = 1
+# The signature detector is tuned for this page size (the escalation first pass).
+_RULES_SIGNATURE_LONG_EDGE = 1024
+
+
+class ExtractionBackend(Protocol):
+    """One extraction pass in three stages; the orchestrator (escalation, signature check, notes) is shared.
+
+    A backend is created per request with that request's settings snapshot and debug log.
+    """
+
+    name: str
+    # Whether PDF_ESCALATION may re-run the pass with a larger render.
+    escalates: bool
+
+    def render(self, pdf_bytes: bytes, render_cfg: Settings) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """PDF -> (image content blocks, render info: pages, sizes, signature detector score)."""
+
+    def draft(self, image_blocks: List[Dict[str, Any]]) -> str:
+        """Images -> free-text draft (transcription and candidate fields)."""
+
+    def structure(self, draft_text: str) -> LeaveRequestExtract:
+        """Draft -> validated extract."""
+
+
+MOCK_EXTRACT: Dict[str, Any] = {
+    "schema_version": "1.0",
+    "employer_name": None,
+    "employee": {"full_name": "Иванов Иван Иванович", "position": "Инженер", "department": "ИТ"},
+    "manager": {"full_name": None, "position": None},
+    "request_date": "2026-02-21",
+    "leave": {
+        "leave_type": "annual_paid",
+        "start_date": "2026-03-01",
+        "end_date": "2026-03-14",
+        "days_count": 14,
+        "comment": None,
+    },
+    "signature_present": True,
+    "signature_confidence": 0.8,
+    "raw_text": "Прошу предоставить ежегодный оплачиваемый отпуск",
+    "quality": {"overall_confidence": 0.8, "missing_fields": [], "notes": ["MOCK_MODE=1"]},
+}
+
+
+class MockBackend:
+    """Fixed extract without rendering or any external call (MOCK_MODE=1, demos and UI work)."""
+
+    name = "mock"
+    escalates = False
+
+    def __init__(self, cfg: Settings, debug_steps: DebugLog, **_: Any):
+        debug_steps.add("config", "mock", "MOCK_MODE=1, внешний AI не вызывается")
+
+    def render(self, pdf_bytes: bytes, render_cfg: Settings) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        return [], {}
+
+    def draft(self, image_blocks: List[Dict[str, Any]]) -> str:
+        return ""
+
+    def structure(self, draft_text: str) -> LeaveRequestExtract:
+        return LeaveRequestExtract.model_validate(MOCK_EXTRACT)
+
+
+def recording_path(directory: str, pdf_bytes: bytes) -> str:
+    return os.path.join(directory, hashlib.sha256(pdf_bytes).hexdigest() + ".json")
+
+
+def record_extraction(
+    directory: str,
+    pdf_bytes: bytes,
+    backend: str,
+    render_info: Dict[str, Any],
+    draft_text: str,
+    extract: Dict[str, Any],
+    debug_steps: Optional[DebugLog] = None,
+) -> Optional[str]:
+    """Save the final pass of a document (EXTRACTION_RECORD_DIR) for the replay backend; best effort."""
+    path = recording_path(directory, pdf_bytes)
+    recording = {
+        "version": RECORDING_VERSION,
+        "backend": backend,
+        "render_info": render_info,
+        "draft": draft_text,
+        "extract": extract,
+    }
+    try:
+        os.makedirs(directory, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(recording, f, ensure_ascii=False, indent=1, default=str)
+        # Atomic: a concurrent replay never reads half a file.
+        os.replace(tmp, path)
+    except OSError:
+        logger.exception("Extraction recording failed: %s", path)
+        return None
+    if debug_steps is not None:
+        debug_steps.add("record", "saved", "Шаг {step}: запись для replay сохранена ({name})", name=os.path.basename(path))
+    return path
+
+
+class ReplayBackend:
+    """Answers recorded by EXTRACTION_RECORD_DIR, looked up by the PDF's sha256: no render, no API calls.
+
+    Reproduces a production extraction offline (debugging, regression runs of the checks).
+    """
+
+    name = "replay"
+    escalates = False
+
+    def __init__(self, cfg: Settings, debug_steps: DebugLog, **_: Any):
+        self.directory = cfg.EXTRACTION_REPLAY_DIR
+        self.debug_steps = debug_steps
+        self._recording: Dict[str, Any] = {}
+
+    def render(self, pdf_bytes: bytes, render_cfg: Settings) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        from .ai_extract import UpstreamAIError
+
+        path = recording_path(self.directory, pdf_bytes)
+        try:
+            with open(path, encoding="utf-8") as f:
+                self._recording = json.load(f)
+        except (OSError, ValueError) as e:
+            self.debug_steps.add("replay", "missing", "Шаг {step}: нет записи {name}", level=logging.WARNING, name=os.path.basename(path))
+            raise UpstreamAIError(
+                step="replay",
+                status_code=404,
+                message="Для этого документа нет записанного ответа (EXTRACTION_REPLAY_DIR).",
+                debug_steps=self.debug_steps,
+            ) from e
+        self.debug_steps.add(
+            "replay",
+            "loaded",
+            "Шаг {step}: запись {name} (backend={backend})",
+            name=os.path.basename(path),
+            backend=self._recording.get("backend"),
+        )
+        return [], dict(self._recording.get("render_info") or {})
+
+    def draft(self, image_blocks: List[Dict[str, Any]]) -> str:
+        return self._recording.get("draft") or ""
+
+    def structure(self, draft_text: str) -> LeaveRequestExtract:
+        return LeaveRequestExtract.model_validate(self._recording["extract"])
+
+
+class RulesBackend:
+    """Zero-LLM: compiled patterns and a Russian date grammar over the PDF text layer (template applications).
+
+    The page is rendered only for the local signature detector; scans without a text layer are an error.
+    """
+
+    name = "rules"
+    escalates = False
+
+    def __init__(self, cfg: Settings, debug_steps: DebugLog, **_: Any):
+        self.debug_steps = debug_steps
+        self.found: Optional[RuleExtraction] = None
+        self._text = ""
+
+    def read(self, pdf_bytes: bytes) -> Optional[RuleExtraction]:
+        """Parse the text layer once; None for a scan or a PDF that does not open."""
+        try:
+            with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+                page, self._text = application_text(doc)
+        except Exception:
+            page = None
+        if page is None:
+            self.debug_steps.add("rules", "no_text", "Шаг {step}: нет текстового слоя с заявлением", level=logging.DEBUG)
+            return None
+        self.found = parse_application_text(self._text)
+        self.found.page = page
+        self.debug_steps.add(
+            "rules",
+            "parsed",
+            "Шаг {step}: page={page}, fields={fields}, missing={missing}, ms={ms}",
+            page=page,
+            fields=len(self.found.confidence),
+            missing=self.found.missing,
+            ms=self.found.ms,
+        )
+        return self.found
+
+    def render(self, pdf_bytes: bytes, render_cfg: Settings) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        if self.found is None and self.read(pdf_bytes) is None:
+            from .ai_extract import UpstreamAIError
+
+            raise UpstreamAIError(
+                step="rules",
+                status_code=422,
+                message="В PDF нет текстового слоя с заявлением: нужен AI-backend (EXTRACTION_BACKEND=anthropic).",
+                debug_steps=self.debug_steps,
+            )
+        info: Dict[str, Any] = {"text_layer_page": self.found.page, "text_chars": self.found.text_chars}
+        if render_cfg.SIGNATURE_DETECTOR != "off":
+            with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+                page = doc.load_page(self.found.page)
+                zoom = _RULES_SIGNATURE_LONG_EDGE / (max(page.rect.width, page.rect.height) or 1.0)
+                pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+                gray = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+                info["signature"] = {**detect_signature(gray).as_dict(), "page": self.found.page}
+        return [], info
+
+    def draft(self, image_blocks: List[Dict[str, Any]]) -> str:
+        return self._text
+
+    def structure(self, draft_text: str) -> LeaveRequestExtract:
+        return self.found.extract.model_copy(deep=True)
+
+
+def _anthropic(cfg: Settings, debug_steps: DebugLog, **options: Any) -> ExtractionBackend:
+    # Imported on use: ai_extract itself builds its backends through this module.
+    from .ai_extract import AnthropicBackend
+
+    return AnthropicBackend(cfg, debug_steps, **options)
+
+
+BACKENDS: Dict[str, Callable[..., ExtractionBackend]] = {
+    "anthropic": _anthropic,
+    "mock": MockBackend,
+    "replay": ReplayBackend,
+    "rules": RulesBackend,
+}
+
+
+def create_backend(
+    name: str,
+    cfg: Settings,
+    debug_steps: DebugLog,
+    *,
+    model: Optional[str] = None,
+    on_delta: Optional[Callable[[str, str], None]] = None,
+    on_field: Optional[Callable[[str, Any], None]] = None,
+    on_reset: Optional[Callable[[str], None]] = None,
+) -> ExtractionBackend:
+    factory = BACKENDS.get(name)
+    if factory is None:
+        raise ValueError(f"Неизвестный backend извлечения: {name!r} (доступны: {', '.join(BACKENDS)})")
+    return factory(cfg, debug_steps, model=model, on_delta=on_delta, on_field=on_field, on_reset=on_reset)
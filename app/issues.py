@@ -94,19 +94,24 @@ def make_upstream_issue(*, code: str, message: str, source: Optional[str] = None
 
 
 
+def is_severe_error(severity: str, domain: str, category: str) -> bool:
+    return severity == 'error' and domain in {'extraction', 'compliance', 'system', 'upstream'} and category != 'quality'
+
+
+
 def build_decision(issues: list[Issue]) -> Decision:
-    severe_error = any(
-        i.severity == 'error'
-        and i.domain in {'extraction', 'compliance', 'system', 'upstream'}
-        and i.category != 'quality'
-        for i in issues
-    )
+    severe_error = any(is_severe_error(i.severity, i.domain, i.category) for i in issues)
     warn_exists = any(i.severity == 'warn' for i in issues)
+    return decision_from_flags(severe_error, warn_exists, bool(issues))
+
+
+
+def decision_from_flags(severe_error: bool, warn_exists: bool, has_issues: bool) -> Decision:
     if severe_error:
         return Decision(status='error', needs_rewrite=True, summary='Найдены критичные проблемы: заявление нужно исправить.')
     if warn_exists:
         return Decision(status='warn', needs_rewrite=False, summary='Есть замечания. Проверьте поля перед отправкой в кадровую службу.')
-    if issues:
+    if has_issues:
         return Decision(status='ok', needs_rewrite=False, summary='Извлечение завершено. Есть информационные подсказки.')
     return Decision(status='ok', needs_rewrite=False, summary='Ошибок не найдено.')
 
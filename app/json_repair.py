@@ -0,0 +1,308 @@
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+# Structural characters outside strings, and the two characters that matter inside them.
+_STRUCT_RE = re.compile(r'[{}\[\]",:]')
+_STRING_RE = re.compile(r'["\\]')
+# An object opens with a key or is empty; other "{" (prose, templates) are skipped unscanned.
+_OBJECT_START_RE = re.compile(r'\{\s*(?:"|\}|$)')
+_CLOSERS = {"{": "}", "[": "]"}
+_DECODER = json.JSONDecoder()
+# Extract payloads nest a few levels; anything much deeper is not an answer worth repairing.
+_MAX_DEPTH = 64
+# A candidate that is neither valid nor repairable ("{см. {...}}", a stray "{" in prose) is
+# retried from at most this many later "{" before skipping past it, so work stays O(n).
+_MAX_INNER_RETRIES = 8
+
+
+@dataclass
+class JsonRecovery:
+    value: Dict[str, Any]
+    start: int
+    end: int
+    repaired: bool = False
+    appended: str = ""
+    dropped_chars: int = 0
+
+
+class _Frame:
+    __slots__ = ("kind", "phase", "scalar")
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        # object: key -> colon -> value -> comma; array: value -> comma
+        self.phase = "key" if kind == "{" else "value"
+        self.scalar = False
+
+
+def _closers(stack: List[_Frame], depth: int) -> str:
+    return "".join(_CLOSERS[f.kind] for f in reversed(stack[:depth]))
+
+
+@dataclass
+class _Scan:
+    """Result of scanning one object.
+
+    end: index after the matching "}", or -1 if the text ended first.
+    string_tail: when cut inside a value string, (chars to drop, closers) that complete it in place.
+    last_cut: (position, closers) such that text[start:position] + closers is complete JSON.
+    """
+
+    end: int = -1
+    string_tail: Optional[Tuple[int, str]] = None
+    last_cut: Optional[Tuple[int, str]] = None
+
+
+def _resolve(stack: List[_Frame], cut: Optional[Tuple[int, int]]) -> Optional[Tuple[int, str]]:
+    return None if cut is None else (cut[0], _closers(stack, cut[1]))
+
+
+def _scan_object(text: str, start: int) -> _Scan:
+    """Scan one top-level object starting at text[start] == "{"."""
+    stack: List[_Frame] = []
+    # (position, depth); frames below a cut's depth cannot change without popping
+    # past it, which records a new cut, so closers are only built once at the end.
+    last_cut: Optional[Tuple[int, int]] = None
+    pos = start
+    n = len(text)
+
+    while pos < n:
+        m = _STRUCT_RE.search(text, pos)
+        if m is None:
+            break
+        i = m.start()
+        ch = text[i]
+        if stack and text[pos:i].strip():
+            stack[-1].scalar = True
+
+        if ch in "{[":
+            if stack:
+                stack[-1].scalar = False
+            stack.append(_Frame(ch))
+            if len(stack) > _MAX_DEPTH:
+                return _Scan()
+            last_cut = (i + 1, len(stack))
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            if not stack:
+                return _Scan(end=i + 1)
+            stack[-1].phase = "comma"
+            stack[-1].scalar = False
+            last_cut = (i + 1, len(stack))
+        elif ch == ":":
+            if stack:
+                stack[-1].phase = "value"
+        elif ch == ",":
+            if stack:
+                top = stack[-1]
+                if top.scalar:
+                    last_cut = (i, len(stack))
+                top.scalar = False
+                top.phase = "key" if top.kind == "{" else "value"
+        else:  # opening quote
+            is_key = bool(stack) and stack[-1].kind == "{" and stack[-1].phase == "key"
+            j = i + 1
+            while True:
+                sm = _STRING_RE.search(text, j)
+                if sm is None:
+                    # Truncated inside a string: a value string can be closed where it stops.
+                    if is_key or not stack:
+                        return _Scan(last_cut=_resolve(stack, last_cut))
+                    body = text[i + 1 :]
+                    trailing = len(body) - len(body.rstrip("\\"))
+                    drop = trailing % 2
+                    # A partial \uXXXX escape cannot be closed either.
+                    u = body.rfind("\\u")
+                    if u != -1 and len(body) - u < 6 and (u == 0 or body[u - 1] != "\\"):
+                        drop = len(body) - u
+                    return _Scan(string_tail=(drop, '"' + _closers(stack, len(stack))), last_cut=_resolve(stack, last_cut))
+                if text[sm.start()] == "\\":
+                    j = sm.start() + 2
+                    continue
+                j = sm.start() + 1
+                break
+            if stack:
+                top = stack[-1]
+                if is_key:
+                    top.phase = "colon"
+                else:
+                    top.phase = "comma"
+                    top.scalar = False
+                    last_cut = (j, len(stack))
+            pos = j
+            continue
+        pos = i + 1
+
+    # A trailing number may be cut short ("1" of "14"); only a complete literal is kept.
+    if stack and stack[-1].phase == "value" and text[pos:].strip() in ("true", "false", "null"):
+        last_cut = (len(text.rstrip()), len(stack))
+    return _Scan(last_cut=_resolve(stack, last_cut))
+
+
+def _loads_dict(chunk: str) -> Optional[Dict[str, Any]]:
+    try:
+        obj = json.loads(chunk)
+    except (json.JSONDecodeError, RecursionError):
+        return None
+    return obj if isinstance(obj, dict) else None
+
+
+def _repair_truncated(text: str, pos: int, scan: _Scan) -> Optional[JsonRecovery]:
+    if scan.string_tail is not None:
+        drop, appended = scan.string_tail
+        obj = _loads_dict(text[pos : len(text) - drop] + appended)
+        if obj is not None:
+            return JsonRecovery(value=obj, start=pos, end=len(text), repaired=True, appended=appended, dropped_chars=drop)
+    if scan.last_cut is not None:
+        cut, closers = scan.last_cut
+        obj = _loads_dict(text[pos:cut] + closers)
+        # Nothing survived the cut ("{" + "}"): that is not a recovered answer.
+        if obj:
+            return JsonRecovery(value=obj, start=pos, end=len(text), repaired=True, appended=closers, dropped_chars=len(text) - cut)
+    return None
+
+
+def recover_json_object(text: str) -> JsonRecovery:
+    """Find the first top-level JSON object in model output, repairing truncation.
+
+    Single forward pass: markdown fences and prose around the object are skipped,
+    each candidate object is decoded once, and an object cut off by max_tokens is
+    closed at the last complete value (or in place, for a truncated string value).
+    """
+    text = text or ""
+    if not text.strip():
+        raise ValueError("Пустой ответ модели")
+
+    pos = first = text.find("{")
+    retries = 0
+    outer_end = -1
+    while pos != -1:
+        if not _OBJECT_START_RE.match(text, pos):
+            pos = text.find("{", pos + 1)
+            continue
+        if pos == first:
+            # Fast path for the usual reply: the first object is well-formed and decoded in C.
+            # Only tried once: JSONDecodeError counts lines from the start of `text`.
+            try:
+                obj, end = _DECODER.raw_decode(text, pos)
+                return JsonRecovery(value=obj, start=pos, end=end)
+            except (json.JSONDecodeError, RecursionError):
+                pass
+        scan = _scan_object(text, pos)
+        if scan.end != -1:
+            obj = _loads_dict(text[pos : scan.end])
+            if obj is not None:
+                return JsonRecovery(value=obj, start=pos, end=scan.end)
+            if pos >= outer_end:
+                outer_end, retries = scan.end, 0
+        else:
+            recovered = _repair_truncated(text, pos, scan)
+            if recovered is not None:
+                return recovered
+            # A stray "{" in prose swallows the real object: retry from later starts.
+            outer_end = len(text)
+        retries += 1
+        # Not JSON: try a few inner starts, then skip past the candidate entirely.
+        nxt = text.find("{", pos + 1, outer_end) if retries <= _MAX_INNER_RETRIES else -1
+        pos = nxt if nxt != -1 else text.find("{", outer_end)
+
+    raise ValueError("В ответе модели не найден валидный JSON объект")
+
+
+class _FieldFrame:
+    __slots__ = ("kind", "key", "expect_key")
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.key: Optional[str] = None
+        self.expect_key = kind == "{"
+
+
+class JsonFieldStream:
+    """Incremental reader for a streamed JSON object.
+
+    `feed(chunk)` returns the (dotted path, value) pairs that became final in that chunk:
+    a string at its closing quote, a number/literal at its terminator, an array (as a
+    whole) at its closing bracket. Each input character is looked at once.
+    """
+
+    def __init__(self) -> None:
+        self._text = ""
+        self._pos = 0
+        self._stack: List[_FieldFrame] = []
+        self._string_start = -1
+        self._escape = False
+        self._scalar_start = -1
+        self._array_start = -1
+        self._array_depth = 0
+
+    def _path(self) -> str:
+        return ".".join(f.key for f in self._stack if f.kind == "{" and f.key is not None)
+
+    def _value_done(self, start: int, end: int, out: List[Tuple[str, Any]]) -> None:
+        if self._array_start != -1 or not self._stack:
+            return
+        try:
+            out.append((self._path(), json.loads(self._text[start:end])))
+        except json.JSONDecodeError:
+            pass
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        out: List[Tuple[str, Any]] = []
+        if not chunk:
+            return out
+        self._text += chunk
+        text = self._text
+        stack = self._stack
+        i = self._pos
+        n = len(text)
+        while i < n:
+            ch = text[i]
+            if self._string_start != -1:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    start, self._string_start = self._string_start, -1
+                    top = stack[-1] if stack else None
+                    if top is not None and top.kind == "{" and top.expect_key:
+                        try:
+                            top.key = json.loads(text[start : i + 1])
+                        except json.JSONDecodeError:
+                            top.key = text[start + 1 : i]
+                        top.expect_key = False
+                    else:
+                        self._value_done(start, i + 1, out)
+                i += 1
+                continue
+
+            if self._scalar_start != -1 and (ch in ",}]" or ch.isspace()):
+                self._value_done(self._scalar_start, i, out)
+                self._scalar_start = -1
+
+            if ch == '"':
+                self._string_start = i
+            elif ch in "{[":
+                if ch == "[" and self._array_start == -1 and stack:
+                    self._array_start, self._array_depth = i, len(stack) + 1
+                stack.append(_FieldFrame(ch))
+            elif ch in "}]":
+                if stack:
+                    stack.pop()
+                if ch == "]" and self._array_start != -1 and len(stack) == self._array_depth - 1:
+                    start, self._array_start = self._array_start, -1
+                    self._value_done(start, i + 1, out)
+            elif ch == ",":
+                if stack and stack[-1].kind == "{":
+                    stack[-1].expect_key = True
+            elif ch != ":" and not ch.isspace() and self._scalar_start == -1 and stack:
+                self._scalar_start = i
+            i += 1
+        self._pos = i
+        return out
@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import logging
+import threading
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .compliance_rules.common import parse_iso
+from .result_store import ResultStore, employee_key, get_result_store
+from .schemas import LeaveRequestExtract
+
+logger = logging.getLogger(__name__)
+
+
+class Period(NamedTuple):
+    start: int  # date ordinals, inclusive
+    end: int
+    sha256: str
+    leave_type: str
+    days: int
+
+
+@dataclass
+class _EmployeeLeaves:
+    """Periods sorted by start, with the running maximum of ends for the overlap search.
+
+    Flat lists rather than an interval tree: an update shifts the list and recomputes
+    `max_end` from the changed position, O(n) in this employee's periods (a handful a
+    year), while a query stays a bisect plus the periods it returns.
+    """
+
+    starts: List[int] = field(default_factory=list)
+    periods: List[Period] = field(default_factory=list)
+    max_end: List[int] = field(default_factory=list)
+    # year -> {sha256: days} of annual paid parts starting in that year.
+    annual: Dict[int, Dict[str, int]] = field(default_factory=dict)
+
+    def add(self, period: Period) -> None:
+        i = bisect_right(self.starts, period.start)
+        self.starts.insert(i, period.start)
+        self.periods.insert(i, period)
+        self._refresh_max_end(i)
+        if period.leave_type == "annual_paid":
+            self.annual.setdefault(date.fromordinal(period.start).year, {})[period.sha256] = period.days
+
+    def remove(self, period: Period) -> None:
+        i = bisect_left(self.starts, period.start)
+        while self.periods[i] != period:
+            i += 1
+        del self.starts[i], self.periods[i]
+        self._refresh_max_end(i)
+        if period.leave_type == "annual_paid":
+            year = date.fromordinal(period.start).year
+            parts = self.annual.get(year, {})
+            parts.pop(period.sha256, None)
+            if not parts:
+                self.annual.pop(year, None)
+
+    def _refresh_max_end(self, i: int) -> None:
+        del self.max_end[i:]
+        running = self.max_end[-1] if self.max_end else 0
+        for period in self.periods[i:]:
+            running = max(running, period.end)
+            self.max_end.append(running)
+
+    def overlaps(self, start: int, end: int, exclude: Optional[str]) -> List[Period]:
+        # Candidates start no later than `end`; walk back while some earlier period still reaches `start`.
+        out: List[Period] = []
+        j = bisect_right(self.starts, end) - 1
+        while j >= 0 and self.max_end[j] >= start:
+            period = self.periods[j]
+            if period.end >= start and period.sha256 != exclude:
+                out.append(period)
+            j -= 1
+        out.reverse()
+        return out
+
+    def longest_annual_part(self, year: int, exclude: Optional[str]) -> int:
+        return max((days for sha, days in self.annual.get(year, {}).items() if sha != exclude), default=0)
+
+
+def _period_of(sha256: str, leave_type: str, start: Optional[str], end: Optional[str], days: Optional[int]) -> Optional[Period]:
+    sd, ed = parse_iso(start), parse_iso(end)
+    if sd is None or ed is None or ed < sd:
+        return None
+    return Period(sd.toordinal(), ed.toordinal(), sha256, leave_type, days if days and days > 0 else (ed - sd).days + 1)
+
+
+class LeaveHistory:
+    """Accepted leave periods per employee (by normalized ФИО) for cross-request compliance checks.
+
+    Per employee the periods are a sorted list with a running max of ends, so an
+    overlap query is a bisect plus the overlapping periods themselves (adding or
+    removing a period is linear in that employee's periods); the longest
+    annual paid part per calendar year is a dict lookup. Documents are keyed by
+    sha256: saving a document again replaces its period. `refresh` applies the store
+    rows written since the last one it saw, including those of other processes.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._employees: Dict[str, _EmployeeLeaves] = {}
+        self._documents: Dict[str, Tuple[str, Period]] = {}
+        self._refresh_lock = threading.Lock()
+        self._last_id = 0
+
+    def add(
+        self,
+        sha256: str,
+        employee: Optional[str],
+        leave_type: str,
+        start: Optional[str],
+        end: Optional[str],
+        days: Optional[int] = None,
+    ) -> bool:
+        key = employee_key(employee)
+        period = _period_of(sha256, leave_type, start, end, days)
+        with self._lock:
+            self._remove_locked(sha256)
+            if key is None or period is None:
+                return False
+            self._employees.setdefault(key, _EmployeeLeaves()).add(period)
+            self._documents[sha256] = (key, period)
+        return True
+
+    def remove(self, sha256: str) -> None:
+        with self._lock:
+            self._remove_locked(sha256)
+
+    def _remove_locked(self, sha256: str) -> None:
+        old = self._documents.pop(sha256, None)
+        if old is None:
+            return
+        key, period = old
+        leaves = self._employees[key]
+        leaves.remove(period)
+        if not leaves.periods:
+            del self._employees[key]
+
+    def overlaps(self, employee: Optional[str], start: date, end: date, *, exclude: Optional[str] = None) -> List[Period]:
+        key = employee_key(employee)
+        with self._lock:
+            leaves = self._employees.get(key) if key else None
+            return leaves.overlaps(start.toordinal(), end.toordinal(), exclude) if leaves else []
+
+    def longest_annual_part(self, employee: Optional[str], year: int, *, exclude: Optional[str] = None) -> int:
+        key = employee_key(employee)
+        with self._lock:
+            leaves = self._employees.get(key) if key else None
+            return leaves.longest_annual_part(year, exclude) if leaves else 0
+
+    def rule_inputs(self, extract: LeaveRequestExtract, *, exclude: Optional[str] = None) -> Dict[str, Any]:
+        """Extra compliance inputs (`history.*`) for one extract; the document itself is excluded by sha256."""
+        name = extract.employee.full_name
+        sd, ed = parse_iso(extract.leave.start_date), parse_iso(extract.leave.end_date)
+        if employee_key(name) is None or sd is None:
+            return {}
+        out: Dict[str, Any] = {
+            "history.annual_max_part": self.longest_annual_part(name, sd.year, exclude=exclude),
+        }
+        if ed is not None and ed >= sd:
+            found = self.overlaps(name, sd, ed, exclude=exclude)
+            if found:
+                out["history.overlaps"] = [
+                    {
+                        "start": date.fromordinal(p.start).isoformat(),
+                        "end": date.fromordinal(p.end).isoformat(),
+                        "leave_type": p.leave_type,
+                    }
+                    for p in found
+                ]
+        return out
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"employees": len(self._employees), "periods": len(self._documents)}
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[str, Optional[str], str, Optional[str], Optional[str], Optional[int]]]) -> "LeaveHistory":
+        history = cls()
+        for row in rows:
+            history.add(*row)
+        return history
+
+    def refresh(self, store: ResultStore) -> int:
+        """Apply the results saved since the last refresh (by row id); returns how many rows were read."""
+        with self._refresh_lock:
+            rows = store.leaves_since(self._last_id)
+            for result_id, sha256, key, leave_type, start, end, days, needs_rewrite in rows:
+                if needs_rewrite:
+                    # Not accepted: an earlier accepted result of the same document no longer counts.
+                    self.remove(sha256)
+                else:
+                    self.add(sha256, key, leave_type, start, end, days)
+                self._last_id = result_id
+            return len(rows)
+
+    @classmethod
+    def from_store(cls, store: ResultStore) -> "LeaveHistory":
+        history = cls()
+        history.refresh(store)
+        return history
+
+
+_histories: Dict[str, LeaveHistory] = {}
+_histories_lock = threading.Lock()
+
+
+def get_leave_history(store_path: str) -> Optional[LeaveHistory]:
+    """The index over RESULT_STORE_PATH, up to date with the store; None without a store.
+
+    Built from the stored results on first use, then each call reads only the rows saved since
+    (by this or another process): one range scan over the primary key.
+    """
+    store = get_result_store(store_path)
+    if store is None:
+        return None
+    with _histories_lock:
+        history = _histories.get(store_path)
+        if history is None:
+            history = _histories[store_path] = LeaveHistory.from_store(store)
+            logger.info("leave history: rebuilt from %s: %s", store_path, history.stats())
+            return history
+    history.refresh(store)
+    return history
@@ -1,40 +1,84 @@
 from __future__ import annotations
 
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
+import asyncio
 import json
 import logging
 import os
 import queue
 import re
+import signal
 import threading
 from typing import Any
 
 import anthropic
 from anthropic import Anthropic
-from dotenv import load_dotenv
-from fastapi import FastAPI, File, HTTPException, Request, UploadFile
+from fastapi import FastAPI, File, HTTPException, Query, Request, UploadFile
 from fastapi.concurrency import run_in_threadpool
-from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
+from .admission import (
+    DEFAULT_TENANT,
+    PRIORITY_BATCH,
+    PRIORITY_STREAM,
+    AdmissionConfig,
+    AdmissionController,
+    AdmissionRejected,
+    Slot,
+    resolve_tenant,
+)
 from .ai_extract import UpstreamAIError, extract_leave_request_with_debug
-from .compliance import run_compliance_checks
-from .issues import build_decision, build_trace, from_compliance, from_validation, make_upstream_issue
-from .schemas import ApiResponse
-from .validation import validate_extract
-
-load_dotenv()
-
-logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+from .batch_checks import run_batch_checks
+from .compliance_rules import rule_profile
+from .escalation import ESCALATION
+from .issues import build_decision, build_trace, from_validation, make_upstream_issue
+from .memory_budget import MEMORY_BUDGET
+from .pipeline import finish_extraction
+from .result_store import MAX_PAGE_SIZE, get_result_store
+from .response_profile import StreamCompressor, compress, dump_json, negotiate_encoding, parse_fields
+from .schemas import ApiResponse, BatchCheckRequest
+from .settings import get_settings, reload_settings
+from .singleflight import Flight, SingleFlight, document_key
+from .startup import STATE as STARTUP_STATE
+from .startup import record_import, start_worker_warmup
+from .validation import validate_partial
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
 logger = logging.getLogger(__name__)
+# First load: validates the config and logs it once; requests then only read the snapshot.
+logging.getLogger().setLevel(get_settings().LOG_LEVEL)
 
 app = FastAPI(title="Leave Request Parser (RU)")
 
 templates = Jinja2Templates(directory="templates")
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "15"))
-MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+
+def _reload_config() -> None:
+    cfg = reload_settings()
+    logging.getLogger().setLevel(cfg.LOG_LEVEL)
+
+
+@app.on_event("startup")
+async def _install_config_reload() -> None:
+    """SIGHUP re-reads env/.env in this worker without restarting it (runs after gunicorn's signal setup)."""
+    if not hasattr(signal, "SIGHUP"):
+        return
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, _reload_config)
+    except (NotImplementedError, RuntimeError, ValueError):
+        # Not the main thread (e.g. TestClient) or no signal support in this loop.
+        logger.debug("SIGHUP config reload is not available in this process")
+
+
+@app.on_event("startup")
+async def _start_warmup() -> None:
+    start_worker_warmup(get_settings().STARTUP_WARMUP)
 
 
 def _normalize_upstream_http_status(status_code: int) -> int:
@@ -57,9 +101,10 @@ def _extract_upstream_request_id(debug_steps: list[str] | None) -> str | None:
 
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
+    cfg = get_settings()
     resp = templates.TemplateResponse(
         "index.html",
-        {"request": request, "max_upload_mb": MAX_UPLOAD_MB, "mock_mode": os.getenv("MOCK_MODE", "0")},
+        {"request": request, "max_upload_mb": cfg.MAX_UPLOAD_MB, "mock_mode": "1" if cfg.MOCK_MODE else "0"},
     )
     resp.headers["Cache-Control"] = "no-store, max-age=0"
     resp.headers["Pragma"] = "no-cache"
@@ -71,9 +116,17 @@ async def api_health():
     return {"status": "ok"}
 
 
+@app.get("/api/ready")
+async def api_ready():
+    """Readiness: 503 until this worker finished warm-up (liveness stays /api/health)."""
+    state = STARTUP_STATE.snapshot()
+    return JSONResponse(status_code=200 if state["status"] == "ready" else 503, content=state)
+
+
 def _anthropic_probe() -> dict:
-    model = os.getenv("ANTHROPIC_MODEL", "claude-sonnet-4-6")
-    client = Anthropic()
+    cfg = get_settings()
+    model = cfg.ANTHROPIC_MODEL
+    client = Anthropic(api_key=cfg.ANTHROPIC_API_KEY)
     msg = client.messages.create(
         model=model,
         max_tokens=16,
@@ -89,10 +142,11 @@ def _anthropic_probe() -> dict:
 
 @app.get("/api/health/anthropic")
 async def api_health_anthropic():
-    if os.getenv("MOCK_MODE", "0") == "1":
+    cfg = get_settings()
+    if cfg.MOCK_MODE:
         return {"status": "ok", "mode": "mock"}
 
-    if not os.getenv("ANTHROPIC_API_KEY"):
+    if not cfg.ANTHROPIC_API_KEY:
         raise HTTPException(status_code=500, detail="ANTHROPIC_API_KEY не задан в переменных окружения.")
 
     try:
@@ -110,9 +164,10 @@ async def _read_pdf_upload(file: UploadFile) -> tuple[str, bytes]:
     if not filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Пожалуйста, загрузите PDF файл.")
 
+    cfg = get_settings()
     data = await file.read()
-    if len(data) > MAX_UPLOAD_BYTES:
-        raise HTTPException(status_code=413, detail=f"Файл слишком большой. Лимит: {MAX_UPLOAD_MB} MB.")
+    if len(data) > cfg.MAX_PDF_BYTES:
+        raise HTTPException(status_code=413, detail=f"Файл слишком большой. Лимит: {cfg.MAX_UPLOAD_MB} MB.")
     return filename, data
 
 
@@ -237,23 +292,207 @@ def _build_error_payload(err: Exception, where: str) -> tuple[int, dict[str, Any
     }
 
 
+def _admission_config(cfg) -> AdmissionConfig:
+    return AdmissionConfig(
+        initial_limit=cfg.ADMISSION_INITIAL_LIMIT,
+        min_limit=cfg.ADMISSION_MIN_LIMIT,
+        max_limit=max(cfg.ADMISSION_MIN_LIMIT, cfg.ADMISSION_MAX_LIMIT),
+        queue_size=cfg.ADMISSION_QUEUE_SIZE,
+        max_wait_s=cfg.ADMISSION_MAX_WAIT_S,
+        target_latency_s=cfg.ADMISSION_TARGET_LATENCY_S,
+        tenants=cfg.ADMISSION_TENANTS,
+        tenant_max_in_flight=cfg.ADMISSION_TENANT_MAX_IN_FLIGHT,
+        interactive_reserve=cfg.ADMISSION_INTERACTIVE_RESERVE_PERCENT / 100,
+    )
+
+
+ADMISSION = AdmissionController(_admission_config(get_settings()))
+_admission_generation = get_settings().GENERATION
+
+
+async def _admit(priority: str, tenant: str = DEFAULT_TENANT) -> Slot | None:
+    """Wait for an extract slot (per worker); raises AdmissionRejected when the queue is full or the wait too long."""
+    global _admission_generation
+    cfg = get_settings()
+    if not cfg.ADMISSION_ENABLED:
+        return None
+    if cfg.GENERATION != _admission_generation:
+        ADMISSION.configure(_admission_config(cfg))
+        _admission_generation = cfg.GENERATION
+    return await ADMISSION.acquire(priority, tenant)
+
+
+def _tenant_of(request: Request) -> str:
+    """Department the request is queued under (weighted fair share): API key, then the tenant header."""
+    cfg = get_settings()
+    return resolve_tenant(request.headers, header=cfg.TENANT_HEADER, api_keys=dict(cfg.TENANT_API_KEYS))
+
+
+def _release_slot(slot: Slot | None, err: BaseException | None) -> None:
+    """Feed the outcome into AIMD: upstream overload/timeouts shrink the limit, caller-side errors are neutral."""
+    if slot is None:
+        return
+    if err is None:
+        slot.release()
+    elif isinstance(err, UpstreamAIError) and _normalize_upstream_http_status(err.status_code) in (429, 503, 504):
+        slot.release(overloaded=True)
+    elif isinstance(err, anthropic.APIError):
+        slot.release(overloaded=True)
+    else:
+        slot.release(neutral=True)
+
+
+def _busy_payload(err: AdmissionRejected) -> dict[str, Any]:
+    issue = make_upstream_issue(
+        code="server_busy",
+        message="Сервис перегружен: слишком много документов в обработке. Повторите попытку позже.",
+        source="admission",
+        category="network",
+        severity="error",
+        hint=f"Повторите запрос через {err.retry_after_s} с.",
+    )
+    return {
+        "error": "Сервис перегружен.",
+        "status": 429,
+        "detail": issue.message,
+        "retry_after_s": err.retry_after_s,
+        "issues": [issue.model_dump()],
+        "decision": build_decision([issue]).model_dump(),
+        "trace": build_trace("upload", {}, {}).model_dump(),
+    }
+
+
+def _busy_response(err: AdmissionRejected) -> JSONResponse:
+    return JSONResponse(status_code=429, headers={"Retry-After": str(err.retry_after_s)}, content=_busy_payload(err))
+
+
+SINGLE_FLIGHT = SingleFlight()
+
+
+async def _start_extraction(
+    data: bytes, priority: str, streaming: bool, tenant: str = DEFAULT_TENANT
+) -> tuple[Flight, bool, Slot | None]:
+    """Join an identical in-flight extraction or lead a new one; only the leader takes an admission slot."""
+    cfg = get_settings()
+    key = None
+    if cfg.SINGLE_FLIGHT_ENABLED:
+        # Same bytes + same config snapshot + same mode (stream events or not) => same result.
+        key = await run_in_threadpool(document_key, data, cfg.GENERATION, streaming)
+    flight, leader = SINGLE_FLIGHT.join(key)
+    if not leader:
+        return flight, False, None
+    try:
+        slot = await _admit(priority, tenant)
+    except AdmissionRejected as e:
+        flight.fail(e)
+        raise
+    except BaseException:
+        # Leader's client went away while queued: let the coalesced waiters retry soon.
+        flight.fail(AdmissionRejected("cancelled", 1))
+        raise
+    return flight, True, slot
+
+
+def _run_extraction(
+    flight: Flight,
+    leader: bool,
+    slot: Slot | None,
+    data: bytes,
+    filename: str,
+    *,
+    streaming: bool = False,
+    on_debug=None,
+    on_delta=None,
+    on_field=None,
+    on_reset=None,
+) -> tuple[Any, list[str]]:
+    """Blocking: the leader runs the pipeline once, coalesced waiters get its result and a replay of its events."""
+    if not leader:
+        note = f"Single-flight: этот документ уже обрабатывается, ждём результат (sha256={flight.key[0][:12]})"
+        if on_debug:
+            on_debug(note)
+        flight.subscribe(on_debug, on_delta, on_field, on_reset)
+        extract, debug_steps = flight.wait()
+        return extract, [note, *debug_steps]
+
+    if not flight.claim():
+        # The request was abandoned before this thread started: waiters are failed, the slot is released.
+        return flight.wait()
+
+    def _pipeline(**callbacks):
+        if streaming:
+            return extract_leave_request_with_debug(data, filename, **callbacks)
+        return extract_leave_request_with_debug(data, filename)
+
+    flight.subscribe(on_debug, on_delta, on_field, on_reset)
+    try:
+        result = flight.run(_pipeline)
+    except BaseException as e:
+        _release_slot(slot, e)
+        raise
+    _release_slot(slot, None)
+    return result
+
+
+def _abandon_leader(flight: Flight, slot: Slot | None, err: BaseException) -> None:
+    """The leader's request failed or was cancelled before `_run_extraction` took the flight over."""
+    if flight.claim():
+        flight.fail(AdmissionRejected("cancelled", 1))
+        _release_slot(slot, err)
+
+
+async def _extract_in_threadpool(
+    flight: Flight, leader: bool, slot: Slot | None, data: bytes, filename: str
+) -> tuple[Any, list[str]]:
+    try:
+        return await run_in_threadpool(_run_extraction, flight, leader, slot, data, filename)
+    except BaseException as e:
+        # E.g. cancelled while waiting for a threadpool token: nobody else would finish the flight.
+        if leader:
+            _abandon_leader(flight, slot, e)
+        raise
+
+
+def _want_debug_steps(debug: bool | None) -> bool:
+    return get_settings().DEBUG_STEPS if debug is None else debug
+
+
+def _dump_response(resp: ApiResponse, fields: str | None) -> bytes:
+    return dump_json(resp, include=parse_fields(fields), exclude=None if resp.debug_steps is not None else {"debug_steps"})
+
+
+def _json_bytes_response(request: Request, body: bytes, status_code: int = 200) -> Response:
+    body, encoding = compress(body, negotiate_encoding(request.headers.get("accept-encoding")))
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
+
+
 @app.post("/api/extract")
-async def api_extract(file: UploadFile = File(...)):
+async def api_extract(
+    request: Request,
+    file: UploadFile = File(...),
+    debug: bool | None = None,
+    fields: str | None = None,
+):
+    """`debug=1` adds debug_steps (default: DEBUG_STEPS); `fields=extract.leave,decision` projects the response."""
     try:
         filename, data = await _read_pdf_upload(file)
-        extract, debug_steps = await run_in_threadpool(extract_leave_request_with_debug, data, filename)
-        validation = validate_extract(extract)
-        compliance, needs_rewrite = run_compliance_checks(extract)
-        issues = [*from_validation(validation), *from_compliance(compliance)]
-        resp = ApiResponse(
-            extract=extract,
-            issues=issues,
-            decision=build_decision(issues),
-            trace=build_trace("upload", {}, {}),
-            needs_rewrite=needs_rewrite,
-        ).model_dump()
-        resp["debug_steps"] = debug_steps
-        return resp
+        flight, leader, slot = await _start_extraction(data, PRIORITY_BATCH, streaming=False, tenant=_tenant_of(request))
+        extract, debug_steps = await _extract_in_threadpool(flight, leader, slot, data, filename)
+        resp = await run_in_threadpool(
+            finish_extraction,
+            extract,
+            debug_steps,
+            data,
+            filename,
+            with_debug=_want_debug_steps(debug),
+            store_path=get_settings().RESULT_STORE_PATH,
+        )
+        return _json_bytes_response(request, _dump_response(resp, fields))
+    except AdmissionRejected as e:
+        return _busy_response(e)
     except HTTPException as e:
         status, issue = _http_error_to_issue_and_status(e)
         issues = [issue]
@@ -270,51 +509,205 @@ async def api_extract(file: UploadFile = File(...)):
         return JSONResponse(status_code=status, content=payload)
 
 
+def _encode_event(event: dict[str, Any]) -> bytes:
+    raw = event.pop("payload_json", None)
+    line = json.dumps(event, ensure_ascii=False)
+    if raw is None:
+        return (line + "\n").encode("utf-8")
+    # The result payload is already JSON bytes from pydantic-core; splice it in instead of re-encoding.
+    return line[:-1].encode("utf-8") + b', "payload": ' + raw + b"}\n"
+
+
 @app.post("/api/extract/stream")
-async def api_extract_stream(file: UploadFile = File(...)):
+async def api_extract_stream(
+    request: Request,
+    file: UploadFile = File(...),
+    debug: bool | None = None,
+    fields: str | None = None,
+):
     filename, data = await _read_pdf_upload(file)
+    with_debug = _want_debug_steps(debug)
+    try:
+        # Interactive requests: admitted ahead of queued plain /api/extract calls.
+        flight, leader, slot = await _start_extraction(data, PRIORITY_STREAM, streaming=True, tenant=_tenant_of(request))
+    except AdmissionRejected as e:
+        return _busy_response(e)
     events: queue.Queue[dict[str, Any]] = queue.Queue()
 
     def _on_debug(step: str) -> None:
         events.put({"type": "step", "message": step})
 
+    partial_fields: dict[str, Any] = {}
+    early_codes: set[str] = set()
+
+    def _on_delta(step: str, text: str) -> None:
+        events.put({"type": "delta", "step": step, "text": text})
+
+    def _on_reset(step: str) -> None:
+        # PDF_ESCALATION second pass: its draft, fields and early issues replace the first pass's.
+        partial_fields.clear()
+        early_codes.clear()
+        events.put({"type": "reset", "step": step})
+
+    def _on_field(path: str, value: Any) -> None:
+        # Cheap validation on the fields known so far; each issue is sent once, with the field that raised it.
+        partial_fields[path] = value
+        fresh = [v for v in validate_partial(partial_fields) if v.code not in early_codes]
+        early_codes.update(v.code for v in fresh)
+        events.put(
+            {
+                "type": "field",
+                "path": path,
+                "value": value,
+                "issues": [item.model_dump() for item in from_validation(fresh)],
+            }
+        )
+
     def _worker() -> None:
         try:
-            extract, debug_steps = extract_leave_request_with_debug(data, filename, on_debug=_on_debug)
-            validation = validate_extract(extract)
-            compliance, needs_rewrite = run_compliance_checks(extract)
-            issues = [*from_validation(validation), *from_compliance(compliance)]
-            resp = ApiResponse(
-                extract=extract,
-                issues=issues,
-                decision=build_decision(issues),
-                trace=build_trace("upload", {}, {}),
-                needs_rewrite=needs_rewrite,
-            ).model_dump()
-            resp["debug_steps"] = debug_steps
-            events.put({"type": "result", "ok": True, "status": 200, "payload": resp})
+            extract, debug_steps = _run_extraction(
+                flight,
+                leader,
+                slot,
+                data,
+                filename,
+                streaming=True,
+                on_debug=_on_debug,
+                on_delta=_on_delta,
+                on_field=_on_field,
+                on_reset=_on_reset,
+            )
+            resp = finish_extraction(
+                extract, debug_steps, data, filename, with_debug=with_debug, store_path=get_settings().RESULT_STORE_PATH
+            )
+            events.put({"type": "result", "ok": True, "status": 200, "payload_json": _dump_response(resp, fields)})
+        except AdmissionRejected as e:
+            # Coalesced onto a leader that was not admitted.
+            events.put({"type": "result", "ok": False, "status": 429, "payload": _busy_payload(e)})
         except Exception as e:
             status, payload = _build_error_payload(e, "api_extract_stream")
             events.put({"type": "result", "ok": False, "status": status, "payload": payload})
 
-    threading.Thread(target=_worker, daemon=True).start()
+    try:
+        threading.Thread(target=_worker, daemon=True).start()
+    except BaseException as e:
+        if leader:
+            _abandon_leader(flight, slot, e)
+        raise
+
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    compressor = StreamCompressor(encoding) if encoding else None
 
     async def _stream_gen():
         while True:
             event = await run_in_threadpool(events.get)
-            yield (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+            line = _encode_event(event)
+            yield compressor.compress(line) if compressor else line
             if event.get("type") == "result":
                 break
+        if compressor:
+            yield compressor.finish()
+
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return StreamingResponse(_stream_gen(), media_type="application/x-ndjson", headers=headers)
+
+
+@app.post("/api/check")
+async def api_check(request: Request, body: BatchCheckRequest):
+    """Re-run validation and compliance on already extracted records (no PDF, no LLM)."""
+    results = await run_in_threadpool(run_batch_checks, body.extracts)
+    payload = json.dumps({"count": len(results), "results": results}, ensure_ascii=False).encode("utf-8")
+    return _json_bytes_response(request, payload)
+
+
+def _result_store_or_404():
+    store = get_result_store(get_settings().RESULT_STORE_PATH)
+    if store is None:
+        raise HTTPException(status_code=404, detail="Хранилище результатов выключено (RESULT_STORE_PATH не задан).")
+    return store
+
+
+@app.get("/api/results")
+async def api_results(
+    request: Request,
+    employee: str | None = None,
+    leave_type: str | None = None,
+    status: str | None = None,
+    issue_code: str | None = None,
+    leave_from: str | None = None,
+    leave_to: str | None = None,
+    created_from: str | None = None,
+    created_to: str | None = None,
+    sha256: str | None = None,
+    cursor: int | None = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+):
+    """Stored results, newest first; `next_cursor` of a page is the `cursor` of the next one."""
+    store = _result_store_or_404()
+    page = await run_in_threadpool(
+        store.query,
+        employee=employee,
+        leave_type=leave_type,
+        status=status,
+        issue_code=issue_code,
+        leave_from=leave_from,
+        leave_to=leave_to,
+        created_from=created_from,
+        created_to=created_to,
+        sha256=sha256,
+        cursor=cursor,
+        limit=limit,
+    )
+    return _json_bytes_response(request, json.dumps(page, ensure_ascii=False).encode("utf-8"))
+
 
-    return StreamingResponse(_stream_gen(), media_type="application/x-ndjson")
+@app.get("/api/results/{result_id}")
+async def api_result(request: Request, result_id: int):
+    """Stored ApiResponse of one result (without debug_steps)."""
+    body = await run_in_threadpool(_result_store_or_404().get, result_id)
+    if body is None:
+        raise HTTPException(status_code=404, detail="Результат не найден.")
+    return _json_bytes_response(request, body)
+
+
+@app.get("/api/admission")
+async def api_admission():
+    """Extract admission control of this worker: current AIMD limit, queue depth, rejections, coalesced uploads, memory budget."""
+    cfg = get_settings()
+    return {
+        "enabled": cfg.ADMISSION_ENABLED,
+        **ADMISSION.stats(),
+        "single_flight": {"enabled": cfg.SINGLE_FLIGHT_ENABLED, **SINGLE_FLIGHT.stats()},
+        "memory": MEMORY_BUDGET.stats(),
+    }
+
+
+@app.get("/api/escalation")
+async def api_escalation():
+    """Two-pass rendering of this worker (PDF_ESCALATION): escalation rate, reasons and image tokens saved."""
+    cfg = get_settings()
+    return {"enabled": cfg.PDF_ESCALATION, "first_pass_long_edge": cfg.PDF_FIRST_PASS_LONG_EDGE, **ESCALATION.stats()}
+
+
+@app.get("/api/compliance/rules")
+async def api_compliance_rules():
+    """Active rule versions with per-rule timing and firing counters."""
+    return {"rules": rule_profile()}
 
 
 @app.get("/api/version")
 async def api_version():
+    cfg = get_settings()
     return {
         "RENDER_GIT_COMMIT": os.getenv("RENDER_GIT_COMMIT"),
         "RENDER_GIT_BRANCH": os.getenv("RENDER_GIT_BRANCH"),
         "RENDER_GIT_REPO_SLUG": os.getenv("RENDER_GIT_REPO_SLUG"),
-        "ANTHROPIC_MODEL": os.getenv("ANTHROPIC_MODEL"),
-        "MOCK_MODE": os.getenv("MOCK_MODE"),
+        "ANTHROPIC_MODEL": cfg.ANTHROPIC_MODEL,
+        "MOCK_MODE": "1" if cfg.MOCK_MODE else "0",
+        "CONFIG_GENERATION": cfg.GENERATION,
     }
+
+
+record_import(_IMPORT_STARTED)
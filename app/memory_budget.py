@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, Optional, Tuple
+
+try:  # optional: peak RSS of the process (not available on Windows)
+    import resource
+except ImportError:  # pragma: no cover - depends on the platform
+    resource = None
+
+MB = 1024 * 1024
+
+# MuPDF keeps its own parsed copy of the document next to the upload bytes.
+PDF_COPIES = 2
+# PNG of a scanned page vs raw pixmap; conservative for scans, text-only pages compress far better.
+# Check against the per-stage RSS in /api/admission -> memory.stages before lowering.
+PNG_RATIO = 0.6
+# Retained per image until the vision call is over: the base64 str, the SDK's JSON body str and its encoded bytes.
+B64_COPIES = 3
+# Scan preprocessing works on numpy copies; deskew's float32 coordinate grids and intp indexes dominate.
+PREPROCESS_BYTES_PER_PIXEL = 32
+# Same clamp as the renderer: pages above this are rendered once more at a smaller zoom.
+MAX_PIXMAP_EDGE = 8000
+
+
+class MemoryBudgetTimeout(Exception):
+    def __init__(self, needed: int, waited_s: float):
+        super().__init__(f"memory budget: {needed} bytes did not fit within {waited_s:.1f}s")
+        self.needed = needed
+        self.waited_s = waited_s
+
+
+def render_zoom(width_pts: float, height_pts: float, target_long_edge: int) -> float:
+    long_edge_pts = max(width_pts, height_pts) or 1.0
+    return max(0.5, min(float(target_long_edge) / float(long_edge_pts), 4.0))
+
+
+def estimate_render_bytes(
+    pdf_size: int,
+    page_rects: Iterable[Tuple[float, float]],
+    *,
+    target_long_edge: int,
+    channels: int,
+    preprocess: bool = False,
+) -> Dict[str, int]:
+    """Upper estimate of the extra memory one request holds from render until the vision call returns.
+
+    Pages are rendered one at a time, so only the largest page's transient buffers
+    count (first pixmap, the re-render when over 8000 px, preprocess arrays, the PNG);
+    the base64 images of all pages stay alive together with the request body.
+    """
+    transient = 0
+    retained = 0
+    pixels = 0
+    pages = 0
+    for width_pts, height_pts in page_rects:
+        zoom = render_zoom(width_pts, height_pts, target_long_edge)
+        w, h = math.ceil(width_pts * zoom), math.ceil(height_pts * zoom)
+        first = w * h * channels
+        if w > MAX_PIXMAP_EDGE or h > MAX_PIXMAP_EDGE:
+            scale = min(MAX_PIXMAP_EDGE / w, MAX_PIXMAP_EDGE / h)
+            w, h = math.ceil(w * scale), math.ceil(h * scale)
+            final = w * h * channels
+            page_peak = first + final
+        else:
+            final = first
+            page_peak = first
+        if preprocess:
+            page_peak += w * h * PREPROCESS_BYTES_PER_PIXEL
+        png = int(final * PNG_RATIO)
+        transient = max(transient, page_peak + png)
+        retained += math.ceil(png / 3) * 4
+        pixels += w * h
+        pages += 1
+    total = pdf_size * PDF_COPIES + transient + retained * B64_COPIES
+    return {"bytes": total, "pages": pages, "pixels": pixels, "transient": transient, "retained": retained * B64_COPIES}
+
+
+def rss_bytes() -> Optional[int]:
+    """Current resident set size (Linux /proc), None where it cannot be read."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """High-water mark of the process RSS since start (ru_maxrss is KiB on Linux)."""
+    if resource is None:
+        return None
+    return int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss) * 1024
+
+
+class MemoryGrant:
+    """Reserved bytes of one request; `release()` once the images and request body are gone."""
+
+    def __init__(self, budget: Optional["MemoryBudget"], nbytes: int, estimate: int, waited_ms: int):
+        self._budget = budget
+        self.nbytes = nbytes
+        self.estimate = estimate
+        self.waited_ms = waited_ms
+        self._rss_start = rss_bytes()
+        self._released = False
+
+    def checkpoint(self, stage: str) -> None:
+        """Record RSS growth since the grant for calibration of the estimate (noisy under concurrency)."""
+        if self._budget is None or self._rss_start is None:
+            return
+        rss = rss_bytes()
+        if rss is not None:
+            self._budget._observe(stage, rss - self._rss_start, self.estimate)
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        if self._budget is not None:
+            self._budget._release(self.nbytes)
+
+
+class MemoryBudget:
+    """Process-wide weighted semaphore over estimated render/encode bytes.
+
+    Waiters are served in arrival order so a large document is not starved by a
+    stream of small ones; a request larger than the whole budget is clamped to it
+    and therefore runs alone.
+    """
+
+    def __init__(self, limit_bytes: int = 0):
+        self._cond = threading.Condition()
+        self._queue: Deque[object] = deque()
+        self.limit_bytes = int(limit_bytes)
+        self.reserved = 0
+        self.peak_reserved = 0
+        self.granted = 0
+        self.waited = 0
+        self.timeouts = 0
+        self._stages: Dict[str, Dict[str, Any]] = {}
+
+    def acquire(self, nbytes: int, *, limit_bytes: int, timeout_s: float) -> MemoryGrant:
+        """Block until `nbytes` fit; limit_bytes <= 0 disables the budget (the grant only records RSS)."""
+        started = time.monotonic()
+        with self._cond:
+            if limit_bytes != self.limit_bytes:
+                self.limit_bytes = int(limit_bytes)
+                self._cond.notify_all()
+            if self.limit_bytes <= 0:
+                return MemoryGrant(self, 0, nbytes, 0)
+            need = max(0, min(int(nbytes), self.limit_bytes))
+            ticket = object()
+            self._queue.append(ticket)
+
+            def _fits() -> bool:
+                return self._queue[0] is ticket and (self.reserved + need <= self.limit_bytes or self.reserved == 0)
+
+            try:
+                if not _fits():
+                    self.waited += 1
+                    if not self._cond.wait_for(_fits, timeout=timeout_s):
+                        self.timeouts += 1
+                        raise MemoryBudgetTimeout(need, time.monotonic() - started)
+            finally:
+                self._queue.remove(ticket)
+                # The next in line may fit now (or became head after a timeout).
+                self._cond.notify_all()
+            self.reserved += need
+            self.peak_reserved = max(self.peak_reserved, self.reserved)
+            self.granted += 1
+        return MemoryGrant(self, need, nbytes, int((time.monotonic() - started) * 1000))
+
+    def _release(self, nbytes: int) -> None:
+        with self._cond:
+            self.reserved -= nbytes
+            self._cond.notify_all()
+
+    def _observe(self, stage: str, rss_delta: int, estimate: int) -> None:
+        with self._cond:
+            entry = self._stages.setdefault(stage, {"samples": 0, "max_rss_delta_bytes": 0, "max_ratio": 0.0})
+            entry["samples"] += 1
+            entry["last_rss_delta_bytes"] = rss_delta
+            entry["max_rss_delta_bytes"] = max(entry["max_rss_delta_bytes"], rss_delta)
+            if estimate > 0:
+                entry["max_ratio"] = round(max(entry["max_ratio"], rss_delta / estimate), 3)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "limit_bytes": self.limit_bytes,
+                "reserved_bytes": self.reserved,
+                "peak_reserved_bytes": self.peak_reserved,
+                "waiting": len(self._queue),
+                "granted": self.granted,
+                "waited": self.waited,
+                "timeouts": self.timeouts,
+                "rss_bytes": rss_bytes(),
+                "rss_peak_bytes": peak_rss_bytes(),
+                "stages": {stage: dict(entry) for stage, entry in self._stages.items()},
+            }
+
+
+MEMORY_BUDGET = MemoryBudget()
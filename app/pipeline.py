@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import re
+from typing import Any, Mapping, Optional, Sequence
+
+from .compliance import run_compliance_checks
+from .debug_events import DebugLog
+from .issues import build_decision, build_trace, from_compliance, from_validation
+from .leave_history import get_leave_history
+from .result_store import persist_result
+from .roster import current_roster, roster_issue
+from .schemas import ApiResponse, Issue, LeaveRequestExtract
+from .validation import validate_extract
+
+logger = logging.getLogger(__name__)
+
+
+def extract_timings(debug_steps: DebugLog | Sequence[str] | None) -> dict[str, int]:
+    """Step timings for Trace.timings_ms from the debug log: `<step>` elapsed, `<step>.ttft` first token."""
+    if isinstance(debug_steps, DebugLog):
+        # Typed fields: no need to render the steps.
+        return debug_steps.timings()
+    timings: dict[str, int] = {}
+    for step in debug_steps or []:
+        m = re.match(r"Шаг ([\w.]+): (elapsed_ms|ttft_ms)=(\d+)$", step)
+        if m:
+            name, kind, value = m.groups()
+            timings[name if kind == "elapsed_ms" else f"{name}.ttft"] = int(value)
+    return timings
+
+
+def build_api_response(
+    extract: LeaveRequestExtract,
+    debug_steps: DebugLog | Sequence[str],
+    *,
+    with_debug: bool,
+    request_id: str = "upload",
+    context: Optional[Mapping[str, Any]] = None,
+    extra_issues: Sequence[Issue] = (),
+) -> ApiResponse:
+    """Extract -> validation + compliance issues, decision and trace (shared by the API and the batch CLI)."""
+    validation = validate_extract(extract)
+    compliance, needs_rewrite = run_compliance_checks(extract, context)
+    issues = [*from_validation(validation), *from_compliance(compliance), *extra_issues]
+    return ApiResponse(
+        extract=extract,
+        issues=issues,
+        decision=build_decision(issues),
+        trace=build_trace(request_id, extract_timings(debug_steps), {}),
+        needs_rewrite=needs_rewrite,
+        # Rendered only when asked for.
+        debug_steps=list(debug_steps) if with_debug else None,
+    )
+
+
+def _apply_roster(extract: LeaveRequestExtract) -> tuple[LeaveRequestExtract, list[Issue]]:
+    try:
+        roster = current_roster()
+    except Exception as err:
+        logger.warning("employee roster unavailable: %s: %s", type(err).__name__, err)
+        return extract, []
+    if roster is None:
+        return extract, []
+    extract, match, filled = roster.enrich(extract)
+    return extract, [roster_issue(match, filled)]
+
+
+def finish_extraction(
+    extract: LeaveRequestExtract,
+    debug_steps: DebugLog | Sequence[str],
+    data: bytes,
+    filename: Optional[str],
+    *,
+    with_debug: bool,
+    store_path: str = "",
+    request_id: str = "upload",
+    sha256: Optional[str] = None,
+) -> ApiResponse:
+    """Blocking: build the response and, with RESULT_STORE_PATH, check it against the leave history and save it.
+
+    With EMPLOYEE_ROSTER_PATH the employee is first matched against the roster and the
+    missing fields are filled in. The document's own earlier result (same sha256) is
+    excluded from the history checks.
+    """
+    extract, extra_issues = _apply_roster(extract)
+    if not store_path:
+        return build_api_response(extract, debug_steps, with_debug=with_debug, request_id=request_id, extra_issues=extra_issues)
+    sha256 = sha256 or hashlib.sha256(data).hexdigest()
+    history = None
+    try:
+        history = get_leave_history(store_path)
+    except Exception as err:
+        logger.warning("leave history unavailable: %s: %s", type(err).__name__, err)
+    context = history.rule_inputs(extract, exclude=sha256) if history is not None else None
+    resp = build_api_response(
+        extract, debug_steps, with_debug=with_debug, request_id=request_id, context=context, extra_issues=extra_issues
+    )
+    if persist_result(store_path, resp, sha256, filename) is not None and history is not None:
+        if resp.needs_rewrite:
+            # Not accepted: a previous accepted result of the same document no longer counts either.
+            history.remove(sha256)
+        else:
+            leave = extract.leave
+            history.add(sha256, extract.employee.full_name, leave.leave_type, leave.start_date, leave.end_date, leave.days_count)
+    return resp
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, Mapping, Optional, Union
+
+import numpy as np
+
+from .settings import get_settings
+
+DEFAULT_CALENDAR_PATH = os.path.join(os.path.dirname(__file__), "data", "production_calendar_ru.json")
+
+# Day flags, one uint8 per day.
+HOLIDAY = 1  # нерабочий праздничный день (ст. 112 ТК РФ): not counted in annual paid leave (ст. 120)
+DAY_OFF = 2  # any non-working day: weekend, holiday or a transferred day off
+
+DayLike = Union[date, int]
+
+
+def _ordinal(day: DayLike) -> int:
+    return day.toordinal() if isinstance(day, date) else int(day)
+
+
+def _weekdays_upto(ordinal):
+    # Mondays..Fridays in [1, ordinal]; date.fromordinal(1) is a Monday. Works on ints and numpy arrays.
+    return ordinal // 7 * 5 + np.minimum(ordinal % 7, 5)
+
+
+def _month_days(values: Iterable[str], year: int) -> list[date]:
+    out = []
+    for value in values:
+        month, day = (int(part) for part in value.split("-"))
+        out.append(date(year, month, day))
+    return out
+
+
+class ProductionCalendar:
+    """Russian production calendar over [first_year, last_year] as per-day flags with prefix sums.
+
+    `flags` is the concatenation of per-year bitmaps (HOLIDAY, DAY_OFF); the prefix sums
+    make every range count two array reads, and the `*_many` variants do the same for
+    numpy arrays of date ordinals. Outside the covered years (often an OCR-misread year) no
+    day is a holiday and Monday-Friday are working days.
+    """
+
+    def __init__(
+        self,
+        first_year: int,
+        last_year: int,
+        holidays: Iterable[str],
+        years: Optional[Mapping[str, Mapping[str, Any]]] = None,
+    ):
+        if last_year < first_year:
+            raise ValueError(f"production calendar: last_year {last_year} < first_year {first_year}")
+        self.first_year = int(first_year)
+        self.last_year = int(last_year)
+        self.base = date(self.first_year, 1, 1).toordinal()
+        size = date(self.last_year, 12, 31).toordinal() - self.base + 1
+        self.flags = np.zeros(size, dtype=np.uint8)
+        holidays = list(holidays)
+        overrides = {int(year): spec for year, spec in (years or {}).items()}
+
+        weekday = (np.arange(size) + self.base - 1) % 7  # date.fromordinal(1) is a Monday: 0 = Mon ... 6 = Sun
+        self.flags[weekday >= 5] |= DAY_OFF
+        for year in range(self.first_year, self.last_year + 1):
+            spec = overrides.get(year, {})
+            year_holidays = _month_days(spec.get("holidays", holidays), year)
+            for day in year_holidays:
+                self.flags[day.toordinal() - self.base] |= HOLIDAY | DAY_OFF
+            self._shift_weekend_holidays(year_holidays)
+            for day in _month_days(spec.get("days_off", ()), year):
+                self.flags[day.toordinal() - self.base] |= DAY_OFF
+            for day in _month_days(spec.get("working_days", ()), year):
+                self.flags[day.toordinal() - self.base] &= ~np.uint8(DAY_OFF | HOLIDAY)
+
+        self._holiday_cum = np.zeros(size + 1, dtype=np.int32)
+        np.cumsum((self.flags & HOLIDAY) > 0, out=self._holiday_cum[1:])
+        self._working_cum = np.zeros(size + 1, dtype=np.int32)
+        np.cumsum((self.flags & DAY_OFF) == 0, out=self._working_cum[1:])
+
+    def _shift_weekend_holidays(self, year_holidays: list[date]) -> None:
+        # Ст. 112: a weekend that falls on a holiday moves to the next working day, except the January
+        # ones (the Government moves those by decree, see `years` in the calendar file).
+        for day in year_holidays:
+            if day.month == 1 or day.weekday() < 5:
+                continue
+            nxt = day + timedelta(days=1)
+            while nxt.toordinal() - self.base < len(self.flags) and self.flags[nxt.toordinal() - self.base] & DAY_OFF:
+                nxt += timedelta(days=1)
+            if nxt.toordinal() - self.base < len(self.flags):
+                self.flags[nxt.toordinal() - self.base] |= DAY_OFF
+
+    def _index(self, ordinal: int) -> int:
+        return min(max(ordinal - self.base, 0), len(self.flags))
+
+    def holidays_between(self, start: DayLike, end: DayLike) -> int:
+        """Public holidays in [start, end] (inclusive); 0 for an empty range."""
+        s, e = _ordinal(start), _ordinal(end)
+        if e < s:
+            return 0
+        return int(self._holiday_cum[self._index(e + 1)] - self._holiday_cum[self._index(s)])
+
+    def working_days_between(self, start: DayLike, end: DayLike) -> int:
+        s, e = _ordinal(start), _ordinal(end)
+        if e < s:
+            return 0
+        return int(self._working(s, e, self._index(s), self._index(e + 1)))
+
+    def _working(self, s, e, si, ei):
+        # Calendar working days in the covered part, plain weekdays before and after it.
+        weekdays = _weekdays_upto(e) - _weekdays_upto(s - 1)
+        covered_weekdays = _weekdays_upto(self.base + ei - 1) - _weekdays_upto(self.base + si - 1)
+        return weekdays - covered_weekdays + self._working_cum[ei] - self._working_cum[si]
+
+    def _many(self, cum: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        s = np.clip(np.asarray(starts, dtype=np.int64) - self.base, 0, len(self.flags))
+        e = np.clip(np.asarray(ends, dtype=np.int64) + 1 - self.base, 0, len(self.flags))
+        return np.where(e > s, cum[e] - cum[s], 0).astype(np.int64)
+
+    def holidays_between_many(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """Vectorized holidays_between over arrays of date ordinals."""
+        return self._many(self._holiday_cum, starts, ends)
+
+    def working_days_between_many(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        s = np.asarray(starts, dtype=np.int64)
+        e = np.asarray(ends, dtype=np.int64)
+        si = np.clip(s - self.base, 0, len(self.flags))
+        ei = np.clip(e + 1 - self.base, 0, len(self.flags))
+        return np.where(e >= s, self._working(s, e, si, ei), 0).astype(np.int64)
+
+    def is_holiday(self, day: DayLike) -> bool:
+        i = _ordinal(day) - self.base
+        return 0 <= i < len(self.flags) and bool(self.flags[i] & HOLIDAY)
+
+    def is_working_day(self, day: DayLike) -> bool:
+        ordinal = _ordinal(day)
+        i = ordinal - self.base
+        if not 0 <= i < len(self.flags):
+            return (ordinal - 1) % 7 < 5
+        return not self.flags[i] & DAY_OFF
+
+    def year_bitmap(self, year: int) -> np.ndarray:
+        """Flags of one year (a view), index 0 = 1 January."""
+        start = date(year, 1, 1).toordinal() - self.base
+        return self.flags[start : date(year, 12, 31).toordinal() - self.base + 1]
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "ProductionCalendar":
+        return cls(data["first_year"], data["last_year"], data["holidays"], data.get("years"))
+
+    @classmethod
+    def from_file(cls, path: str) -> "ProductionCalendar":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+_calendars: Dict[str, ProductionCalendar] = {}
+_calendars_lock = threading.Lock()
+
+
+def get_calendar(path: str = "") -> ProductionCalendar:
+    """Calendar from PRODUCTION_CALENDAR_PATH (built once per path); empty path = the bundled file."""
+    path = path or DEFAULT_CALENDAR_PATH
+    with _calendars_lock:
+        calendar = _calendars.get(path)
+        if calendar is None:
+            calendar = _calendars[path] = ProductionCalendar.from_file(path)
+        return calendar
+
+
+def current_calendar() -> ProductionCalendar:
+    return get_calendar(get_settings().PRODUCTION_CALENDAR_PATH)
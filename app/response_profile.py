@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import gzip
+import zlib
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel
+
+try:  # optional: brotli is only offered when the package is installed
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+# Bodies below this size are sent as is: compression overhead outweighs the gain.
+MIN_COMPRESS_BYTES = 512
+
+
+def supported_encodings() -> tuple[str, ...]:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def parse_fields(raw: Optional[str]) -> Optional[Dict[str, Any]]:
+    """`fields=extract.employee.full_name,decision` -> pydantic include tree (None = everything)."""
+    include: Dict[str, Any] = {}
+    for path in (raw or "").split(","):
+        parts = [p for p in path.strip().split(".") if p]
+        if not parts:
+            continue
+        node = include
+        for part in parts[:-1]:
+            child = node.get(part)
+            if child is True:
+                break
+            node = node.setdefault(part, {})
+        else:
+            node[parts[-1]] = True
+    return include or None
+
+
+def dump_json(model: BaseModel, *, include: Optional[Dict[str, Any]] = None, exclude: Optional[set] = None) -> bytes:
+    """Serialize straight to JSON bytes in pydantic-core, without the dict/json.dumps round trip."""
+    return model.__pydantic_serializer__.to_json(model, include=include, exclude=exclude)
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick br or gzip from an Accept-Encoding header (q=0 excludes a coding)."""
+    offered: Dict[str, float] = {}
+    for item in (accept_encoding or "").lower().split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            offered[name] = q
+    for name in supported_encodings():
+        if offered.get(name, offered.get("*", 0.0)) > 0:
+            return name
+    return None
+
+
+def compress(body: bytes, encoding: Optional[str]) -> tuple[bytes, Optional[str]]:
+    """Compress a complete body; returns (body, applied encoding or None)."""
+    if encoding is None or len(body) < MIN_COMPRESS_BYTES:
+        return body, None
+    if encoding == "br":
+        return brotli.compress(body, quality=5), "br"
+    return gzip.compress(body, compresslevel=6), "gzip"
+
+
+class StreamCompressor:
+    """Incremental br/gzip for NDJSON: every chunk is flushed so each event reaches the client at once."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=5)
+        else:
+            self._gz = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._br.process(chunk) + self._br.flush()
+        return self._gz.compress(chunk) + self._gz.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._br.finish()
+        return self._gz.flush(zlib.Z_FINISH)
+
@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .response_profile import dump_json
+from .schemas import ApiResponse
+
+logger = logging.getLogger(__name__)
+
+MAX_PAGE_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at TEXT NOT NULL,
+    sha256 TEXT NOT NULL UNIQUE,
+    filename TEXT,
+    employee_name TEXT,
+    employee_key TEXT,
+    leave_type TEXT,
+    start_date TEXT,
+    end_date TEXT,
+    days_count INTEGER,
+    status TEXT NOT NULL,
+    needs_rewrite INTEGER NOT NULL,
+    response BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS result_issues (
+    code TEXT NOT NULL,
+    result_id INTEGER NOT NULL,
+    severity TEXT NOT NULL,
+    PRIMARY KEY (code, result_id)
+) WITHOUT ROWID;
+-- Equality filter + `id` in every index: the keyset page is a range scan in index order, no sort.
+CREATE INDEX IF NOT EXISTS ix_results_employee ON results (employee_key, id);
+CREATE INDEX IF NOT EXISTS ix_results_leave_type ON results (leave_type, id);
+CREATE INDEX IF NOT EXISTS ix_results_status ON results (status, id);
+CREATE INDEX IF NOT EXISTS ix_results_start ON results (start_date, id);
+CREATE INDEX IF NOT EXISTS ix_results_end ON results (end_date, id);
+CREATE INDEX IF NOT EXISTS ix_results_created ON results (created_at, id);
+CREATE INDEX IF NOT EXISTS ix_result_issues_result ON result_issues (result_id);
+"""
+
+_SUMMARY_COLUMNS = (
+    "id",
+    "created_at",
+    "sha256",
+    "filename",
+    "employee_name",
+    "leave_type",
+    "start_date",
+    "end_date",
+    "days_count",
+    "status",
+    "needs_rewrite",
+)
+
+
+def employee_key(name: Optional[str]) -> Optional[str]:
+    """Search key for ФИО: lower case, `ё` -> `е`, single spaces."""
+    if not name or not name.strip():
+        return None
+    return " ".join(name.lower().replace("ё", "е").split())
+
+
+def _utc_now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+class ResultStore:
+    """SQLite store of extraction results: one row per document (by sha256), the latest result wins.
+
+    The full ApiResponse (without debug_steps) is kept as JSON next to indexed columns
+    for the fields HR queries filter on; issue codes live in their own table.
+    One connection guarded by a lock: writes are a single short transaction per document.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            if path != ":memory:":
+                # Readers do not block the writer and vice versa (other processes, e.g. gunicorn workers).
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def save(self, resp: ApiResponse, *, sha256: str, filename: Optional[str] = None) -> int:
+        """Insert (or replace the previous result of the same document); returns the new row id."""
+        extract = resp.extract
+        body = dump_json(resp, exclude={"debug_steps"})
+        row = (
+            _utc_now(),
+            sha256,
+            filename,
+            extract.employee.full_name,
+            employee_key(extract.employee.full_name),
+            extract.leave.leave_type,
+            extract.leave.start_date,
+            extract.leave.end_date,
+            extract.leave.days_count,
+            resp.decision.status,
+            int(resp.needs_rewrite),
+            body,
+        )
+        issues = {issue.code: issue.severity for issue in resp.issues}
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                old = cur.execute("SELECT id FROM results WHERE sha256 = ?", (sha256,)).fetchone()
+                if old is not None:
+                    # A new id keeps "newest first" pages in processing order.
+                    cur.execute("DELETE FROM result_issues WHERE result_id = ?", (old[0],))
+                    cur.execute("DELETE FROM results WHERE id = ?", (old[0],))
+                cur.execute(
+                    "INSERT INTO results (created_at, sha256, filename, employee_name, employee_key, leave_type,"
+                    " start_date, end_date, days_count, status, needs_rewrite, response)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    row,
+                )
+                result_id = int(cur.lastrowid)
+                cur.executemany(
+                    "INSERT INTO result_issues (code, result_id, severity) VALUES (?, ?, ?)",
+                    [(code, result_id, severity) for code, severity in issues.items()],
+                )
+                cur.execute("COMMIT")
+            except BaseException:
+                cur.execute("ROLLBACK")
+                raise
+        return result_id
+
+    def query(
+        self,
+        *,
+        employee: Optional[str] = None,
+        leave_type: Optional[str] = None,
+        status: Optional[str] = None,
+        issue_code: Optional[str] = None,
+        leave_from: Optional[str] = None,
+        leave_to: Optional[str] = None,
+        created_from: Optional[str] = None,
+        created_to: Optional[str] = None,
+        sha256: Optional[str] = None,
+        cursor: Optional[int] = None,
+        limit: int = 50,
+    ) -> Dict[str, Any]:
+        """Newest first, keyset-paginated: pass the returned `next_cursor` back as `cursor`.
+
+        `employee` is a prefix of the normalized ФИО ("иванов" finds "Иванов Иван Иванович");
+        `leave_from`/`leave_to` select leaves overlapping the period; `created_*` filter the
+        processing time (ISO date or datetime, UTC).
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        where: List[str] = []
+        params: List[Any] = []
+        source = "results r"
+        if issue_code:
+            # Walk the (code, result_id) primary key in id order instead of probing every result.
+            source = "result_issues ri JOIN results r ON r.id = ri.result_id"
+            where.append("ri.code = ?")
+            params.append(issue_code)
+        key = employee_key(employee)
+        if key:
+            where.append("r.employee_key >= ? AND r.employee_key < ?")
+            params += [key, key + "\U0010ffff"]
+        for column, value in (("leave_type", leave_type), ("status", status), ("sha256", sha256)):
+            if value:
+                where.append(f"r.{column} = ?")
+                params.append(value)
+        if leave_from:
+            where.append("COALESCE(r.end_date, r.start_date) >= ?")
+            params.append(leave_from)
+        if leave_to:
+            where.append("r.start_date <= ?")
+            params.append(leave_to)
+        if created_from:
+            where.append("r.created_at >= ?")
+            params.append(created_from)
+        if created_to:
+            # A bare date includes the whole day.
+            where.append("r.created_at <= ?")
+            params.append(created_to + "T23:59:59Z" if len(created_to) == 10 else created_to)
+        id_column = "ri.result_id" if issue_code else "r.id"
+        if cursor is not None:
+            where.append(f"{id_column} < ?")
+            params.append(int(cursor))
+        sql = (
+            f"SELECT {', '.join('r.' + c for c in _SUMMARY_COLUMNS)} FROM {source}"
+            f"{' WHERE ' + ' AND '.join(where) if where else ''}"
+            f" ORDER BY {id_column} DESC LIMIT ?"
+        )
+        with self._lock:
+            rows = self._conn.execute(sql, [*params, limit + 1]).fetchall()
+            page = rows[:limit]
+            codes = self._issue_codes([row["id"] for row in page])
+        items = []
+        for row in page:
+            item = {column: row[column] for column in _SUMMARY_COLUMNS}
+            item["needs_rewrite"] = bool(item["needs_rewrite"])
+            item["issue_codes"] = codes.get(row["id"], [])
+            items.append(item)
+        next_cursor = page[-1]["id"] if len(rows) > limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+    def _issue_codes(self, ids: Sequence[int]) -> Dict[int, List[str]]:
+        if not ids:
+            return {}
+        codes: Dict[int, List[str]] = {}
+        placeholders = ",".join("?" * len(ids))
+        for result_id, code in self._conn.execute(
+            f"SELECT result_id, code FROM result_issues WHERE result_id IN ({placeholders}) ORDER BY code", list(ids)
+        ):
+            codes.setdefault(result_id, []).append(code)
+        return codes
+
+    def get(self, result_id: int) -> Optional[bytes]:
+        """Stored ApiResponse JSON of one result."""
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM results WHERE id = ?", (int(result_id),)).fetchone()
+        return bytes(row[0]) if row is not None else None
+
+    def leaves_since(self, after_id: int) -> List[Tuple[int, str, Optional[str], str, Optional[str], Optional[str], Optional[int], int]]:
+        """(id, sha256, employee_key, leave_type, start, end, days, needs_rewrite) of rows newer than `after_id`.
+
+        For the leave history: a re-saved document gets a new id, so this also returns replacements
+        written by other processes (gunicorn workers, the batch CLI).
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, sha256, employee_key, leave_type, start_date, end_date, days_count, needs_rewrite FROM results"
+                " WHERE id > ? ORDER BY id",
+                (int(after_id),),
+            ).fetchall()
+        return [tuple(row) for row in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        return {"path": self.path, "results": count}
+
+
+_stores: Dict[str, ResultStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_result_store(path: str) -> Optional[ResultStore]:
+    """The store for RESULT_STORE_PATH (opened once per path); empty path = persistence off."""
+    if not path:
+        return None
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = ResultStore(path)
+        return store
+
+
+def persist_result(path: str, resp: ApiResponse, sha256: str, filename: Optional[str]) -> Optional[int]:
+    """Best effort: a failing store is logged and never fails the extraction itself."""
+    try:
+        store = get_result_store(path)
+        if store is None:
+            return None
+        return store.save(resp, sha256=sha256, filename=filename)
+    except Exception as err:
+        logger.warning("result store: failed to save %s: %s: %s", filename, type(err).__name__, err)
+        return None
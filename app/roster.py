@@ -0,0 +1,318 @@
+from __future__ import annotations
+
+import csv
+import logging
+import math
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .ru_normalize import fold
+from .schemas import Issue, LeaveRequestExtract
+from .settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Accepted when the best score reaches ACCEPT_SCORE and beats the runner-up by AMBIGUITY_MARGIN.
+ACCEPT_SCORE = 0.75
+AMBIGUITY_MARGIN = 0.05
+# Weights of surname, first name and patronymic similarity in the score.
+WEIGHTS = (0.6, 0.25, 0.15)
+# Lowest surname similarity that can still reach ACCEPT_SCORE with the other parts matching.
+MIN_SURNAME_DICE = (ACCEPT_SCORE - WEIGHTS[1] - WEIGHTS[2]) / WEIGHTS[0]
+MAX_CANDIDATES = 64
+MAX_BUCKET = 256
+
+_COLUMNS = {
+    "full_name": ("full_name", "fio", "name", "фио", "сотрудник"),
+    "personnel_number": ("personnel_number", "tab_number", "табельный_номер", "табельный номер", "таб_номер", "таб. №"),
+    "position": ("position", "должность"),
+    "department": ("department", "подразделение", "отдел"),
+}
+_WORD = re.compile(r"[a-zа-я]+(?:-[a-zа-я]+)*")
+
+
+@dataclass(frozen=True)
+class RosterEmployee:
+    full_name: str
+    personnel_number: Optional[str] = None
+    position: Optional[str] = None
+    department: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class NameParts:
+    """Folded name: surname plus first name and patronymic, each a full word, an initial or None."""
+
+    surname: str
+    first: Optional[str] = None
+    patronymic: Optional[str] = None
+
+
+def split_name(raw: Optional[str]) -> Optional[NameParts]:
+    """"Иванов Иван Иванович", "Иванов И.И.", "И. И. Иванов", "ИВАНОВ иван" -> folded parts."""
+    text = fold(raw).replace(".", ". ")
+    words: List[str] = []
+    initials: List[str] = []
+    for token in _WORD.findall(text):
+        (initials if len(token) == 1 else words).append(token)
+    if not words:
+        return None
+    # Full words are in "Фамилия Имя Отчество" order; initials fill what is left after the surname.
+    rest = words[1:3] + initials
+    return NameParts(words[0], rest[0] if rest else None, rest[1] if len(rest) > 1 else None)
+
+
+@lru_cache(maxsize=65536)
+def trigrams(word: str) -> frozenset:
+    padded = f"^{word}$"
+    return frozenset(padded[i : i + 3] for i in range(len(padded) - 2))
+
+
+def _dice(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return 2.0 * len(a & b) / (len(a) + len(b))
+
+
+def _part_score(query: Optional[str], candidate: Optional[str]) -> float:
+    """Initial vs word compares first letters; two words compare trigrams; a missing part is neutral."""
+    if not query or not candidate:
+        return 0.5
+    if len(query) == 1 or len(candidate) == 1:
+        return 1.0 if query[0] == candidate[0] else 0.0
+    return 1.0 if query == candidate else _dice(trigrams(query), trigrams(candidate))
+
+
+@dataclass
+class RosterMatch:
+    employee: Optional[RosterEmployee]
+    score: float
+    ambiguous: bool = False
+    by: str = "name"
+    candidates: List[Tuple[RosterEmployee, float]] = field(default_factory=list)
+
+    @property
+    def accepted(self) -> bool:
+        return self.employee is not None and not self.ambiguous and self.score >= ACCEPT_SCORE
+
+
+class Roster:
+    """Employee directory with a surname trigram index.
+
+    Candidates come from the rarest trigrams of the query surname (posting lists as
+    numpy arrays) plus the exact (surname, first initial) bucket; only those are scored
+    on surname, first name and patronymic, so a lookup stays well under a millisecond
+    on 100k employees. Matching folds case and
+    ё/е, accepts initials and tolerates OCR typos and case endings ("Иванова" ~ "Иванов").
+    """
+
+    def __init__(self, employees: Iterable[RosterEmployee]):
+        self.employees: List[RosterEmployee] = []
+        self._parts: List[NameParts] = []
+        self._surname_trigrams: List[frozenset] = []
+        self._by_number: Dict[str, int] = {}
+        # (surname, first initial) -> ids: common surnames ("Иванов") have only common trigrams.
+        self._buckets: Dict[Tuple[str, str], List[int]] = {}
+        self._exact: Dict[NameParts, List[int]] = {}
+        postings: Dict[str, List[int]] = {}
+        for employee in employees:
+            parts = split_name(employee.full_name)
+            if parts is None:
+                continue
+            i = len(self.employees)
+            self.employees.append(employee)
+            self._parts.append(parts)
+            grams = trigrams(parts.surname)
+            self._surname_trigrams.append(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(i)
+            self._buckets.setdefault((parts.surname, (parts.first or "")[:1]), []).append(i)
+            self._exact.setdefault(parts, []).append(i)
+            if employee.personnel_number:
+                self._by_number[employee.personnel_number.strip()] = i
+        self._postings = {gram: np.asarray(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+    def __len__(self) -> int:
+        return len(self.employees)
+
+    def _candidates(self, query: NameParts) -> List[int]:
+        exact = self._buckets.get((query.surname, (query.first or "")[:1]), [])[:MAX_BUCKET]
+        # Prefix filter: a surname with Dice >= MIN_SURNAME_DICE shares at least `need` of the query's
+        # trigrams, so it is in one of the n - need + 1 rarest posting lists (an unknown trigram is the rarest).
+        grams = trigrams(query.surname)
+        need = math.ceil(MIN_SURNAME_DICE * len(grams) / (2 - MIN_SURNAME_DICE))
+        ordered = sorted(grams, key=lambda g: len(self._postings.get(g, ())))
+        prefix = max(1, len(grams) - need + 1)
+        lists = [self._postings[g] for g in ordered[:prefix] if g in self._postings]
+        if not lists:
+            return exact
+        ids, shared = np.unique(np.concatenate(lists), return_counts=True)
+        if len(ids) > MAX_CANDIDATES:
+            # Too many: keep those sharing the most trigrams with the query (posting lists are sorted).
+            for gram in ordered[prefix:]:
+                postings = self._postings[gram]
+                pos = np.minimum(np.searchsorted(postings, ids), len(postings) - 1)
+                shared += postings[pos] == ids
+            ids = ids[np.argsort(-shared, kind="stable")[:MAX_CANDIDATES]]
+        return list(dict.fromkeys([*exact, *ids.tolist()]))
+
+    def match(self, full_name: Optional[str], personnel_number: Optional[str] = None) -> RosterMatch:
+        if personnel_number and personnel_number.strip() in self._by_number:
+            return RosterMatch(self.employees[self._by_number[personnel_number.strip()]], 1.0, by="personnel_number")
+        query = split_name(full_name)
+        if query is None:
+            return RosterMatch(None, 0.0)
+        exact = self._exact.get(query) if query.patronymic and len(query.patronymic) > 1 else None
+        if exact:
+            # Full ФИО spelled exactly as in the roster: no scoring needed.
+            found = [self.employees[i] for i in exact[:3]]
+            return RosterMatch(found[0], 1.0, ambiguous=len(exact) > 1, candidates=[(e, 1.0) for e in found])
+        query_grams = trigrams(query.surname)
+        scored: List[Tuple[float, int]] = []
+        # Below this the candidate can neither be accepted nor make the best one ambiguous.
+        min_surname = MIN_SURNAME_DICE - AMBIGUITY_MARGIN / WEIGHTS[0]
+        for i in self._candidates(query):
+            parts = self._parts[i]
+            surname = 1.0 if parts.surname == query.surname else _dice(query_grams, self._surname_trigrams[i])
+            if surname < min_surname:
+                continue
+            score = (
+                WEIGHTS[0] * surname
+                + WEIGHTS[1] * _part_score(query.first, parts.first)
+                + WEIGHTS[2] * _part_score(query.patronymic, parts.patronymic)
+            )
+            scored.append((score, i))
+        if not scored:
+            return RosterMatch(None, 0.0)
+        scored.sort(key=lambda item: -item[0])
+        best_score, best = scored[0]
+        runner_up = scored[1][0] if len(scored) > 1 else 0.0
+        return RosterMatch(
+            self.employees[best],
+            round(best_score, 3),
+            ambiguous=best_score - runner_up < AMBIGUITY_MARGIN,
+            candidates=[(self.employees[i], round(s, 3)) for s, i in scored[:3]],
+        )
+
+    def enrich(self, extract: LeaveRequestExtract) -> Tuple[LeaveRequestExtract, RosterMatch, List[str]]:
+        """Fill missing employee fields from an accepted match; returns (extract, match, filled field paths)."""
+        employee = extract.employee
+        match = self.match(employee.full_name, employee.personnel_number)
+        if not match.accepted:
+            return extract, match, []
+        update = {
+            name: getattr(match.employee, name)
+            for name in ("personnel_number", "position", "department")
+            if not (getattr(employee, name) or "").strip() and getattr(match.employee, name)
+        }
+        if not (employee.full_name or "").strip():
+            update["full_name"] = match.employee.full_name
+        if not update:
+            return extract, match, []
+        enriched = extract.model_copy(update={"employee": employee.model_copy(update=update)})
+        return enriched, match, [f"employee.{name}" for name in update]
+
+    @classmethod
+    def from_csv(cls, path: str) -> "Roster":
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            sample = f.read(4096)
+            f.seek(0)
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+            except csv.Error:
+                dialect = csv.excel
+            reader = csv.DictReader(f, dialect=dialect)
+            columns = _resolve_columns(reader.fieldnames or ())
+            if "full_name" not in columns:
+                raise ValueError(f"roster {path}: no full name column (one of {', '.join(_COLUMNS['full_name'])})")
+            employees = [
+                RosterEmployee(**{name: (row.get(column) or "").strip() or None for name, column in columns.items()})
+                for row in reader
+                if (row.get(columns["full_name"]) or "").strip()
+            ]
+        return cls(employees)
+
+
+def _resolve_columns(fieldnames: Sequence[str]) -> Dict[str, str]:
+    by_folded = {fold(name): name for name in fieldnames if name}
+    out: Dict[str, str] = {}
+    for name, aliases in _COLUMNS.items():
+        for alias in aliases:
+            if alias in by_folded:
+                out[name] = by_folded[alias]
+                break
+    return out
+
+
+_rosters: Dict[str, Tuple[float, Roster]] = {}
+_rosters_lock = threading.Lock()
+
+
+def get_roster(path: str) -> Optional[Roster]:
+    """Roster from EMPLOYEE_ROSTER_PATH; re-read when the file changes. Empty path = no roster."""
+    if not path:
+        return None
+    mtime = os.path.getmtime(path)
+    with _rosters_lock:
+        cached = _rosters.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+    roster = Roster.from_csv(path)
+    logger.info("roster: loaded %d employees from %s", len(roster), path)
+    with _rosters_lock:
+        _rosters[path] = (mtime, roster)
+    return roster
+
+
+def current_roster() -> Optional[Roster]:
+    return get_roster(get_settings().EMPLOYEE_ROSTER_PATH)
+
+
+def roster_issue(match: RosterMatch, filled: Sequence[str]) -> Issue:
+    """The match outcome as an issue: info when accepted, warn when the employee is not found or ambiguous."""
+    details: Dict[str, object] = {"confidence": match.score, "matched_by": match.by}
+    if match.accepted:
+        details.update(matched_name=match.employee.full_name, filled=list(filled))
+        message = f"Сотрудник найден в справочнике: {match.employee.full_name} (уверенность {match.score:.2f})."
+        if filled:
+            message += f" Дополнены поля: {', '.join(filled)}."
+        return Issue(
+            severity="info",
+            domain="extraction",
+            category="document",
+            code="roster_match",
+            field="employee.full_name",
+            message=message,
+            source="roster",
+            details=details,
+        )
+    if match.ambiguous and match.employee is not None:
+        details["candidates"] = [{"full_name": e.full_name, "personnel_number": e.personnel_number, "score": s} for e, s in match.candidates]
+        return Issue(
+            severity="warn",
+            domain="extraction",
+            category="document",
+            code="roster_ambiguous",
+            field="employee.full_name",
+            message="ФИО сотрудника подходит к нескольким записям справочника.",
+            source="roster",
+            hint="Уточните ФИО или табельный номер в заявлении.",
+            details=details,
+        )
+    return Issue(
+        severity="warn",
+        domain="extraction",
+        category="document",
+        code="roster_not_found",
+        field="employee.full_name",
+        message="Сотрудник не найден в справочнике.",
+        source="roster",
+        hint="Проверьте распознанное ФИО сотрудника.",
+        details=details,
+    )
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import re
+from collections import deque
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+
+def fold(text: Optional[str]) -> str:
+    """Case and ё/е folding plus whitespace collapsing, the canonical form for all matching."""
+    if not text:
+        return ""
+    return " ".join(text.lower().replace("ё", "е").split())
+
+
+def _folding_regex(pattern: str) -> str:
+    """Regex that matches `pattern` in unfolded text: any case, ё or е, any whitespace run."""
+    return r"\s+".join(re.escape(word).replace("е", "[её]") for word in pattern.split(" "))
+
+
+class MultiPatternMatcher:
+    """Multi-pattern matcher built once per pattern set.
+
+    `find_all` walks an Aho-Corasick automaton over folded text and reports every
+    (possibly overlapping) pattern in one pass. `contains_any` only needs the first
+    hit, so it uses an equivalent case/ё-insensitive regex alternation that runs in C
+    directly on the raw text without building a folded copy.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: Tuple[str, ...] = tuple(dict.fromkeys(fold(p) for p in patterns if fold(p)))
+        self._any_re = re.compile("|".join(_folding_regex(p) for p in self.patterns) or r"(?!)", re.IGNORECASE)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[FrozenSet[str]] = [frozenset()]
+
+        for pattern in self.patterns:
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(frozenset())
+                node = nxt
+            self._out[node] = self._out[node] | {pattern}
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] | self._out[self._fail[nxt]]
+
+    def _walk(self, text: str):
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                yield out[node]
+
+    def find_all(self, folded_text: str) -> FrozenSet[str]:
+        found: set = set()
+        for hits in self._walk(folded_text):
+            found |= hits
+        return frozenset(found)
+
+    def contains_any(self, text: str) -> bool:
+        return self._any_re.search(text or "") is not None
+
+
+LEAVE_TYPES: Tuple[str, ...] = ("annual_paid", "unpaid", "study", "maternity", "childcare", "other", "unknown")
+
+_LEAVE_TYPE_ALIASES: Dict[str, str] = {
+    fold(alias): canonical
+    for alias, canonical in (
+        ("ежегодный оплачиваемый отпуск", "annual_paid"),
+        ("ежегодный оплачиваемый", "annual_paid"),
+        ("оплачиваемый отпуск", "annual_paid"),
+        ("без сохранения", "unpaid"),
+        ("без сохранения заработной платы", "unpaid"),
+        ("учебный", "study"),
+        ("беременности и родам", "maternity"),
+        ("по уходу за ребенком", "childcare"),
+    )
+}
+_LEAVE_TYPE_ALIASES.update({t: t for t in LEAVE_TYPES})
+
+# Checked in order; every group must have at least one stem present.
+_LEAVE_TYPE_STEMS: Tuple[Tuple[str, Tuple[Tuple[str, ...], ...]], ...] = (
+    ("annual_paid", (("оплач",), ("отпуск",))),
+    ("unpaid", (("без сохран",),)),
+    ("study", (("учеб",),)),
+    ("maternity", (("беремен", "родам"),)),
+    ("childcare", (("уход",), ("ребен",))),
+)
+_LEAVE_TYPE_MATCHER = MultiPatternMatcher(stem for _, groups in _LEAVE_TYPE_STEMS for group in groups for stem in group)
+
+
+@lru_cache(maxsize=2048)
+def normalize_leave_type(raw: Optional[str]) -> str:
+    """Map free-form leave type text (RU/canonical) to a LeaveType value."""
+    value = fold(raw)
+    if not value:
+        return "unknown"
+    alias = _LEAVE_TYPE_ALIASES.get(value)
+    if alias:
+        return alias
+    stems = _LEAVE_TYPE_MATCHER.find_all(value)
+    for canonical, groups in _LEAVE_TYPE_STEMS:
+        if all(any(stem in stems for stem in group) for group in groups):
+            return canonical
+    return "unknown"
+
+
+UNPAID_REASON_MARKERS: Tuple[str, ...] = ("по семейным обстоятельствам", "по состоянию здоровья", "по уходу", "по причине")
+HUMAN_CHECK_NOTE_MARKERS: Tuple[str, ...] = ("возможно искажение", "требует уточнения")
+
+_UNPAID_REASON_MATCHER = MultiPatternMatcher(UNPAID_REASON_MARKERS)
+_HUMAN_CHECK_MATCHER = MultiPatternMatcher(HUMAN_CHECK_NOTE_MARKERS)
+
+
+# Not cached, unlike normalize_leave_type: the inputs are whole document texts, unique and personal data.
+def has_unpaid_reason_marker(text: Optional[str]) -> bool:
+    return _UNPAID_REASON_MATCHER.contains_any(text or "")
+
+
+def has_human_check_marker(text: Optional[str]) -> bool:
+    return _HUMAN_CHECK_MATCHER.contains_any(text or "")
@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .ru_normalize import normalize_leave_type
+from .schemas import LeaveRequestExtract
+
+# Without these the extract fails validation or the TK RF checks: the LLM pass is still needed.
+REQUIRED_FIELDS: Tuple[str, ...] = (
+    "employee.full_name",
+    "request_date",
+    "leave.leave_type",
+    "leave.start_date",
+    "leave.end_date",
+    "leave.days_count",
+)
+# Read verbatim from the text layer: these win over the model's reading of the image.
+EXACT_FIELDS: Tuple[str, ...] = ("request_date", "leave.leave_type", "leave.start_date", "leave.end_date", "leave.days_count")
+# An application page has the request sentence; anything shorter is a scan without a real text layer.
+_MIN_TEXT_CHARS = 40
+_MAX_TEXT_PAGES = 20
+
+# Month stems of the genitive forms; "ма" (мая) is a prefix of "март", so it is tried last.
+_MONTH_STEMS: Tuple[Tuple[str, int], ...] = (
+    ("январ", 1), ("феврал", 2), ("март", 3), ("апрел", 4), ("июн", 6), ("июл", 7), ("август", 8),
+    ("сентябр", 9), ("октябр", 10), ("ноябр", 11), ("декабр", 12), ("ма", 5),
+)
+_MONTH_WORD = r"(?:января|февраля|марта|апреля|мая|июня|июля|августа|сентября|октября|ноября|декабря)"
+# "01.03.2026", "1/3/26", "2026-03-01", "«1» марта 2026 г.", "1 марта 2026 года".
+_DATE = (
+    r"(?:(?P<d1>\d{1,2})[./-](?P<m1>\d{1,2})[./-](?P<y1>\d{4}|\d{2})(?!\d)"
+    r"|(?P<y2>\d{4})-(?P<m2>\d{2})-(?P<d2>\d{2})"
+    r"|[«\"]?(?P<d3>\d{1,2})[»\"]?\s+(?P<m3>" + _MONTH_WORD + r")\s+(?P<y3>\d{4})(?:\s*(?:г\.|года|г(?![а-яё])))?)"
+)
+_DATE_RE = re.compile(_DATE, re.IGNORECASE)
+_PERIOD_RE = re.compile(
+    r"\bс\s+(?P<start>" + _DATE.replace("?P<", "?P<s_") + r")\s+(?:по|до)\s+(?P<end>" + _DATE.replace("?P<", "?P<e_") + r")",
+    re.IGNORECASE,
+)
+_DAYS_RE = re.compile(
+    r"(?:\bна|продолжительностью|в\s+количестве|сроком\s+на)\s+(?P<days>\d{1,3})\s*(?:\([^)]{0,40}\)\s*)?"
+    r"(?P<calendar>календарн\w*\s+)?(?:дн(?:ей|я|ь)|день)",
+    re.IGNORECASE,
+)
+_REQUEST_RE = re.compile(r"\bпрошу\s+(?P<text>.{0,200}?)(?=\bс\s+[«\"]?\d|\bна\s+\d|$)", re.IGNORECASE | re.DOTALL)
+_DATE_LABEL_RE = re.compile(r"\bдата(?:\s+заявления)?\s*[:\-]?\s*(?P<date>" + _DATE.replace("?P<", "?P<l_") + ")", re.IGNORECASE)
+_EMPLOYER_RE = re.compile(r"\b(?:ООО|АО|ПАО|ЗАО|ОАО|ФГУП|МУП|ГУП|НКО|АНО)\s+[«\"]?[А-ЯЁA-Z][^»\"\n,]{1,60}[»\"]?")
+_FROM_RE = re.compile(r"^\s*от\s+(?P<text>.+)$", re.IGNORECASE | re.MULTILINE)
+_WORD = r"[А-ЯЁ][а-яё]+(?:-[А-ЯЁ][а-яё]+)?"
+_FULL_NAME_RE = re.compile(rf"(?P<name>{_WORD}\s+{_WORD}\s+{_WORD})")
+_INITIALS_NAME_RE = re.compile(rf"(?P<name>{_WORD}\s+[А-ЯЁ]\.\s*[А-ЯЁ]\.?|[А-ЯЁ]\.\s*[А-ЯЁ]\.\s*{_WORD})")
+# "Подпись ____ /Иванов И.И./": the transcript of the signature is in the nominative.
+_SIGNED_NAME_RE = re.compile(rf"/\s*(?P<name>{_WORD}\s+[А-ЯЁ]\.\s*[А-ЯЁ]\.?|{_WORD}\s+{_WORD}\s+{_WORD})\s*/")
+
+# Genitive -> nominative by the patronymic, which tells the gender unambiguously ("Ивановой Анны Сергеевны").
+_GENITIVE_MALE = (("ича", "ич"),)
+_GENITIVE_FEMALE = (("овны", "овна"), ("евны", "евна"), ("ичны", "ична"))
+_VOWELS = "аеёиоуыэюя"
+# After these the genitive of an -а name ends in -и, not -ы: "Ольги", "Луки".
+_HUSHING_AND_VELAR = "гкхжшчщ"
+# Genitive -> (nominative, male) where the stem loses a vowel: "Павла" -> "Павел".
+_FLEETING_VOWEL_NAMES = {"павла": ("Павел", True), "льва": ("Лев", True), "петра": ("Пётр", True), "любови": ("Любовь", False)}
+
+
+@dataclass
+class RuleExtraction:
+    """Fields read from the text layer: the extract plus a confidence 0..1 per filled field path."""
+
+    extract: LeaveRequestExtract
+    confidence: Dict[str, float] = field(default_factory=dict)
+    text_chars: int = 0
+    page: Optional[int] = None
+    ms: float = 0.0
+
+    @property
+    def missing(self) -> List[str]:
+        return [path for path in REQUIRED_FIELDS if path not in self.confidence]
+
+    def complete(self, min_confidence: float) -> bool:
+        """All required fields found, none below `min_confidence`: the LLM pass adds nothing."""
+        return not self.missing and min(self.confidence[p] for p in REQUIRED_FIELDS) >= min_confidence
+
+    def confident_fields(self, min_confidence: float) -> Dict[str, Any]:
+        return {path: get_field(self.extract, path) for path, c in self.confidence.items() if c >= min_confidence}
+
+
+def get_field(extract: LeaveRequestExtract, path: str) -> Any:
+    node: Any = extract
+    for part in path.split("."):
+        node = getattr(node, part)
+    return node
+
+
+def set_field(extract: LeaveRequestExtract, path: str, value: Any) -> None:
+    *parents, last = path.split(".")
+    node: Any = extract
+    for part in parents:
+        node = getattr(node, part)
+    setattr(node, last, value)
+
+
+def apply_rule_fields(extract: LeaveRequestExtract, found: RuleExtraction, min_confidence: float) -> List[str]:
+    """Merge the confident text-layer fields into a model extract in place; returns the paths it changed.
+
+    Dates, the period length and the leave type replace the model's values; names only fill gaps
+    (the signature transcript "Иванов И.И." is shorter than what the model may have read).
+    """
+    changed: List[str] = []
+    for path, value in found.confident_fields(min_confidence).items():
+        current = get_field(extract, path)
+        if current == value or (path not in EXACT_FIELDS and current not in (None, "", "unknown")):
+            continue
+        set_field(extract, path, value)
+        changed.append(path)
+    if changed:
+        extract.quality.missing_fields = [f for f in extract.quality.missing_fields if f not in changed]
+    return changed
+
+
+def _month(word: str) -> Optional[int]:
+    word = word.lower()
+    for stem, month in _MONTH_STEMS:
+        if word.startswith(stem):
+            return month
+    return None
+
+
+def _date_from_groups(groups: Dict[str, Optional[str]], prefix: str = "") -> Optional[str]:
+    for n in ("1", "2", "3"):
+        day = groups.get(f"{prefix}d{n}")
+        if day is None:
+            continue
+        month_raw, year_raw = groups[f"{prefix}m{n}"], groups[f"{prefix}y{n}"]
+        month = int(month_raw) if month_raw.isdigit() else _month(month_raw)
+        year = int(year_raw) + (2000 if len(year_raw) == 2 else 0)
+        try:
+            return date(year, month or 0, int(day)).isoformat()
+        except ValueError:
+            return None
+    return None
+
+
+def parse_ru_date(text: str) -> Optional[str]:
+    """First date in `text` ("1 марта 2026 г.", "01.03.2026", "2026-03-01") as YYYY-MM-DD; None if there is none."""
+    m = _DATE_RE.search(text or "")
+    return _date_from_groups(m.groupdict()) if m else None
+
+
+def _surname_nominative(word: str, male: bool) -> Optional[str]:
+    if male:
+        if word.endswith(("ова", "ева", "ёва", "ина", "ына")):
+            return word[:-1]
+        if word.endswith(("ского", "цкого")):
+            return word[:-3] + "ий"
+    else:
+        if word.endswith(("овой", "евой", "ёвой", "иной", "ыной")):
+            return word[:-2] + "а"
+        if word.endswith(("ской", "цкой")):
+            return word[:-2] + "ая"
+    # Indeclinable or ambiguous ("Шевченко", "Белых", "Толстого"): left to the LLM.
+    return None
+
+
+def _first_name_nominative(word: str, male: bool) -> Optional[str]:
+    fleeting = _FLEETING_VOWEL_NAMES.get(word.lower())
+    if fleeting is not None and fleeting[1] == male:
+        return fleeting[0]
+    before = word[-2:-1].lower()
+    if word.endswith("ы"):  # Никиты, Анны
+        return word[:-1] + "а"
+    if word.endswith("и"):  # Луки, Ольги; Ильи, Марии
+        return word[:-1] + ("а" if before in _HUSHING_AND_VELAR else "я")
+    if male and word.endswith("а") and before not in _VOWELS:  # Ивана
+        return word[:-1]
+    if male and word.endswith("я"):  # Андрея, Игоря
+        return word[:-1] + ("й" if before in _VOWELS else "ь")
+    return None
+
+
+def _convert_hyphenated(word: str, convert: Callable[[str, bool], Optional[str]], male: bool) -> Optional[str]:
+    parts = [convert(part, male) for part in word.split("-")]
+    return None if None in parts else "-".join(parts)
+
+
+def _nominative(name: str) -> Tuple[str, float]:
+    """Nominative of a full name in the genitive, the gender told by the patronymic; (name, confidence).
+
+    0.85 when every part was converted, 0.75 for a name already in the nominative, 0.6 (as is)
+    for initials or a genitive part with an ending the rules do not know.
+    """
+    parts = name.split()
+    if len(parts) != 3:
+        return name, 0.6
+    surname, first, patronymic = parts
+    for endings, male in ((_GENITIVE_MALE, True), (_GENITIVE_FEMALE, False)):
+        for suffix, nominative in endings:
+            if not patronymic.endswith(suffix):
+                continue
+            surname_nom = _convert_hyphenated(surname, _surname_nominative, male)
+            first_nom = _convert_hyphenated(first, _first_name_nominative, male)
+            if surname_nom is None or first_nom is None:
+                return name, 0.6
+            return f"{surname_nom} {first_nom} {patronymic[: -len(suffix)] + nominative}", 0.85
+    return name, 0.75
+
+
+def _employee(text: str, out: LeaveRequestExtract, confidence: Dict[str, float]) -> None:
+    signed = _SIGNED_NAME_RE.search(text)
+    header = _FROM_RE.search(text)
+    if header:
+        line = header.group("text").strip()
+        named = _FULL_NAME_RE.search(line) or _INITIALS_NAME_RE.search(line)
+        if named:
+            # The position before the name is in the genitive too ("от инженера ..."): left to the LLM / roster.
+            out.employee.full_name, confidence["employee.full_name"] = _nominative(named.group("name"))
+            if confidence["employee.full_name"] >= 0.75:
+                return
+            # "Иванова И.И." may be a genitive or a nominative surname, and an unknown ending stayed
+            # in the genitive: prefer the signature transcript, below the threshold without one.
+    if signed:
+        out.employee.full_name = " ".join(signed.group("name").split())
+        confidence["employee.full_name"] = 0.8
+
+
+def _leave_type(text: str) -> Tuple[str, float]:
+    m = _REQUEST_RE.search(text)
+    fragment = m.group("text") if m else text
+    leave_type = normalize_leave_type(fragment)
+    if leave_type != "unknown":
+        return leave_type, 0.9 if m else 0.7
+    return "unknown", 0.0
+
+
+def _days_agree(start: str, end: str, days: int) -> bool:
+    from .production_calendar import current_calendar
+
+    span = (date.fromisoformat(end) - date.fromisoformat(start)).days + 1
+    if span == days:
+        return True
+    try:
+        # Public holidays inside annual leave are not counted (ТК РФ ст. 120).
+        return span - current_calendar().holidays_between(date.fromisoformat(start), date.fromisoformat(end)) == days
+    except Exception:
+        return False
+
+
+def parse_application_text(text: str) -> RuleExtraction:
+    """Compiled-pattern pass over the text of a template application; no network, a few ms."""
+    started = time.perf_counter()
+    out = LeaveRequestExtract()
+    confidence: Dict[str, float] = {}
+    flat = " ".join(text.split())
+
+    period = _PERIOD_RE.search(flat)
+    if period:
+        groups = period.groupdict()
+        start, end = _date_from_groups(groups, "s_"), _date_from_groups(groups, "e_")
+        if start and end and start <= end:
+            out.leave.start_date, out.leave.end_date = start, end
+            confidence["leave.start_date"] = confidence["leave.end_date"] = 0.95
+
+    days = _DAYS_RE.search(flat)
+    if days:
+        out.leave.days_count = int(days.group("days"))
+        confidence["leave.days_count"] = 0.95 if days.group("calendar") else 0.85
+
+    leave_type, type_confidence = _leave_type(flat)
+    if type_confidence:
+        out.leave.leave_type = leave_type
+        confidence["leave.leave_type"] = type_confidence
+
+    labelled = _DATE_LABEL_RE.search(flat)
+    if labelled:
+        out.request_date = _date_from_groups(labelled.groupdict(), "l_")
+        if out.request_date:
+            confidence["request_date"] = 0.95
+    if out.request_date is None:
+        # Template footers put the application date last, after the requested period.
+        after = flat[period.end() :] if period else flat
+        dates = [d for d in (_date_from_groups(m.groupdict()) for m in _DATE_RE.finditer(after)) if d]
+        if dates:
+            out.request_date = dates[-1]
+            confidence["request_date"] = 0.7
+
+    employer = _EMPLOYER_RE.search(text)
+    if employer:
+        out.employer_name = " ".join(employer.group(0).split())
+        confidence["employer_name"] = 0.8
+
+    _employee(text, out, confidence)
+
+    # The period and its length agree: each confirms the other.
+    if {"leave.start_date", "leave.end_date", "leave.days_count"} <= confidence.keys():
+        if _days_agree(out.leave.start_date, out.leave.end_date, out.leave.days_count):
+            for path in ("leave.start_date", "leave.end_date", "leave.days_count"):
+                confidence[path] = max(confidence[path], 0.98)
+        else:
+            confidence["leave.days_count"] = min(confidence["leave.days_count"], 0.6)
+
+    out.raw_text = flat[:300] or None
+    missing = [path for path in REQUIRED_FIELDS if path not in confidence]
+    out.quality.missing_fields = missing
+    out.quality.overall_confidence = round(min([confidence.get(p, 0.0) for p in REQUIRED_FIELDS]), 2)
+    out.quality.notes.append("rules: " + ", ".join(f"{p}={c:.2f}" for p, c in sorted(confidence.items())))
+    return RuleExtraction(out, confidence, len(text), ms=round((time.perf_counter() - started) * 1000, 2))
+
+
+def application_text(doc) -> Tuple[Optional[int], str]:
+    """(page index, text) of the first page with the request sentence in its text layer; (None, "") for scans."""
+    for index in range(min(doc.page_count, _MAX_TEXT_PAGES)):
+        try:
+            text = doc.load_page(index).get_text("text") or ""
+        except Exception:
+            continue
+        low = text.lower()
+        if len(text.strip()) >= _MIN_TEXT_CHARS and "прош" in low and "отпуск" in low:
+            return index, text
+    return None, ""
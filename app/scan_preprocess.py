@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, Iterable, Tuple
+
+import numpy as np
+
+STAGES: Tuple[str, ...] = ("crop", "normalize", "deskew", "despeckle")
+
+_INK_THRESHOLD = 170
+_CROP_MARGIN_PX = 16
+_CROP_MIN_INK_PER_LINE = 2
+_DESKEW_MAX_DEG = 5.0
+_DESKEW_STEP_DEG = 0.25
+_DESKEW_MIN_DEG = 0.3
+_DESKEW_SAMPLE = 20000
+
+
+def _luma(img: np.ndarray) -> np.ndarray:
+    if img.ndim == 2:
+        return img
+    return img[..., :3].mean(axis=2).astype(np.uint8)
+
+
+def _ink_mask(img: np.ndarray, threshold: int = _INK_THRESHOLD) -> np.ndarray:
+    return _luma(img) < threshold
+
+
+def auto_crop(img: np.ndarray, margin: int = _CROP_MARGIN_PX) -> np.ndarray:
+    """Crop to content bounds; rows/columns with only a couple of dark specks count as margin."""
+    mask = _ink_mask(img)
+    rows = np.flatnonzero(mask.sum(axis=1) >= _CROP_MIN_INK_PER_LINE)
+    cols = np.flatnonzero(mask.sum(axis=0) >= _CROP_MIN_INK_PER_LINE)
+    if rows.size == 0 or cols.size == 0:
+        return img
+    h, w = mask.shape
+    top = max(0, int(rows[0]) - margin)
+    bottom = min(h, int(rows[-1]) + margin + 1)
+    left = max(0, int(cols[0]) - margin)
+    right = min(w, int(cols[-1]) + margin + 1)
+    return img[top:bottom, left:right]
+
+
+def normalize_contrast(img: np.ndarray) -> np.ndarray:
+    """Stretch so the paper background becomes white and the darkest ink becomes black."""
+    luma = _luma(img)
+    ink_level, background = np.percentile(luma, (1, 90))
+    if background - ink_level < 16:
+        return img
+    scale = 255.0 / float(background - ink_level)
+    out = (img.astype(np.float32) - float(ink_level)) * scale
+    return np.clip(out, 0, 255).astype(np.uint8)
+
+
+def estimate_skew_deg(img: np.ndarray) -> float:
+    """Projection-profile skew estimate: the angle whose row histogram of ink is sharpest."""
+    ys, xs = np.nonzero(_ink_mask(img))
+    if ys.size < 200:
+        return 0.0
+    if ys.size > _DESKEW_SAMPLE:
+        pick = np.linspace(0, ys.size - 1, _DESKEW_SAMPLE).astype(np.intp)
+        ys, xs = ys[pick], xs[pick]
+    ys = ys.astype(np.float32)
+    xs = xs.astype(np.float32)
+    xs -= xs.mean()
+
+    angles = np.arange(-_DESKEW_MAX_DEG, _DESKEW_MAX_DEG + _DESKEW_STEP_DEG / 2, _DESKEW_STEP_DEG)
+    best_angle, best_score = 0.0, -1.0
+    for angle in angles:
+        shifted = ys - xs * np.float32(np.tan(np.deg2rad(angle)))
+        shifted -= shifted.min()
+        hist = np.bincount(shifted.astype(np.intp))
+        score = float(np.square(hist.astype(np.float64)).sum())
+        if score > best_score or (score == best_score and abs(angle) < abs(best_angle)):
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+
+def rotate(img: np.ndarray, angle_deg: float, fill: int = 255) -> np.ndarray:
+    """Nearest-neighbour rotation around the centre, keeping the original canvas size."""
+    h, w = img.shape[:2]
+    theta = np.deg2rad(angle_deg)
+    cos_t, sin_t = np.float32(np.cos(theta)), np.float32(np.sin(theta))
+    cy, cx = (h - 1) / 2.0, (w - 1) / 2.0
+    yy, xx = np.mgrid[0:h, 0:w].astype(np.float32)
+    yy -= cy
+    xx -= cx
+    src_x = np.rint(cos_t * xx - sin_t * yy + cx).astype(np.intp)
+    src_y = np.rint(sin_t * xx + cos_t * yy + cy).astype(np.intp)
+    valid = (src_x >= 0) & (src_x < w) & (src_y >= 0) & (src_y < h)
+    out = np.full_like(img, fill)
+    out[valid] = img[src_y[valid], src_x[valid]]
+    return out
+
+
+def deskew(img: np.ndarray) -> Tuple[np.ndarray, float]:
+    angle = estimate_skew_deg(img)
+    if abs(angle) < _DESKEW_MIN_DEG:
+        return img, 0.0
+    return rotate(img, angle), angle
+
+
+def despeckle(img: np.ndarray) -> Tuple[np.ndarray, int]:
+    """Whiten dark pixels that have at most one dark 8-neighbour (scanner dust, toner noise)."""
+    mask = _ink_mask(img)
+    padded = np.pad(mask, 1).astype(np.uint8)
+    h, w = mask.shape
+    neighbours = np.zeros((h, w), dtype=np.uint8)
+    for dy in (0, 1, 2):
+        for dx in (0, 1, 2):
+            if dy == 1 and dx == 1:
+                continue
+            neighbours += padded[dy : dy + h, dx : dx + w]
+    speckles = mask & (neighbours <= 1)
+    removed = int(speckles.sum())
+    if not removed:
+        return img, 0
+    out = img.copy()
+    out[speckles] = 255
+    return out, removed
+
+
+def pixmap_to_array(samples: bytes, width: int, height: int, channels: int) -> np.ndarray:
+    arr = np.frombuffer(samples, dtype=np.uint8)
+    if channels == 1:
+        return arr.reshape(height, width)
+    return arr.reshape(height, width, channels)
+
+
+def preprocess_scan(img: np.ndarray, stages: Iterable[str] = STAGES) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """Run the enabled stages in canonical order and report per-stage timing and pixel savings."""
+    enabled = set(stages)
+    pixels_before = int(img.shape[0] * img.shape[1])
+    stage_ms: Dict[str, float] = {}
+    stats: Dict[str, Any] = {}
+
+    for stage in STAGES:
+        if stage not in enabled:
+            continue
+        started = time.perf_counter()
+        if stage == "crop":
+            img = auto_crop(img)
+        elif stage == "normalize":
+            img = normalize_contrast(img)
+        elif stage == "deskew":
+            img, angle = deskew(img)
+            stats["skew_deg"] = round(angle, 2)
+        elif stage == "despeckle":
+            img, removed = despeckle(img)
+            stats["speckles_removed"] = removed
+        stage_ms[stage] = round((time.perf_counter() - started) * 1000, 2)
+
+    pixels_after = int(img.shape[0] * img.shape[1])
+    stats.update(
+        {
+            "stage_ms": stage_ms,
+            "pixels_before": pixels_before,
+            "pixels_after": pixels_after,
+            "pixels_saved": pixels_before - pixels_after,
+        }
+    )
+    return np.ascontiguousarray(img), stats
@@ -3,6 +3,8 @@ from __future__ import annotations
 from pydantic import BaseModel, Field, field_validator
 from typing import Optional, List, Literal
 
+from .ru_normalize import normalize_leave_type
+
 
 LeaveType = Literal[
     "annual_paid",   # ежегодный оплачиваемый
@@ -42,38 +44,7 @@ class LeaveInfo(BaseModel):
     def _normalize_leave_type(cls, value):
         if value is None:
             return "unknown"
-        v = str(value).strip().lower()
-        aliases = {
-            "annual_paid": "annual_paid",
-            "ежегодный оплачиваемый отпуск": "annual_paid",
-            "ежегодный оплачиваемый": "annual_paid",
-            "оплачиваемый отпуск": "annual_paid",
-            "unpaid": "unpaid",
-            "без сохранения": "unpaid",
-            "без сохранения заработной платы": "unpaid",
-            "study": "study",
-            "учебный": "study",
-            "maternity": "maternity",
-            "беременности и родам": "maternity",
-            "childcare": "childcare",
-            "по уходу за ребенком": "childcare",
-            "по уходу за ребёнком": "childcare",
-            "other": "other",
-            "unknown": "unknown",
-        }
-        if v in aliases:
-            return aliases[v]
-        if "оплач" in v and "отпуск" in v:
-            return "annual_paid"
-        if "без сохран" in v:
-            return "unpaid"
-        if "учеб" in v:
-            return "study"
-        if "беремен" in v or "родам" in v:
-            return "maternity"
-        if "уход" in v and ("ребен" in v or "ребён" in v):
-            return "childcare"
-        return "unknown"
+        return normalize_leave_type(str(value))
 
 
 class Quality(BaseModel):
@@ -149,3 +120,13 @@ class ApiResponse(BaseModel):
     decision: Decision
     trace: Trace
     needs_rewrite: bool = False
+    debug_steps: Optional[List[str]] = Field(None, description="Только при ?debug=1 или DEBUG_STEPS=1")
+
+
+# /api/check is not admission-controlled: one request is bounded by size instead (422 above it).
+MAX_BATCH_CHECK_EXTRACTS = 50_000
+
+
+class BatchCheckRequest(BaseModel):
+    extracts: List[LeaveRequestExtract] = Field(default_factory=list, max_length=MAX_BATCH_CHECK_EXTRACTS)
+
@@ -1,81 +1,357 @@
 from __future__ import annotations
 
+import logging
 import os
-from functools import lru_cache
+import re
+import threading
+from typing import Mapping, Optional, Tuple
 
-from dotenv import load_dotenv
-from pydantic import BaseModel
+from dotenv import dotenv_values
+from pydantic import BaseModel, ConfigDict
+
+from .scan_preprocess import STAGES as PREPROCESS_STAGES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = 'claude-sonnet-4-6'
+ENV_FILE = '.env'
+# Implementations live in app/extract_backends.py.
+EXTRACTION_BACKENDS = ('anthropic', 'mock', 'replay', 'rules')
+DEFAULT_TENANT = 'default'
+_TENANT_RE = re.compile(r'[a-z0-9][a-z0-9_.-]{0,31}')
+
+
+def tenant_name(raw: Optional[str]) -> str:
+    """Admission tenant of a configured or request-supplied name; anything else is the default tenant."""
+    name = (raw or '').strip().lower()
+    return name if _TENANT_RE.fullmatch(name) else DEFAULT_TENANT
 
 
 class Settings(BaseModel):
+    """Immutable config snapshot: parsed, clamped and with derived budgets computed once per (re)load."""
+
+    model_config = ConfigDict(frozen=True)
+
+    GENERATION: int = 0
+
     APP_ENV: str = 'dev'
     LOG_LEVEL: str = 'INFO'
     DEBUG_STEPS: bool = False
+    DEBUG_LOG_SAMPLE_PERCENT: int = 100
+    MOCK_MODE: bool = False
+    EXTRACTION_BACKEND: str = 'anthropic'
+    EXTRACTION_REPLAY_DIR: str = ''
+    EXTRACTION_RECORD_DIR: str = ''
+    RULE_EXTRACTOR: str = 'hybrid'
+    RULE_MIN_CONFIDENCE_PERCENT: int = 80
+    STARTUP_WARMUP: bool = True
 
     ANTHROPIC_API_KEY: str = ''
-    ANTHROPIC_MODEL: str = 'claude-sonnet-4-6'
-    ANTHROPIC_VISION_MODEL: str = 'claude-sonnet-4-6'
-    ANTHROPIC_STRUCTURED_MODEL: str = 'claude-sonnet-4-6'
+    ANTHROPIC_MODEL: str = DEFAULT_MODEL
+    ANTHROPIC_VISION_MODEL: str = DEFAULT_MODEL
+    ANTHROPIC_STRUCTURED_MODEL: str = DEFAULT_MODEL
+    ANTHROPIC_VISION_FALLBACK_MODEL: Optional[str] = None
+    ANTHROPIC_STRUCTURED_FALLBACK_MODEL: Optional[str] = None
     ANTHROPIC_HTTP_TIMEOUT_S: int = 60
-    ANTHROPIC_MAX_RETRIES: int = 0
+    ANTHROPIC_MAX_RETRIES: int = 2
+    ANTHROPIC_DRAFT_MAX_TOKENS: int = 1024
+    ANTHROPIC_MAX_TOKENS: int = 1024
 
     ANTHROPIC_VISION_TIMEOUT_S: int = 90
-    ANTHROPIC_STRUCTURED_PARSE_TIMEOUT_S: int = 15
+    ANTHROPIC_STRUCTURED_PARSE_TIMEOUT_S: int = 30
     ANTHROPIC_STRUCTURED_FALLBACK_TIMEOUT_S: int = 90
+    ANTHROPIC_STRUCTURED_DRAFT_MAX_CHARS: int = 12000
+    ANTHROPIC_VISION_STREAM: bool = True
+    ANTHROPIC_STRUCTURED_STREAM: bool = True
 
     MAX_UPLOAD_MB: int = 15
-    PDF_MAX_PAGES: int = 2
+    PDF_MAX_PAGES: int = 1
+    PDF_PAGE_SELECTION: str = 'smart'
     PDF_TARGET_LONG_EDGE: int = 1568
     PDF_COLOR_MODE: str = 'gray'
+    PDF_ESCALATION: bool = False
+    PDF_FIRST_PASS_LONG_EDGE: int = 1024
+    PDF_ESCALATION_CONFIDENCE_PERCENT: int = 70
+    SIGNATURE_DETECTOR: str = 'check'
+    PDF_PREPROCESS_STAGES: Tuple[str, ...] = ()
     MAX_IMAGE_B64_CHARS: int = 4_000_000
-    ANTHROPIC_STRUCTURED_DRAFT_MAX_CHARS: int = 12000
+
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_INITIAL_LIMIT: int = 4
+    ADMISSION_MIN_LIMIT: int = 1
+    ADMISSION_MAX_LIMIT: int = 8
+    ADMISSION_QUEUE_SIZE: int = 8
+    ADMISSION_MAX_WAIT_S: int = 30
+    ADMISSION_TARGET_LATENCY_S: int = 45
+    ADMISSION_TENANTS: Tuple[Tuple[str, int, int], ...] = ()
+    ADMISSION_TENANT_MAX_IN_FLIGHT: int = 0
+    ADMISSION_INTERACTIVE_RESERVE_PERCENT: int = 25
+    TENANT_HEADER: str = 'X-Tenant'
+    TENANT_API_KEYS: Tuple[Tuple[str, str], ...] = ()
+    SINGLE_FLIGHT_ENABLED: bool = True
+    MEMORY_BUDGET_MB: int = 256
+    MEMORY_BUDGET_MAX_WAIT_S: int = 60
+    RESULT_STORE_PATH: str = ''
+    PRODUCTION_CALENDAR_PATH: str = ''
+    EMPLOYEE_ROSTER_PATH: str = ''
+    COMPLIANCE_RULE_PINS: str = ''
+    BATCH_WORKERS: int = 4
+
+    # Derived: worst case per step with SDK retries, and the SDK timeout that covers all of them.
+    VISION_BUDGET_S: int = 0
+    STRUCTURED_PARSE_BUDGET_S: int = 0
+    STRUCTURED_FALLBACK_BUDGET_S: int = 0
+    SDK_HTTP_TIMEOUT_S: int = 60
 
     @property
     def MAX_PDF_BYTES(self) -> int:
         return int(self.MAX_UPLOAD_MB) * 1024 * 1024
 
+    def summary(self) -> str:
+        raised = (
+            f' (raised from {self.ANTHROPIC_HTTP_TIMEOUT_S}: >= max step worst-case with retries + 5s)'
+            if self.SDK_HTTP_TIMEOUT_S != self.ANTHROPIC_HTTP_TIMEOUT_S
+            else ''
+        )
+        tenants = ','.join(f'{n}={w}/{c}' if c else f'{n}={w}' for n, w, c in self.ADMISSION_TENANTS)
+        return (
+            f'generation={self.GENERATION}, app_env={self.APP_ENV}, mock_mode={self.MOCK_MODE}, '
+            f'extraction_backend={self.EXTRACTION_BACKEND}, extraction_record={self.EXTRACTION_RECORD_DIR or "off"}, '
+            f'rule_extractor={self.RULE_EXTRACTOR}:{self.RULE_MIN_CONFIDENCE_PERCENT}%, '
+            f'vision_model={self.ANTHROPIC_VISION_MODEL}, structured_model={self.ANTHROPIC_STRUCTURED_MODEL}, '
+            f'vision_fallback_model={self.ANTHROPIC_VISION_FALLBACK_MODEL or "-"}, '
+            f'structured_fallback_model={self.ANTHROPIC_STRUCTURED_FALLBACK_MODEL or "-"}, '
+            f'retries={self.ANTHROPIC_MAX_RETRIES}, sdk_http_timeout_s={self.SDK_HTTP_TIMEOUT_S}{raised}, '
+            f'vision_timeout_s={self.ANTHROPIC_VISION_TIMEOUT_S}, '
+            f'structured_parse_timeout_s={self.ANTHROPIC_STRUCTURED_PARSE_TIMEOUT_S}, '
+            f'structured_fallback_timeout_s={self.ANTHROPIC_STRUCTURED_FALLBACK_TIMEOUT_S}, '
+            f'vision_budget_worst_case_s={self.VISION_BUDGET_S}, '
+            f'structured_parse_budget_worst_case_s={self.STRUCTURED_PARSE_BUDGET_S}, '
+            f'structured_fallback_budget_worst_case_s={self.STRUCTURED_FALLBACK_BUDGET_S}, '
+            f'structured_draft_max_chars={self.ANTHROPIC_STRUCTURED_DRAFT_MAX_CHARS}, '
+            f'streams=vision:{int(self.ANTHROPIC_VISION_STREAM)},structured:{int(self.ANTHROPIC_STRUCTURED_STREAM)}, '
+            f'pdf_max_pages={self.PDF_MAX_PAGES}, pdf_page_selection={self.PDF_PAGE_SELECTION}, '
+            f'pdf_preprocess={",".join(self.PDF_PREPROCESS_STAGES) or "-"}, '
+            f'pdf_escalation={f"{self.PDF_FIRST_PASS_LONG_EDGE}px/conf<{self.PDF_ESCALATION_CONFIDENCE_PERCENT}%" if self.PDF_ESCALATION else "off"}, '
+            f'signature_detector={self.SIGNATURE_DETECTOR}, debug_steps={self.DEBUG_STEPS}, '
+            f'debug_log_sample_percent={self.DEBUG_LOG_SAMPLE_PERCENT}, '
+            f'admission={"on" if self.ADMISSION_ENABLED else "off"}:{self.ADMISSION_MIN_LIMIT}..{self.ADMISSION_MAX_LIMIT}'
+            f'/queue={self.ADMISSION_QUEUE_SIZE}/target_s={self.ADMISSION_TARGET_LATENCY_S}'
+            f'/interactive_reserve={self.ADMISSION_INTERACTIVE_RESERVE_PERCENT}%, '
+            f'tenants={tenants or "-"}'
+            f'/max_in_flight={self.ADMISSION_TENANT_MAX_IN_FLIGHT or "-"}/header={self.TENANT_HEADER or "-"}'
+            f'/api_keys={len(self.TENANT_API_KEYS)}, '
+            f'single_flight={int(self.SINGLE_FLIGHT_ENABLED)}, '
+            f'memory_budget_mb={self.MEMORY_BUDGET_MB or "off"}/max_wait_s={self.MEMORY_BUDGET_MAX_WAIT_S}, '
+            f'result_store={self.RESULT_STORE_PATH or "off"}, '
+            f'production_calendar={self.PRODUCTION_CALENDAR_PATH or "bundled"}, '
+            f'employee_roster={self.EMPLOYEE_ROSTER_PATH or "off"}, '
+            f'compliance_rule_pins={self.COMPLIANCE_RULE_PINS or "-"}, batch_workers={self.BATCH_WORKERS}'
+        )
+
+
+def estimate_retry_backoff_s(max_retries: int) -> int:
+    retries = max(0, int(max_retries))
+    # Conservative estimate for SDK backoff budget to avoid premature outer timeout cuts.
+    return retries * 2
+
+
+def worst_case_call_budget_s(per_attempt_timeout_s: int, max_retries: int) -> int:
+    attempts = max(1, int(max_retries) + 1)
+    timeout_per_attempt = max(5, int(per_attempt_timeout_s))
+    return timeout_per_attempt * attempts + estimate_retry_backoff_s(max_retries)
+
+
+class _Env:
+    """Typed reads over one merged mapping; empty or malformed values fall back to the default."""
+
+    def __init__(self, values: Mapping[str, Optional[str]]):
+        self._values = values
+
+    def str(self, name: str, default: str) -> str:
+        v = self._values.get(name)
+        return default if v is None or v.strip() == '' else v.strip()
+
+    def opt(self, name: str) -> Optional[str]:
+        v = self._values.get(name)
+        return v.strip() if v and v.strip() else None
 
-def _env_bool(name: str, default: bool) -> bool:
-    v = os.getenv(name)
-    if v is None:
-        return default
-    return str(v).strip().lower() in {'1', 'true', 'yes', 'on'}
+    def int(self, name: str, default: int, minimum: Optional[int] = None) -> int:
+        v = self._values.get(name)
+        value = default
+        if v is not None and v.strip() != '':
+            try:
+                value = int(v)
+            except ValueError:
+                value = default
+        return value if minimum is None else max(minimum, value)
 
+    def flag(self, name: str, default: bool) -> bool:
+        v = self._values.get(name)
+        if v is None or v.strip() == '':
+            return default
+        return v.strip().lower() in {'1', 'true', 'yes', 'on'}
 
-def _env_int(name: str, default: int) -> int:
-    v = os.getenv(name)
-    if v is None or str(v).strip() == '':
-        return default
-    try:
-        return int(v)
-    except ValueError:
-        return default
+
+def _max_image_b64_chars(env: _Env) -> int:
+    # Canonical MAX_IMAGE_B64_CHARS, legacy PDF_MAX_B64_BYTES when the canonical one is unset.
+    if env.opt('MAX_IMAGE_B64_CHARS') is not None:
+        return env.int('MAX_IMAGE_B64_CHARS', 4_000_000)
+    return env.int('PDF_MAX_B64_BYTES', 4_000_000)
+
+
+def _preprocess_stages(env: _Env) -> Tuple[str, ...]:
+    if env.str('PDF_PREPROCESS', '0') != '1':
+        return ()
+    raw = env.str('PDF_PREPROCESS_STAGES', ','.join(PREPROCESS_STAGES))
+    return tuple(s for s in (part.strip().lower() for part in raw.split(',')) if s in PREPROCESS_STAGES)
+
+
+def _extraction_backend(env: _Env, mock_mode: bool) -> str:
+    default = 'mock' if mock_mode else 'anthropic'
+    name = env.str('EXTRACTION_BACKEND', default).lower()
+    return name if name in EXTRACTION_BACKENDS else default
+
+
+def _admission_tenants(env: _Env) -> Tuple[Tuple[str, int, int], ...]:
+    # "finance=1/2,hr=3": weight and an optional concurrency cap per tenant; malformed entries are skipped.
+    tenants = []
+    for part in env.str('ADMISSION_TENANTS', '').split(','):
+        name, _, share = part.partition('=')
+        weight, _, cap = share.partition('/')
+        try:
+            tenants.append((tenant_name(name), max(1, int(weight)), max(0, int(cap or 0))))
+        except ValueError:
+            continue
+    return tuple(tenants)
+
+
+def _tenant_api_keys(env: _Env) -> Tuple[Tuple[str, str], ...]:
+    # "key1=finance,key2=hr": a client presenting the key is queued as that tenant.
+    pairs = (part.strip().rpartition('=') for part in env.str('TENANT_API_KEYS', '').split(','))
+    return tuple((key.strip(), tenant_name(name)) for key, _, name in pairs if key.strip() and name.strip())
+
+
+def _signature_detector(env: _Env) -> str:
+    mode = env.str('SIGNATURE_DETECTOR', 'check').lower()
+    return mode if mode in {'off', 'check', 'replace'} else 'check'
+
+
+def load_settings(environ: Optional[Mapping[str, str]] = None, *, env_file: str = ENV_FILE, generation: int = 0) -> Settings:
+    """Build a snapshot from the process environment layered over `.env` (the environment wins)."""
+    merged = {k: v for k, v in dotenv_values(env_file).items() if v is not None} if os.path.exists(env_file) else {}
+    merged.update(os.environ if environ is None else environ)
+    env = _Env(merged)
+
+    retries = env.int('ANTHROPIC_MAX_RETRIES', 2)
+    http_timeout_s = env.int('ANTHROPIC_HTTP_TIMEOUT_S', 60, 10)
+    vision_timeout_s = env.int('ANTHROPIC_VISION_TIMEOUT_S', 90, 15)
+    parse_timeout_s = env.int('ANTHROPIC_STRUCTURED_PARSE_TIMEOUT_S', 30, 15)
+    fallback_timeout_s = env.int('ANTHROPIC_STRUCTURED_FALLBACK_TIMEOUT_S', 90, 15)
+    vision_budget_s = worst_case_call_budget_s(vision_timeout_s, retries)
+    parse_budget_s = worst_case_call_budget_s(parse_timeout_s, retries)
+    fallback_budget_s = worst_case_call_budget_s(fallback_timeout_s, retries)
+    model = env.str('ANTHROPIC_MODEL', DEFAULT_MODEL)
+    mock_mode = env.str('MOCK_MODE', '0') == '1'
+
+    settings = Settings(
+        GENERATION=generation,
+        APP_ENV=env.str('APP_ENV', 'dev'),
+        LOG_LEVEL=env.str('LOG_LEVEL', 'INFO'),
+        DEBUG_STEPS=env.flag('DEBUG_STEPS', False),
+        DEBUG_LOG_SAMPLE_PERCENT=min(100, env.int('DEBUG_LOG_SAMPLE_PERCENT', 100, 0)),
+        MOCK_MODE=mock_mode,
+        EXTRACTION_BACKEND=_extraction_backend(env, mock_mode),
+        EXTRACTION_REPLAY_DIR=env.str('EXTRACTION_REPLAY_DIR', ''),
+        EXTRACTION_RECORD_DIR=env.str('EXTRACTION_RECORD_DIR', ''),
+        RULE_EXTRACTOR='off' if env.str('RULE_EXTRACTOR', 'hybrid').lower() == 'off' else 'hybrid',
+        RULE_MIN_CONFIDENCE_PERCENT=min(100, env.int('RULE_MIN_CONFIDENCE_PERCENT', 80, 0)),
+        STARTUP_WARMUP=env.flag('STARTUP_WARMUP', True),
+        ANTHROPIC_API_KEY=env.str('ANTHROPIC_API_KEY', ''),
+        ANTHROPIC_MODEL=model,
+        ANTHROPIC_VISION_MODEL=env.str('ANTHROPIC_VISION_MODEL', model),
+        # The structured step defaults to Sonnet regardless of ANTHROPIC_MODEL.
+        ANTHROPIC_STRUCTURED_MODEL=env.str('ANTHROPIC_STRUCTURED_MODEL', DEFAULT_MODEL),
+        ANTHROPIC_VISION_FALLBACK_MODEL=env.opt('ANTHROPIC_VISION_FALLBACK_MODEL'),
+        ANTHROPIC_STRUCTURED_FALLBACK_MODEL=env.opt('ANTHROPIC_STRUCTURED_FALLBACK_MODEL'),
+        ANTHROPIC_HTTP_TIMEOUT_S=http_timeout_s,
+        ANTHROPIC_MAX_RETRIES=retries,
+        ANTHROPIC_DRAFT_MAX_TOKENS=env.int('ANTHROPIC_DRAFT_MAX_TOKENS', 1024, 256),
+        ANTHROPIC_MAX_TOKENS=env.int('ANTHROPIC_MAX_TOKENS', 1024, 512),
+        ANTHROPIC_VISION_TIMEOUT_S=vision_timeout_s,
+        ANTHROPIC_STRUCTURED_PARSE_TIMEOUT_S=parse_timeout_s,
+        ANTHROPIC_STRUCTURED_FALLBACK_TIMEOUT_S=fallback_timeout_s,
+        ANTHROPIC_STRUCTURED_DRAFT_MAX_CHARS=env.int('ANTHROPIC_STRUCTURED_DRAFT_MAX_CHARS', 12000, 2000),
+        ANTHROPIC_VISION_STREAM=env.str('ANTHROPIC_VISION_STREAM', '1') == '1',
+        ANTHROPIC_STRUCTURED_STREAM=env.str('ANTHROPIC_STRUCTURED_STREAM', '1') == '1',
+        MAX_UPLOAD_MB=env.int('MAX_UPLOAD_MB', 15),
+        PDF_MAX_PAGES=env.int('PDF_MAX_PAGES', 1, 1),
+        PDF_PAGE_SELECTION=env.str('PDF_PAGE_SELECTION', 'smart').lower(),
+        PDF_TARGET_LONG_EDGE=env.int('PDF_TARGET_LONG_EDGE', 1568, 512),
+        PDF_COLOR_MODE=env.str('PDF_COLOR_MODE', 'gray').lower(),
+        PDF_ESCALATION=env.flag('PDF_ESCALATION', False),
+        PDF_FIRST_PASS_LONG_EDGE=env.int('PDF_FIRST_PASS_LONG_EDGE', 1024, 512),
+        PDF_ESCALATION_CONFIDENCE_PERCENT=min(100, env.int('PDF_ESCALATION_CONFIDENCE_PERCENT', 70, 0)),
+        SIGNATURE_DETECTOR=_signature_detector(env),
+        PDF_PREPROCESS_STAGES=_preprocess_stages(env),
+        MAX_IMAGE_B64_CHARS=_max_image_b64_chars(env),
+        ADMISSION_ENABLED=env.flag('ADMISSION_ENABLED', True),
+        ADMISSION_INITIAL_LIMIT=env.int('ADMISSION_INITIAL_LIMIT', 4, 1),
+        ADMISSION_MIN_LIMIT=env.int('ADMISSION_MIN_LIMIT', 1, 1),
+        ADMISSION_MAX_LIMIT=env.int('ADMISSION_MAX_LIMIT', 8, 1),
+        ADMISSION_QUEUE_SIZE=env.int('ADMISSION_QUEUE_SIZE', 8, 0),
+        ADMISSION_MAX_WAIT_S=env.int('ADMISSION_MAX_WAIT_S', 30, 1),
+        ADMISSION_TARGET_LATENCY_S=env.int('ADMISSION_TARGET_LATENCY_S', 45, 1),
+        ADMISSION_TENANTS=_admission_tenants(env),
+        ADMISSION_TENANT_MAX_IN_FLIGHT=env.int('ADMISSION_TENANT_MAX_IN_FLIGHT', 0, 0),
+        ADMISSION_INTERACTIVE_RESERVE_PERCENT=min(90, env.int('ADMISSION_INTERACTIVE_RESERVE_PERCENT', 25, 0)),
+        TENANT_HEADER=env.str('TENANT_HEADER', 'X-Tenant'),
+        TENANT_API_KEYS=_tenant_api_keys(env),
+        SINGLE_FLIGHT_ENABLED=env.flag('SINGLE_FLIGHT_ENABLED', True),
+        MEMORY_BUDGET_MB=env.int('MEMORY_BUDGET_MB', 256, 0),
+        MEMORY_BUDGET_MAX_WAIT_S=env.int('MEMORY_BUDGET_MAX_WAIT_S', 60, 1),
+        RESULT_STORE_PATH=env.str('RESULT_STORE_PATH', ''),
+        PRODUCTION_CALENDAR_PATH=env.str('PRODUCTION_CALENDAR_PATH', ''),
+        EMPLOYEE_ROSTER_PATH=env.str('EMPLOYEE_ROSTER_PATH', ''),
+        COMPLIANCE_RULE_PINS=env.str('COMPLIANCE_RULE_PINS', ''),
+        BATCH_WORKERS=env.int('BATCH_WORKERS', 4, 1),
+        VISION_BUDGET_S=vision_budget_s,
+        STRUCTURED_PARSE_BUDGET_S=parse_budget_s,
+        STRUCTURED_FALLBACK_BUDGET_S=fallback_budget_s,
+        SDK_HTTP_TIMEOUT_S=max(http_timeout_s, max(vision_budget_s, parse_budget_s, fallback_budget_s) + 5),
+    )
+    # mock/replay/rules never call the API; the key is needed only when the default backend does.
+    if settings.APP_ENV != 'dev' and settings.EXTRACTION_BACKEND == 'anthropic' and not settings.ANTHROPIC_API_KEY:
+        raise RuntimeError('ANTHROPIC_API_KEY is required outside dev mode with EXTRACTION_BACKEND=anthropic')
+    return settings
+
+
+_current: Optional[Settings] = None
+_lock = threading.Lock()
 
 
-@lru_cache
 def get_settings() -> Settings:
-    load_dotenv(dotenv_path='.env')
-    data = {
-        'APP_ENV': os.getenv('APP_ENV', 'dev'),
-        'LOG_LEVEL': os.getenv('LOG_LEVEL', 'INFO'),
-        'DEBUG_STEPS': _env_bool('DEBUG_STEPS', False),
-        'ANTHROPIC_API_KEY': os.getenv('ANTHROPIC_API_KEY', ''),
-        'ANTHROPIC_MODEL': os.getenv('ANTHROPIC_MODEL', 'claude-sonnet-4-6'),
-        'ANTHROPIC_VISION_MODEL': os.getenv('ANTHROPIC_VISION_MODEL', os.getenv('ANTHROPIC_MODEL', 'claude-sonnet-4-6')),
-        'ANTHROPIC_STRUCTURED_MODEL': os.getenv('ANTHROPIC_STRUCTURED_MODEL', os.getenv('ANTHROPIC_MODEL', 'claude-sonnet-4-6')),
-        'ANTHROPIC_HTTP_TIMEOUT_S': _env_int('ANTHROPIC_HTTP_TIMEOUT_S', 60),
-        'ANTHROPIC_MAX_RETRIES': _env_int('ANTHROPIC_MAX_RETRIES', 0),
-        'ANTHROPIC_VISION_TIMEOUT_S': _env_int('ANTHROPIC_VISION_TIMEOUT_S', 90),
-        'ANTHROPIC_STRUCTURED_PARSE_TIMEOUT_S': _env_int('ANTHROPIC_STRUCTURED_PARSE_TIMEOUT_S', 15),
-        'ANTHROPIC_STRUCTURED_FALLBACK_TIMEOUT_S': _env_int('ANTHROPIC_STRUCTURED_FALLBACK_TIMEOUT_S', 90),
-        'MAX_UPLOAD_MB': _env_int('MAX_UPLOAD_MB', 15),
-        'PDF_MAX_PAGES': _env_int('PDF_MAX_PAGES', 2),
-        'PDF_TARGET_LONG_EDGE': _env_int('PDF_TARGET_LONG_EDGE', 1568),
-        'PDF_COLOR_MODE': os.getenv('PDF_COLOR_MODE', 'gray'),
-        'MAX_IMAGE_B64_CHARS': _env_int('MAX_IMAGE_B64_CHARS', 4_000_000),
-        'ANTHROPIC_STRUCTURED_DRAFT_MAX_CHARS': _env_int('ANTHROPIC_STRUCTURED_DRAFT_MAX_CHARS', 12000),
-    }
-    settings = Settings(**data)
-    if settings.APP_ENV != 'dev' and not settings.ANTHROPIC_API_KEY:
-        raise RuntimeError('ANTHROPIC_API_KEY is required outside dev mode')
+    """The active snapshot. Take it once per request: a reload swaps the reference, never the contents."""
+    current = _current
+    return current if current is not None else reload_settings(strict=True)
+
+
+def reload_settings(*, strict: bool = False) -> Settings:
+    """Re-read the environment and `.env` and swap the snapshot atomically.
+
+    A bad config keeps the previous snapshot (logged) unless there is none yet or `strict`.
+    """
+    global _current
+    with _lock:
+        previous = _current
+        generation = previous.GENERATION + 1 if previous is not None else 1
+        try:
+            settings = load_settings(generation=generation)
+        except Exception:
+            if strict or previous is None:
+                raise
+            logger.exception('Config reload failed, keeping generation=%s', previous.GENERATION)
+            return previous
+        _current = settings
+    logger.info('Config loaded: %s', settings.summary())
     return settings
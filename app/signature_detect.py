@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import math
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from .schemas import LeaveRequestExtract
+
+# Lower band of the page where the date/signature line sits (same band as the page-selection pre-pass).
+SIGNATURE_BAND = (0.55, 0.95)
+# The band is min-pooled to at most this page width: strokes stay connected, the labelling stays cheap.
+_WORK_WIDTH = 600
+_INK_THRESHOLD = 170
+_INK_BELOW_BACKGROUND = 50
+_BLANK_INK_RATIO = 0.002
+# Handwriting-sized component, in page widths: taller than printed text (~0.015), not a rule line or a frame.
+_MIN_HEIGHT = 0.025
+_MIN_WIDTH = 0.05
+_MAX_WIDTH = 0.5
+_MIN_HEIGHT_TO_WIDTH = 0.08
+# Stroke pixels (in page widths) of a full signature.
+_FULL_STROKE = 0.4
+
+PRESENT_SCORE = 0.5
+# The model's answer is overruled ("check" mode) only when the detector is this sure.
+CONFIDENT_ABSENT = 0.15
+CONFIDENT_PRESENT = 0.85
+
+
+@dataclass(frozen=True)
+class SignatureScore:
+    score: float
+    present: bool
+    strokes: int
+    band_ink: float
+    ms: float
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _luma(img: np.ndarray) -> np.ndarray:
+    if img.ndim == 2:
+        return img
+    return img[..., :3].mean(axis=2).astype(np.uint8)
+
+
+def _min_pool(img: np.ndarray, factor: int) -> np.ndarray:
+    if factor <= 1:
+        return img
+    h, w = (img.shape[0] // factor) * factor, (img.shape[1] // factor) * factor
+    # Element-wise minimum of the strided sub-grids: much faster than min() over a 4-d reshaped view.
+    out = img[:h:factor, :w:factor].copy()
+    for dy in range(factor):
+        for dx in range(factor):
+            np.minimum(out, img[dy:h:factor, dx:w:factor], out=out)
+    return out
+
+
+def label_components(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """8-connected components of a boolean mask: (flat indices of set pixels, component id of each).
+
+    Vectorized union-find: every pass hooks the larger root of each touching pair under the
+    smaller one, then compresses paths by pointer jumping; a handful of passes converge.
+    """
+    h, w = mask.shape
+    pixels = np.flatnonzero(mask)
+    if pixels.size == 0:
+        return pixels, pixels
+    # Union-find over the set pixels only, numbered 0..n-1.
+    rank = np.full(h * w, -1, dtype=np.int64)
+    rank[pixels] = np.arange(pixels.size)
+    parent = np.arange(pixels.size, dtype=np.int64)
+    a_parts, b_parts = [], []
+    for dy, dx in ((0, 1), (1, -1), (1, 0), (1, 1)):
+        x0, x1 = max(0, -dx), w - max(0, dx)
+        both = mask[: h - dy, x0:x1] & mask[dy:, x0 + dx : x1 + dx]
+        ys, xs = np.nonzero(both)
+        a = ys * w + xs + x0
+        a_parts.append(a)
+        b_parts.append(a + dy * w + dx)
+    a, b = rank[np.concatenate(a_parts)], rank[np.concatenate(b_parts)]
+    while True:
+        pa, pb = parent[a], parent[b]
+        differ = pa != pb
+        if not differ.any():
+            break
+        np.minimum.at(parent, np.maximum(pa, pb)[differ], np.minimum(pa, pb)[differ])
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                break
+            parent = jumped
+    _, component = np.unique(parent, return_inverse=True)
+    return pixels, component
+
+
+def detect_signature(page: np.ndarray) -> SignatureScore:
+    """Deterministic signature score 0..1 of a rendered page (grayscale or RGB array).
+
+    Handwriting in the signature band shows up as connected ink components taller than
+    printed text, while rule lines and frames are too flat or too wide to count.
+    """
+    started = time.perf_counter()
+    luma = _luma(page)
+    height = luma.shape[0]
+    band = luma[int(height * SIGNATURE_BAND[0]) : int(height * SIGNATURE_BAND[1])]
+    band = _min_pool(band, max(1, math.ceil(luma.shape[1] / _WORK_WIDTH)))
+    if band.size == 0:
+        return SignatureScore(0.0, False, 0, 0.0, round((time.perf_counter() - started) * 1000, 2))
+    width = band.shape[1]
+    background = float(np.percentile(band, 90))
+    mask = band < min(_INK_THRESHOLD, background - _INK_BELOW_BACKGROUND)
+    band_ink = float(mask.mean())
+
+    strokes, stroke_pixels = 0, 0
+    if band_ink >= _BLANK_INK_RATIO:
+        pixels, component = label_components(mask)
+        ys, xs = np.divmod(pixels, width)
+        count = int(component.max()) + 1
+        size = np.bincount(component, minlength=count)
+        top, left = np.full(count, band.shape[0]), np.full(count, width)
+        bottom, right = np.zeros(count, dtype=np.int64), np.zeros(count, dtype=np.int64)
+        np.minimum.at(top, component, ys)
+        np.maximum.at(bottom, component, ys)
+        np.minimum.at(left, component, xs)
+        np.maximum.at(right, component, xs)
+        h_px, w_px = bottom - top + 1, right - left + 1
+        handwriting = (
+            (h_px >= _MIN_HEIGHT * width)
+            & (w_px >= _MIN_WIDTH * width)
+            & (w_px <= _MAX_WIDTH * width)
+            & (h_px >= _MIN_HEIGHT_TO_WIDTH * w_px)
+        )
+        strokes, stroke_pixels = int(handwriting.sum()), int(size[handwriting].sum())
+
+    if band_ink < _BLANK_INK_RATIO:
+        score = 0.0
+    elif strokes:
+        score = 0.6 + 0.4 * min(1.0, stroke_pixels / (_FULL_STROKE * width))
+    else:
+        # Printed text only.
+        score = 0.1
+    score = round(score, 3)
+    return SignatureScore(score, score >= PRESENT_SCORE, strokes, round(band_ink, 4), round((time.perf_counter() - started) * 1000, 2))
+
+
+def reconcile_signature(extract: LeaveRequestExtract, detected: Optional[Dict[str, Any]], mode: str) -> Optional[str]:
+    """Apply the detector to the extract in place (SIGNATURE_DETECTOR); returns a quality note on a change.
+
+    `replace`: the detector decides. `check`: it fills a missing model answer and overrules
+    one it confidently contradicts, leaving the result uncertain for a manual check.
+    """
+    if not detected or mode not in ("check", "replace"):
+        return None
+    score = float(detected["score"])
+    model = (extract.signature_present, extract.signature_confidence)
+    if mode == "replace" or extract.signature_present is None:
+        extract.signature_present = score >= PRESENT_SCORE
+        extract.signature_confidence = round(score if extract.signature_present else 1 - score, 2)
+    elif extract.signature_present and score <= CONFIDENT_ABSENT:
+        # Nothing handwritten where the signature should be: keep "present", but below the review threshold.
+        extract.signature_confidence = round(min(extract.signature_confidence or 1.0, 0.5), 2)
+    elif extract.signature_present is False and score >= CONFIDENT_PRESENT:
+        extract.signature_present, extract.signature_confidence = True, 0.5
+    if (extract.signature_present, extract.signature_confidence) == model:
+        return None
+    return f"signature: detector={score:.2f}, model={model[0]}/{model[1]} -> {extract.signature_present}/{extract.signature_confidence}"
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+OnDebug = Optional[Callable[[str], None]]
+OnDelta = Optional[Callable[[str, str], None]]
+OnField = Optional[Callable[[str, Any], None]]
+OnReset = Optional[Callable[[str], None]]
+
+
+def document_key(data: bytes, *parts: Hashable) -> Tuple[Hashable, ...]:
+    """sha256 of the upload plus whatever makes the result differ (config generation, stream mode)."""
+    return (hashlib.sha256(data).hexdigest(), *parts)
+
+
+class _Listener:
+    __slots__ = ("on_debug", "on_delta", "on_field", "on_reset")
+
+    def __init__(self, on_debug: OnDebug, on_delta: OnDelta, on_field: OnField, on_reset: OnReset):
+        self.on_debug = on_debug
+        self.on_delta = on_delta
+        self.on_field = on_field
+        self.on_reset = on_reset
+
+    def dispatch(self, kind: str, args: tuple) -> None:
+        callback = getattr(self, f"on_{kind}")
+        if callback is not None:
+            callback(*args)
+
+
+class Flight:
+    """One running extraction and everyone waiting for it.
+
+    Events are recorded in order; a late subscriber first gets a replay of what it
+    missed, then live events, so every waiter sees the full step sequence on its own
+    stream. Dispatch happens under the flight lock to keep replay and live events
+    from interleaving.
+    """
+
+    def __init__(self, group: Optional["SingleFlight"], key: Optional[Hashable]):
+        self._group = group
+        self.key = key
+        self._lock = threading.Lock()
+        self._events: List[Tuple[str, tuple]] = []
+        self._listeners: List[_Listener] = []
+        self._done = threading.Event()
+        self._result: Any = None
+        self._error: Optional[BaseException] = None
+        self._claimed = False
+        self.waiters = 0
+
+    def claim(self) -> bool:
+        """Exactly one side owns the leader's flight: the worker that runs it or the request that abandons it."""
+        with self._lock:
+            if self._claimed:
+                return False
+            self._claimed = True
+            return True
+
+    def subscribe(
+        self, on_debug: OnDebug = None, on_delta: OnDelta = None, on_field: OnField = None, on_reset: OnReset = None
+    ) -> None:
+        listener = _Listener(on_debug, on_delta, on_field, on_reset)
+        with self._lock:
+            for kind, args in self._events:
+                listener.dispatch(kind, args)
+            self._listeners.append(listener)
+
+    def _emit(self, kind: str, *args: Any) -> None:
+        with self._lock:
+            self._events.append((kind, args))
+            for listener in self._listeners:
+                listener.dispatch(kind, args)
+
+    def run(self, fn: Callable[..., Any]) -> Any:
+        """Leader side: `fn(on_debug=, on_delta=, on_field=, on_reset=)` runs once, its events fan out to all subscribers."""
+        try:
+            self._result = fn(
+                on_debug=lambda step: self._emit("debug", step),
+                on_delta=lambda step, text: self._emit("delta", step, text),
+                on_field=lambda path, value: self._emit("field", path, value),
+                on_reset=lambda step: self._emit("reset", step),
+            )
+        except BaseException as e:
+            self._error = e
+            raise
+        finally:
+            self._finish()
+        return self._result
+
+    def fail(self, err: BaseException) -> None:
+        """Leader gave up before running (e.g. not admitted): waiters get the same error."""
+        self._error = err
+        self._finish()
+
+    def _finish(self) -> None:
+        # Forget the key first: a request arriving after this point starts a fresh extraction.
+        if self._group is not None:
+            self._group._forget(self)
+        self._done.set()
+
+    def wait(self) -> Any:
+        """Follower side: block until the leader is done; returns its result or raises its error."""
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one `Flight` (per process, not a cache)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def join(self, key: Optional[Hashable]) -> Tuple[Flight, bool]:
+        """Returns (flight, is_leader). Key None = no coalescing, always a private flight."""
+        with self._lock:
+            flight = self._flights.get(key) if key is not None else None
+            if flight is not None:
+                flight.waiters += 1
+                self.coalesced += 1
+                return flight, False
+            flight = Flight(self if key is not None else None, key)
+            if key is not None:
+                self._flights[key] = flight
+            self.leaders += 1
+            return flight, True
+
+    def _forget(self, flight: Flight) -> None:
+        with self._lock:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "in_flight": len(self._flights),
+                "waiting": sum(f.waiters for f in self._flights.values()),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+            }
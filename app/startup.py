@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StartupState:
+    """Per-process startup record behind /api/ready.
+
+    `shared_*` is filled by the phase that may run in the gunicorn master before fork
+    (preload), so workers inherit it; `worker_*` always runs in the worker itself.
+    """
+
+    def __init__(self) -> None:
+        self.import_ms: Optional[int] = None
+        self.preloaded = False
+        self.shared_done = False
+        self.shared_ms: Dict[str, int] = {}
+        self.worker_started = False
+        self.worker_done = False
+        self.worker_ms: Dict[str, int] = {}
+        self.errors: List[str] = []
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "status": "ready" if self.worker_done else "starting",
+                "pid": os.getpid(),
+                "preloaded": self.preloaded,
+                "import_ms": self.import_ms,
+                "warmup_ms": {**self.shared_ms, **self.worker_ms},
+                "errors": list(self.errors),
+            }
+
+
+STATE = StartupState()
+
+
+def record_import(started: float) -> None:
+    STATE.import_ms = int((time.perf_counter() - started) * 1000)
+    logger.info("Startup: app import took %s ms", STATE.import_ms)
+
+
+def _timed(phase: Dict[str, int], name: str, fn: Callable[[], Any]) -> None:
+    started = time.perf_counter()
+    try:
+        fn()
+    except Exception as e:
+        # Warm-up is best effort: the request path still works, just cold.
+        logger.exception("Startup: warm-up step %s failed", name)
+        with STATE._lock:
+            STATE.errors.append(f"{name}: {type(e).__name__}")
+    finally:
+        phase[name] = int((time.perf_counter() - started) * 1000)
+
+
+def sample_pdf() -> bytes:
+    """One-page application-like PDF used to exercise the render pipeline."""
+    import fitz
+
+    doc = fitz.open()
+    try:
+        page = doc.new_page()
+        for y, line in ((100, "Заявление"), (140, "Прошу предоставить ежегодный оплачиваемый отпуск"), (650, "Подпись ________")):
+            page.insert_text((72, y), line, fontsize=12)
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+
+def _render_sample() -> None:
+    from .ai_extract import _render_pdf_to_image_blocks
+
+    _render_pdf_to_image_blocks(sample_pdf(), [])
+
+
+def _build_schemas() -> None:
+    from .main import app
+    from .schemas import ApiResponse, BatchCheckRequest, LeaveRequestExtract
+
+    for model in (LeaveRequestExtract, ApiResponse, BatchCheckRequest):
+        model.model_json_schema()
+    app.openapi()
+
+
+def _compile_templates() -> None:
+    from .main import templates
+
+    templates.get_template("index.html")
+
+
+def warm_shared() -> None:
+    """Read-only, fork-safe warm-up: imports, MuPDF render path, pydantic/OpenAPI schemas, templates.
+
+    Run in the gunicorn master under preload (see gunicorn_conf.py) so every worker
+    inherits the result copy-on-write; otherwise the worker runs it itself.
+    """
+    if STATE.shared_done:
+        return
+    _timed(STATE.shared_ms, "render_sample_pdf", _render_sample)
+    _timed(STATE.shared_ms, "schemas", _build_schemas)
+    _timed(STATE.shared_ms, "templates", _compile_templates)
+    STATE.shared_done = True
+    logger.info("Startup: shared warm-up %s", STATE.shared_ms)
+
+
+def _open_upstream() -> None:
+    import anthropic
+
+    from .ai_extract import _create_anthropic_client
+    from .settings import get_settings
+
+    cfg = get_settings()
+    if cfg.EXTRACTION_BACKEND != "anthropic" or not cfg.ANTHROPIC_API_KEY:
+        return
+    client = _create_anthropic_client(
+        api_key=cfg.ANTHROPIC_API_KEY, max_retries=cfg.ANTHROPIC_MAX_RETRIES, http_timeout_s=cfg.SDK_HTTP_TIMEOUT_S
+    )
+    # Cheap authenticated GET: DNS, TCP and TLS are done before the first user request.
+    # Any HTTP answer (even 4xx) means the connection is open and pooled.
+    try:
+        client.with_options(timeout=10, max_retries=0).models.list(limit=1)
+    except anthropic.APIStatusError as e:
+        logger.info("Startup: upstream answered %s to the warm-up request", e.status_code)
+
+
+def warm_worker() -> None:
+    """Worker warm-up: the shared phase if the master did not preload it, then per-process connections."""
+    with STATE._lock:
+        if STATE.worker_started:
+            return
+        STATE.worker_started = True
+    warm_shared()
+    _timed(STATE.worker_ms, "upstream_connect", _open_upstream)
+    with STATE._lock:
+        STATE.worker_done = True
+    logger.info("Startup: worker pid=%s ready, warm-up %s", os.getpid(), STATE.worker_ms)
+
+
+def start_worker_warmup(enabled: bool = True) -> None:
+    """Run warm_worker in the background; /api/ready answers 503 until it is done."""
+    if not enabled:
+        with STATE._lock:
+            STATE.worker_started = STATE.worker_done = True
+        return
+    threading.Thread(target=warm_worker, name="warmup", daemon=True).start()
@@ -1,13 +1,25 @@
 from __future__ import annotations
 
 from datetime import date
-from typing import List
+from typing import Any, Callable, List, Mapping, Tuple
 
 from .schemas import LeaveRequestExtract, ValidationIssue
 
+# code -> (level, message); shared with the batch engine so both produce identical issues.
+VALIDATION_MESSAGES = {
+    "missing_employee_full_name": ("error", "Не найдено ФИО сотрудника."),
+    "missing_leave_start_date": ("error", "Не найдена дата начала отпуска."),
+    "missing_end_or_days": ("warn", "Нет даты окончания и нет количества дней (нужно хотя бы одно)."),
+    "bad_start_date": ("error", "start_date не в формате YYYY-MM-DD."),
+    "bad_end_date": ("error", "end_date не в формате YYYY-MM-DD."),
+    "dates_inverted": ("error", "Дата окончания раньше даты начала."),
+    "low_confidence": ("warn", "Низкая уверенность распознавания: {confidence:.2f}"),
+}
+LOW_CONFIDENCE_THRESHOLD = 0.6
 
-def _parse_iso(s: str | None) -> date | None:
-    if not s:
+
+def _parse_iso(s: Any) -> date | None:
+    if not s or not isinstance(s, str):
         return None
     try:
         return date.fromisoformat(s)
@@ -15,30 +27,62 @@ def _parse_iso(s: str | None) -> date | None:
         return None
 
 
-def validate_extract(ex: LeaveRequestExtract) -> List[ValidationIssue]:
+def _dates_inverted(start: Any, end: Any) -> bool:
+    sd = _parse_iso(start)
+    ed = _parse_iso(end)
+    return bool(sd and ed and ed < sd)
+
+
+def _is_low_confidence(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value < LOW_CONFIDENCE_THRESHOLD
+
+
+# (fields read, code, predicate -> falsy | True | format args); order is the order of issues.
+_CHECKS: Tuple[Tuple[Tuple[str, ...], str, Callable[[Mapping[str, Any]], Any]], ...] = (
+    (("employee.full_name",), "missing_employee_full_name", lambda f: not f["employee.full_name"]),
+    (("leave.start_date",), "missing_leave_start_date", lambda f: not f["leave.start_date"]),
+    (
+        ("leave.end_date", "leave.days_count"),
+        "missing_end_or_days",
+        lambda f: not f["leave.end_date"] and f["leave.days_count"] is None,
+    ),
+    (("leave.start_date",), "bad_start_date", lambda f: f["leave.start_date"] and not _parse_iso(f["leave.start_date"])),
+    (("leave.end_date",), "bad_end_date", lambda f: f["leave.end_date"] and not _parse_iso(f["leave.end_date"])),
+    (("leave.start_date", "leave.end_date"), "dates_inverted", lambda f: _dates_inverted(f["leave.start_date"], f["leave.end_date"])),
+    (
+        ("quality.overall_confidence",),
+        "low_confidence",
+        lambda f: _is_low_confidence(f["quality.overall_confidence"]) and {"confidence": f["quality.overall_confidence"]},
+    ),
+)
+
+
+def _run_checks(fields: Mapping[str, Any]) -> List[ValidationIssue]:
     issues: List[ValidationIssue] = []
+    for reads, code, check in _CHECKS:
+        if any(name not in fields for name in reads):
+            continue
+        result = check(fields)
+        if result:
+            level, message = VALIDATION_MESSAGES[code]
+            fmt = result if isinstance(result, dict) else None
+            issues.append(ValidationIssue(level=level, code=code, message=message.format(**fmt) if fmt else message))
+    return issues
 
-    def add(level: str, code: str, message: str):
-        issues.append(ValidationIssue(level=level, code=code, message=message))
 
+def validate_extract(ex: LeaveRequestExtract) -> List[ValidationIssue]:
     # минимальный sanity-check (не ТК РФ, просто чтобы не вылететь в прод с мусором)
-    if not ex.employee.full_name:
-        add("error", "missing_employee_full_name", "Не найдено ФИО сотрудника.")
-    if not ex.leave.start_date:
-        add("error", "missing_leave_start_date", "Не найдена дата начала отпуска.")
-    if not ex.leave.end_date and ex.leave.days_count is None:
-        add("warn", "missing_end_or_days", "Нет даты окончания и нет количества дней (нужно хотя бы одно).")
-
-    sd = _parse_iso(ex.leave.start_date)
-    ed = _parse_iso(ex.leave.end_date)
-    if ex.leave.start_date and not sd:
-        add("error", "bad_start_date", "start_date не в формате YYYY-MM-DD.")
-    if ex.leave.end_date and not ed:
-        add("error", "bad_end_date", "end_date не в формате YYYY-MM-DD.")
-    if sd and ed and ed < sd:
-        add("error", "dates_inverted", "Дата окончания раньше даты начала.")
-
-    if ex.quality.overall_confidence is not None and ex.quality.overall_confidence < 0.6:
-        add("warn", "low_confidence", f"Низкая уверенность распознавания: {ex.quality.overall_confidence:.2f}")
+    return _run_checks(
+        {
+            "employee.full_name": ex.employee.full_name,
+            "leave.start_date": ex.leave.start_date,
+            "leave.end_date": ex.leave.end_date,
+            "leave.days_count": ex.leave.days_count,
+            "quality.overall_confidence": ex.quality.overall_confidence,
+        }
+    )
 
-    return issues
+
+def validate_partial(fields: Mapping[str, Any]) -> List[ValidationIssue]:
+    """Same checks on a partially streamed extract: a check runs once every field it reads is final."""
+    return _run_checks(fields)
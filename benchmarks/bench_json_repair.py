@@ -0,0 +1,70 @@
+"""Microbenchmark: single-pass JSON recovery vs the previous raw_decode-per-"{" scan.
+
+Run: python benchmarks/bench_json_repair.py
+"""
+from __future__ import annotations
+
+import json
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.json_repair import recover_json_object  # noqa: E402
+
+
+def _legacy_extract(text: str):
+    """Previous _extract_first_json_object (without the fenced-block fallback)."""
+    decoder = json.JSONDecoder()
+    for idx, ch in enumerate(text):
+        if ch != "{":
+            continue
+        try:
+            obj, _ = decoder.raw_decode(text[idx:])
+            if isinstance(obj, dict):
+                return obj
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def _attempt(fn, text):
+    try:
+        return fn(text)
+    except ValueError:
+        return None
+
+
+def _time(fn, text) -> str:
+    try:
+        best = min(timeit.repeat(lambda: _attempt(fn, text), number=3, repeat=3)) / 3
+    except RecursionError:
+        return "RecursionError"
+    return f"{best * 1000:9.3f} ms"
+
+
+def main() -> None:
+    payload = json.dumps(
+        {
+            "employee": {"full_name": "Иванов Иван Иванович"},
+            "leave": {"leave_type": "annual_paid", "start_date": "2026-02-01", "end_date": "2026-02-14", "days_count": 14},
+            "raw_text": "Прошу предоставить ежегодный оплачиваемый отпуск " * 40,
+            "quality": {"notes": [], "missing_fields": []},
+        },
+        ensure_ascii=False,
+    )
+    cases = {
+        "fenced + prose": f"Ответ:\n```json\n{payload}\n```\nГотово.",
+        "truncated at 90%": payload[: int(len(payload) * 0.9)],
+    }
+    for n in (5_000, 20_000, 80_000):
+        cases[f"'{{x}}' * {n}"] = "{x}" * n
+        cases[f"'{{\"a\":' * {n}"] = '{"a":' * n
+    for name, text in cases.items():
+        for label, fn in (("legacy", _legacy_extract), ("single-pass", recover_json_object)):
+            print(f"{name:24s} {label:12s} {_time(fn, text)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Microbenchmark: shared RU normalization vs the previous per-call implementations.
+
+Run: python benchmarks/bench_ru_normalize.py
+"""
+from __future__ import annotations
+
+import random
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[1] / "tests"))
+
+from app.ru_normalize import has_unpaid_reason_marker, normalize_leave_type  # noqa: E402
+from test_ru_normalize import _FRAGMENTS, _legacy_normalize_leave_type, _legacy_unpaid_marker  # noqa: E402
+
+
+def main() -> None:
+    rnd = random.Random(1)
+    # Realistic traffic: a handful of distinct leave-type strings repeated many times.
+    leave_types = [" ".join(rnd.choice(_FRAGMENTS) for _ in range(rnd.randint(1, 4))) for _ in range(50)]
+    stream = [rnd.choice(leave_types) for _ in range(20000)]
+    raw_texts = [" ".join(rnd.choice(_FRAGMENTS) for _ in range(200)) for _ in range(200)]
+
+    cases = [
+        ("leave_type legacy", lambda: [_legacy_normalize_leave_type(t) for t in stream]),
+        ("leave_type shared", lambda: [normalize_leave_type(t) for t in stream]),
+        ("markers legacy", lambda: [_legacy_unpaid_marker(t) for t in raw_texts]),
+        ("markers shared (cold cache)", lambda: (has_unpaid_reason_marker.cache_clear(), [has_unpaid_reason_marker(t) for t in raw_texts])),
+        ("markers shared (warm cache)", lambda: [has_unpaid_reason_marker(t) for t in raw_texts]),
+    ]
+    for name, fn in cases:
+        best = min(timeit.repeat(fn, number=5, repeat=3)) / 5
+        print(f"{name:32s} {best * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Startup profile: import cost per top-level package (python -X importtime) and warm-up phases.
+
+Run: python benchmarks/bench_startup.py [--top 15]
+"""
+from __future__ import annotations
+
+import argparse
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+_LINE_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def import_profile(module: str = "app.main") -> tuple[int, dict[str, int]]:
+    """Total wall time of `import module` in a fresh interpreter, and self time (us) per top-level package."""
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total_ms = int((time.perf_counter() - started) * 1000)
+    per_package: dict[str, int] = defaultdict(int)
+    for line in proc.stderr.splitlines():
+        m = _LINE_RE.match(line)
+        if m:
+            per_package[m.group(4).split(".")[0]] += int(m.group(1))
+    return total_ms, dict(per_package)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    total_ms, per_package = import_profile()
+    print(f"python -c 'import app.main': {total_ms} ms (process start included)")
+    for name, us in sorted(per_package.items(), key=lambda kv: kv[1], reverse=True)[: args.top]:
+        print(f"  {name:<24} {us / 1000:8.1f} ms")
+
+    import app.main  # noqa: F401  (records import_ms; warm-up below measures only the warm-up itself)
+    from app import startup
+
+    startup.warm_shared()
+    startup.warm_worker()
+    state = startup.STATE.snapshot()
+    print(f"in-process import of app.main: {state['import_ms']} ms")
+    print("warm-up phases (ms):", state["warmup_ms"])
+    if state["errors"]:
+        print("warm-up errors:", state["errors"])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 # Recommended Gunicorn settings for Render/containers.
 # Enables full stdout/stderr capture and access/error logs for debugging.
+import gc
 
 bind = "0.0.0.0:10000"
 worker_class = "uvicorn.workers.UvicornWorker"
@@ -14,3 +15,18 @@ capture_output = True
 
 # Keep output unbuffered for real-time diagnostics.
 enable_stdio_inheritance = True
+
+# Import the app once in the master; forked workers share the imported modules copy-on-write.
+# Only read-only state is built before fork (app/startup.py: warm_shared); upstream clients and
+# connections are opened per worker in its startup warm-up.
+preload_app = True
+
+
+def when_ready(server):
+    from app import startup
+
+    startup.STATE.preloaded = True
+    startup.warm_shared()
+    # Move everything allocated so far out of the GC's reach so collections in workers
+    # do not touch (and un-share) the preloaded pages.
+    gc.freeze()
@@ -2,7 +2,7 @@ import { parseStreamResponse } from './stream.js';
 
 /**
  * @param {File} file
- * @param {{onStep?: (msg:string)=>void, signal?: AbortSignal}} opts
+ * @param {{onStep?: (msg:string)=>void, onDelta?: (step:string, text:string)=>void, onField?: (path:string, value:any, issues:object[])=>void, onReset?: (step:string)=>void, signal?: AbortSignal}} opts
  */
 export async function uploadPdf(file, opts = {}) {
   const fd = new FormData();
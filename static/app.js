@@ -4,6 +4,7 @@ const dlBtn = document.getElementById('download');
 const outEl = document.getElementById('out') || { textContent: '' };
 const statusEl = document.getElementById('status');
 const stepsEl = document.getElementById('steps');
+const draftEl = document.getElementById('draft');
 const resultBody = document.querySelector('#resultTable tbody');
 const errorBox = document.getElementById('errorBox');
 const issuesSummaryEl = document.getElementById('issuesSummary');
@@ -35,8 +36,23 @@ function addStep(text) {
   stepsEl.appendChild(li);
 }
 
+function appendDraft(step, text) {
+  if (!draftEl) return;
+  // A fallback model restarts the transcription from scratch.
+  if (draftEl.dataset.step && draftEl.dataset.step !== step) draftEl.textContent = '';
+  draftEl.dataset.step = step;
+  draftEl.hidden = false;
+  draftEl.textContent += text;
+  draftEl.scrollTop = draftEl.scrollHeight;
+}
+
 function clearUI() {
   stepsEl.innerHTML = '';
+  if (draftEl) {
+    draftEl.textContent = '';
+    draftEl.dataset.step = '';
+    draftEl.hidden = true;
+  }
   resultBody.innerHTML = '';
   errorBox.hidden = true;
   errorBox.textContent = '';
@@ -49,18 +65,62 @@ function clearUI() {
   statusEl.textContent = 'В обработке...';
 }
 
-function row(key, val) {
+function row(key, val, path) {
   const tr = document.createElement('tr');
   const k = document.createElement('th');
   const v = document.createElement('td');
   k.textContent = key;
   v.textContent = val == null ? '—' : String(val);
+  if (path) tr.dataset.path = path;
   tr.appendChild(k);
   tr.appendChild(v);
   resultBody.appendChild(tr);
+  return tr;
+}
+
+function humanSignature(v) {
+  return v ? 'Да' : (v === false ? 'Нет' : 'Неизвестно');
+}
+
+// [path, label, format]; shared by the progressive (field events) and the final rendering.
+const FIELD_ROWS = [
+  ['employer_name', 'Организация'],
+  ['employee.full_name', 'Сотрудник'],
+  ['employee.position', 'Должность'],
+  ['manager.full_name', 'Руководитель'],
+  ['request_date', 'Дата заявления'],
+  ['leave.leave_type', 'Тип отпуска', humanLeaveType],
+  ['leave.start_date', 'Начало отпуска'],
+  ['leave.end_date', 'Окончание отпуска'],
+  ['leave.days_count', 'Дней'],
+  ['signature_present', 'Подпись', humanSignature],
+];
+
+function getPath(obj, path) {
+  return path.split('.').reduce((acc, key) => (acc == null ? undefined : acc[key]), obj);
+}
+
+function renderField(path, value) {
+  const spec = FIELD_ROWS.find(([p]) => p === path);
+  if (!spec) return;
+  const [, label, format] = spec;
+  const shown = format ? format(value) : value;
+  const existing = resultBody.querySelector(`tr[data-path="${path}"]`);
+  if (existing) {
+    existing.lastChild.textContent = shown == null ? '—' : String(shown);
+    return;
+  }
+  // Keep the FIELD_ROWS order even though fields arrive in model order.
+  const tr = row(label, shown, path);
+  const order = FIELD_ROWS.findIndex(([p]) => p === path);
+  const next = Array.from(resultBody.children).find(
+    (el) => FIELD_ROWS.findIndex(([p]) => p === el.dataset.path) > order,
+  );
+  if (next) resultBody.insertBefore(tr, next);
 }
 
 function renderIssues(issues) {
+  issuesListEl.innerHTML = '';
   const items = Array.isArray(issues) ? issues.slice() : [];
   const errors = items.filter((i) => i.severity === 'error');
   const warnings = items.filter((i) => i.severity === 'warn');
@@ -105,17 +165,12 @@ function renderPayload(payload) {
     return;
   }
 
+  resultBody.innerHTML = '';
   row('Статус обработки', 'Обработка завершена');
-  row('Организация', extract.employer_name);
-  row('Сотрудник', extract.employee?.full_name);
-  row('Должность', extract.employee?.position);
-  row('Руководитель', extract.manager?.full_name);
-  row('Дата заявления', extract.request_date);
-  row('Тип отпуска', humanLeaveType(extract.leave?.leave_type));
-  row('Начало отпуска', extract.leave?.start_date);
-  row('Окончание отпуска', extract.leave?.end_date);
-  row('Дней', extract.leave?.days_count);
-  row('Подпись', extract.signature_present ? 'Да' : (extract.signature_present === false ? 'Нет' : 'Неизвестно'));
+  FIELD_ROWS.forEach(([path, label, format]) => {
+    const value = getPath(extract, path);
+    row(label, format ? format(value) : value, path);
+  });
 
   renderIssues(payload.issues);
 }
@@ -134,6 +189,26 @@ function handleNdjsonLine(line, state) {
 
   if (evt.type === 'step') {
     addStep(evt.message || '');
+  } else if (evt.type === 'delta') {
+    appendDraft(evt.step || 'vision', evt.text || '');
+  } else if (evt.type === 'reset') {
+    // Escalated second pass: its transcription and fields replace the first pass's.
+    if (draftEl) {
+      draftEl.textContent = '';
+      draftEl.dataset.step = evt.step || '';
+    }
+    resultBody.innerHTML = '';
+    state.earlyIssues = [];
+    issuesListEl.innerHTML = '';
+    issuesSummaryEl.textContent = 'Ожидание результата…';
+    issuesSummaryEl.className = 'small muted';
+  } else if (evt.type === 'field') {
+    renderField(evt.path, evt.value);
+    if (Array.isArray(evt.issues) && evt.issues.length) {
+      state.earlyIssues.push(...evt.issues);
+      renderIssues(state.earlyIssues);
+      issuesSummaryEl.textContent = 'Предварительная проверка: ' + issuesSummaryEl.textContent;
+    }
   } else if (evt.type === 'result') {
     state.finalPayload = evt.payload;
     state.ok = Boolean(evt.ok);
@@ -173,7 +248,7 @@ btn.addEventListener('click', async () => {
     const reader = res.body.getReader();
     const decoder = new TextDecoder('utf-8');
     let buffer = '';
-    const state = { finalPayload: null, ok: false };
+    const state = { finalPayload: null, ok: false, earlyIssues: [] };
 
     while (true) {
       const { done, value } = await reader.read();
@@ -14,10 +14,16 @@ function extractJsonTail(text) {
 
 /**
  * @param {Response} res
- * @param {{onStep?: (s:string)=>void, signal?: AbortSignal}} opts
+ * @param {{
+ *   onStep?: (s:string)=>void,
+ *   onDelta?: (step:string, text:string)=>void,
+ *   onField?: (path:string, value:any, issues:object[])=>void,
+ *   onReset?: (step:string)=>void,
+ *   signal?: AbortSignal,
+ * }} opts
  */
 export async function parseStreamResponse(res, opts = {}) {
-  const { onStep, signal } = opts;
+  const { onStep, onDelta, onField, onReset, signal } = opts;
   const reader = res.body.getReader();
   const decoder = new TextDecoder('utf-8');
   let buffer = '';
@@ -29,6 +35,10 @@ export async function parseStreamResponse(res, opts = {}) {
     try {
       const evt = JSON.parse(trimmed);
       if (evt.type === 'step') onStep?.(evt.message || '');
+      if (evt.type === 'delta') onDelta?.(evt.step || 'vision', evt.text || '');
+      if (evt.type === 'field') onField?.(evt.path, evt.value, evt.issues || []);
+      // Escalated second pass: drop the draft and fields received so far.
+      if (evt.type === 'reset') onReset?.(evt.step || 'vision.escalated');
       if (evt.type === 'result') finalPayload = evt.payload;
       if (!evt.type && evt.detail) finalPayload = evt;
       return;
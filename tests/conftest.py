@@ -0,0 +1,15 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.settings import reload_settings
+
+
+@pytest.fixture(autouse=True)
+def _settings_snapshot_from_env():
+    # Tests that change env reload the snapshot themselves; restore it from the reverted env afterwards.
+    yield
+    reload_settings()
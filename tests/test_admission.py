@@ -0,0 +1,217 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from fastapi.testclient import TestClient
+
+from app import main
+from app.settings import load_settings
+from app.admission import (
+    PRIORITY_BATCH,
+    PRIORITY_STREAM,
+    AdmissionConfig,
+    AdmissionController,
+    AdmissionRejected,
+    resolve_tenant,
+)
+
+PDF = {"file": ("a.pdf", b"%PDF-1.4 test", "application/pdf")}
+
+
+def test_limit_grows_additively_and_shrinks_multiplicatively():
+    ctrl = AdmissionController(AdmissionConfig(initial_limit=2, min_limit=1, max_limit=4, target_latency_s=10))
+
+    async def run(outcomes):
+        for kwargs in outcomes:
+            (await ctrl.acquire()).release(**kwargs)
+
+    asyncio.run(run([{}] * 6))
+    assert 4 >= ctrl.limit > 3
+    grown = ctrl.limit
+
+    asyncio.run(run([{"overloaded": True}]))
+    assert ctrl.limit == pytest.approx(grown * 0.7)
+    # A second overload inside the same window does not shrink it again.
+    asyncio.run(run([{"overloaded": True}]))
+    assert ctrl.limit == pytest.approx(grown * 0.7)
+    assert ctrl.stats()["limit_decreases"] == 1
+
+
+def test_neutral_outcomes_do_not_move_the_limit():
+    ctrl = AdmissionController(AdmissionConfig(initial_limit=3))
+
+    async def run():
+        slot = await ctrl.acquire()
+        slot.release(neutral=True)
+
+    asyncio.run(run())
+    assert ctrl.limit == 3 and ctrl.in_flight == 0
+
+
+def test_full_queue_rejects_with_retry_after_and_wait_times_out():
+    ctrl = AdmissionController(AdmissionConfig(initial_limit=1, queue_size=1, max_wait_s=0.05, target_latency_s=20))
+
+    async def run():
+        held = await ctrl.acquire()
+        waiting = asyncio.ensure_future(ctrl.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as full:
+            await ctrl.acquire()
+        with pytest.raises(AdmissionRejected) as timed_out:
+            await waiting
+        held.release(neutral=True)
+        return full.value, timed_out.value
+
+    full, timed_out = asyncio.run(run())
+    assert full.reason == "queue_full" and full.retry_after_s == 40
+    assert timed_out.reason == "timeout"
+    stats = ctrl.stats()
+    assert stats["rejected"] == {"queue_full": 1, "timeout": 1, "displaced": 0}
+    assert stats["in_flight"] == 0 and stats["queue_depth"] == {"stream": 0, "extract": 0}
+
+
+def test_stream_requests_are_admitted_first_and_displace_plain_waiters():
+    ctrl = AdmissionController(AdmissionConfig(initial_limit=1, queue_size=2, max_wait_s=5))
+    order = []
+
+    async def take(priority, name):
+        slot = await ctrl.acquire(priority)
+        order.append(name)
+        slot.release(neutral=True)
+
+    async def run():
+        held = await ctrl.acquire()
+        plain_1 = asyncio.ensure_future(take(PRIORITY_BATCH, "plain-1"))
+        plain_2 = asyncio.ensure_future(take(PRIORITY_BATCH, "plain-2"))
+        await asyncio.sleep(0)
+        stream = asyncio.ensure_future(take(PRIORITY_STREAM, "stream"))
+        await asyncio.sleep(0)
+        held.release(neutral=True)
+        await asyncio.gather(plain_1, stream)
+        with pytest.raises(AdmissionRejected) as displaced:
+            await plain_2
+        return displaced.value
+
+    displaced = asyncio.run(run())
+    assert order == ["stream", "plain-1"]
+    assert displaced.reason == "displaced"
+
+
+def test_tenants_share_the_queue_by_weight_and_cap():
+    cfg = AdmissionConfig(initial_limit=1, max_limit=1, queue_size=16, max_wait_s=5, tenants=(("hr", 2, 0),))
+    ctrl = AdmissionController(cfg)
+    order = []
+
+    async def take(tenant, name):
+        slot = await ctrl.acquire(PRIORITY_BATCH, tenant)
+        order.append(name)
+        await asyncio.sleep(0)
+        slot.release(neutral=True)
+
+    async def run():
+        held = await ctrl.acquire(PRIORITY_BATCH, "finance")
+        # Month-end bulk upload queued first, the other departments' requests after it.
+        tasks = [asyncio.ensure_future(take("finance", f"f{i}")) for i in range(4)]
+        await asyncio.sleep(0)
+        tasks += [asyncio.ensure_future(take("hr", f"h{i}")) for i in range(4)]
+        tasks.append(asyncio.ensure_future(take("legal", "l0")))
+        await asyncio.sleep(0)
+        held.release(neutral=True)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    # Weight 2 for hr: two of its requests per finance one, and legal is not stuck behind the bulk upload.
+    assert order[:5] == ["h0", "f0", "h1", "l0", "h2"]
+    tenants = ctrl.stats()["tenants"]
+    assert tenants["finance"]["admitted"] == 5 and tenants["hr"]["weight"] == 2
+    assert tenants["hr"]["wait_ms"]["max"] is not None and tenants["finance"]["queued"] == 0
+
+    capped = AdmissionController(AdmissionConfig(initial_limit=4, tenant_max_in_flight=1, max_wait_s=0.05))
+
+    async def run_capped():
+        held = await capped.acquire(PRIORITY_BATCH, "finance")
+        other = await capped.acquire(PRIORITY_BATCH, "hr")
+        with pytest.raises(AdmissionRejected) as timed_out:
+            await capped.acquire(PRIORITY_BATCH, "finance")
+        held.release(neutral=True)
+        other.release(neutral=True)
+        return timed_out.value
+
+    assert asyncio.run(run_capped()).reason == "timeout"
+    assert capped.stats()["tenants"]["finance"]["rejected"] == 1
+
+
+def test_interactive_reserve_keeps_slots_for_stream_requests():
+    ctrl = AdmissionController(AdmissionConfig(initial_limit=4, max_limit=4, interactive_reserve=0.25, max_wait_s=0.05))
+
+    async def run():
+        plain = [await ctrl.acquire(PRIORITY_BATCH) for _ in range(3)]
+        with pytest.raises(AdmissionRejected):
+            await ctrl.acquire(PRIORITY_BATCH)
+        stream = await ctrl.acquire(PRIORITY_STREAM)
+        for slot in [*plain, stream]:
+            slot.release(neutral=True)
+
+    asyncio.run(run())
+    stats = ctrl.stats()
+    assert stats["interactive_reserved"] == 1 and stats["admitted"] == 4 and stats["in_flight"] == 0
+    # At a limit of one the reserve never blocks plain requests entirely.
+    assert AdmissionController(AdmissionConfig(initial_limit=1, interactive_reserve=0.5)).stats()["interactive_reserved"] == 0
+
+
+def test_tenant_from_api_key_or_header():
+    keys = {"k-fin": "finance"}
+    assert resolve_tenant({"x-api-key": "k-fin", "x-tenant": "hr"}, header="X-Tenant", api_keys=keys) == "finance"
+    assert resolve_tenant({"authorization": "Bearer k-fin"}, header="X-Tenant", api_keys=keys) == "finance"
+    assert resolve_tenant({"x-tenant": " HR "}, header="X-Tenant", api_keys=keys) == "hr"
+    assert resolve_tenant({"x-tenant": "../etc"}, header="X-Tenant", api_keys=keys) == "default"
+    assert resolve_tenant({"x-tenant": "hr"}, header="", api_keys=keys) == "default"
+
+    cfg = load_settings({"ADMISSION_TENANTS": "Finance=1/2, hr=3, bad=x", "TENANT_API_KEYS": "k1=finance"})
+    assert cfg.ADMISSION_TENANTS == (("finance", 1, 2), ("hr", 3, 0)) and cfg.TENANT_API_KEYS == (("k1", "finance"),)
+    assert "k1" not in cfg.summary()
+
+
+def test_extract_returns_429_with_retry_after_when_saturated(monkeypatch):
+    ctrl = AdmissionController(AdmissionConfig(initial_limit=1, queue_size=0, target_latency_s=30))
+    monkeypatch.setattr(main, "ADMISSION", ctrl)
+    monkeypatch.setattr(main, "_admission_generation", main.get_settings().GENERATION)
+    held = asyncio.run(ctrl.acquire())
+    client = TestClient(main.app)
+
+    for path in ("/api/extract", "/api/extract/stream"):
+        r = client.post(path, files=PDF)
+        assert r.status_code == 429
+        assert r.headers["retry-after"] == "30"
+        body = r.json()
+        assert body["issues"][0]["code"] == "server_busy"
+        assert body["decision"]["status"] == "error"
+
+    r = client.post("/api/extract", files=PDF, headers={"X-Tenant": "hr"})
+    assert r.status_code == 429
+
+    stats = client.get("/api/admission").json()
+    assert stats["enabled"] is True
+    assert stats["tenants"]["hr"]["rejected"] == 1
+    assert stats["in_flight"] == 1 and stats["rejected"]["queue_full"] == 3
+    held.release(neutral=True)
+
+
+def test_upstream_overload_shrinks_limit_through_endpoint(monkeypatch):
+    ctrl = AdmissionController(AdmissionConfig(initial_limit=4))
+    monkeypatch.setattr(main, "ADMISSION", ctrl)
+    monkeypatch.setattr(main, "_admission_generation", main.get_settings().GENERATION)
+
+    def overloaded(data, filename, **kwargs):
+        raise main.UpstreamAIError(step="vision", status_code=529, message="Overloaded")
+
+    monkeypatch.setattr(main, "extract_leave_request_with_debug", overloaded)
+    r = TestClient(main.app).post("/api/extract", files=PDF)
+
+    assert r.status_code == 503
+    assert ctrl.limit == pytest.approx(2.8)
+    assert ctrl.in_flight == 0
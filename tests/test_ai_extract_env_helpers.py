@@ -3,25 +3,23 @@ from pathlib import Path
 
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-from app.ai_extract import _max_image_b64_chars_limit, _resolve_structured_model
+from app.ai_extract import _resolve_structured_model
+from app.settings import load_settings
 
 
-def test_prefers_canonical_max_image_b64_chars(monkeypatch):
-    monkeypatch.setenv('MAX_IMAGE_B64_CHARS', '12345')
-    monkeypatch.setenv('PDF_MAX_B64_BYTES', '999')
-    assert _max_image_b64_chars_limit() == 12345
+def test_prefers_canonical_max_image_b64_chars():
+    s = load_settings({'MAX_IMAGE_B64_CHARS': '12345', 'PDF_MAX_B64_BYTES': '999'})
+    assert s.MAX_IMAGE_B64_CHARS == 12345
 
 
-def test_falls_back_to_legacy_pdf_max_b64_bytes(monkeypatch):
-    monkeypatch.delenv('MAX_IMAGE_B64_CHARS', raising=False)
-    monkeypatch.setenv('PDF_MAX_B64_BYTES', '54321')
-    assert _max_image_b64_chars_limit() == 54321
+def test_falls_back_to_legacy_pdf_max_b64_bytes():
+    s = load_settings({'PDF_MAX_B64_BYTES': '54321'})
+    assert s.MAX_IMAGE_B64_CHARS == 54321
 
 
-def test_invalid_env_uses_default(monkeypatch):
-    monkeypatch.setenv('MAX_IMAGE_B64_CHARS', 'abc')
-    monkeypatch.delenv('PDF_MAX_B64_BYTES', raising=False)
-    assert _max_image_b64_chars_limit() == 4_000_000
+def test_invalid_env_uses_default():
+    s = load_settings({'MAX_IMAGE_B64_CHARS': 'abc'})
+    assert s.MAX_IMAGE_B64_CHARS == 4_000_000
 
 
 def test_resolve_structured_model_defaults_to_sonnet():
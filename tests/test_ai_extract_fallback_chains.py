@@ -5,6 +5,7 @@ sys.path.append(str(Path(__file__).resolve().parents[1]))
 
 from app import ai_extract
 from app.schemas import LeaveRequestExtract
+from app.settings import reload_settings
 
 
 class FakeAPIError(Exception):
@@ -78,6 +79,7 @@ def _prepare(monkeypatch, plan):
     monkeypatch.setenv("ANTHROPIC_VISION_MODEL", "claude-opus-4-6")
     monkeypatch.setenv("ANTHROPIC_STRUCTURED_MODEL", "claude-opus-4-6")
     monkeypatch.delenv("ANTHROPIC_STRUCTURED_FALLBACK_MODEL", raising=False)
+    reload_settings()
 
     monkeypatch.setattr(ai_extract.anthropic, "APIError", FakeAPIError)
     monkeypatch.setattr(ai_extract.anthropic, "APITimeoutError", FakeTimeoutError)
@@ -89,7 +91,7 @@ def _prepare(monkeypatch, plan):
     monkeypatch.setattr(
         ai_extract,
         "_render_pdf_to_image_blocks",
-        lambda pdf_bytes, debug_steps, on_debug=None: ([{"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": "x"}}], {"pages_sent": 1, "total_pages": 1, "target_long_edge": 1024, "approx_b64_chars": 1, "color_mode": "gray"}),
+        lambda pdf_bytes, debug_steps, on_debug=None, settings=None, memory=None: ([{"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": "x"}}], {"pages_sent": 1, "total_pages": 1, "target_long_edge": 1024, "approx_b64_chars": 1, "color_mode": "gray"}),
     )
     return fake_messages
 
@@ -140,6 +142,24 @@ def test_structured_parse_timeout_then_fallback_timeout_then_create_success(monk
     assert messages.calls == {"create": 2, "parse": 2}
 
 
+def test_structured_create_fallback_repairs_truncated_json(monkeypatch):
+    truncated = '```json\n{"schema_version":"1.0","employee":{"full_name":"Иванов Иван Иванович"},"request_date":"2026-01-01","leave":{"leave_type":"annual_paid","start_date":"2026-02-01","end_date":"2026-02-14","days_count":14},"raw_text":"Прошу предоставить отпу'
+    _prepare(
+        monkeypatch,
+        {
+            "create": [_Msg("TRANSCRIPTION: ok"), _Msg(truncated)],
+            "parse": [FakeTimeoutError("t1"), FakeTimeoutError("t2")],
+        },
+    )
+
+    parsed, debug_steps = ai_extract.extract_leave_request_with_debug(b"%PDF-1.4", filename="x.pdf")
+
+    assert parsed.raw_text == "Прошу предоставить отпу"
+    assert parsed.leave.days_count == 14
+    assert any("structured.fallback.repair" in s for s in debug_steps)
+    assert any("JSON был обрезан" in n for n in parsed.quality.notes)
+
+
 def test_structured_parse_422_does_not_try_any_fallback(monkeypatch):
     messages = _prepare(
         monkeypatch,
@@ -6,6 +6,7 @@ import pytest
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
 from app.ai_extract import _render_pdf_to_image_blocks
+from app.settings import load_settings
 
 
 class _Rect:
@@ -16,6 +17,8 @@ class _Rect:
 class _Pix:
     width = 100
     height = 100
+    n = 1
+    samples = bytes(100 * 100)
 
     def tobytes(self, *args, **kwargs):
         return b"abcd"
@@ -39,8 +42,7 @@ class _Doc:
 
 
 def test_render_pdf_uses_max_image_b64_chars(monkeypatch):
-    monkeypatch.setenv("MAX_IMAGE_B64_CHARS", "3")
     monkeypatch.setattr("app.ai_extract.fitz.open", lambda **kwargs: _Doc())
 
     with pytest.raises(RuntimeError, match="approx_b64_chars"):
-        _render_pdf_to_image_blocks(b"dummy", [])
+        _render_pdf_to_image_blocks(b"dummy", [], settings=load_settings({"MAX_IMAGE_B64_CHARS": "3"}))
@@ -0,0 +1,63 @@
+import sys
+from pathlib import Path
+
+import fitz
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.ai_extract import _choose_pages, _page_keyword_score, _render_pdf_to_image_blocks
+from app.settings import load_settings
+
+
+def _pdf(pages: list[list[tuple[float, str]]]) -> bytes:
+    doc = fitz.open()
+    for lines in pages:
+        page = doc.new_page()
+        for y, text in lines:
+            page.insert_text((72, y), text, fontname="china-s", fontsize=14)
+    return doc.tobytes()
+
+
+def _score(score: float, blank: bool = False) -> dict:
+    return {"score": score, "blank": blank}
+
+
+def test_keyword_score_folds_case_and_yo():
+    assert _page_keyword_score("ЗАЯВЛЕНИЕ. Прошу предоставить отпуск") > _page_keyword_score("Приложение 1")
+    assert _page_keyword_score("") == 0
+
+
+def test_choose_pages_skips_blank_and_keeps_document_order():
+    scores = [_score(0.0, blank=True), _score(2.0), _score(9.0), _score(2.0)]
+    assert _choose_pages(scores, 1) == [2]
+    assert _choose_pages(scores, 2) == [1, 2]
+
+
+def test_choose_pages_falls_back_when_every_page_is_blank():
+    assert _choose_pages([_score(0.0, blank=True), _score(0.0, blank=True)], 1) == [0]
+
+
+def test_render_selects_application_page_after_blank_and_attachment():
+    pdf = _pdf(
+        [
+            [],
+            [(100, "Приложение к договору")],
+            [(100, "Заявление"), (140, "Прошу предоставить ежегодный отпуск"), (650, "Подпись ________")],
+        ]
+    )
+
+    blocks, info = _render_pdf_to_image_blocks(pdf, [], settings=load_settings({"PDF_MAX_PAGES": "1"}))
+
+    assert len(blocks) == 1
+    assert info["selected_pages"] == [2]
+    assert info["page_stats"][0]["page"] == 2
+    assert info["page_scores"][0]["blank"] is True
+
+
+def test_render_first_mode_keeps_leading_pages():
+    pdf = _pdf([[], [(100, "Заявление на отпуск")]])
+
+    _, info = _render_pdf_to_image_blocks(pdf, [], settings=load_settings({"PDF_MAX_PAGES": "1", "PDF_PAGE_SELECTION": "first"}))
+
+    assert info["selected_pages"] == [0]
+    assert info["page_scores"] == []
@@ -0,0 +1,269 @@
+import json
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from fastapi.testclient import TestClient
+
+from app import ai_extract, main
+from app.escalation import EscalationStats
+from app.schemas import LeaveRequestExtract
+from app.settings import reload_settings
+from app.validation import validate_extract, validate_partial
+
+DRAFT_CHUNKS = ["TRANSCRIPTION:\n", "Прошу предоставить ", "ежегодный отпуск\n", "CANDIDATE_FIELDS:\n", "leave.days_count: 14"]
+STRUCTURED_JSON = (
+    '{"employee": {"full_name": "Иванов Иван Иванович", "position": null}, "request_date": "2026-01-01", '
+    '"leave": {"leave_type": "ежегодный оплачиваемый", "start_date": "2026-02-01", "end_date": "2026-02-14", "days_count": 14}, '
+    '"signature_present": true, "signature_confidence": 0.8, "quality": {"overall_confidence": 0.8, "notes": ["ok"]}}'
+)
+
+
+class _Msg:
+    def __init__(self, text: str, request_id: str = "req_ok"):
+        self.content = [{"type": "text", "text": text}]
+        self.request_id = request_id
+
+
+class _ParseResult:
+    def __init__(self, parsed_output):
+        self.parsed_output = parsed_output
+
+
+class FakeStream:
+    def __init__(self, chunks, parsed_output=None):
+        self.text_stream = iter(chunks)
+        self._text = "".join(chunks)
+        self._parsed_output = parsed_output
+        self.request_id = "req_stream"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def get_final_message(self):
+        msg = _Msg(self._text)
+        msg.request_id = None
+        msg.parsed_output = self._parsed_output
+        return msg
+
+
+class FakeMessages:
+    def __init__(self):
+        self.calls = {"create": 0, "parse": 0, "stream": 0}
+        self.parse_prompts = []
+
+    def create(self, **kwargs):
+        self.calls["create"] += 1
+        return _Msg("".join(DRAFT_CHUNKS))
+
+    def stream(self, **kwargs):
+        self.calls["stream"] += 1
+        if "output_format" in kwargs:
+            chunks = [STRUCTURED_JSON[i : i + 7] for i in range(0, len(STRUCTURED_JSON), 7)]
+            return FakeStream(chunks, parsed_output=LeaveRequestExtract.model_validate_json(STRUCTURED_JSON))
+        return FakeStream(DRAFT_CHUNKS)
+
+    def parse(self, **kwargs):
+        self.calls["parse"] += 1
+        self.parse_prompts.append(kwargs["messages"][0]["content"])
+        return _ParseResult(_valid_extract())
+
+
+class FakeClient:
+    def __init__(self, messages: FakeMessages):
+        self.messages = messages
+
+    def with_options(self, **kwargs):
+        return self
+
+
+def _valid_extract():
+    return LeaveRequestExtract.model_validate(
+        {
+            "employee": {"full_name": "Иванов Иван Иванович"},
+            "request_date": "2026-01-01",
+            "leave": {"leave_type": "annual_paid", "start_date": "2026-02-01", "end_date": "2026-02-14", "days_count": 14},
+            "signature_present": True,
+            "signature_confidence": 0.8,
+            "quality": {"overall_confidence": 0.8},
+        }
+    )
+
+
+def _prepare(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    monkeypatch.delenv("MOCK_MODE", raising=False)
+    monkeypatch.delenv("ANTHROPIC_VISION_STREAM", raising=False)
+    monkeypatch.delenv("ANTHROPIC_STRUCTURED_STREAM", raising=False)
+    reload_settings()
+    messages = FakeMessages()
+    monkeypatch.setattr(ai_extract, "_create_anthropic_client", lambda **kwargs: FakeClient(messages))
+    monkeypatch.setattr(
+        ai_extract,
+        "_render_pdf_to_image_blocks",
+        lambda pdf_bytes, debug_steps, on_debug=None, settings=None, memory=None: ([{"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": "x"}}], {"pages_sent": 1, "total_pages": 1, "target_long_edge": 1024, "approx_b64_chars": 1, "color_mode": "gray"}),
+    )
+    return messages
+
+
+def test_vision_stream_forwards_deltas_and_keeps_draft_identical(monkeypatch):
+    messages = _prepare(monkeypatch)
+    ai_extract.extract_leave_request_with_debug(b"%PDF-1.4", filename="x.pdf")
+    assert messages.calls["create"] == 1 and messages.calls["stream"] == 0
+
+    deltas = []
+    _, debug_steps = ai_extract.extract_leave_request_with_debug(
+        b"%PDF-1.4", filename="x.pdf", on_delta=lambda step, text: deltas.append((step, text))
+    )
+
+    assert messages.calls["stream"] == 1
+    assert deltas == [("vision", chunk) for chunk in DRAFT_CHUNKS]
+    assert messages.parse_prompts[0] == messages.parse_prompts[1]
+    assert any("method=messages.stream" in s for s in debug_steps)
+    assert any(s.startswith("Шаг vision: ttft_ms=") for s in debug_steps)
+    assert "Шаг vision: request_id=req_stream" in debug_steps
+
+
+def test_vision_stream_can_be_disabled(monkeypatch):
+    messages = _prepare(monkeypatch)
+    monkeypatch.setenv("ANTHROPIC_VISION_STREAM", "0")
+    reload_settings()
+    deltas = []
+
+    ai_extract.extract_leave_request_with_debug(b"%PDF-1.4", filename="x.pdf", on_delta=lambda *a: deltas.append(a))
+
+    assert messages.calls["stream"] == 0 and messages.calls["create"] == 1
+    assert deltas == []
+
+
+def test_stream_endpoint_emits_delta_events_and_ttft_in_trace(monkeypatch):
+    def fake_extract(data, filename, *, on_debug=None, on_delta=None, on_field=None, on_reset=None):
+        steps = []
+        for msg in ("Шаг vision.call: method=messages.stream", "Шаг vision: ttft_ms=420"):
+            steps.append(msg)
+            on_debug(msg)
+        for chunk in DRAFT_CHUNKS:
+            on_delta("vision", chunk)
+        steps.append("Шаг vision: elapsed_ms=1500")
+        return _valid_extract(), steps
+
+    monkeypatch.setattr(main, "extract_leave_request_with_debug", fake_extract)
+    client = TestClient(main.app)
+    r = client.post("/api/extract/stream", files={"file": ("a.pdf", b"%PDF-1.4 test", "application/pdf")})
+
+    events = [json.loads(line) for line in r.text.splitlines() if line.strip()]
+    deltas = [e for e in events if e["type"] == "delta"]
+    assert "".join(e["text"] for e in deltas) == "".join(DRAFT_CHUNKS)
+    assert {e["step"] for e in deltas} == {"vision"}
+    assert events[-1]["type"] == "result" and events[-1]["ok"] is True
+    assert events[-1]["payload"]["trace"]["timings_ms"] == {"vision.ttft": 420, "vision": 1500}
+
+
+def test_structured_stream_emits_final_fields_in_order(monkeypatch):
+    messages = _prepare(monkeypatch)
+    fields = []
+
+    parsed, debug_steps = ai_extract.extract_leave_request_with_debug(
+        b"%PDF-1.4", filename="x.pdf", on_field=lambda path, value: fields.append((path, value))
+    )
+
+    assert messages.calls == {"create": 1, "parse": 0, "stream": 1}
+    assert fields[:3] == [("employee.full_name", "Иванов Иван Иванович"), ("employee.position", None), ("request_date", "2026-01-01")]
+    assert ("leave.leave_type", "annual_paid") in fields
+    assert ("quality.notes", ["ok"]) in fields
+    assert len({path for path, _ in fields}) == len(fields)
+    assert parsed.leave.days_count == 14
+    assert any(s.startswith("Шаг structured.parse: ttft_ms=") for s in debug_steps)
+
+
+def test_validate_partial_runs_only_checks_with_final_inputs():
+    assert validate_partial({}) == []
+    assert [i.code for i in validate_partial({"leave.start_date": "01.02.2026"})] == ["bad_start_date"]
+    assert validate_partial({"leave.end_date": None}) == []
+    assert [i.code for i in validate_partial({"leave.end_date": None, "leave.days_count": None})] == ["missing_end_or_days"]
+    inverted = {"leave.start_date": "2026-02-14", "leave.end_date": "2026-02-01"}
+    assert [i.code for i in validate_partial(inverted)] == ["dates_inverted"]
+
+    full = LeaveRequestExtract.model_validate_json(STRUCTURED_JSON)
+    full.quality.overall_confidence = 0.3
+    flat = {
+        "employee.full_name": full.employee.full_name,
+        "leave.start_date": full.leave.start_date,
+        "leave.end_date": full.leave.end_date,
+        "leave.days_count": full.leave.days_count,
+        "quality.overall_confidence": full.quality.overall_confidence,
+    }
+    assert validate_partial(flat) == validate_extract(full)
+
+
+def test_stream_endpoint_emits_field_events_with_early_issues(monkeypatch):
+    def fake_extract(data, filename, *, on_debug=None, on_delta=None, on_field=None, on_reset=None):
+        on_field("employee.full_name", "Иванов Иван Иванович")
+        on_field("leave.start_date", "2026-02-14")
+        on_field("leave.end_date", "2026-02-01")
+        on_field("leave.days_count", 14)
+        return _valid_extract(), []
+
+    monkeypatch.setattr(main, "extract_leave_request_with_debug", fake_extract)
+    client = TestClient(main.app)
+    r = client.post("/api/extract/stream", files={"file": ("a.pdf", b"%PDF-1.4 test", "application/pdf")})
+
+    events = [json.loads(line) for line in r.text.splitlines() if line.strip()]
+    field_events = [e for e in events if e["type"] == "field"]
+    assert [e["path"] for e in field_events] == ["employee.full_name", "leave.start_date", "leave.end_date", "leave.days_count"]
+    assert [[i["code"] for i in e["issues"]] for e in field_events] == [[], [], ["dates_inverted"], []]
+    assert events[-1]["type"] == "result"
+
+
+def test_stream_endpoint_resets_draft_and_fields_on_escalated_pass(monkeypatch):
+    messages = _prepare(monkeypatch)
+    monkeypatch.setenv("PDF_ESCALATION", "1")
+    reload_settings()
+    monkeypatch.setattr(ai_extract, "ESCALATION", EscalationStats())
+    # Low confidence: the first pass escalates, and both passes raise the same early issue.
+    low = STRUCTURED_JSON.replace('"overall_confidence": 0.8', '"overall_confidence": 0.5')
+    draft_stream = messages.stream
+
+    def stream(**kwargs):
+        if "output_format" not in kwargs:
+            return draft_stream(**kwargs)
+        chunks = [low[i : i + 7] for i in range(0, len(low), 7)]
+        return FakeStream(chunks, parsed_output=LeaveRequestExtract.model_validate_json(low))
+
+    messages.stream = stream
+    client = TestClient(main.app)
+    r = client.post("/api/extract/stream", files={"file": ("a.pdf", b"%PDF-1.4 escalated", "application/pdf")})
+
+    events = [json.loads(line) for line in r.text.splitlines() if line.strip()]
+    draft = [e.get("step") for e in events if e["type"] in ("delta", "reset")]
+    assert draft == ["vision"] * len(DRAFT_CHUNKS) + ["vision.escalated"] * (len(DRAFT_CHUNKS) + 1)
+    assert [e["type"] for e in events if e.get("step") == "vision.escalated"][0] == "reset"
+    low_confidence = [e for e in events if e["type"] == "field" and any(i["code"] == "low_confidence" for i in e["issues"])]
+    assert len(low_confidence) == 2
+    assert events[-1]["type"] == "result" and events[-1]["ok"] is True
+
+
+def test_stream_endpoint_resets_only_on_the_reset_callback(monkeypatch):
+    def fake_extract(data, filename, *, on_debug=None, on_delta=None, on_field=None, on_reset=None):
+        for _ in range(2):
+            on_delta("vision.escalated", "")
+            on_field("leave.start_date", "2026-02-14")
+            on_field("leave.end_date", "2026-02-01")
+        on_reset("vision.escalated")
+        on_field("leave.start_date", "2026-02-14")
+        on_field("leave.end_date", "2026-02-01")
+        return _valid_extract(), []
+
+    monkeypatch.setattr(main, "extract_leave_request_with_debug", fake_extract)
+    client = TestClient(main.app)
+    r = client.post("/api/extract/stream", files={"file": ("a.pdf", b"%PDF-1.4 reset", "application/pdf")})
+
+    events = [json.loads(line) for line in r.text.splitlines() if line.strip()]
+    assert [e["type"] for e in events if e["type"] in ("delta", "reset")] == ["delta", "delta", "reset"]
+    inverted = [i for e in events if e["type"] == "field" for i in e["issues"] if i["code"] == "dates_inverted"]
+    # Once before the reset (the repeat is deduplicated), once after it.
+    assert len(inverted) == 2
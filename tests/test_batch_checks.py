@@ -0,0 +1,116 @@
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from fastapi.testclient import TestClient
+
+from app.batch_checks import run_batch_checks
+from app.compliance import run_compliance_checks
+from app.issues import build_decision, from_compliance, from_validation
+from app.main import app
+from app.schemas import MAX_BATCH_CHECK_EXTRACTS, LeaveRequestExtract
+from app.settings import reload_settings
+from app.validation import validate_extract
+
+
+def _per_record(ex: LeaveRequestExtract) -> dict:
+    compliance, needs_rewrite = run_compliance_checks(ex)
+    issues = [*from_validation(validate_extract(ex)), *from_compliance(compliance)]
+    return {
+        "issues": [i.model_dump() for i in issues],
+        "decision": build_decision(issues).model_dump(),
+        "needs_rewrite": needs_rewrite,
+    }
+
+
+def _random_extracts(n: int, seed: int = 7) -> list[LeaveRequestExtract]:
+    rnd = random.Random(seed)
+    dates = [None, "", "2026-02-01", "2026-02-10", "2026-02-16", "2026-02-20", "2026-13-01", "01.02.2026", " "]
+    # Public holidays in range: January and May holidays change the v2 day counts and working-day notice.
+    dates += ["2025-12-20", "2026-01-05", "2026-01-12", "2026-04-20", "2026-05-01", "2026-05-10"]
+    names = [None, "", "  ", "Иванов И.И."]
+    out = []
+    for _ in range(n):
+        out.append(
+            LeaveRequestExtract.model_validate(
+                {
+                    "employer_name": rnd.choice(names),
+                    "employee": {"full_name": rnd.choice(names)},
+                    "manager": {"full_name": rnd.choice(names)},
+                    "request_date": rnd.choice(dates),
+                    "leave": {
+                        "leave_type": rnd.choice(["annual_paid", "unpaid", "study", None]),
+                        "start_date": rnd.choice(dates),
+                        "end_date": rnd.choice(dates),
+                        "days_count": rnd.choice([None, -1, 0, 7, 11, 14, 21]),
+                        "comment": rnd.choice([None, "", "по семейным обстоятельствам"]),
+                    },
+                    "signature_present": rnd.choice([None, True, False]),
+                    "signature_confidence": rnd.choice([None, 0.3, 0.6, 0.9]),
+                    "raw_text": rnd.choice([None, "Прошу отпуск", "ПО СОСТОЯНИЮ ЗДОРОВЬЯ"]),
+                    "quality": {
+                        "overall_confidence": rnd.choice([None, 0.2, 0.59, 0.6, 1.0]),
+                        "notes": rnd.choice([[], ["Возможно искажение даты"], ["ok"]]),
+                    },
+                }
+            )
+        )
+    return out
+
+
+def test_batch_matches_per_record_engine():
+    extracts = _random_extracts(600)
+    batch = run_batch_checks(extracts)
+    assert len(batch) == len(extracts)
+    for ex, got in zip(extracts, batch):
+        assert got == _per_record(ex)
+
+
+@pytest.mark.parametrize("pins", ["COUNT-002@1,DATE-003@1", "COUNT-003@1,LAW-122-001@1"])
+def test_batch_follows_pinned_rule_versions(monkeypatch, pins):
+    monkeypatch.setenv("COMPLIANCE_RULE_PINS", pins)
+    reload_settings()
+    try:
+        may = LeaveRequestExtract.model_validate(
+            {"request_date": "2026-04-20", "leave": {"leave_type": "annual_paid", "start_date": "2026-05-01", "end_date": "2026-05-10", "days_count": 10}}
+        )
+        extracts = [may, *_random_extracts(600, seed=11)]
+        batch = run_batch_checks(extracts)
+        for ex, got in zip(extracts, batch):
+            assert got == _per_record(ex)
+        codes = {it["code"] for it in batch[0]["issues"]}
+        # v1 counts the May holidays as leave days; v2 expects 9 and flags the 10.
+        assert ("days_count_mismatch" in codes) == ("COUNT-002@1" not in pins)
+    finally:
+        monkeypatch.delenv("COMPLIANCE_RULE_PINS")
+        reload_settings()
+
+
+def test_batch_covers_every_issue_code():
+    codes = {it["code"] for res in run_batch_checks(_random_extracts(600)) for it in res["issues"]}
+    assert {"days_count_mismatch", "short_notice", "low_confidence", "unpaid_no_reason", "needs_human_check"} <= codes
+
+
+def test_batch_empty_input():
+    assert run_batch_checks([]) == []
+
+
+def test_check_endpoint_accepts_extract_json_only():
+    client = TestClient(app)
+    extracts = _random_extracts(5, seed=3)
+    r = client.post("/api/check", json={"extracts": [ex.model_dump() for ex in extracts]})
+    assert r.status_code == 200
+    js = r.json()
+    assert js["count"] == 5
+    assert js["results"] == [_per_record(ex) for ex in extracts]
+
+
+def test_check_endpoint_rejects_oversized_batch():
+    client = TestClient(app)
+    r = client.post("/api/check", json={"extracts": [{}] * (MAX_BATCH_CHECK_EXTRACTS + 1)})
+    assert r.status_code == 422
+    assert r.json()["detail"][0]["type"] == "too_long"
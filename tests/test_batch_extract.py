@@ -0,0 +1,105 @@
+import io
+import json
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app import batch_extract
+from app.ai_extract import UpstreamAIError
+from app.schemas import LeaveRequestExtract
+
+STEPS = ["Шаг vision: elapsed_ms=1200", "Шаг structured.parse: elapsed_ms=300"]
+
+
+def _extract():
+    return LeaveRequestExtract.model_validate(
+        {
+            "employee": {"full_name": "Иванов Иван Иванович"},
+            "request_date": "2026-01-01",
+            "leave": {"leave_type": "annual_paid", "start_date": "2026-02-01", "end_date": "2026-02-14", "days_count": 14},
+            "signature_present": True,
+            "signature_confidence": 0.9,
+            "quality": {"overall_confidence": 0.9, "notes": []},
+        }
+    )
+
+
+def _install_fake(monkeypatch, failing=()):
+    calls = []
+
+    def fake(data, filename, backend=None):
+        calls.append(filename)
+        if filename in failing:
+            raise UpstreamAIError(step="vision", status_code=503, message="Anthropic overloaded", debug_steps=["Шаг vision: 529"])
+        return _extract(), list(STEPS)
+
+    monkeypatch.setattr(batch_extract, "extract_leave_request_with_debug", fake)
+    return calls
+
+
+def _scans(tmp_path):
+    root = tmp_path / "scans"
+    (root / "2019").mkdir(parents=True)
+    for name in ("2019/a.pdf", "2019/b.PDF", "c.pdf"):
+        (root / name).write_bytes(b"%PDF-1.4 " + name.encode())
+    (root / "notes.txt").write_text("не PDF")
+    return root
+
+
+def _records(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_find_pdfs_accepts_dirs_and_globs_without_duplicates(tmp_path):
+    root = _scans(tmp_path)
+    found = batch_extract.find_pdfs([str(root), str(root / "2019" / "*.pdf")])
+    assert [p.name for p in found] == ["a.pdf", "b.PDF", "c.pdf"]
+
+
+def test_run_writes_records_and_resumes_from_checkpoint(tmp_path, monkeypatch):
+    root = _scans(tmp_path)
+    out = tmp_path / "out" / "results.jsonl"
+    calls = _install_fake(monkeypatch, failing={"b.PDF"})
+    stream = io.StringIO()
+
+    statuses = batch_extract.run([str(root)], out, workers=2, stream=stream)
+    assert statuses[batch_extract.STATUS_FAILED] == 1 and sum(statuses.values()) == 3
+    records = {Path(r["file"]).name: r for r in _records(out)}
+    ok = records["a.pdf"]
+    assert ok["status"] == ok["response"]["decision"]["status"]
+    assert ok["response"]["extract"]["employee"]["full_name"] == "Иванов Иван Иванович"
+    assert ok["response"]["trace"]["timings_ms"] == {"vision": 1200, "structured.parse": 300}
+    assert "debug_steps" not in ok["response"] and len(ok["sha256"]) == 64
+    failed = records["b.PDF"]
+    assert failed["status"] == "failed"
+    assert failed["error"] == {"type": "UpstreamAIError", "step": "vision", "status": 503, "message": "Anthropic overloaded"}
+    assert "[3/3]" in stream.getvalue() and "Готово: обработано 3 из 3" in stream.getvalue()
+
+    # Everything is in the checkpoint: a rerun does nothing.
+    calls.clear()
+    stream = io.StringIO()
+    assert not batch_extract.run([str(root)], out, workers=2, stream=stream)
+    assert calls == [] and "пропущено по checkpoint: 3" in stream.getvalue()
+
+    # --retry-failed reprocesses only the failed document; a modified file counts as new.
+    (root / "c.pdf").write_bytes(b"%PDF-1.4 c, second scan")
+    calls = _install_fake(monkeypatch)
+    statuses = batch_extract.run([str(root)], out, workers=2, retry_failed=True, stream=io.StringIO())
+    assert sorted(calls) == ["b.PDF", "c.pdf"] and not statuses[batch_extract.STATUS_FAILED]
+    assert len(_records(out)) == 5
+
+
+def test_main_exit_code_and_debug_steps(tmp_path, monkeypatch):
+    root = _scans(tmp_path)
+    out = tmp_path / "results.jsonl"
+    _install_fake(monkeypatch, failing={"c.pdf"})
+    monkeypatch.setattr(sys, "stderr", io.StringIO())
+    assert batch_extract.main([str(root), "--out", str(out), "--workers", "1", "--debug"]) == 1
+    records = {Path(r["file"]).name: r for r in _records(out)}
+    assert records["a.pdf"]["response"]["debug_steps"] == STEPS
+    assert records["c.pdf"]["debug_steps"] == ["Шаг vision: 529"]
+    assert (tmp_path / "results.jsonl.checkpoint").exists()
+
+    _install_fake(monkeypatch)
+    assert batch_extract.main([str(root), "--out", str(out), "--retry-failed"]) == 0
@@ -0,0 +1,99 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.compliance_rules import DispatchPlan, RuleDef, current_plan
+from app.compliance_rules.registry import parse_pins
+from app.compliance_rules.rules import RULES
+from app.schemas import LeaveRequestExtract
+from app.settings import load_settings, reload_settings
+
+
+def _rule(rule_id="T-001", version=1, requires=(), when=lambda f: True, message="msg"):
+    return RuleDef(
+        rule_id=rule_id,
+        code=f"code_{rule_id}_{version}",
+        level="warn",
+        message=message,
+        legal_basis="basis",
+        action_hint="hint",
+        requires=requires,
+        when=when,
+        version=version,
+    )
+
+
+def _extract(**leave):
+    return LeaveRequestExtract.model_validate({"leave": leave})
+
+
+def test_rule_skipped_when_required_inputs_absent():
+    calls = []
+    plan = DispatchPlan([_rule(requires=("start", "end"), when=lambda f: calls.append(1) or True)])
+
+    assert plan.run(_extract(start_date="2026-02-01")) == []
+    assert calls == []
+    assert plan.profile()[0]["skipped"] == 1
+
+    issues = plan.run(_extract(start_date="2026-02-01", end_date="2026-02-03"))
+    assert [i.code for i in issues] == ["code_T-001_1"]
+    assert plan.profile()[0]["evaluated"] == 1
+    assert plan.profile()[0]["fired"] == 1
+
+
+def test_latest_version_is_active_unless_pinned():
+    rules = [_rule(version=1), _rule(version=2)]
+    assert DispatchPlan(rules).rule("T-001").version == 2
+    assert DispatchPlan(rules, pins={"T-001": 1}).rule("T-001").version == 1
+    with pytest.raises(ValueError):
+        DispatchPlan(rules, pins={"T-001": 3})
+
+
+def test_message_template_uses_details():
+    plan = DispatchPlan([_rule(requires=("expected_days",), when=lambda f: {"n": f["expected_days"]}, message="days={n}")])
+    issue = plan.run(_extract(start_date="2026-02-01", end_date="2026-02-03"))[0]
+    assert issue.message == "days=3"
+    assert issue.details == {"n": 3}
+
+
+def test_rule_exception_becomes_internal_error_issue():
+    plan = DispatchPlan([_rule(when=lambda f: 1 / 0)])
+    issue = plan.run(_extract())[0]
+    assert issue.code == "compliance_internal_error"
+    assert issue.rule_id == "SYS-001"
+    assert issue.message.endswith("ZeroDivisionError")
+    assert issue.details is None
+    assert plan.profile()[0]["errors"] == 1
+
+
+def test_parse_pins():
+    assert parse_pins("COUNT-002@1, DATE-003@2,bad,X@y") == {"COUNT-002": 1, "DATE-003": 2}
+    assert parse_pins(None) == {}
+
+
+def test_pins_come_from_the_settings_snapshot_and_follow_reloads(tmp_path, monkeypatch):
+    env_file = tmp_path / ".env"
+    env_file.write_text("COMPLIANCE_RULE_PINS=COUNT-002@1\nBATCH_WORKERS=2\n")
+    cfg = load_settings({}, env_file=str(env_file))
+    assert (cfg.COMPLIANCE_RULE_PINS, cfg.BATCH_WORKERS) == ("COUNT-002@1", 2)
+    assert "compliance_rule_pins=COUNT-002@1" in cfg.summary()
+
+    latest = current_plan().rule("COUNT-002").version
+    monkeypatch.setenv("COMPLIANCE_RULE_PINS", "COUNT-002@1")
+    reload_settings()
+    assert current_plan().rule("COUNT-002").version == 1
+    # An unknown version is logged and the previous plan stays.
+    monkeypatch.setenv("COMPLIANCE_RULE_PINS", "COUNT-002@99")
+    reload_settings()
+    assert current_plan().rule("COUNT-002").version == 1
+    monkeypatch.delenv("COMPLIANCE_RULE_PINS")
+    reload_settings()
+    assert current_plan().rule("COUNT-002").version == latest
+
+
+def test_catalog_rule_ids_are_unique():
+    ids = [r.rule_id for r in RULES]
+    assert len(ids) == len(set(ids))
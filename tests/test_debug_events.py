@@ -0,0 +1,74 @@
+import logging
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.debug_events import ELAPSED, TTFT, DebugLog, as_debug_log
+
+LOG = logging.getLogger("tests.debug_events")
+
+
+class _Counted:
+    def __init__(self):
+        self.renders = 0
+
+    def __format__(self, spec):
+        self.renders += 1
+        return "page-stats"
+
+
+def test_steps_are_rendered_only_when_read(caplog):
+    caplog.set_level(logging.WARNING, logger=LOG.name)
+    value = _Counted()
+    log = DebugLog(log=LOG)
+    log.add("pdf", "rendered", "PDF->PNG ок: page0={page0}", page0=value)
+    assert value.renders == 0
+
+    assert list(log) == ["PDF->PNG ок: page0=page-stats"]
+    assert log[0] == log[-1] == "PDF->PNG ок: page0=page-stats"
+    # Cached after the first render.
+    assert value.renders == 1
+
+
+def test_on_debug_receives_text_and_templates_render_like_before():
+    seen = []
+    log = DebugLog(seen.append, log=LOG)
+    log.add("vision", TTFT, "Шаг {step}: ttft_ms={ttft_ms}", ttft_ms=None)
+    log.add("vision", ELAPSED, "Шаг {step}: elapsed_ms={elapsed_ms}", elapsed_ms=1200)
+    log.add("vision", "timeout", "Шаг vision: timeout {literal}")
+    assert seen == ["Шаг vision: ttft_ms=-", "Шаг vision: elapsed_ms=1200", "Шаг vision: timeout {literal}"]
+    assert "Шаг vision: elapsed_ms=1200" in log
+    assert log.events[1].to_dict()["fields"] == {"elapsed_ms": 1200}
+
+
+def test_timings_come_from_typed_fields():
+    log = DebugLog(log=LOG)
+    log.add("vision", TTFT, "Шаг {step}: ttft_ms={ttft_ms}", ttft_ms=300)
+    log.add("vision", ELAPSED, "Шаг {step}: elapsed_ms={elapsed_ms}", elapsed_ms=1200)
+    log.add("structured.parse", TTFT, "Шаг {step}: ttft_ms={ttft_ms}", ttft_ms=None)
+    log.add("structured.parse", ELAPSED, "Шаг {step}: elapsed_ms={elapsed_ms}", elapsed_ms=400)
+    assert log.timings() == {"vision.ttft": 300, "vision": 1200, "structured.parse": 400}
+
+
+def test_unsampled_requests_log_only_warnings(caplog):
+    caplog.set_level(logging.DEBUG, logger=LOG.name)
+    log = DebugLog(log=LOG, sample_percent=0)
+    log.add("vision", "send", "Шаг vision: отправка")
+    log.add("vision.call", "call", "Шаг vision.call: model={model}", level=logging.DEBUG, model="m")
+    log.add("vision", "timeout", "Шаг vision: timeout", level=logging.WARNING)
+    assert [r.getMessage() for r in caplog.records] == ["[extract] Шаг vision: timeout"]
+
+    caplog.clear()
+    sampled = DebugLog(log=LOG, sample_percent=100)
+    sampled.add("vision.call", "call", "Шаг vision.call: model={model}", level=logging.DEBUG, model="m")
+    assert [(r.levelno, r.getMessage()) for r in caplog.records] == [(logging.DEBUG, "[extract] Шаг vision.call: model=m")]
+
+
+def test_plain_list_callers_get_rendered_strings():
+    steps = []
+    seen = []
+    log = as_debug_log(steps, seen.append)
+    log.add("pdf", "opened", "PDF открыт: pages_total={total}", total=2)
+    assert steps == seen == ["PDF открыт: pages_total=2"]
+    assert as_debug_log(log) is log
@@ -0,0 +1,125 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app import ai_extract, escalation
+from app.escalation import EscalationStats, escalation_reasons
+from app.schemas import LeaveRequestExtract
+from app.settings import reload_settings
+
+
+class _Msg:
+    def __init__(self, text: str):
+        self.content = [{"type": "text", "text": text}]
+        self.request_id = "req_ok"
+
+
+class _ParseResult:
+    def __init__(self, parsed_output):
+        self.parsed_output = parsed_output
+
+
+class FakeClient:
+    def __init__(self, parsed):
+        self.parsed = list(parsed)
+        self.messages = self
+
+    def with_options(self, **kwargs):
+        return self
+
+    def create(self, **kwargs):
+        return _Msg("TRANSCRIPTION: ok")
+
+    def parse(self, **kwargs):
+        return _ParseResult(self.parsed.pop(0))
+
+
+def _extract(confidence=0.9, signature_confidence=0.9, full_name="Иванов Иван Иванович", signature_present=True):
+    return LeaveRequestExtract.model_validate(
+        {
+            "employee": {"full_name": full_name},
+            "request_date": "2026-01-01",
+            "leave": {"leave_type": "annual_paid", "start_date": "2026-02-01", "end_date": "2026-02-14", "days_count": 14},
+            "signature_present": signature_present,
+            "signature_confidence": signature_confidence,
+            "quality": {"overall_confidence": confidence, "missing_fields": [], "notes": []},
+        }
+    )
+
+
+def _prepare(monkeypatch, parsed):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    monkeypatch.setenv("ANTHROPIC_VISION_STREAM", "0")
+    monkeypatch.setenv("ANTHROPIC_STRUCTURED_STREAM", "0")
+    monkeypatch.setenv("PDF_ESCALATION", "1")
+    reload_settings()
+    monkeypatch.setattr(escalation, "ESCALATION", EscalationStats())
+    monkeypatch.setattr(ai_extract, "ESCALATION", escalation.ESCALATION)
+    monkeypatch.setattr(ai_extract, "_create_anthropic_client", lambda **kwargs: FakeClient(parsed))
+    renders = []
+
+    def _render(pdf_bytes, debug_steps, on_debug=None, settings=None, memory=None):
+        edge, mode = settings.PDF_TARGET_LONG_EDGE, settings.PDF_COLOR_MODE
+        renders.append((edge, mode))
+        page = {"page": 0, "w_px": edge * 707 // 1000, "h_px": edge, "png_bytes": 1, "b64_chars": 1}
+        info = {"pages_sent": 1, "total_pages": 1, "target_long_edge": edge, "approx_b64_chars": 1, "color_mode": mode, "page_stats": [page]}
+        return [{"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": "x"}}], info
+
+    monkeypatch.setattr(ai_extract, "_render_pdf_to_image_blocks", _render)
+    return renders
+
+
+def test_escalation_reasons():
+    assert escalation_reasons(_extract(), 0.7) == []
+    assert escalation_reasons(_extract(confidence=0.5), 0.7) == ["low_confidence"]
+    assert escalation_reasons(_extract(full_name=None, signature_confidence=0.3), 0.7) == ["missing_employee_full_name", "signature"]
+    assert escalation_reasons(_extract(signature_present=None), 0.7) == ["signature"]
+    assert escalation_reasons(_extract(signature_present=False), 0.7) == []
+
+
+def test_clean_first_pass_is_kept_and_saves_tokens(monkeypatch):
+    renders = _prepare(monkeypatch, [_extract()])
+
+    parsed, _ = ai_extract.extract_leave_request_with_debug(b"%PDF-1.4", filename="x.pdf")
+
+    assert renders == [(1024, "gray")]
+    stats = escalation.ESCALATION.stats()
+    assert (stats["documents"], stats["escalated"], stats["escalation_rate"]) == (1, 0, 0.0)
+    tokens = stats["image_tokens"]
+    assert tokens["first_pass"] < tokens["single_pass_estimate"] and tokens["saved"] == tokens["single_pass_estimate"] - tokens["first_pass"]
+    assert not any(n.startswith("escalation:") for n in parsed.quality.notes)
+
+
+def test_confidently_unsigned_first_pass_is_kept(monkeypatch):
+    renders = _prepare(monkeypatch, [_extract(signature_present=False)])
+
+    parsed, _ = ai_extract.extract_leave_request_with_debug(b"%PDF-1.4", filename="x.pdf")
+
+    assert renders == [(1024, "gray")]
+    assert parsed.signature_present is False
+    assert escalation.ESCALATION.stats()["escalated"] == 0
+
+
+def test_unclear_signature_escalates_to_full_size_colour(monkeypatch):
+    renders = _prepare(monkeypatch, [_extract(confidence=0.5, signature_confidence=0.2), _extract()])
+
+    parsed, debug_steps = ai_extract.extract_leave_request_with_debug(b"%PDF-1.4", filename="x.pdf")
+
+    assert renders == [(1024, "gray"), (1568, "rgb")]
+    assert parsed.quality.overall_confidence == 0.9
+    assert any("повторный проход" in s for s in debug_steps)
+    stats = escalation.ESCALATION.stats()
+    assert stats["escalation_rate"] == 1.0 and stats["reasons"] == {"low_confidence": 1, "signature": 1}
+    assert stats["image_tokens"]["saved"] == -stats["image_tokens"]["first_pass"]
+
+
+def test_escalation_off_renders_once_at_full_size(monkeypatch):
+    renders = _prepare(monkeypatch, [_extract(confidence=0.1)])
+    monkeypatch.setenv("PDF_ESCALATION", "0")
+    reload_settings()
+
+    ai_extract.extract_leave_request_with_debug(b"%PDF-1.4", filename="x.pdf")
+
+    assert renders == [(1568, "gray")]
+    assert escalation.ESCALATION.stats()["documents"] == 0
@@ -0,0 +1,109 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app import ai_extract
+from app.ai_extract import UpstreamAIError, extract_leave_request_with_debug
+from app.schemas import LeaveRequestExtract
+from app.settings import load_settings, reload_settings
+
+PDF = b"%PDF-1.4 backend test"
+
+
+class _Msg:
+    def __init__(self, text: str):
+        self.content = [{"type": "text", "text": text}]
+        self.request_id = "req_ok"
+
+
+class _ParseResult:
+    def __init__(self, parsed_output):
+        self.parsed_output = parsed_output
+
+
+class FakeClient:
+    def __init__(self):
+        self.messages = self
+
+    def with_options(self, **kwargs):
+        return self
+
+    def create(self, **kwargs):
+        return _Msg("TRANSCRIPTION: Прошу предоставить отпуск")
+
+    def parse(self, **kwargs):
+        return _ParseResult(
+            LeaveRequestExtract.model_validate(
+                {
+                    "employee": {"full_name": "Петров Пётр Петрович"},
+                    "request_date": "2026-05-01",
+                    "leave": {"leave_type": "annual_paid", "start_date": "2026-06-01", "end_date": "2026-06-14", "days_count": 14},
+                    "signature_present": True,
+                    "signature_confidence": 0.9,
+                    "quality": {"overall_confidence": 0.9, "missing_fields": [], "notes": []},
+                }
+            )
+        )
+
+
+def _fake_render(pdf_bytes, debug_steps, on_debug=None, settings=None, memory=None):
+    info = {"pages_sent": 1, "total_pages": 1, "target_long_edge": 1568, "approx_b64_chars": 1, "color_mode": "gray"}
+    info["signature"] = {"score": 0.1, "present": False, "page": 0}
+    return [{"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": "x"}}], info
+
+
+def _no_client(**kwargs):
+    raise AssertionError("replay must not call the API")
+
+
+def test_backend_setting_defaults_to_mock_in_mock_mode():
+    assert load_settings({}).EXTRACTION_BACKEND == "anthropic"
+    assert load_settings({"MOCK_MODE": "1"}).EXTRACTION_BACKEND == "mock"
+    assert load_settings({"MOCK_MODE": "1", "EXTRACTION_BACKEND": "Replay"}).EXTRACTION_BACKEND == "replay"
+    assert load_settings({"EXTRACTION_BACKEND": "nope"}).EXTRACTION_BACKEND == "anthropic"
+    # Backends that never call the API start without a key outside dev mode.
+    for name in ("mock", "replay", "rules"):
+        assert load_settings({"APP_ENV": "prod", "EXTRACTION_BACKEND": name}).EXTRACTION_BACKEND == name
+    with pytest.raises(RuntimeError):
+        load_settings({"APP_ENV": "prod", "EXTRACTION_BACKEND": "anthropic"})
+
+
+def test_mock_backend_per_request_without_api_key(monkeypatch):
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+    reload_settings()
+
+    parsed, debug_steps = extract_leave_request_with_debug(PDF, backend="mock")
+
+    assert parsed.employee.full_name == "Иванов Иван Иванович" and "MOCK_MODE=1" in parsed.quality.notes
+    assert any("внешний AI не вызывается" in s for s in debug_steps)
+    with pytest.raises(ValueError):
+        extract_leave_request_with_debug(PDF, backend="nope")
+
+
+def test_recorded_anthropic_pass_replays_offline(tmp_path, monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    monkeypatch.setenv("ANTHROPIC_VISION_STREAM", "0")
+    monkeypatch.setenv("ANTHROPIC_STRUCTURED_STREAM", "0")
+    monkeypatch.setenv("EXTRACTION_RECORD_DIR", str(tmp_path))
+    monkeypatch.setenv("EXTRACTION_REPLAY_DIR", str(tmp_path))
+    reload_settings()
+    monkeypatch.setattr(ai_extract, "_create_anthropic_client", lambda **kwargs: FakeClient())
+    monkeypatch.setattr(ai_extract, "_render_pdf_to_image_blocks", _fake_render)
+
+    live, _ = extract_leave_request_with_debug(PDF, filename="x.pdf")
+    assert len(list(tmp_path.glob("*.json"))) == 1
+
+    monkeypatch.setattr(ai_extract, "_create_anthropic_client", _no_client)
+    monkeypatch.setattr(ai_extract, "_render_pdf_to_image_blocks", _no_client)
+    replayed, debug_steps = extract_leave_request_with_debug(PDF, filename="x.pdf", backend="replay")
+
+    # The signature check and the notes are applied again to the recorded answer, the same way.
+    assert replayed == live and live.signature_confidence == 0.5
+    assert any("backend=anthropic" in s for s in debug_steps)
+
+    with pytest.raises(UpstreamAIError) as err:
+        extract_leave_request_with_debug(b"%PDF-1.4 other", backend="replay")
+    assert (err.value.step, err.value.status_code) == ("replay", 404)
@@ -0,0 +1,143 @@
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import pytest
+
+from app.ai_extract import _extract_first_json_object
+from app.json_repair import JsonFieldStream, recover_json_object
+
+
+def _sample():
+    return {
+        "employee": {"full_name": "Иванов Иван"},
+        "leave": {"leave_type": "annual_paid", "start_date": "2026-02-01", "days_count": 14, "comment": None},
+        "signature_present": True,
+        "raw_text": 'Строка с "кавычками", {скобками} и \\ слэшем',
+        "quality": {"notes": ["a", "b"], "missing_fields": []},
+    }
+
+
+def test_plain_fenced_and_prose_wrapped():
+    payload = json.dumps(_sample(), ensure_ascii=False)
+    for text in (
+        payload,
+        f"```json\n{payload}\n```",
+        f"Вот результат:\n```\n{payload}\n```\nЕсли нужно — уточню {{детали}}.",
+        f"Пример {{не json}} и далее {payload} конец",
+        f"см. {{пример {payload}}}",
+        f"Незакрытая {{скобка в тексте, а затем {payload}",
+    ):
+        rec = recover_json_object(text)
+        assert rec.value == _sample()
+        assert not rec.repaired
+
+
+def test_empty_and_missing_object():
+    with pytest.raises(ValueError, match="Пустой"):
+        recover_json_object("  \n")
+    with pytest.raises(ValueError, match="не найден"):
+        recover_json_object("нет json, только {текст} и [1, 2]")
+    with pytest.raises(ValueError):
+        _extract_first_json_object('{"a"')
+
+
+def test_truncated_string_value_is_closed_in_place():
+    rec = recover_json_object('{"leave": {"comment": "по семейным обстоя')
+    assert rec.value == {"leave": {"comment": "по семейным обстоя"}}
+    assert rec.repaired and rec.appended == '"}}'
+
+    assert recover_json_object('{"a": "x\\').value == {"a": "x"}
+    assert recover_json_object('{"a": "x\\u04').value == {"a": "x"}
+    assert recover_json_object('{"a": "x\\\\').value == {"a": "x\\"}
+
+
+def test_truncated_scalars_keys_and_containers_drop_incomplete_tail():
+    assert recover_json_object('{"a": 1, "b": 14').value == {"a": 1}
+    assert recover_json_object('{"a": 1, "b": tru').value == {"a": 1}
+    assert recover_json_object('{"a": 1, "b": true').value == {"a": 1, "b": True}
+    assert recover_json_object('{"a": 1, "quali').value == {"a": 1}
+    assert recover_json_object('{"a": 1, "b":').value == {"a": 1}
+    assert recover_json_object('{"a": [1, 2, {"b": null').value == {"a": [1, 2, {"b": None}]}
+    assert recover_json_object('{"a": {"b": 1}, "c": [').value == {"a": {"b": 1}, "c": []}
+
+
+def test_every_prefix_of_a_valid_object_recovers_to_a_subset():
+    full = _sample()
+    payload = json.dumps(full, ensure_ascii=False)
+    first_member_end = payload.index("}") + 1
+    for cut in range(1, len(payload)):
+        try:
+            value = recover_json_object(payload[:cut]).value
+        except ValueError:
+            # Only a prefix that holds no complete value yet may be unrecoverable.
+            assert cut < first_member_end
+            continue
+        assert set(value) <= set(full)
+
+
+def test_random_noise_never_crashes():
+    rnd = random.Random(7)
+    alphabet = '{}[]":,\\ abc123truenull\n'
+    for _ in range(2000):
+        text = "".join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 40)))
+        try:
+            assert isinstance(recover_json_object(text).value, dict)
+        except ValueError:
+            pass
+
+
+def test_adversarial_inputs_stay_linear():
+    def elapsed(text):
+        started = time.perf_counter()
+        try:
+            recover_json_object(text)
+        except ValueError:
+            pass
+        return time.perf_counter() - started
+
+    # The previous raw_decode-per-"{" approach is quadratic on all of these.
+    for make in (
+        lambda n: "{" * n,
+        lambda n: "{x}" * n,
+        lambda n: '{"a":' * n,
+        lambda n: "{ " + '"k": "v", ' * n,
+        lambda n: "{" * n + '{"a": 1}',
+    ):
+        small, large = elapsed(make(20_000)), elapsed(make(80_000))
+        assert large < max(small, 0.002) * 12
+
+
+def test_field_stream_is_chunking_invariant():
+    payload = json.dumps(_sample(), ensure_ascii=False)
+    expected = [
+        ("employee.full_name", "Иванов Иван"),
+        ("leave.leave_type", "annual_paid"),
+        ("leave.start_date", "2026-02-01"),
+        ("leave.days_count", 14),
+        ("leave.comment", None),
+        ("signature_present", True),
+        ("raw_text", _sample()["raw_text"]),
+        ("quality.notes", ["a", "b"]),
+        ("quality.missing_fields", []),
+    ]
+    for size in (1, 2, 3, 7, 64, len(payload)):
+        stream = JsonFieldStream()
+        got = []
+        for i in range(0, len(payload), size):
+            got.extend(stream.feed(payload[i : i + size]))
+        assert got == expected
+
+
+def test_field_stream_holds_back_unfinished_values():
+    stream = JsonFieldStream()
+    assert stream.feed('{"leave": {"days_count": 1') == []
+    assert stream.feed("4") == []
+    assert stream.feed(', "comment": "по сем') == [("leave.days_count", 14)]
+    assert stream.feed('ейным"') == [("leave.comment", "по семейным")]
+    assert stream.feed("}, \"notes\": [\"a\"") == []
+    assert stream.feed("]}") == [("notes", ["a"])]
@@ -0,0 +1,136 @@
+import random
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app import leave_history
+from app.compliance import run_compliance_checks
+from app.compliance_rules import DispatchPlan
+from app.compliance_rules.rules import PREVIOUS_VERSIONS, RULES
+from app.leave_history import LeaveHistory
+from app.pipeline import finish_extraction
+from app.result_store import ResultStore
+from app.schemas import LeaveRequestExtract
+
+
+def _extract(start, end, days, *, name="Иванов Иван Иванович", leave_type="annual_paid"):
+    return LeaveRequestExtract.model_validate(
+        {
+            "employer_name": "ООО Ромашка",
+            "employee": {"full_name": name},
+            "manager": {"full_name": "Петров Пётр Петрович"},
+            "request_date": "2026-01-10",
+            "leave": {"leave_type": leave_type, "start_date": start, "end_date": end, "days_count": days},
+            "signature_present": True,
+            "signature_confidence": 0.9,
+            "quality": {"overall_confidence": 0.9, "notes": []},
+        }
+    )
+
+
+def _codes(issues):
+    return [i.code for i in issues]
+
+
+def test_overlaps_match_brute_force_and_documents_are_replaced():
+    rng = random.Random(7)
+    history = LeaveHistory()
+    periods = {}
+    base = date(2024, 1, 1)
+    for i in range(300):
+        start = base + timedelta(days=rng.randrange(700))
+        end = start + timedelta(days=rng.randrange(1, 30))
+        sha = f"doc{rng.randrange(200)}"
+        history.add(sha, "Иванов  Иван", "annual_paid", start.isoformat(), end.isoformat())
+        periods[sha] = (start, end)
+    for _ in range(200):
+        start = base + timedelta(days=rng.randrange(720))
+        end = start + timedelta(days=rng.randrange(0, 40))
+        exclude = f"doc{rng.randrange(200)}"
+        expected = sorted(sha for sha, (s, e) in periods.items() if s <= end and e >= start and sha != exclude)
+        found = history.overlaps("иванов иван", start, end, exclude=exclude)
+        assert sorted(p.sha256 for p in found) == expected
+    assert history.stats() == {"employees": 1, "periods": len(periods)}
+
+    history.remove(next(iter(periods)))
+    assert history.stats()["periods"] == len(periods) - 1
+    assert history.overlaps("Сидоров", base, base + timedelta(days=1000)) == []
+
+
+def test_history_rules_overlap_and_14_day_part():
+    history = LeaveHistory()
+    history.add("main", "Иванов Иван Иванович", "annual_paid", "2026-07-01", "2026-07-14", 14)
+    history.add("short", "Иванов Иван Иванович", "annual_paid", "2026-03-02", "2026-03-06", 5)
+
+    short = _extract("2026-10-05", "2026-10-09", 5)
+    # Alone the document only allows a reminder; with a 14-day part of 2026 on record the rule is silent.
+    assert "annual_paid_part_lt14" in _codes(run_compliance_checks(short)[0])
+    issues, _ = run_compliance_checks(short, history.rule_inputs(short))
+    assert "annual_paid_part_lt14" not in _codes(issues) and "leave_overlap" not in _codes(issues)
+
+    next_year = _extract("2027-03-01", "2027-03-05", 5)
+    issue = next(i for i in run_compliance_checks(next_year, history.rule_inputs(next_year))[0] if i.code == "annual_paid_part_lt14")
+    assert issue.details == {"longest_other_part": 0}
+
+    overlapping = _extract("2026-07-10", "2026-07-23", 14)
+    issue = next(i for i in run_compliance_checks(overlapping, history.rule_inputs(overlapping))[0] if i.code == "leave_overlap")
+    assert issue.level == "warn" and issue.message.endswith("2026-07-01..2026-07-14.")
+    # The same document checked again does not overlap with itself.
+    assert "history.overlaps" not in history.rule_inputs(overlapping, exclude="main")
+
+    v1 = DispatchPlan((*RULES, *PREVIOUS_VERSIONS), pins={"LAW-122-001": 1})
+    assert "annual_paid_part_lt14" in _codes(v1.run(short, history.rule_inputs(short)))
+
+
+def test_finish_extraction_feeds_history_and_rebuilds_from_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(leave_history, "_histories", {})
+    path = str(tmp_path / "results.sqlite3")
+
+    first = finish_extraction(_extract("2026-07-01", "2026-07-14", 14), [], b"doc-1", "1.pdf", with_debug=False, store_path=path)
+    assert not first.needs_rewrite and "leave_overlap" not in _codes(first.issues)
+    again = finish_extraction(_extract("2026-07-01", "2026-07-14", 14), [], b"doc-1", "1.pdf", with_debug=False, store_path=path)
+    assert "leave_overlap" not in [i.code for i in again.issues]
+    second = finish_extraction(_extract("2026-07-10", "2026-07-12", 3), [], b"doc-2", "2.pdf", with_debug=False, store_path=path)
+    codes = [i.code for i in second.issues]
+    assert "leave_overlap" in codes and "annual_paid_part_lt14" not in codes
+
+    rebuilt = LeaveHistory.from_store(ResultStore(path))
+    assert rebuilt.stats() == leave_history.get_leave_history(path).stats() == {"employees": 1, "periods": 2}
+
+
+def test_history_sees_results_saved_by_other_processes(tmp_path, monkeypatch):
+    monkeypatch.setattr(leave_history, "_histories", {})
+    path = str(tmp_path / "results.sqlite3")
+    finish_extraction(_extract("2026-07-01", "2026-07-14", 14), [], b"doc-1", "1.pdf", with_debug=False, store_path=path)
+
+    # Another gunicorn worker or `python -m app.batch_extract` writing to the same file.
+    other = ResultStore(path)
+    resp = finish_extraction(_extract("2026-08-01", "2026-08-14", 14), [], b"doc-2", "2.pdf", with_debug=False, store_path="")
+    other.save(resp, sha256="doc-2")
+    third = finish_extraction(_extract("2026-08-10", "2026-08-12", 3), [], b"doc-3", "3.pdf", with_debug=False, store_path=path)
+    assert "leave_overlap" in _codes(third.issues)
+
+    # Re-saved there as needing a rewrite: the period no longer counts here either.
+    other.save(resp.model_copy(update={"needs_rewrite": True}), sha256="doc-2")
+    history = leave_history.get_leave_history(path)
+    assert history.overlaps("Иванов Иван Иванович", date(2026, 8, 1), date(2026, 8, 5)) == []
+    assert history.stats() == {"employees": 1, "periods": 2}
+
+
+def test_index_of_100k_employees_stays_fast():
+    rows = []
+    for i in range(100_000):
+        start = date(2025, 1, 1) + timedelta(days=i % 300)
+        rows.append((f"{i:064x}", f"Сотрудник{i} Иван", "annual_paid", start.isoformat(), (start + timedelta(days=13)).isoformat(), 14))
+    history = LeaveHistory.from_rows(rows)
+    assert history.stats() == {"employees": 100_000, "periods": 100_000}
+
+    extracts = [_extract("2025-03-01", "2025-03-05", 5, name=f"Сотрудник{i} Иван") for i in range(0, 100_000, 10)]
+    started = time.perf_counter()
+    inputs = [history.rule_inputs(ex) for ex in extracts]
+    assert (time.perf_counter() - started) / len(extracts) < 0.0005
+    assert all(item["history.annual_max_part"] == 14 for item in inputs)
+    assert sum("history.overlaps" in item for item in inputs) > 0
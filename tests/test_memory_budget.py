@@ -0,0 +1,108 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app import ai_extract
+from app.ai_extract import UpstreamAIError, _estimate_render_memory, _render_pdf_to_image_blocks, _reserve_render_memory
+from app.memory_budget import MB, MemoryBudget, MemoryBudgetTimeout, estimate_render_bytes
+from app.settings import load_settings
+from app.startup import sample_pdf
+
+A4 = (595.0, 842.0)
+
+
+def test_estimate_grows_with_pages_color_and_preprocess():
+    gray = estimate_render_bytes(0, [A4], target_long_edge=1568, channels=1)
+    rgb = estimate_render_bytes(0, [A4], target_long_edge=1568, channels=3)
+    two = estimate_render_bytes(0, [A4, A4], target_long_edge=1568, channels=1)
+    pre = estimate_render_bytes(0, [A4], target_long_edge=1568, channels=1, preprocess=True)
+    assert gray["pixels"] == 1109 * 1568
+    assert rgb["bytes"] > gray["bytes"]
+    # Pages render one at a time: only the retained images add up, not the transient pixmaps.
+    assert two["transient"] == gray["transient"] and two["retained"] == 2 * gray["retained"]
+    assert pre["bytes"] > gray["bytes"]
+    assert estimate_render_bytes(10 * MB, [], target_long_edge=1568, channels=1)["bytes"] == 20 * MB
+
+
+def test_estimate_counts_the_rerender_of_huge_pages():
+    # zoom is at least 0.5, so a 20000pt page renders at 10000px and is rendered again at 8000px.
+    est = estimate_render_bytes(0, [(20000.0, 20000.0)], target_long_edge=1568, channels=1)
+    assert est["pixels"] == 8000 * 8000
+    assert est["transient"] >= 10000 * 10000 + 8000 * 8000
+
+
+def test_estimate_covers_the_actual_render():
+    pdf = sample_pdf()
+    settings = load_settings({"PDF_MAX_PAGES": "1"})
+    est = _estimate_render_memory(pdf, settings)
+    _, info = _render_pdf_to_image_blocks(pdf, [], settings=settings)
+    stat = info["page_stats"][0]
+    assert est["pixels"] == stat["w_px"] * stat["h_px"]
+    assert est["retained"] >= info["approx_b64_chars"]
+
+
+def test_waits_until_bytes_fit_and_serves_in_order():
+    budget = MemoryBudget()
+    first = budget.acquire(60, limit_bytes=100, timeout_s=1)
+    order = []
+
+    def take(name, nbytes):
+        grant = budget.acquire(nbytes, limit_bytes=100, timeout_s=5)
+        order.append(name)
+        grant.release()
+
+    big = threading.Thread(target=take, args=("big", 80))
+    big.start()
+    deadline = time.monotonic() + 5
+    while budget.stats()["waiting"] < 1:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    # Would fit right now (60 + 30 <= 100) but must not overtake the waiting big request.
+    small = threading.Thread(target=take, args=("small", 30))
+    small.start()
+    time.sleep(0.05)
+    assert order == []
+    first.release()
+    big.join(5)
+    small.join(5)
+    assert order == ["big", "small"]
+    stats = budget.stats()
+    assert stats["reserved_bytes"] == 0 and stats["peak_reserved_bytes"] == 80 and stats["waited"] == 2
+
+
+def test_oversized_request_runs_alone_and_timeout_raises():
+    budget = MemoryBudget()
+    whole = budget.acquire(500, limit_bytes=100, timeout_s=1)
+    assert whole.nbytes == 100
+    with pytest.raises(MemoryBudgetTimeout):
+        budget.acquire(1, limit_bytes=100, timeout_s=0.05)
+    whole.release()
+    whole.release()
+    assert budget.stats()["reserved_bytes"] == 0 and budget.stats()["timeouts"] == 1
+    # limit 0 disables the budget.
+    assert budget.acquire(10**12, limit_bytes=0, timeout_s=0).nbytes == 0
+
+
+def test_reserve_maps_timeout_to_503(monkeypatch):
+    budget = MemoryBudget()
+    monkeypatch.setattr(ai_extract, "MEMORY_BUDGET", budget)
+    settings = load_settings({"MEMORY_BUDGET_MB": "1", "MEMORY_BUDGET_MAX_WAIT_S": "1"})
+    held = budget.acquire(MB, limit_bytes=MB, timeout_s=1)
+    started = time.monotonic()
+    debug_steps = []
+    with pytest.raises(UpstreamAIError) as exc:
+        _reserve_render_memory(sample_pdf(), settings, debug_steps)
+    assert exc.value.step == "memory" and exc.value.status_code == 503
+    assert time.monotonic() - started >= 0.9
+    held.release()
+
+    grant = _reserve_render_memory(sample_pdf(), settings, debug_steps)
+    grant.checkpoint("render")
+    grant.release()
+    assert debug_steps[-1].startswith("Шаг memory: оценка_mb=")
+    assert budget.stats()["stages"]["render"]["samples"] == 1
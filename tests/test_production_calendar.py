@@ -0,0 +1,122 @@
+import json
+import random
+import sys
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.compliance import run_compliance_checks
+from app.compliance_rules import DispatchPlan
+from app.compliance_rules.rules import PREVIOUS_VERSIONS, RULES
+from app.production_calendar import ProductionCalendar, current_calendar, get_calendar
+from app.schemas import LeaveRequestExtract
+from app.settings import reload_settings
+
+
+def _extract(start, end, days, *, leave_type="annual_paid", request_date="2025-11-01"):
+    return LeaveRequestExtract.model_validate(
+        {
+            "employer_name": "ООО Ромашка",
+            "employee": {"full_name": "Иванов И.И."},
+            "manager": {"full_name": "Петров П.П."},
+            "request_date": request_date,
+            "leave": {"leave_type": leave_type, "start_date": start, "end_date": end, "days_count": days},
+            "signature_present": True,
+            "signature_confidence": 0.9,
+        }
+    )
+
+
+def _codes(issues):
+    return {i.code: i for i in issues}
+
+
+def test_bundled_calendar_holidays_transfers_and_norms():
+    cal = get_calendar()
+    assert cal.holidays_between(date(2026, 1, 1), date(2026, 1, 14)) == 8
+    assert cal.holidays_between(date(2026, 1, 14), date(2026, 1, 1)) == 0
+    # Annual working-day norms of the official calendars.
+    assert cal.working_days_between(date(2025, 1, 1), date(2025, 12, 31)) == 247
+    assert cal.working_days_between(date(2026, 1, 1), date(2026, 12, 31)) == 247
+    # Decree transfer and the automatic one for a weekend holiday (8 March 2026 is a Sunday).
+    assert not cal.is_working_day(date(2026, 1, 9)) and not cal.is_holiday(date(2026, 1, 9))
+    assert not cal.is_working_day(date(2026, 3, 9)) and cal.is_holiday(date(2026, 3, 8))
+    assert cal.is_working_day(date(2025, 11, 1))
+    assert len(cal.year_bitmap(2024)) == 366
+
+
+def test_vectorized_counts_match_scalar_ones():
+    cal = get_calendar()
+    rng = random.Random(3)
+    lo, hi = date(1998, 6, 1).toordinal(), date(2052, 6, 1).toordinal()
+    starts = np.array([rng.randrange(lo, hi) for _ in range(2000)], dtype=np.int64)
+    ends = starts + np.array([rng.randrange(-5, 400) for _ in range(2000)], dtype=np.int64)
+    holidays = cal.holidays_between_many(starts, ends)
+    working = cal.working_days_between_many(starts, ends)
+    for i in range(0, 2000, 7):
+        assert holidays[i] == cal.holidays_between(int(starts[i]), int(ends[i]))
+        assert working[i] == cal.working_days_between(int(starts[i]), int(ends[i]))
+
+
+def test_calendar_file_from_settings(tmp_path, monkeypatch):
+    path = tmp_path / "calendar.json"
+    path.write_text(
+        json.dumps(
+            {
+                "first_year": 2030,
+                "last_year": 2030,
+                "holidays": ["01-01"],
+                "years": {"2030": {"days_off": ["01-02"], "working_days": ["01-05"]}},
+            }
+        ),
+        encoding="utf-8",
+    )
+    monkeypatch.setenv("PRODUCTION_CALENDAR_PATH", str(path))
+    reload_settings()
+    cal = current_calendar()
+    assert cal is get_calendar(str(path)) and isinstance(cal, ProductionCalendar)
+    # 1 Jan 2030 is a Tuesday; the 5th a Saturday made a working day.
+    assert cal.working_days_between(date(2030, 1, 1), date(2030, 1, 6)) == 3
+    assert cal.holidays_between(date(2029, 12, 25), date(2030, 1, 10)) == 1
+
+
+def test_rules_exclude_holidays_from_annual_leave_only():
+    ok = _extract("2026-01-01", "2026-01-14", 6)
+    assert "days_count_mismatch" not in _codes(run_compliance_checks(ok)[0])
+
+    naive = _codes(run_compliance_checks(_extract("2026-01-01", "2026-01-14", 14))[0])["days_count_mismatch"]
+    assert naive.details == {"expected": 6, "actual": 14, "holidays_excluded": 8}
+    assert "ожидается 6" in naive.message
+
+    unpaid = _extract("2026-01-01", "2026-01-14", 14, leave_type="unpaid")
+    assert "days_count_mismatch" not in _codes(run_compliance_checks(unpaid)[0])
+    # The previous version counted calendar days only.
+    v1 = DispatchPlan((*RULES, *PREVIOUS_VERSIONS), pins={"COUNT-002": 1})
+    assert "days_count_mismatch" not in _codes(v1.run(_extract("2026-01-01", "2026-01-14", 14)))
+
+
+def test_short_notice_counts_working_days_over_holidays():
+    # 23 calendar days of notice, but the New Year holidays leave 7 working days.
+    ex = _extract("2026-01-12", "2026-01-25", 14, request_date="2025-12-20")
+    notice = _codes(run_compliance_checks(ex)[0])["short_notice"]
+    assert notice.details == {"days_before_start": 23, "working_days_before_start": 7}
+    v1 = DispatchPlan((*RULES, *PREVIOUS_VERSIONS), pins={"DATE-003": 1})
+    assert "short_notice" not in _codes(v1.run(ex))
+    assert "short_notice" not in _codes(run_compliance_checks(_extract("2026-03-02", "2026-03-15", 14, request_date="2026-02-02"))[0])
+
+
+def test_years_outside_the_calendar_count_weekdays():
+    cal = get_calendar()
+    # 6 March 2062 is a Monday: four full weeks before it, no holidays known.
+    assert cal.working_days_between(date(2062, 2, 6), date(2062, 3, 5)) == 20
+    assert cal.is_working_day(date(2062, 3, 6)) and not cal.is_working_day(date(2062, 3, 5))
+    # A range across the edge: calendar days inside (31 Dec 2050 is a Saturday), weekdays after.
+    assert cal.working_days_between(date(2050, 12, 26), date(2051, 1, 6)) == (
+        cal.working_days_between(date(2050, 12, 26), date(2050, 12, 31)) + 5
+    )
+    # A misread year does not make a well-announced leave look short-noticed.
+    ex = _extract("2062-03-06", "2062-03-19", 14, request_date="2062-02-06")
+    assert "short_notice" not in _codes(run_compliance_checks(ex)[0])
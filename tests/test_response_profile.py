@@ -0,0 +1,129 @@
+import gzip
+import json
+import sys
+import zlib
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from fastapi.testclient import TestClient
+
+from app import main
+from app.response_profile import MIN_COMPRESS_BYTES, StreamCompressor, compress, negotiate_encoding, parse_fields
+from app.schemas import LeaveRequestExtract
+from app.settings import reload_settings
+
+PDF = {"file": ("a.pdf", b"%PDF-1.4 test", "application/pdf")}
+STEPS = ["Шаг vision: elapsed_ms=1200", "Шаг structured.parse: elapsed_ms=300"]
+
+
+def _extract():
+    return LeaveRequestExtract.model_validate(
+        {
+            "employee": {"full_name": "Иванов Иван Иванович"},
+            "request_date": "2026-01-01",
+            "leave": {"leave_type": "annual_paid", "start_date": "2026-02-01", "end_date": "2026-02-14", "days_count": 14},
+            "signature_present": True,
+            "signature_confidence": 0.9,
+            "quality": {"overall_confidence": 0.9, "notes": []},
+            "raw_text": "Прошу предоставить ежегодный оплачиваемый отпуск " * 20,
+        }
+    )
+
+
+def _fake_extract(data, filename, *, on_debug=None, on_delta=None, on_field=None, on_reset=None):
+    for step in STEPS:
+        if on_debug:
+            on_debug(step)
+    return _extract(), list(STEPS)
+
+
+def _client(monkeypatch, debug_steps="0"):
+    monkeypatch.setenv("DEBUG_STEPS", debug_steps)
+    reload_settings()
+    monkeypatch.setattr(main, "extract_leave_request_with_debug", _fake_extract)
+    return TestClient(main.app)
+
+
+def test_parse_fields_builds_include_tree():
+    assert parse_fields(None) is None
+    assert parse_fields(" , ") is None
+    assert parse_fields("decision,extract.leave.start_date,extract.employee") == {
+        "decision": True,
+        "extract": {"leave": {"start_date": True}, "employee": True},
+    }
+    # A whole subtree already selected is not narrowed by a later, deeper path.
+    assert parse_fields("extract,extract.leave") == {"extract": True}
+
+
+def test_negotiate_encoding_respects_q_values():
+    assert negotiate_encoding(None) is None
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("gzip, deflate") == "gzip"
+    assert negotiate_encoding("gzip;q=0") is None
+    assert negotiate_encoding("*") in ("br", "gzip")
+
+
+def test_compress_skips_small_bodies():
+    assert compress(b"{}", "gzip") == (b"{}", None)
+    body = b"x" * MIN_COMPRESS_BYTES
+    packed, encoding = compress(body, "gzip")
+    assert encoding == "gzip" and gzip.decompress(packed) == body
+
+
+def test_stream_compressor_flushes_every_chunk():
+    comp = StreamCompressor("gzip")
+    dec = zlib.decompressobj(31)
+    for line in (b'{"type": "step"}\n', b'{"type": "result"}\n'):
+        assert dec.decompress(comp.compress(line)) == line
+    assert dec.decompress(comp.finish()) == b""
+    assert dec.eof
+
+
+def test_extract_omits_debug_steps_by_default(monkeypatch):
+    client = _client(monkeypatch)
+    r = client.post("/api/extract", files=PDF, headers={"Accept-Encoding": "identity"})
+    body = r.json()
+    assert r.status_code == 200
+    assert "debug_steps" not in body
+    assert body["trace"]["timings_ms"] == {"vision": 1200, "structured.parse": 300}
+
+    r = client.post("/api/extract?debug=1", files=PDF)
+    assert r.json()["debug_steps"] == STEPS
+
+
+def test_extract_debug_steps_follow_settings(monkeypatch):
+    client = _client(monkeypatch, debug_steps="1")
+    assert client.post("/api/extract", files=PDF).json()["debug_steps"] == STEPS
+    assert "debug_steps" not in client.post("/api/extract?debug=0", files=PDF).json()
+
+
+def test_extract_fields_projection(monkeypatch):
+    client = _client(monkeypatch)
+    r = client.post("/api/extract?fields=decision.status,extract.leave.start_date", files=PDF)
+    body = r.json()
+    assert set(body) == {"decision", "extract"}
+    assert set(body["decision"]) == {"status"}
+    assert body["extract"] == {"leave": {"start_date": "2026-02-01"}}
+
+
+def test_extract_response_is_gzipped_when_accepted(monkeypatch):
+    client = _client(monkeypatch)
+    r = client.post("/api/extract", files=PDF, headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in r.headers["vary"]
+    assert r.json()["extract"]["employee"]["full_name"] == "Иванов Иван Иванович"
+
+
+def test_stream_endpoint_gzip_ndjson_with_projection(monkeypatch):
+    client = _client(monkeypatch)
+    with client.stream(
+        "POST", "/api/extract/stream?fields=decision", files=PDF, headers={"Accept-Encoding": "gzip"}
+    ) as r:
+        assert r.headers["content-encoding"] == "gzip"
+        raw = b"".join(r.iter_raw())
+
+    events = [json.loads(line) for line in zlib.decompressobj(31).decompress(raw).decode("utf-8").splitlines()]
+    assert [e["type"] for e in events] == ["step", "step", "result"]
+    assert events[-1]["ok"] is True
+    assert set(events[-1]["payload"]) == {"decision"}
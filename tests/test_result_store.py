@@ -0,0 +1,131 @@
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from fastapi.testclient import TestClient
+
+from app import main
+from app.pipeline import build_api_response
+from app.result_store import ResultStore, employee_key
+from app.schemas import LeaveRequestExtract
+from app.settings import reload_settings
+
+PDF = {"file": ("a.pdf", b"%PDF-1.4 test", "application/pdf")}
+
+
+def _response(name="Иванов Иван Иванович", start="2026-02-01", end="2026-02-14", days=14):
+    extract = LeaveRequestExtract.model_validate(
+        {
+            "employee": {"full_name": name},
+            "request_date": "2026-01-01",
+            "leave": {"leave_type": "annual_paid", "start_date": start, "end_date": end, "days_count": days},
+            "signature_present": True,
+            "signature_confidence": 0.9,
+            "quality": {"overall_confidence": 0.9, "notes": []},
+        }
+    )
+    return build_api_response(extract, ["Шаг vision: elapsed_ms=1200"], with_debug=True)
+
+
+def _bulk_insert(store, count):
+    # Straight SQL: 100k pipeline runs would only slow the test down.
+    rows = []
+    issues = []
+    for i in range(1, count + 1):
+        status = "error" if i % 50 == 0 else "ok"
+        month = 1 + i % 12
+        rows.append(
+            (
+                i,
+                "2026-01-01T00:00:00Z",
+                f"{i:064x}",
+                f"{i}.pdf",
+                f"Сотрудник{i % 5000} Иван",
+                employee_key(f"Сотрудник{i % 5000} Иван"),
+                "annual_paid" if i % 3 else "unpaid",
+                f"2025-{month:02d}-01",
+                f"2025-{month:02d}-14",
+                14,
+                status,
+                0,
+                b"{}",
+            )
+        )
+        if status == "error":
+            issues.append(("days_count_mismatch", i, "error"))
+    with store._lock:
+        conn = store._conn
+        conn.execute("BEGIN")
+        conn.executemany("INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.executemany("INSERT INTO result_issues VALUES (?, ?, ?)", issues)
+        conn.execute("COMMIT")
+
+
+def test_save_replaces_the_same_document_and_filters(tmp_path):
+    store = ResultStore(str(tmp_path / "results.sqlite3"))
+    first = store.save(_response(end="2026-02-10"), sha256="a" * 64, filename="a.pdf")
+    store.save(_response(name="Петрова Алёна Сергеевна", start="2026-05-12", end="2026-05-18", days=7), sha256="b" * 64)
+    again = store.save(_response(end="2026-02-10"), sha256="a" * 64, filename="a.pdf")
+    assert again > first
+
+    page = store.query()
+    assert [item["sha256"][0] for item in page["items"]] == ["a", "b"]
+    mismatch = page["items"][0]
+    assert mismatch["status"] == "error" and "days_count_mismatch" in mismatch["issue_codes"]
+    assert store.query(issue_code="days_count_mismatch")["items"] == [mismatch]
+
+    assert [i["employee_name"] for i in store.query(employee="петрова алена")["items"]] == ["Петрова Алёна Сергеевна"]
+    assert [i["start_date"] for i in store.query(leave_from="2026-05-05", leave_to="2026-06-01")["items"]] == ["2026-05-12"]
+    assert len(store.query(status="error", leave_type="annual_paid")["items"]) == 2
+    assert store.query(status="ok")["items"] == []
+    assert store.query(created_to="2000-01-01")["items"] == []
+    # Stored response: the same JSON as the API, without debug_steps.
+    body = store.get(again)
+    assert b'"days_count_mismatch"' in body and b"debug_steps" not in body
+    assert store.get(first) is None
+
+
+def test_keyset_pages_are_fast_on_100k_results(tmp_path):
+    store = ResultStore(str(tmp_path / "results.sqlite3"))
+    _bulk_insert(store, 100_000)
+
+    seen = []
+    cursor = None
+    started = time.perf_counter()
+    for _ in range(5):
+        page = store.query(issue_code="days_count_mismatch", cursor=cursor, limit=100)
+        seen += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+    elapsed = time.perf_counter() - started
+    assert seen == list(range(100_000, 100_000 - 500 * 50, -50))
+    assert all(item["status"] == "error" for item in page["items"])
+    # Five pages on 100k rows: index range scans, not table scans.
+    assert elapsed < 0.5
+
+    deep = store.query(status="error", cursor=1000, limit=50)
+    assert [item["id"] for item in deep["items"]][:2] == [950, 900] and deep["next_cursor"] is None
+    named = store.query(employee="сотрудник42 иван", leave_type="unpaid")
+    assert named["items"] and all(i["employee_name"] == "Сотрудник42 Иван" for i in named["items"])
+
+
+def test_api_persists_and_queries_results(tmp_path, monkeypatch):
+    monkeypatch.setenv("RESULT_STORE_PATH", str(tmp_path / "api.sqlite3"))
+    reload_settings()
+    monkeypatch.setattr(main, "extract_leave_request_with_debug", lambda data, filename, **_: (_response().extract, []))
+    client = TestClient(main.app)
+
+    assert client.post("/api/extract", files=PDF).status_code == 200
+    page = client.get("/api/results", params={"employee": "Иванов", "limit": 10}).json()
+    assert len(page["items"]) == 1 and page["next_cursor"] is None
+    item = page["items"][0]
+    assert item["filename"] == "a.pdf" and item["leave_type"] == "annual_paid"
+    stored = client.get(f"/api/results/{item['id']}").json()
+    assert stored["extract"]["employee"]["full_name"] == "Иванов Иван Иванович"
+    assert client.get("/api/results/999").status_code == 404
+    assert client.get("/api/results", params={"limit": 0}).status_code == 422
+
+    monkeypatch.setenv("RESULT_STORE_PATH", "")
+    reload_settings()
+    assert client.get("/api/results").status_code == 404
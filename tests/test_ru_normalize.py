@@ -0,0 +1,116 @@
+import itertools
+import random
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.ai_extract import _normalize_leave_type
+from app.compliance_rules.rules import has_unpaid_reason_marker
+from app.ru_normalize import MultiPatternMatcher, fold, normalize_leave_type
+from app.schemas import LeaveInfo
+
+
+def _legacy_normalize_leave_type(raw):
+    """Pre-refactor implementation kept as the equivalence reference."""
+    value = (raw or "").strip().lower()
+    if not value:
+        return "unknown"
+    aliases = {
+        "annual_paid": "annual_paid",
+        "ежегодный оплачиваемый отпуск": "annual_paid",
+        "ежегодный оплачиваемый": "annual_paid",
+        "оплачиваемый отпуск": "annual_paid",
+        "unpaid": "unpaid",
+        "без сохранения": "unpaid",
+        "без сохранения заработной платы": "unpaid",
+        "study": "study",
+        "учебный": "study",
+        "maternity": "maternity",
+        "беременности и родам": "maternity",
+        "childcare": "childcare",
+        "по уходу за ребенком": "childcare",
+        "по уходу за ребёнком": "childcare",
+        "other": "other",
+        "unknown": "unknown",
+    }
+    if value in aliases:
+        return aliases[value]
+    if "оплач" in value and "отпуск" in value:
+        return "annual_paid"
+    if "без сохран" in value:
+        return "unpaid"
+    if "учеб" in value:
+        return "study"
+    if "беремен" in value or "родам" in value:
+        return "maternity"
+    if "уход" in value and ("ребен" in value or "ребён" in value):
+        return "childcare"
+    return "unknown"
+
+
+def _legacy_unpaid_marker(raw):
+    raw = (raw or "").strip().lower()
+    return any(m in raw for m in ["по семейным обстоятельствам", "по состоянию здоровья", "по уходу", "по причине"])
+
+
+_FRAGMENTS = [
+    "ежегодный", "оплачиваемый", "отпуск", "без", "сохранения", "заработной платы", "учебный", "учебного",
+    "по", "беременности", "и", "родам", "уходу", "за", "ребенком", "ребёнком", "Отпуск", "ОПЛАЧИВАЕМЫЙ",
+    "other", "unknown", "annual_paid", "unpaid", "study", "прошу", "семейным", "обстоятельствам", "причине",
+    "состоянию", "здоровья", "  ",
+]
+
+
+def _corpus(n=3000, seed=11):
+    rnd = random.Random(seed)
+    out = ["", " ", None, "ANNUAL_PAID", "Без сохранения", "по уходу за ребёнком"]
+    for _ in range(n):
+        out.append(" ".join(rnd.choice(_FRAGMENTS) for _ in range(rnd.randint(1, 5))))
+    return out
+
+
+def test_leave_type_matches_legacy_on_folded_input():
+    for text in _corpus():
+        assert normalize_leave_type(text) == _legacy_normalize_leave_type(fold(text) if text else text)
+
+
+def test_all_call_sites_agree():
+    for text in _corpus(500, seed=5):
+        expected = normalize_leave_type(text)
+        assert _normalize_leave_type(text) == expected
+        assert LeaveInfo(leave_type=text).leave_type == expected
+
+
+def test_yo_folding_is_applied_everywhere():
+    assert normalize_leave_type("учёбный отпуск") == "study"
+    assert normalize_leave_type("По уходу за РЕБЁНКОМ") == "childcare"
+    assert fold("  Ёлка\n\tЗЕЛЁНАЯ ") == "елка зеленая"
+
+
+def test_unpaid_markers_match_legacy_on_folded_input():
+    for text in _corpus(1500, seed=23):
+        assert has_unpaid_reason_marker(text) == _legacy_unpaid_marker(fold(text))
+
+
+def test_unpaid_markers_tolerate_case_yo_and_line_breaks():
+    assert has_unpaid_reason_marker("ПО СЕМЕЙНЫМ\nобстоятельствам")
+    assert has_unpaid_reason_marker("по  причинё болезни")
+    assert not has_unpaid_reason_marker(None)
+
+
+def test_matcher_finds_overlapping_and_nested_patterns():
+    m = MultiPatternMatcher(["he", "she", "his", "hers", "по уходу", "уход"])
+    assert m.find_all("ushers") == {"he", "she", "hers"}
+    assert m.find_all("по уходу") == {"по уходу", "уход"}
+    assert m.contains_any("xyz") is False
+
+
+def test_matcher_agrees_with_naive_substring_search():
+    rnd = random.Random(3)
+    patterns = ["".join(rnd.choice("абв") for _ in range(rnd.randint(1, 4))) for _ in range(12)]
+    m = MultiPatternMatcher(patterns)
+    for text in ("".join(p) for p in itertools.product("абв", repeat=6)):
+        expected = {fold(p) for p in patterns if fold(p) in text}
+        assert m.find_all(text) == expected
+        assert m.contains_any(text.upper()) == bool(expected)
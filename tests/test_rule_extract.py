@@ -0,0 +1,155 @@
+import sys
+from pathlib import Path
+
+import fitz
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app import ai_extract
+from app.ai_extract import UpstreamAIError, extract_leave_request_with_debug
+from app.rule_extract import apply_rule_fields, parse_application_text, parse_ru_date
+from app.schemas import LeaveRequestExtract
+from app.settings import reload_settings
+
+TEMPLATE = [
+    "Генеральному директору ООО Ромашка",
+    "Петрову П.П.",
+    "от инженера Иванова Ивана Ивановича",
+    "ЗАЯВЛЕНИЕ",
+    "Прошу предоставить ежегодный оплачиваемый отпуск",
+    "с 1 мая 2026 г. по 14 мая 2026 г.",
+    "на 12 календарных дней.",
+    "Дата: 10.04.2026",
+    "Подпись: ________ /Иванов И.И./",
+]
+
+
+def _pdf(lines) -> bytes:
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    for i, line in enumerate(lines):
+        # A CJK base font: it has the Cyrillic glyphs, so the text layer is real.
+        page.insert_text((60, 80 + 24 * i), line, fontsize=11, fontname="china-s")
+    return doc.tobytes()
+
+
+class _Msg:
+    def __init__(self, text: str):
+        self.content = [{"type": "text", "text": text}]
+        self.request_id = "req_ok"
+
+
+class _ParseResult:
+    def __init__(self, parsed_output):
+        self.parsed_output = parsed_output
+
+
+class FakeClient:
+    def __init__(self, parsed):
+        self.parsed = parsed
+        self.messages = self
+
+    def with_options(self, **kwargs):
+        return self
+
+    def create(self, **kwargs):
+        return _Msg("TRANSCRIPTION: ok")
+
+    def parse(self, **kwargs):
+        return _ParseResult(self.parsed)
+
+
+def _model_extract(**employee):
+    return LeaveRequestExtract.model_validate(
+        {
+            "employee": {"full_name": "Иванов Иван Иванович", "position": "Инженер", **employee},
+            "request_date": "2026-04-10",
+            "leave": {"leave_type": "annual_paid", "start_date": "2026-05-07", "end_date": "2026-05-14", "days_count": 12},
+            "signature_present": True,
+            "signature_confidence": 0.9,
+            "quality": {"overall_confidence": 0.9, "missing_fields": [], "notes": []},
+        }
+    )
+
+
+def _no_client(**kwargs):
+    raise AssertionError("the AI service must not be called")
+
+
+def test_date_grammar_and_template_fields():
+    assert parse_ru_date("«1» марта 2026 г.") == parse_ru_date("01.03.2026") == parse_ru_date("1.3.26") == "2026-03-01"
+    assert parse_ru_date("5 мая 2026 года") == "2026-05-05" and parse_ru_date("31.02.2026") is None
+
+    found = parse_application_text("\n".join(TEMPLATE))
+    ex = found.extract
+    assert (ex.employee.full_name, ex.employer_name, ex.request_date) == ("Иванов Иван Иванович", "ООО Ромашка", "2026-04-10")
+    assert (ex.leave.leave_type, ex.leave.start_date, ex.leave.end_date, ex.leave.days_count) == ("annual_paid", "2026-05-01", "2026-05-14", 12)
+    # 14 calendar days minus the 1st and 9th of May: the period and its length agree.
+    assert found.confidence["leave.days_count"] == 0.98 and found.complete(0.8)
+
+    unpaid = parse_application_text("от Смирновой Анны Петровны\nПрошу предоставить отпуск без сохранения заработной платы с 02.02.2026 по 04.02.2026")
+    assert unpaid.extract.employee.full_name == "Смирнова Анна Петровна" and unpaid.extract.leave.leave_type == "unpaid"
+    assert unpaid.missing == ["request_date", "leave.days_count"] and not unpaid.complete(0.8)
+
+
+def test_genitive_names_convert_fully_or_stay_below_the_threshold():
+    for genitive, nominative in (
+        ("Кузьмина Ильи Андреевича", "Кузьмин Илья Андреевич"),
+        ("Сидорова Никиты Петровича", "Сидоров Никита Петрович"),
+        ("Соколовского Игоря Павловича", "Соколовский Игорь Павлович"),
+        ("Кузнецова Павла Андреевича", "Кузнецов Павел Андреевич"),
+        ("Смирновой Ольги Игоревны", "Смирнова Ольга Игоревна"),
+    ):
+        found = parse_application_text("\n".join([TEMPLATE[0], f"от инженера {genitive}", *TEMPLATE[3:]]))
+        assert (found.extract.employee.full_name, found.confidence["employee.full_name"]) == (nominative, 0.85)
+
+    # An indeclinable surname keeps the genitive first name: never confident enough to skip the AI.
+    lines = [TEMPLATE[0], "от инженера Шевченко Никиты Петровича", *TEMPLATE[3:-1]]
+    unsure = parse_application_text("\n".join(lines))
+    assert unsure.confidence["employee.full_name"] < 0.8 and not unsure.complete(0.8)
+    signed = parse_application_text("\n".join([*lines, "Подпись: ________ /Шевченко Никита Петрович/"]))
+    assert (signed.extract.employee.full_name, signed.complete(0.8)) == ("Шевченко Никита Петрович", True)
+
+
+def test_complete_template_skips_the_ai(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    reload_settings()
+    monkeypatch.setattr(ai_extract, "_create_anthropic_client", _no_client)
+
+    parsed, debug_steps = extract_leave_request_with_debug(_pdf(TEMPLATE), filename="t.pdf")
+
+    assert parsed.leave.days_count == 12 and parsed.employee.full_name == "Иванов Иван Иванович"
+    # No handwriting on the generated page: the local detector answers the signature question.
+    assert parsed.signature_present is False
+    assert any("AI не вызывается" in s for s in debug_steps)
+
+    with pytest.raises(UpstreamAIError) as err:
+        extract_leave_request_with_debug(b"%PDF-1.4 scan", backend="rules")
+    assert (err.value.step, err.value.status_code) == ("rules", 422)
+
+
+def test_partial_template_merges_and_degrades(monkeypatch):
+    lines = TEMPLATE[:6]  # no period length, no date line
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    monkeypatch.setenv("ANTHROPIC_VISION_STREAM", "0")
+    monkeypatch.setenv("ANTHROPIC_STRUCTURED_STREAM", "0")
+    reload_settings()
+    monkeypatch.setattr(ai_extract, "_create_anthropic_client", lambda **kwargs: FakeClient(_model_extract()))
+
+    parsed, _ = extract_leave_request_with_debug(_pdf(lines), filename="t.pdf")
+    # The model misread the start date: the text layer's one wins, and it fills the employer the model left empty.
+    assert (parsed.leave.start_date, parsed.leave.days_count, parsed.employee.position) == ("2026-05-01", 12, "Инженер")
+    assert "text_layer: leave.start_date, employer_name" in parsed.quality.notes
+
+    monkeypatch.delenv("ANTHROPIC_API_KEY")
+    reload_settings()
+    degraded, _ = extract_leave_request_with_debug(_pdf(lines), filename="t.pdf")
+    assert degraded.leave.start_date == "2026-05-01" and degraded.leave.days_count is None
+    assert any(n.startswith("degraded:") for n in degraded.quality.notes)
+    assert degraded.quality.missing_fields == ["request_date", "leave.days_count"]
+
+    # A shorter name from the text layer does not replace the model's full one.
+    other = _model_extract(full_name="Иванов-Петров Иван Иванович")
+    other.employer_name = "ООО Ромашка"
+    assert apply_rule_fields(other, parse_application_text("\n".join(TEMPLATE)), 0.8) == ["leave.start_date"]
@@ -0,0 +1,78 @@
+import sys
+from pathlib import Path
+
+import fitz
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.ai_extract import _render_pdf_to_image_blocks
+from app.scan_preprocess import auto_crop, deskew, despeckle, estimate_skew_deg, normalize_contrast, preprocess_scan, rotate
+from app.settings import load_settings
+
+
+def _page_with_lines(h: int = 400, w: int = 300, background: int = 255) -> np.ndarray:
+    img = np.full((h, w), background, dtype=np.uint8)
+    for y in range(120, 280, 20):
+        img[y : y + 3, 80:220] = 20
+    return img
+
+
+def test_auto_crop_trims_margins_but_keeps_content():
+    img = _page_with_lines()
+    cropped = auto_crop(img, margin=4)
+    assert cropped.shape == (143 + 8, 140 + 8)
+    assert (cropped < 100).sum() == (img < 100).sum()
+
+
+def test_auto_crop_ignores_isolated_specks_in_margin():
+    img = _page_with_lines()
+    img[5, 5] = 0
+    assert auto_crop(img, margin=0).shape == (143, 140)
+
+
+def test_normalize_contrast_whitens_grey_background():
+    img = _page_with_lines(background=190)
+    out = normalize_contrast(img)
+    assert out[0, 0] == 255
+    assert out[121, 100] == 0
+
+
+def test_deskew_straightens_rotated_lines():
+    skewed = rotate(_page_with_lines(), 3.0)
+    assert abs(estimate_skew_deg(skewed) + 3.0) <= 0.5
+    straightened, angle = deskew(skewed)
+    assert angle != 0.0
+    assert abs(estimate_skew_deg(straightened)) <= 0.5
+    assert estimate_skew_deg(_page_with_lines()) == 0.0
+
+
+def test_despeckle_removes_isolated_pixels_only():
+    img = _page_with_lines()
+    img[50, 50] = 0
+    out, removed = despeckle(img)
+    assert removed == 1
+    assert out[50, 50] == 255
+    assert (out[120:123, 80:220] == 20).all()
+
+
+def test_preprocess_reports_stage_timing_and_pixel_savings():
+    out, stats = preprocess_scan(_page_with_lines(background=200))
+    assert set(stats["stage_ms"]) == {"crop", "normalize", "deskew", "despeckle"}
+    assert stats["pixels_after"] == out.shape[0] * out.shape[1]
+    assert stats["pixels_saved"] > 0
+
+
+def test_render_applies_preprocess_when_enabled():
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((200, 300), "Заявление на отпуск", fontname="china-s", fontsize=16)
+    pdf = doc.tobytes()
+    settings = load_settings({"PDF_PREPROCESS": "1", "PDF_PREPROCESS_STAGES": "crop,despeckle"})
+
+    blocks, info = _render_pdf_to_image_blocks(pdf, [], settings=settings)
+
+    assert len(blocks) == 1
+    assert info["preprocess"]["stages"] == ["crop", "despeckle"]
+    assert info["preprocess"]["pixels_after"] < info["preprocess"]["pixels_before"]
+    assert info["page_stats"][0]["w_px"] * info["page_stats"][0]["h_px"] == info["preprocess"]["pixels_after"]
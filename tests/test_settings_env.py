@@ -1,10 +1,14 @@
+import asyncio
 import os
+import signal
 import sys
 from pathlib import Path
 
+import pytest
+
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-from app.settings import get_settings
+from app.settings import get_settings, load_settings, reload_settings
 
 
 def test_settings_reads_dotenv(tmp_path, monkeypatch):
@@ -12,6 +16,69 @@ def test_settings_reads_dotenv(tmp_path, monkeypatch):
     env_file.write_text('APP_ENV=dev\nLOG_LEVEL=DEBUG\nMAX_UPLOAD_MB=12\n')
     monkeypatch.chdir(tmp_path)
     monkeypatch.delenv('MAX_UPLOAD_MB', raising=False)
-    get_settings.cache_clear()
+    reload_settings()
     s = get_settings()
     assert s.MAX_UPLOAD_MB == 12
+
+
+def test_environment_wins_over_dotenv_and_dotenv_edits_apply_on_reload(tmp_path, monkeypatch):
+    env_file = tmp_path / '.env'
+    env_file.write_text('MAX_UPLOAD_MB=12\nPDF_MAX_PAGES=3\n')
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv('MAX_UPLOAD_MB', raising=False)
+    monkeypatch.setenv('PDF_MAX_PAGES', '2')
+    before = reload_settings()
+    assert (before.MAX_UPLOAD_MB, before.PDF_MAX_PAGES) == (12, 2)
+
+    env_file.write_text('MAX_UPLOAD_MB=20\nPDF_MAX_PAGES=3\n')
+    after = reload_settings()
+    assert (after.MAX_UPLOAD_MB, after.PDF_MAX_PAGES) == (20, 2)
+    assert after.GENERATION == before.GENERATION + 1
+    assert get_settings() is after
+    # The old snapshot is untouched for requests that already hold it.
+    assert before.MAX_UPLOAD_MB == 12
+
+
+def test_defaults_match_runtime_and_budgets_are_precomputed():
+    s = load_settings({})
+    assert s.ANTHROPIC_MAX_RETRIES == 2
+    assert s.PDF_MAX_PAGES == 1
+    assert s.ANTHROPIC_STRUCTURED_PARSE_TIMEOUT_S == 30
+    # 90s x 3 attempts + 2s backoff per retry
+    assert s.VISION_BUDGET_S == 274
+    assert s.SDK_HTTP_TIMEOUT_S == 279
+    assert load_settings({'ANTHROPIC_MAX_RETRIES': '0', 'ANTHROPIC_VISION_TIMEOUT_S': '5'}).ANTHROPIC_VISION_TIMEOUT_S == 15
+
+
+def test_snapshot_is_immutable():
+    s = load_settings({})
+    with pytest.raises(Exception):
+        s.PDF_MAX_PAGES = 5
+
+
+def test_failed_reload_keeps_previous_snapshot(monkeypatch):
+    current = reload_settings()
+    monkeypatch.setenv('APP_ENV', 'prod')
+    monkeypatch.setenv('ANTHROPIC_API_KEY', '')
+    assert reload_settings() is current
+    assert get_settings() is current
+    with pytest.raises(RuntimeError):
+        load_settings()
+
+
+@pytest.mark.skipif(not hasattr(signal, 'SIGHUP'), reason='SIGHUP is POSIX-only')
+def test_sighup_reloads_snapshot_in_running_worker(monkeypatch):
+    from app import main
+
+    before = reload_settings()
+    monkeypatch.setenv('PDF_MAX_PAGES', '4')
+
+    async def _serve():
+        await main._install_config_reload()
+        os.kill(os.getpid(), signal.SIGHUP)
+        await asyncio.sleep(0.05)
+
+    asyncio.run(_serve())
+    after = get_settings()
+    assert after.GENERATION == before.GENERATION + 1
+    assert after.PDF_MAX_PAGES == 4
@@ -0,0 +1,113 @@
+import math
+import sys
+from pathlib import Path
+
+import fitz
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.ai_extract import _draft_prompt_ru, _parse_prompt_ru_json_only, _render_pdf_to_image_blocks
+from app.schemas import LeaveRequestExtract
+from app.settings import load_settings
+from app.signature_detect import detect_signature, label_components, reconcile_signature
+
+LINES = [
+    "Генеральному директору ООО Ромашка",
+    "от инженера Иванова И.И.",
+    "",
+    "ЗАЯВЛЕНИЕ",
+    "Прошу предоставить ежегодный оплачиваемый отпуск с 01.07.2026 по 14.07.2026",
+    *[""] * 12,
+    "Дата: 10.06.2026        Подпись: ____________ /Иванов И.И./",
+]
+
+
+def _pdf(*, signed: bool, frame: bool = False) -> bytes:
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    for i, line in enumerate(LINES):
+        page.insert_text((60, 80 + 30 * i), line, fontsize=12, fontname="helv")
+    page.draw_line((60, 700), (540, 700))
+    if frame:
+        page.draw_rect(fitz.Rect(50, 480, 560, 720))
+    if signed:
+        points = [(360 + t * 1.2, 570 + 18 * math.sin(t / 6) - t * 0.15) for t in range(100)]
+        for a, b in zip(points, points[1:]):
+            page.draw_line(a, b, color=(0.1, 0.2, 0.8), width=1.2)
+    return doc.tobytes()
+
+
+def _page_array(pdf: bytes, long_edge: int = 1568) -> np.ndarray:
+    page = fitz.open(stream=pdf, filetype="pdf").load_page(0)
+    zoom = long_edge / 842
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+    return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+
+
+def _extract(present, confidence):
+    return LeaveRequestExtract.model_validate({"signature_present": present, "signature_confidence": confidence})
+
+
+def test_label_components_matches_flood_fill():
+    mask = np.random.default_rng(1).random((60, 80)) < 0.45
+    pixels, component = label_components(mask)
+    labels = -np.ones(mask.shape, dtype=int)
+    count = 0
+    for y, x in zip(*np.nonzero(mask)):
+        if labels[y, x] >= 0:
+            continue
+        labels[y, x], stack = count, [(y, x)]
+        while stack:
+            cy, cx = stack.pop()
+            for ny in range(max(0, cy - 1), min(60, cy + 2)):
+                for nx in range(max(0, cx - 1), min(80, cx + 2)):
+                    if mask[ny, nx] and labels[ny, nx] < 0:
+                        labels[ny, nx] = count
+                        stack.append((ny, nx))
+        count += 1
+    assert component.max() + 1 == count
+    assert len(set(zip(labels.ravel()[pixels], component))) == count
+
+
+def test_detector_tells_handwriting_from_print_lines_and_frames():
+    for long_edge in (1568, 1024):
+        signed = detect_signature(_page_array(_pdf(signed=True, frame=True), long_edge))
+        assert signed.present and signed.strokes >= 1 and signed.score >= 0.85
+        for pdf in (_pdf(signed=False), _pdf(signed=False, frame=True)):
+            unsigned = detect_signature(_page_array(pdf, long_edge))
+            assert not unsigned.present and unsigned.score <= 0.15
+        assert signed.ms < 100
+    assert detect_signature(np.full((800, 600), 255, dtype=np.uint8)).score == 0.0
+
+
+def test_reconcile_modes():
+    absent, present = {"score": 0.1}, {"score": 0.95}
+
+    ex = _extract(True, 0.9)
+    assert reconcile_signature(ex, absent, "check") is not None
+    assert (ex.signature_present, ex.signature_confidence) == (True, 0.5)
+    ex = _extract(False, 0.8)
+    reconcile_signature(ex, present, "check")
+    assert (ex.signature_present, ex.signature_confidence) == (True, 0.5)
+    ex = _extract(None, None)
+    reconcile_signature(ex, present, "check")
+    assert (ex.signature_present, ex.signature_confidence) == (True, 0.95)
+    # Agreement, an unsure detector or the detector off leave the model's answer as is.
+    ex = _extract(True, 0.9)
+    assert reconcile_signature(ex, present, "check") is None and reconcile_signature(ex, {"score": 0.4}, "check") is None
+    assert reconcile_signature(ex, absent, "off") is None and ex.signature_confidence == 0.9
+
+    ex = _extract(True, 0.9)
+    reconcile_signature(ex, absent, "replace")
+    assert (ex.signature_present, ex.signature_confidence) == (False, 0.9)
+
+
+def test_render_reports_signature_and_replace_mode_drops_the_question():
+    _, info = _render_pdf_to_image_blocks(_pdf(signed=True), [], settings=load_settings({}))
+    assert info["signature"]["present"] and info["signature"]["page"] == 0
+    _, info = _render_pdf_to_image_blocks(_pdf(signed=True), [], settings=load_settings({"SIGNATURE_DETECTOR": "off"}))
+    assert "signature" not in info
+
+    assert "подпись" in _draft_prompt_ru() and "подпись" not in _draft_prompt_ru(signature=False)
+    assert "signature_present=null" in _parse_prompt_ru_json_only("черновик", signature=False)
@@ -0,0 +1,180 @@
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from fastapi.testclient import TestClient
+
+from app import main
+from app.admission import PRIORITY_BATCH, AdmissionConfig, AdmissionController, AdmissionRejected
+from app.schemas import LeaveRequestExtract
+from app.singleflight import SingleFlight, document_key
+
+PDF = {"file": ("a.pdf", b"%PDF-1.4 single flight", "application/pdf")}
+
+
+def _wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+def test_document_key_depends_on_bytes_and_config():
+    assert document_key(b"a", 1, True) == document_key(b"a", 1, True)
+    assert document_key(b"a", 1, True) != document_key(b"a", 2, True)
+    assert document_key(b"a", 1, True) != document_key(b"a", 1, False)
+    assert document_key(b"a", 1, True) != document_key(b"b", 1, True)
+
+
+def test_follower_gets_replay_then_live_events_and_the_leader_result():
+    group = SingleFlight()
+    leader_flight, leader = group.join("k")
+    follower_flight, follower_leads = group.join("k")
+    assert leader and not follower_leads and follower_flight is leader_flight
+
+    leader_events, follower_events = [], []
+    leader_flight.subscribe(on_debug=leader_events.append)
+    joined = threading.Event()
+
+    def pipeline(on_debug, on_delta, on_field, on_reset):
+        on_debug("step 1")
+        joined.wait(5)
+        on_debug("step 2")
+        return "result"
+
+    runner = threading.Thread(target=lambda: leader_flight.run(pipeline))
+    runner.start()
+    _wait_until(lambda: leader_events)
+    follower_flight.subscribe(on_debug=follower_events.append)
+    joined.set()
+    assert follower_flight.wait() == "result"
+    runner.join()
+
+    assert leader_events == follower_events == ["step 1", "step 2"]
+    assert group.stats() == {"in_flight": 0, "waiting": 0, "leaders": 1, "coalesced": 1}
+    # Done flights are forgotten: the next identical call runs again.
+    assert group.join("k")[1] is True
+
+
+def test_reset_is_replayed_as_its_own_event():
+    flight, _ = SingleFlight().join("k")
+
+    def pipeline(on_debug, on_delta, on_field, on_reset):
+        on_delta("vision", "first")
+        on_reset("vision.escalated")
+        on_delta("vision.escalated", "")
+        return "result"
+
+    flight.run(pipeline)
+    events = []
+    flight.subscribe(on_delta=lambda *a: events.append(("delta", *a)), on_reset=lambda step: events.append(("reset", step)))
+
+    assert events == [("delta", "vision", "first"), ("reset", "vision.escalated"), ("delta", "vision.escalated", "")]
+
+
+def test_leader_error_reaches_every_waiter():
+    group = SingleFlight()
+    flight, _ = group.join("k")
+    follower, _ = group.join("k")
+
+    def pipeline(**callbacks):
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        flight.run(pipeline)
+    with pytest.raises(ValueError):
+        follower.wait()
+
+
+def test_no_key_never_coalesces():
+    group = SingleFlight()
+    assert group.join(None)[1] is True
+    assert group.join(None)[1] is True
+    assert group.stats()["coalesced"] == 0
+
+
+def test_concurrent_identical_uploads_call_upstream_once(monkeypatch):
+    started, release = threading.Event(), threading.Event()
+    calls = []
+    extract = LeaveRequestExtract.model_validate({"employee": {"full_name": "Иванов Иван Иванович"}})
+
+    def slow_extract(data, filename, **kwargs):
+        calls.append(filename)
+        started.set()
+        release.wait(5)
+        return extract, ["Шаг vision: elapsed_ms=1000"]
+
+    group = SingleFlight()
+    monkeypatch.setattr(main, "SINGLE_FLIGHT", group)
+    monkeypatch.setattr(main, "ADMISSION", AdmissionController())
+    monkeypatch.setattr(main, "_admission_generation", main.get_settings().GENERATION)
+    monkeypatch.setattr(main, "extract_leave_request_with_debug", slow_extract)
+    client = TestClient(main.app)
+
+    responses = []
+    first = threading.Thread(target=lambda: responses.append(client.post("/api/extract?debug=1", files=PDF)))
+    first.start()
+    assert started.wait(5)
+    second = threading.Thread(target=lambda: responses.append(client.post("/api/extract?debug=1", files=PDF)))
+    second.start()
+    _wait_until(lambda: group.stats()["waiting"] == 1)
+    release.set()
+    first.join(5)
+    second.join(5)
+
+    assert len(calls) == 1
+    bodies = [r.json() for r in responses]
+    assert [r.status_code for r in responses] == [200, 200]
+    assert all(b["extract"]["employee"]["full_name"] == "Иванов Иван Иванович" for b in bodies)
+    assert all(b["trace"]["timings_ms"] == {"vision": 1000} for b in bodies)
+    assert sum(b["debug_steps"][0].startswith("Single-flight") for b in bodies) == 1
+
+    stats = client.get("/api/admission").json()["single_flight"]
+    assert stats["leaders"] == 1 and stats["coalesced"] == 1
+    # The coalesced request did not take an admission slot.
+    assert main.ADMISSION.stats()["admitted"] == 1
+
+
+def test_leader_cancelled_before_its_thread_starts_frees_waiters_and_slot(monkeypatch):
+    ctrl = AdmissionController(AdmissionConfig(initial_limit=2))
+    monkeypatch.setattr(main, "ADMISSION", ctrl)
+    monkeypatch.setattr(main, "_admission_generation", main.get_settings().GENERATION)
+    monkeypatch.setattr(main, "SINGLE_FLIGHT", SingleFlight())
+    calls = []
+    monkeypatch.setattr(main, "extract_leave_request_with_debug", lambda *a, **kw: calls.append(a))
+    real_run_in_threadpool = main.run_in_threadpool
+
+    async def starved_threadpool(fn, *args, **kwargs):
+        if fn is main._run_extraction:
+            # No threadpool token ever becomes free: the request is cancelled while waiting for one.
+            await asyncio.Event().wait()
+        return await real_run_in_threadpool(fn, *args, **kwargs)
+
+    monkeypatch.setattr(main, "run_in_threadpool", starved_threadpool)
+
+    async def run():
+        flight, leader, slot = await main._start_extraction(b"%PDF-1.4 x", PRIORITY_BATCH, streaming=False)
+        follower, follower_leads = main.SINGLE_FLIGHT.join(flight.key)
+        task = asyncio.create_task(main._extract_in_threadpool(flight, leader, slot, b"%PDF-1.4 x", "a.pdf"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return flight, follower, follower_leads
+
+    flight, follower, follower_leads = asyncio.run(run())
+
+    assert not follower_leads
+    with pytest.raises(AdmissionRejected):
+        follower.wait()
+    assert ctrl.in_flight == 0
+    # A thread that starts late does not run the pipeline or release the slot a second time.
+    with pytest.raises(AdmissionRejected):
+        main._run_extraction(flight, True, None, b"%PDF-1.4 x", "a.pdf")
+    assert calls == [] and ctrl.in_flight == 0
@@ -0,0 +1,83 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from fastapi.testclient import TestClient
+
+from app import ai_extract, main, startup
+from app.settings import reload_settings
+
+
+def _fresh_state(monkeypatch):
+    state = startup.StartupState()
+    monkeypatch.setattr(startup, "STATE", state)
+    monkeypatch.setattr(main, "STARTUP_STATE", state)
+    return state
+
+
+def test_ready_is_503_until_worker_warmup_finishes(monkeypatch):
+    monkeypatch.setenv("MOCK_MODE", "1")
+    reload_settings()
+    state = _fresh_state(monkeypatch)
+    client = TestClient(main.app)
+
+    r = client.get("/api/ready")
+    assert r.status_code == 503 and r.json()["status"] == "starting"
+    assert client.get("/api/health").status_code == 200
+
+    startup.warm_worker()
+
+    body = client.get("/api/ready").json()
+    assert body["status"] == "ready" and body["errors"] == []
+    assert set(body["warmup_ms"]) == {"render_sample_pdf", "schemas", "templates", "upstream_connect"}
+    assert state.shared_done
+
+
+def test_preloaded_shared_phase_is_not_repeated_in_worker(monkeypatch):
+    monkeypatch.setenv("MOCK_MODE", "1")
+    reload_settings()
+    state = _fresh_state(monkeypatch)
+    state.preloaded = True
+    state.shared_done = True
+    calls = []
+    monkeypatch.setattr(startup, "_render_sample", lambda: calls.append("render"))
+
+    startup.warm_worker()
+
+    assert calls == []
+    assert state.snapshot()["status"] == "ready"
+
+
+def test_warmup_failures_are_reported_but_do_not_block_readiness(monkeypatch):
+    monkeypatch.setenv("MOCK_MODE", "1")
+    reload_settings()
+    _fresh_state(monkeypatch)
+
+    def broken():
+        raise OSError("no fonts")
+
+    monkeypatch.setattr(startup, "_compile_templates", broken)
+    startup.warm_worker()
+
+    body = TestClient(main.app).get("/api/ready").json()
+    assert body["status"] == "ready"
+    assert body["errors"] == ["templates: OSError"]
+
+
+def test_startup_event_with_warmup_disabled_reports_ready(monkeypatch):
+    monkeypatch.setenv("STARTUP_WARMUP", "0")
+    reload_settings()
+    _fresh_state(monkeypatch)
+    with TestClient(main.app) as client:
+        assert client.get("/api/ready").status_code == 200
+
+
+def test_anthropic_client_is_shared_per_config(monkeypatch):
+    monkeypatch.setattr(ai_extract, "_new_anthropic_client", lambda *key: object())
+    ai_extract._CLIENTS.clear()
+
+    first = ai_extract._create_anthropic_client(api_key="k", max_retries=2, http_timeout_s=60)
+    assert ai_extract._create_anthropic_client(api_key="k", max_retries=2, http_timeout_s=60) is first
+    assert ai_extract._create_anthropic_client(api_key="k", max_retries=0, http_timeout_s=60) is not first
+    ai_extract._CLIENTS.clear()